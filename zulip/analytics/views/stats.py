@@ -30,6 +30,7 @@ from zerver.decorator import (
 )
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.i18n import get_and_set_request_language, get_language_translation_data
+from zerver.lib.read_replica import read_from_replica
 from zerver.lib.request import REQ, has_request_variables
 from zerver.lib.response import json_success
 from zerver.lib.streams import access_stream_by_id
@@ -239,6 +240,7 @@ def get_chart_data_for_remote_installation(
     )
 
 
+@read_from_replica
 @require_non_guest_user
 @has_request_variables
 def get_chart_data(
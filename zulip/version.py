@@ -34,7 +34,7 @@ DESKTOP_WARNING_VERSION = "5.9.3"
 # new level means in api_docs/changelog.md, as well as "**Changes**"
 # entries in the endpoint's documentation in `zulip.yaml`.
 
-API_FEATURE_LEVEL = 278  # Last bumped for backporting original-dimensions on spinner
+API_FEATURE_LEVEL = 285  # Last bumped for versioning users and subscriptions in /register
 
 # Bump the minor PROVISION_VERSION to indicate that folks should provision
 # only when going from an old version of the code to a newer version. Bump
@@ -49,4 +49,4 @@ API_FEATURE_LEVEL = 278  # Last bumped for backporting original-dimensions on sp
 #   historical commits sharing the same major version, in which case a
 #   minor version bump suffices.
 
-PROVISION_VERSION = (292, 0)  # bumped 2024-10-31 to upgrade Python requirements
+PROVISION_VERSION = (292, 1)  # bumped 2026-10-19 to build the emoji index
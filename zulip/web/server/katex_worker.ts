@@ -0,0 +1,70 @@
+// A long-running KaTeX renderer, started by zerver/lib/tex.py to
+// render batches of TeX without starting node for each formula.
+//
+// Each request on stdin, and each response on stdout, is a JSON
+// object preceded by its length in bytes, as a 4-byte big-endian
+// integer.  A request is {"formulas": [{"content": ..., "is_display":
+// ...}, ...]}, and its response {"results": [...]}, with the HTML for
+// each formula, or null if it couldn't be rendered.
+//
+// Once KaTeX is loaded, before any responses, we write {"ready":
+// true}, so that our parent doesn't count our startup time against
+// its first request.
+
+import katex from "katex";
+
+const render = (formula: unknown): string | null => {
+    if (
+        typeof formula !== "object" ||
+        formula === null ||
+        !("content" in formula) ||
+        typeof formula.content !== "string"
+    ) {
+        return null;
+    }
+    const is_display = "is_display" in formula && formula.is_display === true;
+    try {
+        return katex.renderToString(formula.content, {displayMode: is_display});
+    } catch (error) {
+        if (!(error instanceof katex.ParseError)) {
+            console.error(error);
+        }
+        return null;
+    }
+};
+
+const write_frame = (payload: unknown): void => {
+    const body = Buffer.from(JSON.stringify(payload), "utf8");
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(body.length);
+    process.stdout.write(Buffer.concat([header, body]));
+};
+
+write_frame({ready: true});
+
+let buffer = Buffer.alloc(0);
+
+process.stdin.on("data", (chunk: Buffer) => {
+    buffer = Buffer.concat([buffer, chunk]);
+    while (buffer.length >= 4) {
+        const length = buffer.readUInt32BE(0);
+        if (buffer.length < 4 + length) {
+            break;
+        }
+        const request: unknown = JSON.parse(buffer.subarray(4, 4 + length).toString("utf8"));
+        buffer = buffer.subarray(4 + length);
+        const formulas =
+            typeof request === "object" &&
+            request !== null &&
+            "formulas" in request &&
+            Array.isArray(request.formulas)
+                ? (request.formulas as unknown[])
+                : [];
+        write_frame({results: formulas.map((formula) => render(formula))});
+    }
+});
+
+// Our parent closes our stdin when it's done with us, or exits.
+process.stdin.on("end", () => {
+    process.exit(0);
+});
@@ -1,6 +1,7 @@
 import $ from "jquery";
 import _ from "lodash";
 import assert from "minimalistic-assert";
+import type {z} from "zod";
 
 import render_empty_list_widget_for_list from "../templates/empty_list_widget_for_list.hbs";
 
@@ -16,6 +17,7 @@ import * as popovers from "./popovers";
 import * as presence from "./presence";
 import type {PresenceInfoFromEvent} from "./presence";
 import * as sidebar_ui from "./sidebar_ui";
+import type {presence_schema} from "./state_data";
 import {realm} from "./state_data";
 import * as ui_util from "./ui_util";
 import type {FullUnreadCountsData} from "./unread";
@@ -185,6 +187,24 @@ export function update_presence_info(
     pm_list.update_private_messages();
 }
 
+export function update_presence_info_from_batch(
+    presences: Record<string, z.infer<typeof presence_schema>>,
+    server_time: number,
+): void {
+    for (const [user_id_str, info] of Object.entries(presences)) {
+        const user_id = Number.parseInt(user_id_str, 10);
+        // As in update_presence_info, ignore inaccessible users.
+        const person = people.maybe_get_user_by_id(user_id, true);
+        if (person === undefined || person.is_inaccessible_user) {
+            continue;
+        }
+
+        presence.update_info_from_batch_event(user_id, info, server_time);
+        redraw_user(user_id);
+    }
+    pm_list.update_private_messages();
+}
+
 export function redraw(): void {
     build_user_sidebar();
     assert(user_cursor !== undefined);
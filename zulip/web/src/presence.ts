@@ -176,6 +176,23 @@ export function update_info_from_event(
     presence_info.set(user_id, status);
 }
 
+export function update_info_from_batch_event(
+    user_id: number,
+    info: z.infer<typeof presence_schema>,
+    server_timestamp: number,
+): void {
+    // presence_batch events contain the user's current presence, in
+    // the same format as the `presences` data we get from the server
+    // when registering, so we replace what we had.
+    const raw: RawPresence = {
+        server_timestamp,
+        active_timestamp: info.active_timestamp,
+        idle_timestamp: info.idle_timestamp,
+    };
+    raw_info.set(user_id, raw);
+    presence_info.set(user_id, status_from_raw(raw));
+}
+
 export function set_info(
     presences: Record<number, z.infer<typeof presence_schema>>,
     server_timestamp: number,
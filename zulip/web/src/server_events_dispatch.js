@@ -165,6 +165,10 @@ export function dispatch_normal_event(event) {
             activity_ui.update_presence_info(event.user_id, event.presence, event.server_timestamp);
             break;
 
+        case "presence_batch":
+            activity_ui.update_presence_info_from_batch(event.presences, event.server_timestamp);
+            break;
+
         case "restart":
             realm.zulip_version = event.zulip_version;
             realm.zulip_merge_base = event.zulip_merge_base;
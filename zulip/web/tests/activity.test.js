@@ -779,6 +779,42 @@ test("update_presence_info", ({override, override_rewire}) => {
     assert.equal(presence.presence_info.get(inaccessible_user_id), undefined);
 });
 
+test("update_presence_info_from_batch", ({override, override_rewire}) => {
+    let num_updates = 0;
+    override(pm_list, "update_private_messages", () => {
+        num_updates += 1;
+    });
+    override_rewire(activity_ui, "update_presence_indicators", noop);
+    override(buddy_list, "insert_or_move", noop);
+
+    realm.server_presence_offline_threshold_seconds = 200;
+
+    const inaccessible_user_id = 11;
+    settings_data.user_can_access_all_other_users = () => false;
+    people._add_user(
+        people.make_user(inaccessible_user_id, "user11@zulipdev.com", "Unknown user"),
+    );
+
+    const invalid_user_id = 99;
+    presence.presence_info.delete(alice.user_id);
+    activity_ui.update_presence_info_from_batch(
+        {
+            [alice.user_id]: {active_timestamp: 500, idle_timestamp: 500},
+            [invalid_user_id]: {active_timestamp: 500},
+            [inaccessible_user_id]: {active_timestamp: 500},
+        },
+        500,
+    );
+
+    assert.deepEqual(presence.presence_info.get(alice.user_id), {
+        status: "active",
+        last_active: 500,
+    });
+    assert.equal(presence.presence_info.get(invalid_user_id), undefined);
+    assert.equal(presence.presence_info.get(inaccessible_user_id), undefined);
+    assert.equal(num_updates, 1);
+});
+
 test("initialize", ({override, override_rewire, mock_template}) => {
     override(pm_list, "update_private_messages", noop);
     override(watchdog, "check_for_unsuspend", noop);
@@ -380,6 +380,18 @@ run_test("presence", ({override}) => {
     assert_same(args.server_time, event.server_timestamp);
 });
 
+run_test("presence_batch", ({override}) => {
+    const event = event_fixtures.presence_batch;
+
+    const stub = make_stub();
+    override(activity_ui, "update_presence_info_from_batch", stub.f);
+    dispatch(event);
+    assert.equal(stub.num_calls, 1);
+    const args = stub.get_args("presences", "server_time");
+    assert_same(args.presences, event.presences);
+    assert_same(args.server_time, event.server_timestamp);
+});
+
 run_test("reaction", ({override}) => {
     let event = event_fixtures.reaction__add;
     {
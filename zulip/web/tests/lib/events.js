@@ -220,6 +220,17 @@ exports.fixtures = {
         server_timestamp: fake_now,
     },
 
+    presence_batch: {
+        type: "presence_batch",
+        presences: {
+            42: {
+                active_timestamp: fake_now,
+                idle_timestamp: fake_now,
+            },
+        },
+        server_timestamp: fake_now,
+    },
+
     reaction__add: {
         type: "reaction",
         op: "add",
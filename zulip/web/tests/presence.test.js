@@ -327,3 +327,24 @@ test("update_info_from_event", () => {
         last_active: 1000,
     });
 });
+
+test("update_info_from_batch_event", () => {
+    presence.presence_info.delete(alice.user_id);
+    presence.update_info_from_batch_event(
+        alice.user_id,
+        {active_timestamp: 500, idle_timestamp: 510},
+        510,
+    );
+
+    assert.deepEqual(presence.presence_info.get(alice.user_id), {
+        status: "active",
+        last_active: 510,
+    });
+
+    presence.update_info_from_batch_event(alice.user_id, {idle_timestamp: 1000}, 1000);
+
+    assert.deepEqual(presence.presence_info.get(alice.user_id), {
+        status: "idle",
+        last_active: 1000,
+    });
+});
@@ -260,6 +260,7 @@ const config = (
         entry: {
             katex_server: "babel-loader!./server/katex_server.ts",
             "katex-cli": "shebang-loader!katex/cli",
+            katex_worker: "babel-loader!./server/katex_worker.ts",
         },
         output: {
             path: path.resolve(__dirname, "../static/webpack-bundles"),
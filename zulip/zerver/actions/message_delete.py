@@ -4,7 +4,8 @@ from typing import TypedDict
 from zerver.lib import retention
 from zerver.lib.retention import move_messages_to_archive
 from zerver.lib.stream_subscription import get_active_subscriptions_for_stream_id
-from zerver.models import Message, Realm, Stream, UserMessage, UserProfile
+from zerver.lib.user_access_cache import clear_realm_user_access, discard_user_access_for_users
+from zerver.models import Message, Realm, Recipient, Stream, UserMessage, UserProfile
 from zerver.tornado.django_api import send_event_on_commit
 
 
@@ -88,6 +89,11 @@ def do_delete_messages(
         users_to_notify.add(acting_user.id)
 
     move_messages_to_archive(message_ids, realm=realm, chunk_size=archiving_chunk_size)
+    if sample_message.recipient.type == Recipient.PERSONAL:
+        # The two users may no longer be able to access each other.
+        discard_user_access_for_users(
+            realm.id, [sample_message.sender_id, sample_message.recipient.type_id]
+        )
     if message_type == "stream":
         stream = Stream.objects.get(id=sample_message.recipient.type_id)
         check_update_first_message_id(realm, stream, message_ids, users_to_notify)
@@ -105,3 +111,4 @@ def do_delete_messages_by_sender(user: UserProfile) -> None:
     )
     if message_ids:
         move_messages_to_archive(message_ids, chunk_size=retention.STREAM_MESSAGE_BATCH_SIZE)
+        clear_realm_user_access(user.realm_id)
@@ -60,6 +60,7 @@ from zerver.lib.topic import (
     TOPIC_NAME,
     messages_for_topic,
     participants_for_topic,
+    refresh_stream_topics,
     save_message_for_edit_use_case,
     update_edit_history,
     update_messages_for_topic_edit,
@@ -550,7 +551,9 @@ def do_update_message(
         event["followed_topic_email_user_ids"] = list(info.followed_topic_email_user_ids)
         event["muted_sender_user_ids"] = list(info.muted_sender_user_ids)
         event["prior_mention_user_ids"] = list(prior_mention_user_ids)
-        event["presence_idle_user_ids"] = filter_presence_idle_user_ids(info.active_user_ids)
+        event["presence_idle_user_ids"] = filter_presence_idle_user_ids(
+            info.active_user_ids, realm.id
+        )
         event["all_bot_user_ids"] = list(info.all_bot_user_ids)
         if rendering_result.mentions_stream_wildcard:
             event["stream_wildcard_mention_user_ids"] = list(info.stream_wildcard_mention_user_ids)
@@ -793,6 +796,14 @@ def do_update_message(
     # freshly-fetched-from-the-database changed messages.
     changed_messages = save_changes_for_propagation_mode()
 
+    if topic_name is not None or new_stream is not None:
+        assert stream_being_edited is not None
+        assert orig_topic_name is not None
+        assert stream_being_edited.recipient_id is not None
+        refresh_stream_topics(realm.id, stream_being_edited.recipient_id, [orig_topic_name])
+        assert target_stream.recipient_id is not None
+        refresh_stream_topics(realm.id, target_stream.recipient_id, [target_topic_name])
+
     realm_id: int | None = None
     if stream_being_edited is not None:
         realm_id = stream_being_edited.realm_id
@@ -3,15 +3,16 @@ from collections import defaultdict
 from dataclasses import asdict, dataclass, field
 
 from django.conf import settings
-from django.db import transaction
-from django.db.models import F
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
+from psycopg2.sql import SQL
 
 from analytics.lib.counts import COUNT_STATS, do_increment_logging_stat
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.message import (
-    bulk_access_messages,
+    bulk_access_message_ids,
     format_unread_message_details,
     get_raw_unread_data,
 )
@@ -33,9 +34,117 @@ class ReadMessagesEvent:
     flag: str = field(default="read", init=False)
 
 
-def do_mark_all_as_read(user_profile: UserProfile, *, timeout: float | None = None) -> int | None:
+# The number of UserMessage rows bulk_mark_as_read updates in each
+# transaction.
+MARK_AS_READ_BATCH_SIZE = 2000
+
+
+@dataclass
+class MarkAsReadProgress:
+    updated_count: int = 0
+    # The batches are ranges of consecutive unread message IDs, so the
+    # next batch starts after the last message ID we marked as read.
+    last_message_id: int = 0
+    complete: bool = False
+
+
+def mark_batch_as_read(query: QuerySet[UserMessage], after_message_id: int) -> list[int]:
+    batch_query = (
+        query.filter(message_id__gt=after_message_id)
+        .extra(where=[UserMessage.where_unread()])  # noqa: S610
+        .select_for_update(of=("self",))
+        .order_by("message_id")
+        .values("id")[:MARK_AS_READ_BATCH_SIZE]
+    )
+    # Django's update() can't tell us which rows it updated, so we
+    # lock and update the batch in a single UPDATE ... RETURNING
+    # query; the subquery's FOR UPDATE, in message ID order, avoids
+    # deadlocks with concurrent flag updates to the same rows (see
+    # UserMessage.select_for_update_query).
+    subquery, params = batch_query.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SQL(
+                """
+                UPDATE zerver_usermessage
+                SET flags = flags | %s
+                WHERE id IN ({subquery})
+                RETURNING message_id
+                """
+            ).format(subquery=SQL(subquery)),
+            [UserMessage.flags.read.mask, *params],
+        )
+        return sorted(message_id for (message_id,) in cursor.fetchall())
+
+
+def bulk_mark_as_read(
+    user_profile: UserProfile,
+    query: QuerySet[UserMessage],
+    *,
+    send_batch_events: bool,
+    timeout: float | None = None,
+    progress: MarkAsReadProgress | None = None,
+) -> MarkAsReadProgress:
+    """Marks the user's unread messages among the UserMessage rows in
+    `query` as read, in batches of MARK_AS_READ_BATCH_SIZE, each
+    updated by a single query in its own transaction.  This way,
+    marking 100,000s of messages as read never holds locks on more
+    than one batch of rows, and so doesn't block other changes to
+    them, like new messages being marked as read by the user's other
+    clients, for long.
+
+    If `timeout` seconds pass, returns with `complete` false;
+    passing the returned progress back in resumes where we stopped.
+    With `send_batch_events`, each batch sends the user a single event
+    for all of its messages, and clears their mobile push
+    notifications.
+    """
+    if progress is None:
+        progress = MarkAsReadProgress()
+
     start_time = time.monotonic()
+    while True:
+        if timeout is not None and time.monotonic() >= start_time + timeout:
+            return progress
+
+        with transaction.atomic(savepoint=False):
+            message_ids = mark_batch_as_read(query, progress.last_message_id)
+            if message_ids:
+                event_time = timezone_now()
+                do_increment_logging_stat(
+                    user_profile,
+                    COUNT_STATS["messages_read::hour"],
+                    None,
+                    event_time,
+                    increment=len(message_ids),
+                )
+                if progress.updated_count == 0:
+                    # A bulk operation counts as a single interaction,
+                    # however many batches it takes.
+                    do_increment_logging_stat(
+                        user_profile,
+                        COUNT_STATS["messages_read_interactions::hour"],
+                        None,
+                        event_time,
+                        increment=1,
+                    )
 
+        if message_ids:
+            progress.updated_count += len(message_ids)
+            progress.last_message_id = message_ids[-1]
+            if send_batch_events:
+                event = asdict(ReadMessagesEvent(messages=message_ids, all=False))
+                send_event(user_profile.realm, event, [user_profile.id])
+                do_clear_mobile_push_notifications_for_ids([user_profile.id], message_ids)
+
+        if len(message_ids) < MARK_AS_READ_BATCH_SIZE:
+            progress.complete = True
+            return progress
+
+
+def do_mark_all_as_read(
+    user_profile: UserProfile, *, timeout: float | None = None
+) -> MarkAsReadProgress:
     # First, we clear mobile push notifications.  This is safer in the
     # event that the below logic times out and we're killed.
     all_push_message_ids = (
@@ -49,46 +158,16 @@ def do_mark_all_as_read(user_profile: UserProfile, *, timeout: float | None = No
     )
     do_clear_mobile_push_notifications_for_ids([user_profile.id], all_push_message_ids)
 
-    batch_size = 2000
-    count = 0
-    while True:
-        if timeout is not None and time.monotonic() >= start_time + timeout:
-            return None
-
-        with transaction.atomic(savepoint=False):
-            query = (
-                UserMessage.select_for_update_query()
-                .filter(user_profile=user_profile)
-                .extra(where=[UserMessage.where_unread()])[:batch_size]  # noqa: S610
-            )
-            # This updated_count is the same as the number of UserMessage
-            # rows selected, because due to the FOR UPDATE lock, we're guaranteed
-            # that all the selected rows will indeed be updated.
-            # UPDATE queries don't support LIMIT, so we have to use a subquery
-            # to do batching.
-            updated_count = UserMessage.objects.filter(id__in=query).update(
-                flags=F("flags").bitor(UserMessage.flags.read),
-            )
-
-            event_time = timezone_now()
-            do_increment_logging_stat(
-                user_profile,
-                COUNT_STATS["messages_read::hour"],
-                None,
-                event_time,
-                increment=updated_count,
-            )
-            do_increment_logging_stat(
-                user_profile,
-                COUNT_STATS["messages_read_interactions::hour"],
-                None,
-                event_time,
-                increment=min(1, updated_count),
-            )
-
-            count += updated_count
-            if updated_count < batch_size:
-                break
+    # We don't send an event for each batch, since the client reloads
+    # its unread data once everything has been marked as read.
+    progress = bulk_mark_as_read(
+        user_profile,
+        UserMessage.objects.filter(user_profile=user_profile),
+        send_batch_events=False,
+        timeout=timeout,
+    )
+    if not progress.complete:
+        return progress
 
     event = asdict(
         ReadMessagesEvent(
@@ -98,104 +177,32 @@ def do_mark_all_as_read(user_profile: UserProfile, *, timeout: float | None = No
     )
     send_event(user_profile.realm, event, [user_profile.id])
 
-    return count
+    return progress
 
 
 def do_mark_stream_messages_as_read(
     user_profile: UserProfile, stream_recipient_id: int, topic_name: str | None = None
 ) -> int:
-    with transaction.atomic(savepoint=False):
-        query = (
-            UserMessage.select_for_update_query()
-            .filter(
-                user_profile=user_profile,
-                message__recipient_id=stream_recipient_id,
-            )
-            .extra(  # noqa: S610
-                where=[UserMessage.where_unread()],
-            )
-        )
-
-        if topic_name:
-            query = filter_by_topic_name_via_message(
-                query=query,
-                topic_name=topic_name,
-            )
-
-        message_ids = list(query.values_list("message_id", flat=True))
-
-        if len(message_ids) == 0:
-            return 0
-
-        count = query.update(
-            flags=F("flags").bitor(UserMessage.flags.read),
-        )
-
-    event = asdict(
-        ReadMessagesEvent(
-            messages=message_ids,
-            all=False,
-        )
+    query = UserMessage.objects.filter(
+        user_profile=user_profile,
+        message__recipient_id=stream_recipient_id,
     )
-    event_time = timezone_now()
 
-    send_event(user_profile.realm, event, [user_profile.id])
-    do_clear_mobile_push_notifications_for_ids([user_profile.id], message_ids)
+    if topic_name:
+        query = filter_by_topic_name_via_message(
+            query=query,
+            topic_name=topic_name,
+        )
 
-    do_increment_logging_stat(
-        user_profile, COUNT_STATS["messages_read::hour"], None, event_time, increment=count
-    )
-    do_increment_logging_stat(
-        user_profile,
-        COUNT_STATS["messages_read_interactions::hour"],
-        None,
-        event_time,
-        increment=min(1, count),
-    )
-    return count
+    return bulk_mark_as_read(user_profile, query, send_batch_events=True).updated_count
 
 
 def do_mark_muted_user_messages_as_read(
     user_profile: UserProfile,
     muted_user: UserProfile,
 ) -> int:
-    with transaction.atomic(savepoint=False):
-        query = (
-            UserMessage.select_for_update_query()
-            .filter(user_profile=user_profile, message__sender=muted_user)
-            .extra(where=[UserMessage.where_unread()])  # noqa: S610
-        )
-        message_ids = list(query.values_list("message_id", flat=True))
-
-        if len(message_ids) == 0:
-            return 0
-
-        count = query.update(
-            flags=F("flags").bitor(UserMessage.flags.read),
-        )
-
-    event = asdict(
-        ReadMessagesEvent(
-            messages=message_ids,
-            all=False,
-        )
-    )
-    event_time = timezone_now()
-
-    send_event(user_profile.realm, event, [user_profile.id])
-    do_clear_mobile_push_notifications_for_ids([user_profile.id], message_ids)
-
-    do_increment_logging_stat(
-        user_profile, COUNT_STATS["messages_read::hour"], None, event_time, increment=count
-    )
-    do_increment_logging_stat(
-        user_profile,
-        COUNT_STATS["messages_read_interactions::hour"],
-        None,
-        event_time,
-        increment=min(1, count),
-    )
-    return count
+    query = UserMessage.objects.filter(user_profile=user_profile, message__sender=muted_user)
+    return bulk_mark_as_read(user_profile, query, send_batch_events=True).updated_count
 
 
 def do_update_mobile_push_notification(
@@ -332,16 +339,8 @@ def do_update_message_flags(
             # See create_historical_user_messages for a more detailed
             # explanation.
             historical_message_ids = set(messages) - set(ums.keys())
-            historical_messages = bulk_access_messages(
-                user_profile,
-                list(
-                    # Uses index: zerver_message_pkey
-                    Message.objects.filter(id__in=historical_message_ids).prefetch_related(
-                        "recipient"
-                    )
-                ),
-            )
-            if len(historical_messages) != len(historical_message_ids):
+            accessible_message_ids = bulk_access_message_ids(user_profile, historical_message_ids)
+            if len(accessible_message_ids) != len(historical_message_ids):
                 raise JsonableError(_("Invalid message(s)"))
 
             create_historical_user_messages(
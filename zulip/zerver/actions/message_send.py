@@ -23,6 +23,7 @@ from zerver.actions.user_topics import (
     bulk_do_set_user_topic_visibility_policy,
     do_set_user_topic_visibility_policy,
 )
+from zerver.lib import presence_store
 from zerver.lib.addressee import Addressee
 from zerver.lib.alert_words import get_alert_word_automaton
 from zerver.lib.cache import cache_with_key, user_profile_delivery_email_cache_key
@@ -51,7 +52,7 @@ from zerver.lib.message import (
     truncate_topic,
     visibility_policy_for_send_message,
 )
-from zerver.lib.message_cache import MessageDict
+from zerver.lib.message_cache import MessageDict, cache_new_messages
 from zerver.lib.muted_users import get_muting_users
 from zerver.lib.notification_data import (
     UserMessageNotificationsData,
@@ -70,8 +71,9 @@ from zerver.lib.streams import access_stream_for_send_message, ensure_stream, su
 from zerver.lib.string_validation import check_stream_name
 from zerver.lib.thumbnail import get_user_upload_previews, rewrite_thumbnailed_images
 from zerver.lib.timestamp import timestamp_to_datetime
-from zerver.lib.topic import participants_for_topic
+from zerver.lib.topic import participants_for_topic, update_stream_topics_for_new_messages
 from zerver.lib.url_preview.types import UrlEmbedData
+from zerver.lib.user_access_cache import update_user_access_for_direct_message
 from zerver.lib.user_groups import is_any_user_in_group, is_user_in_group
 from zerver.lib.user_message import UserMessageLite, bulk_insert_ums
 from zerver.lib.users import (
@@ -788,7 +790,7 @@ def create_user_messages(
     return user_messages
 
 
-def filter_presence_idle_user_ids(user_ids: set[int]) -> list[int]:
+def filter_presence_idle_user_ids(user_ids: set[int], realm_id: int) -> list[int]:
     # Given a set of user IDs (the recipients of a message), accesses
     # the UserPresence table to determine which of these users are
     # currently idle and should potentially get email notifications
@@ -799,6 +801,16 @@ def filter_presence_idle_user_ids(user_ids: set[int]) -> list[int]:
         return []
 
     recent = timezone_now() - timedelta(seconds=settings.OFFLINE_THRESHOLD_SECS)
+    if settings.PRESENCE_UPDATES_IN_REDIS:
+        # The UserPresence table is only updated when presence updates
+        # are flushed, so it may be out of date.
+        active_user_ids = {
+            presence.user_profile_id
+            for presence in presence_store.get_users_presences(realm_id, user_ids)
+            if presence.last_active_time is not None and presence.last_active_time >= recent
+        }
+        return sorted(user_ids - active_user_ids)
+
     rows = UserPresence.objects.filter(
         user_profile_id__in=user_ids,
         last_active_time__gte=recent,
@@ -833,7 +845,7 @@ def get_active_presence_idle_user_ids(
         if user_notifications_data.is_notifiable(sender_id, idle=True):
             user_ids.add(user_notifications_data.user_id)
 
-    return filter_presence_idle_user_ids(user_ids)
+    return filter_presence_idle_user_ids(user_ids, realm.id)
 
 
 @transaction.atomic(savepoint=False)
@@ -859,6 +871,14 @@ def do_send_messages(
 
     Message.objects.bulk_create(send_request.message for send_request in send_message_requests)
 
+    for send_request in send_message_requests:
+        if send_request.message.recipient.type == Recipient.PERSONAL:
+            update_user_access_for_direct_message(
+                send_request.message.realm_id,
+                send_request.message.sender_id,
+                send_request.message.recipient.type_id,
+            )
+
     # Claim attachments in message
     for send_request in send_message_requests:
         if do_claim_attachments(
@@ -932,9 +952,34 @@ def do_send_messages(
 
     bulk_insert_ums(ums)
 
+    update_stream_topics_for_new_messages(
+        [send_request.message for send_request in send_message_requests]
+    )
+
     for send_request in send_message_requests:
         do_widget_post_save_actions(send_request)
 
+    # Messages are rendered for the realm of the stream they were sent
+    # to, which can differ from the sender's for cross-realm bots.
+    rendering_realm_ids: dict[int, int | None] = {}
+    for send_request in send_message_requests:
+        realm_id: int | None = None
+        if send_request.message.is_stream_message():
+            if send_request.stream is None:
+                stream_id = send_request.message.recipient.type_id
+                send_request.stream = Stream.objects.get(id=stream_id)
+            realm_id = send_request.stream.realm_id
+        rendering_realm_ids[send_request.message.id] = realm_id
+
+    # Populate the message cache for the whole batch at once; clients
+    # will fetch these messages shortly after receiving the events.
+    encoded_messages = cache_new_messages(
+        [
+            (send_request.message, rendering_realm_ids[send_request.message.id])
+            for send_request in send_message_requests
+        ]
+    )
+
     # This next loop is responsible for notifying other parts of the
     # Zulip system about the messages we just committed to the database:
     # * Sender automatically follows or unmutes the topic depending on 'automatically_follow_topics_policy'
@@ -945,14 +990,10 @@ def do_send_messages(
     # * Implementing the Welcome Bot reply hack
     # * Adding links to the embed_links queue for open graph processing.
     for send_request in send_message_requests:
-        realm_id: int | None = None
+        realm_id = rendering_realm_ids[send_request.message.id]
         if send_request.message.is_stream_message():
-            if send_request.stream is None:
-                stream_id = send_request.message.recipient.type_id
-                send_request.stream = Stream.objects.get(id=stream_id)
             # assert needed because stubs for django are missing
             assert send_request.stream is not None
-            realm_id = send_request.stream.realm_id
             sender = send_request.message.sender
 
             # Determine and set the visibility_policy depending on 'automatically_follow_topics_policy'
@@ -1031,7 +1072,9 @@ def do_send_messages(
 
         # Deliver events to the real-time push system, as well as
         # enqueuing any additional processing triggered by the message.
-        wide_message_dict = MessageDict.wide_dict(send_request.message, realm_id)
+        wide_message_dict = MessageDict.wide_dict(
+            send_request.message, realm_id, encoded_messages[send_request.message.id]
+        )
 
         user_flags = user_message_flags.get(send_request.message.id, {})
 
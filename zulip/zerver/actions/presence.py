@@ -7,10 +7,12 @@ from django.db import connection, transaction
 from psycopg2 import sql
 
 from zerver.actions.user_activity import update_user_activity_interval
+from zerver.lib import presence_store
 from zerver.lib.presence import (
     format_legacy_presence_dict,
     user_presence_datetime_with_date_joined_default,
 )
+from zerver.lib.timestamp import datetime_to_timestamp
 from zerver.lib.users import get_user_ids_who_can_access_user
 from zerver.models import Client, UserPresence, UserProfile
 from zerver.models.clients import get_client
@@ -71,6 +73,10 @@ def send_presence_changed(
         user_id=user_profile.id,
         server_timestamp=time.time(),
         presence={presence_dict["client"]: presence_dict},
+        # Used by Tornado for presence_batch events; see
+        # process_presence_event.
+        active_timestamp=datetime_to_timestamp(last_active_time),
+        idle_timestamp=datetime_to_timestamp(last_connected_time),
     )
     send_event(user_profile.realm, event, user_ids)
 
@@ -88,48 +94,25 @@ def consolidate_client(client: Client) -> Client:
         return client
 
 
-# This function takes a very hot lock on the PresenceSequence row for the user's realm.
-# Since all presence updates in the realm all compete for this lock, we need to be
-# maximally efficient and only hold it as briefly as possible.
-# For that reason, we need durable=True to ensure we're not running inside a larger
-# transaction, which may stay alive longer than we'd like, holding the lock.
-@transaction.atomic(durable=True)
-def do_update_user_presence(
-    user_profile: UserProfile,
-    client: Client,
-    log_time: datetime,
-    status: int,
-    *,
-    force_send_update: bool = False,
-) -> None:
-    # This function requires some careful handling around setting the
-    # last_update_id field when updatng UserPresence objects. See the
-    # PresenceSequence model and the comments throughout the code for more details.
-
-    client = consolidate_client(client)
-
+def new_user_presence(user_profile: UserProfile, log_time: datetime, status: int) -> UserPresence:
     # If the user doesn't have a UserPresence row yet, we create one with
     # sensible defaults. If we're getting a presence update, clearly the user
     # at least connected, so last_connected_time should be set. last_active_time
     # will depend on whether the status sent is idle or active.
-    defaults = dict(
-        last_active_time=None,
-        last_connected_time=log_time,
+    return UserPresence(
+        user_profile=user_profile,
         realm_id=user_profile.realm_id,
+        last_active_time=log_time if status == UserPresence.LEGACY_STATUS_ACTIVE_INT else None,
+        last_connected_time=log_time,
     )
-    if status == UserPresence.LEGACY_STATUS_ACTIVE_INT:
-        defaults["last_active_time"] = log_time
 
-    try:
-        presence = UserPresence.objects.select_for_update().get(user_profile=user_profile)
-        creating = False
-    except UserPresence.DoesNotExist:
-        # We're not ready to write until we know the next last_update_id value.
-        # We don't want to hold the lock on PresenceSequence for too long,
-        # so we defer that until the last moment.
-        # Create the presence object in-memory only for now.
-        presence = UserPresence(**defaults, user_profile=user_profile)
-        creating = True
+
+def apply_presence_update(
+    presence: UserPresence, *, creating: bool, log_time: datetime, status: int
+) -> tuple[list[str], bool]:
+    """Applies a presence update from the user to the presence object
+    in memory.  Returns the fields which need to be saved, and whether
+    the user just became online."""
 
     # We initialize these values as a large delta so that if the user
     # was never active, we always treat the user as newly online.
@@ -180,6 +163,92 @@ def do_update_user_presence(
             presence.last_connected_time = log_time
             update_fields.append("last_connected_time")
 
+    return update_fields, became_online
+
+
+def do_update_user_presence(
+    user_profile: UserProfile,
+    client: Client,
+    log_time: datetime,
+    status: int,
+    *,
+    force_send_update: bool = False,
+) -> None:
+    client = consolidate_client(client)
+
+    if settings.PRESENCE_UPDATES_IN_REDIS:
+        do_update_user_presence_in_redis(
+            user_profile, log_time, status, force_send_update=force_send_update
+        )
+    else:
+        do_update_user_presence_in_database(
+            user_profile, log_time, status, force_send_update=force_send_update
+        )
+
+
+def do_update_user_presence_in_redis(
+    user_profile: UserProfile,
+    log_time: datetime,
+    status: int,
+    *,
+    force_send_update: bool,
+) -> None:
+    # See zerver/lib/presence_store.py; the database is updated later,
+    # by `manage.py flush_presence_updates`.
+    presence, raw_value = presence_store.get_user_presence(user_profile)
+    creating = presence is None
+    if presence is None:
+        presence = new_user_presence(user_profile, log_time, status)
+
+    update_fields, became_online = apply_presence_update(
+        presence, creating=creating, log_time=log_time, status=status
+    )
+    if (creating or len(update_fields) > 0) and presence_store.set_user_presence(
+        user_profile, presence, raw_value
+    ) is None:
+        # Another process just updated this user's presence, and will
+        # have sent any event about it.
+        logger.info("UserPresence concurrently updated for %s, returning.", user_profile.id)
+        return
+
+    if force_send_update or (
+        not user_profile.realm.presence_disabled and (creating or became_online)
+    ):
+        send_presence_changed(user_profile, presence, force_send_update=force_send_update)
+
+
+# This function takes a very hot lock on the PresenceSequence row for the user's realm.
+# Since all presence updates in the realm all compete for this lock, we need to be
+# maximally efficient and only hold it as briefly as possible.
+# For that reason, we need durable=True to ensure we're not running inside a larger
+# transaction, which may stay alive longer than we'd like, holding the lock.
+@transaction.atomic(durable=True)
+def do_update_user_presence_in_database(
+    user_profile: UserProfile,
+    log_time: datetime,
+    status: int,
+    *,
+    force_send_update: bool,
+) -> None:
+    # This function requires some careful handling around setting the
+    # last_update_id field when updatng UserPresence objects. See the
+    # PresenceSequence model and the comments throughout the code for more details.
+
+    try:
+        presence = UserPresence.objects.select_for_update().get(user_profile=user_profile)
+        creating = False
+    except UserPresence.DoesNotExist:
+        # We're not ready to write until we know the next last_update_id value.
+        # We don't want to hold the lock on PresenceSequence for too long,
+        # so we defer that until the last moment.
+        # Create the presence object in-memory only for now.
+        presence = new_user_presence(user_profile, log_time, status)
+        creating = True
+
+    update_fields, became_online = apply_presence_update(
+        presence, creating=creating, log_time=log_time, status=status
+    )
+
     # WARNING: Delicate, performance-sensitive block.
 
     # It's time to determine last_update_id and update the presence object in the database.
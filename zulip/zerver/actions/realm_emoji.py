@@ -8,6 +8,7 @@ from django.utils.translation import gettext as _
 
 from zerver.lib.emoji import get_emoji_file_name
 from zerver.lib.exceptions import JsonableError
+from zerver.lib.message_rerendering import queue_message_rerender
 from zerver.lib.thumbnail import THUMBNAIL_ACCEPT_IMAGE_TYPES, BadImageError
 from zerver.lib.upload import upload_emoji_image
 from zerver.lib.upload.base import INLINE_MIME_TYPES
@@ -62,6 +63,7 @@ def check_add_realm_emoji(
         },
     )
     notify_realm_emoji(realm_emoji.realm, realm_emoji_dict)
+    queue_message_rerender(realm, emoji_names=[name])
     return realm_emoji
 
 
@@ -84,3 +86,4 @@ def do_remove_realm_emoji(realm: Realm, name: str, *, acting_user: UserProfile |
     )
 
     notify_realm_emoji(realm, realm_emoji_dict)
+    queue_message_rerender(realm, emoji_names=[name])
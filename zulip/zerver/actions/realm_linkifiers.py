@@ -4,6 +4,7 @@ from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 
 from zerver.lib.exceptions import JsonableError
+from zerver.lib.message_rerendering import queue_message_rerender
 from zerver.lib.types import LinkifierDict
 from zerver.models import Realm, RealmAuditLog, RealmFilter, UserProfile
 from zerver.models.linkifiers import flush_linkifiers, linkifiers_for_realm
@@ -58,6 +59,7 @@ def do_add_linkifier(
         },
     )
     notify_linkifiers(realm, realm_linkifiers)
+    queue_message_rerender(realm, linkifier_patterns=[pattern])
 
     return linkifier.id
 
@@ -95,6 +97,7 @@ def do_remove_linkifier(
         },
     )
     notify_linkifiers(realm, realm_linkifiers)
+    queue_message_rerender(realm, linkifier_patterns=[pattern])
 
 
 @transaction.atomic(durable=True)
@@ -109,6 +112,7 @@ def do_update_linkifier(
     pattern = pattern.strip()
     url_template = url_template.strip()
     linkifier = RealmFilter.objects.get(realm=realm, id=id)
+    old_pattern = linkifier.pattern
     linkifier.pattern = pattern
     linkifier.url_template = url_template
     linkifier.full_clean()
@@ -131,6 +135,7 @@ def do_update_linkifier(
     )
 
     notify_linkifiers(realm, realm_linkifiers)
+    queue_message_rerender(realm, linkifier_patterns=sorted({old_pattern, pattern}))
 
 
 @transaction.atomic(durable=True)
@@ -180,3 +185,7 @@ def check_reorder_linkifiers(
         },
     )
     notify_linkifiers(realm, realm_linkifiers)
+    # When linkifiers overlap, the first to match applies.
+    queue_message_rerender(
+        realm, linkifier_patterns=[linkifier["pattern"] for linkifier in realm_linkifiers]
+    )
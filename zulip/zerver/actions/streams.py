@@ -48,7 +48,12 @@ from zerver.lib.streams import (
     stream_to_dict,
 )
 from zerver.lib.subscription_info import get_subscribers_query
+from zerver.lib.topic import rebuild_stream_topics
 from zerver.lib.types import APISubscriptionDict
+from zerver.lib.user_access_cache import (
+    update_user_access_for_new_subscriptions,
+    update_user_access_for_removed_subscriptions,
+)
 from zerver.lib.users import (
     get_subscribers_of_target_user_subscriptions,
     get_users_involved_in_dms_with_target_users,
@@ -135,6 +140,10 @@ def do_deactivate_stream(stream: Stream, *, acting_user: UserProfile | None) ->
     ).select_related("user_profile")
     subscribed_users = [sub.user_profile for sub in stream_subscribers]
     stream_subscribers.update(active=False)
+    assert stream.recipient_id is not None
+    update_user_access_for_removed_subscriptions(
+        stream.realm_id, [stream.recipient_id], [user.id for user in subscribed_users]
+    )
 
     was_invite_only = stream.invite_only
     was_public = stream.is_public()
@@ -376,6 +385,8 @@ def merge_streams(
         recipient=recipient_to_destroy,
     ).update(recipient=recipient_to_keep)
     bulk_delete_cache_keys(message_ids_to_clear)
+    rebuild_stream_topics(realm.id, recipient_to_destroy.id)
+    rebuild_stream_topics(realm.id, recipient_to_keep.id)
 
     # Remove subscriptions to the old stream.
     if len(subs_to_deactivate) > 0:
@@ -486,6 +497,11 @@ def bulk_add_subs_to_db_with_logging(
     sub_ids = [info.sub.id for info in subs_to_activate]
     Subscription.objects.filter(id__in=sub_ids).update(active=True)
 
+    new_subscriber_ids: dict[int, list[int]] = defaultdict(list)
+    for sub_info in [*subs_to_add, *subs_to_activate]:
+        new_subscriber_ids[sub_info.sub.recipient_id].append(sub_info.user.id)
+    update_user_access_for_new_subscriptions(realm.id, Recipient.STREAM, new_subscriber_ids)
+
     # Log subscription activities in RealmAuditLog
     event_time = timezone_now()
     event_last_message_id = get_last_message_id()
@@ -1055,6 +1071,11 @@ def bulk_remove_subscriptions(
         Subscription.objects.filter(
             id__in=sub_ids_to_deactivate,
         ).update(active=False)
+        update_user_access_for_removed_subscriptions(
+            realm.id,
+            {sub_info.sub.recipient_id for sub_info in subs_to_deactivate},
+            {sub_info.user.id for sub_info in subs_to_deactivate},
+        )
         occupied_streams_after = list(get_occupied_streams(realm))
 
         # Log subscription activities in RealmAuditLog
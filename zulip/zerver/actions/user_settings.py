@@ -9,6 +9,7 @@ from django.utils.timezone import now as timezone_now
 from confirmation.models import Confirmation, create_confirmation_link
 from confirmation.settings import STATUS_REVOKED
 from zerver.actions.presence import do_update_user_presence
+from zerver.lib import presence_store
 from zerver.lib.avatar import avatar_url
 from zerver.lib.cache import (
     cache_delete,
@@ -561,6 +562,8 @@ def do_change_user_setting(
             # replace our presence data structure with a simpler model
             # that doesn't separate individual clients.
             UserPresence.objects.filter(user_profile_id=user_profile.id).delete()
+            if settings.PRESENCE_UPDATES_IN_REDIS:
+                presence_store.delete_user_presence(user_profile)
 
             # We create a single presence entry for the user, old
             # enough to be guaranteed to be treated as offline by
@@ -22,6 +22,7 @@ from zerver.lib.sessions import delete_user_sessions
 from zerver.lib.stream_subscription import bulk_get_subscriber_peer_info
 from zerver.lib.stream_traffic import get_streams_traffic
 from zerver.lib.streams import get_streams_for_user, stream_to_dict
+from zerver.lib.user_access_cache import clear_realm_user_access
 from zerver.lib.user_counts import realm_user_count_by_role
 from zerver.lib.user_groups import get_system_user_group_for_user
 from zerver.lib.users import (
@@ -108,6 +109,9 @@ def do_delete_user(user_profile: UserProfile, *, acting_user: UserProfile | None
             event_type=RealmAuditLog.USER_DELETED,
             event_time=timezone_now(),
         )
+        # Direct messages with the user were deleted, so other users
+        # may have lost access to them.
+        clear_realm_user_access(realm.id)
 
 
 def do_delete_user_preserving_messages(user_profile: UserProfile) -> None:
@@ -1,12 +1,16 @@
+import threading
 from collections.abc import Iterable
+from dataclasses import dataclass
 
 import ahocorasick
 from django.db import transaction
 
 from zerver.lib.cache import (
+    bump_realm_alert_words_generation,
+    cache_get,
     cache_with_key,
-    realm_alert_words_automaton_cache_key,
     realm_alert_words_cache_key,
+    realm_alert_words_generation_cache_key,
 )
 from zerver.models import AlertWord, Realm, UserProfile
 from zerver.models.alert_words import flush_realm_alert_words
@@ -24,26 +28,76 @@ def alert_words_in_realm(realm: Realm) -> dict[int, list[str]]:
     return user_ids_with_words
 
 
-@cache_with_key(lambda realm: realm_alert_words_automaton_cache_key(realm.id), timeout=3600 * 24)
-def get_alert_word_automaton(realm: Realm) -> ahocorasick.Automaton:
-    user_id_with_words = alert_words_in_realm(realm)
-    alert_word_automaton = ahocorasick.Automaton()
-    for user_id, alert_words in user_id_with_words.items():
+def get_user_ids_by_alert_word(user_ids_with_words: dict[int, list[str]]) -> dict[str, set[int]]:
+    user_ids_by_word: dict[str, set[int]] = {}
+    for user_id, alert_words in user_ids_with_words.items():
         for alert_word in alert_words:
-            alert_word_lower = alert_word.lower()
-            if alert_word_automaton.exists(alert_word_lower):
-                (key, user_ids_for_alert_word) = alert_word_automaton.get(alert_word_lower)
-                user_ids_for_alert_word.add(user_id)
-            else:
-                alert_word_automaton.add_word(alert_word_lower, (alert_word_lower, {user_id}))
-    alert_word_automaton.make_automaton()
+            user_ids_by_word.setdefault(alert_word.lower(), set()).add(user_id)
+    return user_ids_by_word
+
+
+def build_alert_word_automaton(user_ids_by_word: dict[str, set[int]]) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for alert_word, user_ids in user_ids_by_word.items():
+        automaton.add_word(alert_word, (alert_word, user_ids))
+    automaton.make_automaton()
+    return automaton
+
+
+def get_realm_alert_words_generation(realm_id: int) -> str:
+    cached = cache_get(realm_alert_words_generation_cache_key(realm_id))
+    if cached is None:
+        return bump_realm_alert_words_generation(realm_id)
+    (generation,) = cached
+    return generation
+
+
+@dataclass
+class RealmAlertWordAutomaton:
+    generation: str
+    automaton: ahocorasick.Automaton
+
+
+# Each process's alert word automatons, by realm ID; see
+# get_alert_word_automaton.
+realm_alert_word_automatons: dict[int, RealmAlertWordAutomaton] = {}
+realm_alert_word_automatons_lock = threading.Lock()
+
+
+def get_alert_word_automaton(realm: Realm) -> ahocorasick.Automaton | None:
+    """Returns an automaton matching the alert words of the realm's
+    users, or None if they have none.
+
+    The automaton for a realm with many alert words is several
+    megabytes, so rather than fetching it from memcached for every
+    message, each process keeps its own, along with the generation
+    of the realm's alert words it was built from; checking that
+    generation is a single small memcached fetch.  When the
+    generation changes, the process builds a new automaton, and
+    replaces the old one, which other threads may still be searching,
+    without modifying it."""
+    # We fetch the generation before the alert words, so that if they
+    # change in between, we'll build the automaton again next time.
+    generation = get_realm_alert_words_generation(realm.id)
+    with realm_alert_word_automatons_lock:
+        cached = realm_alert_word_automatons.get(realm.id)
+    if cached is None or cached.generation != generation:
+        cached = RealmAlertWordAutomaton(
+            generation=generation,
+            automaton=build_alert_word_automaton(
+                get_user_ids_by_alert_word(alert_words_in_realm(realm))
+            ),
+        )
+        with realm_alert_word_automatons_lock:
+            realm_alert_word_automatons[realm.id] = cached
+
     # If the kind is not AHOCORASICK after calling make_automaton, it means there is no key present
     # and hence we cannot call items on the automaton yet. To avoid it we return None for such cases
     # where there is no alert-words in the realm.
     # https://pyahocorasick.readthedocs.io/en/latest/#make-automaton
-    if alert_word_automaton.kind != ahocorasick.AHOCORASICK:
+    if cached.automaton.kind != ahocorasick.AHOCORASICK:
         return None
-    return alert_word_automaton
+    return cached.automaton
 
 
 def user_alert_words(user_profile: UserProfile) -> list[str]:
@@ -4,6 +4,7 @@ from typing import Any
 from django.db.models import Model, QuerySet
 from django.utils.timezone import now as timezone_now
 
+from zerver.lib.cache import bump_realm_user_mention_generation
 from zerver.lib.create_user import create_user_profile, get_display_email_address
 from zerver.lib.initial_password import initial_password
 from zerver.lib.streams import render_stream_description
@@ -92,6 +93,8 @@ def bulk_create_users(
         UserProfile.objects.bulk_update(profiles_to_create, ["email"])
 
     user_ids = {user.id for user in profiles_to_create}
+    # Django bulk_create operations don't flush caches, so we need to do this ourselves.
+    bump_realm_user_mention_generation(realm.id)
 
     RealmAuditLog.objects.bulk_create(
         RealmAuditLog(
@@ -319,6 +319,32 @@ CacheItemT = TypeVar("CacheItemT")
 CompressedItemT = TypeVar("CompressedItemT")
 
 
+class BatchedCacheGet:
+    """Allows several generic_bulk_cached_fetch calls to share a single
+    memcached round trip: callers add() the keys that each of those
+    calls will need, fetch() them all at once, and then pass this
+    object as their cache_batch argument.  Any keys which weren't
+    added are looked up separately."""
+
+    def __init__(self) -> None:
+        self.keys: set[str] = set()
+        self.values: dict[str, Any] = {}
+
+    def add(self, keys: Iterable[str]) -> None:
+        self.keys.update(keys)
+
+    def fetch(self) -> None:
+        if self.keys:
+            self.values = safe_cache_get_many(list(self.keys))
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        result = {key: self.values[key] for key in keys if key in self.values}
+        missing_keys = [key for key in keys if key not in self.keys]
+        if missing_keys:
+            result.update(safe_cache_get_many(missing_keys))
+        return result
+
+
 # Required arguments are as follows:
 # * object_ids: The list of object ids to look up
 # * cache_key_function: object_id => cache key
@@ -332,6 +358,8 @@ CompressedItemT = TypeVar("CompressedItemT")
 # * cache_transformer: Function mapping an object from database =>
 #   value for cache (in case the values that we're caching are some
 #   function of the objects, not the objects themselves)
+# The optional cache_batch argument is a BatchedCacheGet which has
+# already fetched some or all of the needed keys.
 def generic_bulk_cached_fetch(
     cache_key_function: Callable[[ObjKT], str],
     query_function: Callable[[list[ObjKT]], Iterable[ItemT]],
@@ -341,6 +369,7 @@ def generic_bulk_cached_fetch(
     setter: Callable[[CacheItemT], CompressedItemT],
     id_fetcher: Callable[[ItemT], ObjKT],
     cache_transformer: Callable[[ItemT], CacheItemT],
+    cache_batch: BatchedCacheGet | None = None,
 ) -> dict[ObjKT, CacheItemT]:
     if len(object_ids) == 0:
         # Nothing to fetch.
@@ -350,7 +379,8 @@ def generic_bulk_cached_fetch(
     for object_id in object_ids:
         cache_keys[object_id] = cache_key_function(object_id)
 
-    cached_objects_compressed: dict[str, tuple[CompressedItemT]] = safe_cache_get_many(
+    cache_get_many_function = safe_cache_get_many if cache_batch is None else cache_batch.get_many
+    cached_objects_compressed: dict[str, tuple[CompressedItemT]] = cache_get_many_function(
         [cache_keys[object_id] for object_id in object_ids],
     )
 
@@ -386,6 +416,7 @@ def bulk_cached_fetch(
     object_ids: Sequence[ObjKT],
     *,
     id_fetcher: Callable[[ItemT], ObjKT],
+    cache_batch: BatchedCacheGet | None = None,
 ) -> dict[ObjKT, ItemT]:
     return generic_bulk_cached_fetch(
         cache_key_function,
@@ -395,6 +426,7 @@ def bulk_cached_fetch(
         extractor=lambda obj: obj,
         setter=lambda obj: obj,
         cache_transformer=lambda obj: obj,
+        cache_batch=cache_batch,
     )
 
 
@@ -402,6 +434,10 @@ def preview_url_cache_key(url: str) -> str:
     return f"preview_url:{hashlib.sha1(url.encode()).hexdigest()}"
 
 
+def preview_url_failure_cache_key(url: str) -> str:
+    return f"preview_url_failure:{hashlib.sha1(url.encode()).hexdigest()}"
+
+
 def display_recipient_cache_key(recipient_id: int) -> str:
     return f"display_recipient_dict:{recipient_id}"
 
@@ -410,6 +446,10 @@ def single_user_display_recipient_cache_key(user_id: int) -> str:
     return f"single_user_display_recipient:{user_id}"
 
 
+def message_sender_cache_key(user_id: int) -> str:
+    return f"message_sender:{user_id}"
+
+
 def user_profile_cache_key_id(email: str, realm_id: int) -> str:
     return f"user_profile:{hashlib.sha1(email.strip().encode()).hexdigest()}:{realm_id}"
 
@@ -465,6 +505,24 @@ def realm_user_dicts_cache_key(realm_id: int) -> str:
     return f"realm_user_dicts:{realm_id}"
 
 
+def realm_user_columns_cache_key(realm_id: int) -> str:
+    # This includes avatar URLs, which depend on the server's settings.
+    return f"realm_user_columns:{realm_id}:{settings.SERVER_GENERATION}"
+
+
+def realm_custom_profile_field_values_cache_key(realm_id: int) -> str:
+    return f"realm_custom_profile_field_values:{realm_id}"
+
+
+def flush_realm_custom_profile_field_values(realm_id: int) -> None:
+    cache_delete_many(
+        [
+            realm_custom_profile_field_values_cache_key(realm_id),
+            realm_user_columns_cache_key(realm_id),
+        ]
+    )
+
+
 def get_muting_users_cache_key(muted_user_id: int) -> str:
     return f"muting_users_list:{muted_user_id}"
 
@@ -485,6 +543,56 @@ def active_non_guest_user_ids_cache_key(realm_id: int) -> str:
     return f"active_non_guest_user_ids:{realm_id}"
 
 
+def realm_state_generation_cache_key(realm_id: int, section: str) -> str:
+    return f"realm_state_generation:{realm_id}:{section}"
+
+
+def realm_state_snapshot_cache_key(realm_id: int, section: str) -> str:
+    # Parts of the snapshot come from the server's settings, so we
+    # start fresh whenever the server is restarted.
+    return f"realm_state_snapshot:{realm_id}:{section}:{settings.SERVER_GENERATION}"
+
+
+REALM_STATE_SNAPSHOT_TIMEOUT = 3600 * 24 * 7
+
+# The types of events which can change the versioned sections of the
+# initial state, mapped to the sections they change; see
+# get_realm_state_snapshot in zerver/lib/events.py.  The users and
+# subscriptions sections differ between users, but their generations
+# are realm-wide, so any event which changes them for some user
+# changes their generation for everyone.
+REALM_STATE_EVENT_SECTIONS: dict[str, list[str]] = {
+    "custom_profile_fields": ["custom_profile_fields", "realm_user"],
+    "default_streams": ["default_streams"],
+    "realm": ["realm"],
+    "realm_emoji": ["realm_emoji"],
+    "realm_linkifiers": ["realm_linkifiers"],
+    "realm_playgrounds": ["realm_playgrounds"],
+    # Deactivating a user removes them from channels' subscribers.
+    "realm_user": ["realm_user", "subscription"],
+    # The realm section includes the IDs of the announcement
+    # channels, which are -1 once a channel is deactivated.
+    "stream": ["default_streams", "realm", "subscription"],
+    "subscription": ["subscription"],
+    "user_group": ["realm_user_groups"],
+}
+
+
+def bump_realm_state_generation(realm_id: int, sections: Iterable[str]) -> dict[str, str]:
+    """Invalidates the given sections of the realm's cached initial
+    state snapshot, by giving each of them a new, random, generation.
+    Clients use these generations to skip refetching sections which
+    haven't changed, so they must never be reused."""
+    generations = {section: secrets.token_hex(8) for section in sections}
+    cache_set_many(
+        {
+            realm_state_generation_cache_key(realm_id, section): (generation,)
+            for section, generation in generations.items()
+        }
+    )
+    return generations
+
+
 bot_dict_fields: list[str] = [
     "api_key",
     "avatar_source",
@@ -517,6 +625,7 @@ def delete_user_profile_caches(user_profiles: Iterable["UserProfile"], realm_id:
         keys += map(user_profile_by_api_key_cache_key, get_all_api_keys(user_profile))
         keys.append(user_profile_cache_key_id(user_profile.email, realm_id))
         keys.append(user_profile_delivery_email_cache_key(user_profile.delivery_email, realm_id))
+        keys.append(message_sender_cache_key(user_profile.id))
         if user_profile.is_bot and is_cross_realm_bot_email(user_profile.email):
             # Handle clearing system bots from their special cache.
             keys.append(bot_profile_cache_key(user_profile.email, realm_id))
@@ -560,6 +669,7 @@ def flush_user_profile(
     # the fields in the dict or become (in)active
     if changed(update_fields, realm_user_dict_fields):
         cache_delete(realm_user_dicts_cache_key(user_profile.realm_id))
+        cache_delete(realm_user_columns_cache_key(user_profile.realm_id))
 
     if changed(update_fields, ["is_active"]):
         cache_delete(active_user_ids_cache_key(user_profile.realm_id))
@@ -568,6 +678,9 @@ def flush_user_profile(
     if changed(update_fields, ["role"]):
         cache_delete(active_non_guest_user_ids_cache_key(user_profile.realm_id))
 
+    if changed(update_fields, ["full_name", "is_active"]):
+        bump_realm_user_mention_generation(user_profile.realm_id)
+
     if changed(update_fields, ["email", "full_name", "id", "is_mirror_dummy"]):
         delete_display_recipient_cache(user_profile)
 
@@ -595,6 +708,7 @@ def flush_realm(
     realm = instance
     users = realm.get_active_users()
     delete_user_profile_caches(users, realm.id)
+    bump_realm_state_generation(realm.id, ["realm"])
 
     if (
         from_deletion
@@ -602,24 +716,59 @@ def flush_realm(
         or (update_fields is not None and "string_id" in update_fields)
     ):
         cache_delete(realm_user_dicts_cache_key(realm.id))
+        cache_delete(realm_user_columns_cache_key(realm.id))
         cache_delete(active_user_ids_cache_key(realm.id))
         cache_delete(bot_dicts_in_realm_cache_key(realm.id))
         cache_delete(realm_alert_words_cache_key(realm.id))
-        cache_delete(realm_alert_words_automaton_cache_key(realm.id))
+        bump_realm_alert_words_generation(realm.id)
+        bump_realm_user_mention_generation(realm.id)
         cache_delete(active_non_guest_user_ids_cache_key(realm.id))
         cache_delete(realm_rendered_description_cache_key(realm))
         cache_delete(realm_text_description_cache_key(realm))
+        if update_fields is not None and "string_id" in update_fields:
+            # Message senders' cached data includes the realm's
+            # string_id, including for deactivated users.
+            from zerver.models import UserProfile
+
+            cache_delete_many(
+                message_sender_cache_key(user_id)
+                for user_id in UserProfile.objects.filter(realm_id=realm.id).values_list(
+                    "id", flat=True
+                )
+            )
     elif changed(update_fields, ["description"]):
         cache_delete(realm_rendered_description_cache_key(realm))
         cache_delete(realm_text_description_cache_key(realm))
 
 
+def realm_user_mention_generation_cache_key(realm_id: int) -> str:
+    return f"realm_user_mention_generation:{realm_id}"
+
+
+def bump_realm_user_mention_generation(realm_id: int) -> str:
+    """Invalidates the indexes of the realm's users' names each server
+    process has built for resolving mentions (see
+    get_realm_user_mention_index)."""
+    generation = secrets.token_hex(8)
+    cache_set(realm_user_mention_generation_cache_key(realm_id), generation)
+    return generation
+
+
 def realm_alert_words_cache_key(realm_id: int) -> str:
     return f"realm_alert_words:{realm_id}"
 
 
-def realm_alert_words_automaton_cache_key(realm_id: int) -> str:
-    return f"realm_alert_words_automaton:{realm_id}"
+def realm_alert_words_generation_cache_key(realm_id: int) -> str:
+    return f"realm_alert_words_generation:{realm_id}"
+
+
+def bump_realm_alert_words_generation(realm_id: int) -> str:
+    """Invalidates the alert word automatons each server process has
+    built for the realm (see get_alert_word_automaton), by giving the
+    realm's alert words a new, random, generation."""
+    generation = secrets.token_hex(8)
+    cache_set(realm_alert_words_generation_cache_key(realm_id), generation)
+    return generation
 
 
 def realm_rendered_description_cache_key(realm: "Realm") -> str:
@@ -641,6 +790,7 @@ def flush_stream(
     from zerver.models import UserProfile
 
     stream = instance
+    bump_realm_state_generation(stream.realm_id, ["default_streams"])
 
     if update_fields is None or (
         "name" in update_fields
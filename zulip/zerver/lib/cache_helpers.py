@@ -1,11 +1,15 @@
 # See https://zulip.readthedocs.io/en/latest/subsystems/caching.html for docs
 import logging
+import time
 from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta
 from typing import Any
 
+import bmemcached
 from django.conf import settings
 from django.contrib.sessions.models import Session
+from django.core.cache import cache
 from django.db import connection
 from django.db.models import QuerySet
 from django.utils.timezone import now as timezone_now
@@ -22,10 +26,12 @@ from zerver.lib.cache import (
     user_profile_by_api_key_cache_key,
     user_profile_cache_key_id,
 )
+from zerver.lib.message_cache_warming import warm_realm_message_cache
+from zerver.lib.queue import queue_json_publish
 from zerver.lib.safe_session_cached_db import SessionStore
 from zerver.lib.sessions import session_engine
 from zerver.lib.users import get_all_api_keys
-from zerver.models import Client, UserProfile
+from zerver.models import Client, Realm, UserProfile
 from zerver.models.clients import get_client_cache_key
 
 
@@ -139,3 +145,45 @@ def fill_remote_cache(cache: str) -> None:
         get_remote_cache_requests() - remote_cache_requests_start,
         get_remote_cache_time() - remote_cache_time_start,
     )
+
+
+# The message cache is handled separately from the above, since
+# warming it takes many more database queries; see
+# zerver/lib/message_cache_warming.py.
+def warm_message_cache_for_realm_id(realm_id: int) -> int:
+    return warm_realm_message_cache(Realm.objects.get(id=realm_id))
+
+
+def fill_remote_message_cache(processes: int) -> None:
+    """Warms the message cache for all active realms, using up to
+    `processes` processes to do so in parallel."""
+    start = time.time()
+    realm_ids = list(get_active_realm_ids())
+    count = 0
+    if processes == 1:
+        for realm_id in realm_ids:
+            count += warm_message_cache_for_realm_id(realm_id)
+    else:
+        # Each process needs its own database and memcached connections.
+        connection.close()
+        _cache = cache._cache  # type: ignore[attr-defined] # not in stubs
+        assert isinstance(_cache, bmemcached.Client)
+        _cache.disconnect_all()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for future in as_completed(
+                executor.submit(warm_message_cache_for_realm_id, realm_id) for realm_id in realm_ids
+            ):
+                count += future.result()
+    logging.info(
+        "Successfully populated message cache: %d messages in %d realms, %.2f seconds",
+        count,
+        len(realm_ids),
+        time.time() - start,
+    )
+
+
+def queue_message_cache_warming() -> None:
+    """Asks the deferred_work queue processor to warm the message
+    cache for each active realm, without blocking the caller."""
+    for realm_id in get_active_realm_ids():
+        queue_json_publish("deferred_work", {"type": "warm_message_cache", "realm_id": realm_id})
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING, Optional, TypedDict
 from django_stubs_ext import ValuesQuerySet
 
 from zerver.lib.cache import (
+    BatchedCacheGet,
     bulk_cached_fetch,
     cache_with_key,
     display_recipient_cache_key,
@@ -68,7 +69,9 @@ def user_dict_id_fetcher(user_dict: UserDisplayRecipient) -> int:
     return user_dict["id"]
 
 
-def bulk_fetch_single_user_display_recipients(uids: list[int]) -> dict[int, UserDisplayRecipient]:
+def bulk_fetch_single_user_display_recipients(
+    uids: list[int], *, cache_batch: BatchedCacheGet | None = None
+) -> dict[int, UserDisplayRecipient]:
     from zerver.models import UserProfile
 
     return bulk_cached_fetch(
@@ -81,11 +84,12 @@ def bulk_fetch_single_user_display_recipients(uids: list[int]) -> dict[int, User
         ),
         object_ids=uids,
         id_fetcher=user_dict_id_fetcher,
+        cache_batch=cache_batch,
     )
 
 
 def bulk_fetch_stream_names(
-    recipient_tuples: set[tuple[int, int, int]],
+    recipient_tuples: set[tuple[int, int, int]], *, cache_batch: BatchedCacheGet | None = None
 ) -> dict[int, str]:
     """
     Takes set of tuples of the form (recipient_id, recipient_type, recipient_type_id)
@@ -121,13 +125,14 @@ def bulk_fetch_stream_names(
         cache_transformer=get_name,
         setter=lambda obj: obj,
         extractor=lambda obj: obj,
+        cache_batch=cache_batch,
     )
 
     return stream_display_recipients
 
 
 def bulk_fetch_user_display_recipients(
-    recipient_tuples: set[tuple[int, int, int]],
+    recipient_tuples: set[tuple[int, int, int]], *, cache_batch: BatchedCacheGet | None = None
 ) -> dict[int, list[UserDisplayRecipient]]:
     """
     Takes set of tuples of the form (recipient_id, recipient_type, recipient_type_id)
@@ -165,7 +170,9 @@ def bulk_fetch_user_display_recipients(
         user_ids_to_fetch |= direct_message_group_user_ids
 
     # Fetch the needed user dictionaries.
-    user_display_recipients = bulk_fetch_single_user_display_recipients(list(user_ids_to_fetch))
+    user_display_recipients = bulk_fetch_single_user_display_recipients(
+        list(user_ids_to_fetch), cache_batch=cache_batch
+    )
 
     result = {}
 
@@ -181,8 +188,27 @@ def bulk_fetch_user_display_recipients(
     return result
 
 
+def display_recipient_cache_keys(recipient_tuples: set[tuple[int, int, int]]) -> list[str]:
+    """
+    Returns the cache keys which bulk_fetch_display_recipients will
+    look up for these recipients, for use with a BatchedCacheGet.
+    Group direct message recipients aren't included, since we need to
+    query their members first.
+    """
+
+    from zerver.models import Recipient
+
+    keys = []
+    for recipient_id, recipient_type, recipient_type_id in recipient_tuples:
+        if recipient_type == Recipient.STREAM:
+            keys.append(display_recipient_cache_key(recipient_id))
+        elif recipient_type == Recipient.PERSONAL:
+            keys.append(single_user_display_recipient_cache_key(recipient_type_id))
+    return keys
+
+
 def bulk_fetch_display_recipients(
-    recipient_tuples: set[tuple[int, int, int]],
+    recipient_tuples: set[tuple[int, int, int]], *, cache_batch: BatchedCacheGet | None = None
 ) -> dict[int, DisplayRecipientT]:
     """
     Takes set of tuples of the form (recipient_id, recipient_type, recipient_type_id)
@@ -196,9 +222,9 @@ def bulk_fetch_display_recipients(
     }
     direct_message_recipients = recipient_tuples - stream_recipients
 
-    stream_display_recipients = bulk_fetch_stream_names(stream_recipients)
+    stream_display_recipients = bulk_fetch_stream_names(stream_recipients, cache_batch=cache_batch)
     direct_message_display_recipients = bulk_fetch_user_display_recipients(
-        direct_message_recipients
+        direct_message_recipients, cache_batch=cache_batch
     )
 
     # Glue the dicts together and return:
@@ -1,38 +1,64 @@
 import hashlib
 import os
 import re
+from collections import OrderedDict
+from collections.abc import Mapping
 from dataclasses import dataclass
+from re import Match
 
 import orjson
 from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.utils.translation import gettext as _
 
+from zerver.lib.cache import (
+    bump_realm_state_generation,
+    cache_get,
+    realm_state_generation_cache_key,
+)
+from zerver.lib.emoji_index import (
+    CODEPOINT_TO_NAME_TABLE,
+    EMOTICON_CONVERSIONS_TABLE,
+    NAME_TO_CODEPOINT_TABLE,
+    read_emoji_index,
+)
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.mime_types import guess_extension
 from zerver.lib.storage import static_path
 from zerver.lib.upload import upload_backend
 from zerver.models import Reaction, Realm, RealmEmoji, UserProfile
 from zerver.models.realm_emoji import (
+    EmojiInfo,
     get_all_custom_emoji_for_realm,
     get_name_keyed_dict_for_active_realm_emoji,
 )
 
-emoji_codes_path = static_path("generated/emoji/emoji_codes.json")
-if not os.path.exists(emoji_codes_path):  # nocoverage
-    # During the collectstatic step of build-release-tarball,
-    # prod-static/serve/generated/emoji won't exist yet.
-    emoji_codes_path = os.path.join(
-        os.path.dirname(__file__),
-        "../../static/generated/emoji/emoji_codes.json",
-    )
-
-with open(emoji_codes_path, "rb") as fp:
-    emoji_codes = orjson.loads(fp.read())
 
-name_to_codepoint = emoji_codes["name_to_codepoint"]
-codepoint_to_name = emoji_codes["codepoint_to_name"]
-EMOTICON_CONVERSIONS = emoji_codes["emoticon_conversions"]
+def generated_emoji_path(name: str) -> str:
+    path = static_path(f"generated/emoji/{name}")
+    if not os.path.exists(path):  # nocoverage
+        # During the collectstatic step of build-release-tarball,
+        # prod-static/serve/generated/emoji won't exist yet.
+        path = os.path.join(os.path.dirname(__file__), "../../static/generated/emoji", name)
+    return path
+
+
+name_to_codepoint: Mapping[str, str]
+codepoint_to_name: Mapping[str, str]
+EMOTICON_CONVERSIONS: Mapping[str, str]
+emoji_index_path = generated_emoji_path("emoji_index.bin")
+if os.path.exists(emoji_index_path):
+    emoji_index = read_emoji_index(emoji_index_path)
+    name_to_codepoint = emoji_index[NAME_TO_CODEPOINT_TABLE]
+    codepoint_to_name = emoji_index[CODEPOINT_TO_NAME_TABLE]
+    EMOTICON_CONVERSIONS = emoji_index[EMOTICON_CONVERSIONS_TABLE]
+else:  # nocoverage
+    # The emoji were built before we started building the index.
+    with open(generated_emoji_path("emoji_codes.json"), "rb") as fp:
+        emoji_codes = orjson.loads(fp.read())
+    name_to_codepoint = emoji_codes["name_to_codepoint"]
+    codepoint_to_name = emoji_codes["codepoint_to_name"]
+    EMOTICON_CONVERSIONS = emoji_codes["emoticon_conversions"]
 
 possible_emoticons = EMOTICON_CONVERSIONS.keys()
 possible_emoticon_regexes = (re.escape(emoticon) for emoticon in possible_emoticons)
@@ -42,6 +68,11 @@ EMOTICON_RE = (
     + r")|(".join(possible_emoticon_regexes)
     + rf"))(?![^{terminal_symbols}])"
 )
+# Longer emoticons first, so that they take precedence over any
+# emoticons they start with.
+EMOTICON_TRANSLATION_RE = re.compile(
+    "|".join(re.escape(emoticon) for emoticon in sorted(possible_emoticons, key=len, reverse=True))
+)
 
 
 def data_url() -> str:
@@ -54,12 +85,47 @@ def data_url() -> str:
 
 # Translates emoticons to their colon syntax, e.g. `:smiley:`.
 def translate_emoticons(text: str) -> str:
-    translated = text
+    def replace(match: Match[str]) -> str:
+        return EMOTICON_CONVERSIONS[match.group()]
+
+    return EMOTICON_TRANSLATION_RE.sub(replace, text)
+
+
+@dataclass
+class RealmEmojiIndex:
+    # The generation of the realm's custom emoji the index was built from.
+    generation: str
+    active_emoji: dict[str, EmojiInfo]
+
+
+# Each process's copy of the active custom emoji of recently used
+# realms, by realm ID, used if settings.REALM_EMOJI_CACHE_MAX_REALMS is
+# set.  Like the mention indexes (see zerver/lib/mention.py), a realm's
+# copy is fetched again when the generation of its custom emoji, bumped
+# by flush_realm_emoji, changes.
+realm_emoji_indexes: OrderedDict[int, RealmEmojiIndex] = OrderedDict()
 
-    for emoticon in EMOTICON_CONVERSIONS:
-        translated = re.sub(re.escape(emoticon), EMOTICON_CONVERSIONS[emoticon], translated)
 
-    return translated
+def get_active_realm_emoji(realm_id: int) -> dict[str, EmojiInfo]:
+    if not settings.REALM_EMOJI_CACHE_MAX_REALMS:
+        return get_name_keyed_dict_for_active_realm_emoji(realm_id)
+
+    cached = cache_get(realm_state_generation_cache_key(realm_id, "realm_emoji"))
+    if cached is None:
+        generation = bump_realm_state_generation(realm_id, ["realm_emoji"])["realm_emoji"]
+    else:
+        (generation,) = cached
+    index = realm_emoji_indexes.get(realm_id)
+    if index is None or index.generation != generation:
+        index = RealmEmojiIndex(
+            generation=generation,
+            active_emoji=get_name_keyed_dict_for_active_realm_emoji(realm_id),
+        )
+        realm_emoji_indexes[realm_id] = index
+    realm_emoji_indexes.move_to_end(realm_id)
+    while len(realm_emoji_indexes) > settings.REALM_EMOJI_CACHE_MAX_REALMS:
+        realm_emoji_indexes.popitem(last=False)
+    return index.active_emoji
 
 
 @dataclass
@@ -71,7 +137,7 @@ class EmojiData:
 def get_emoji_data(realm_id: int, emoji_name: str) -> EmojiData:
     # Even if emoji_name is either in name_to_codepoint or named "zulip",
     # we still need to call get_realm_active_emoji.
-    realm_emoji_dict = get_name_keyed_dict_for_active_realm_emoji(realm_id)
+    realm_emoji_dict = get_active_realm_emoji(realm_id)
     realm_emoji = realm_emoji_dict.get(emoji_name)
 
     if realm_emoji is not None:
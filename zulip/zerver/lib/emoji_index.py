@@ -0,0 +1,128 @@
+# This file doesn't import from django so that we can use it in `build_emoji`
+#
+# The emoji index is a compact, immutable form of the mappings in
+# emoji_codes.json which the server needs, written by `build_emoji`.
+# Each server process maps the file into memory rather than loading
+# those mappings into dicts, so that all of them share one copy.
+#
+# The file starts with MAGIC, the number of tables, and each table's
+# offset in the file.  Each table is its number of entries; the
+# positions of the entries in the order they were written, which is
+# the order we iterate over them in, like a dict; then the offsets of
+# its keys and values, alternately, in its strings, which follow.  The
+# entries are sorted by key, so that we find them by bisection.  All
+# numbers are little-endian 32-bit unsigned integers, and all strings
+# UTF-8.
+import bisect
+import mmap
+import struct
+import sys
+from collections.abc import Iterator, Mapping
+
+from typing_extensions import override
+
+MAGIC = b"ZEMOJI01"
+
+# The tables of the index, in order.
+NAME_TO_CODEPOINT_TABLE = 0
+CODEPOINT_TO_NAME_TABLE = 1
+EMOTICON_CONVERSIONS_TABLE = 2
+
+# How many lookups in each table we remember the results of.
+RECENT_LOOKUPS_SIZE = 1000
+
+
+def encode_table(table: Mapping[str, str]) -> bytes:
+    items = [(key.encode(), value.encode()) for key, value in table.items()]
+    order = sorted(range(len(items)), key=lambda i: items[i][0])
+    positions = [0] * len(items)
+    for position, i in enumerate(order):
+        positions[i] = position
+    strings = [string for i in order for string in items[i]]
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return struct.pack(
+        f"<{1 + len(positions) + len(offsets)}I", len(items), *positions, *offsets
+    ) + b"".join(strings)
+
+
+def write_emoji_index(path: str, tables: list[Mapping[str, str]]) -> None:
+    encoded_tables = [encode_table(table) for table in tables]
+    table_offsets = []
+    position = len(MAGIC) + 4 * (len(tables) + 1)
+    for encoded_table in encoded_tables:
+        table_offsets.append(position)
+        position += len(encoded_table)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack(f"<{len(tables) + 1}I", len(tables), *table_offsets))
+        for encoded_table in encoded_tables:
+            f.write(encoded_table)
+
+
+class IndexedStringMap(Mapping[str, str]):
+    def __init__(self, buffer: mmap.mmap | bytes, offset: int) -> None:
+        # We read the numbers directly from the buffer; every platform
+        # Zulip runs on is little-endian.
+        assert sys.byteorder == "little"
+        self.buffer = buffer
+        (self.length,) = struct.unpack_from("<I", buffer, offset)
+        view = memoryview(buffer)
+        positions_start = offset + 4
+        offsets_start = positions_start + 4 * self.length
+        self.strings_start = offsets_start + 4 * (2 * self.length + 1)
+        self.positions = view[positions_start:offsets_start].cast("I")
+        self.offsets = view[offsets_start : self.strings_start].cast("I")
+        # Searching the index is much slower than looking in a dict, so
+        # we remember the results of recent lookups; most messages use
+        # the same few emoji.
+        self.recent_lookups: dict[str, str | None] = {}
+
+    def string(self, n: int) -> bytes:
+        return self.buffer[
+            self.strings_start + self.offsets[n] : self.strings_start + self.offsets[n + 1]
+        ]
+
+    def find(self, key: bytes) -> int | None:
+        i = bisect.bisect_left(range(self.length), key, key=lambda i: self.string(2 * i))
+        if i < self.length and self.string(2 * i) == key:
+            return i
+        return None
+
+    def lookup(self, key: str) -> str | None:
+        if key in self.recent_lookups:
+            return self.recent_lookups[key]
+        i = self.find(key.encode())
+        value = None if i is None else self.string(2 * i + 1).decode()
+        if len(self.recent_lookups) >= RECENT_LOOKUPS_SIZE:
+            self.recent_lookups.clear()
+        self.recent_lookups[key] = value
+        return value
+
+    @override
+    def __getitem__(self, key: object) -> str:
+        value = self.lookup(key) if isinstance(key, str) else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    @override
+    def __iter__(self) -> Iterator[str]:
+        for position in self.positions:
+            yield self.string(2 * position).decode()
+
+    @override
+    def __len__(self) -> int:
+        return self.length
+
+
+def read_emoji_index(path: str) -> list[IndexedStringMap]:
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an emoji index")
+    (table_count,) = struct.unpack_from("<I", buffer, len(MAGIC))
+    table_offsets = struct.unpack_from(f"<{table_count}I", buffer, len(MAGIC) + 4)
+    return [IndexedStringMap(buffer, offset) for offset in table_offsets]
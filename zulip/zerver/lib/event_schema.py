@@ -515,6 +515,23 @@ def check_presence(
     assert event_presence_value["status"] == status
 
 
+modern_presence_type = DictType(
+    required_keys=[
+        ("active_timestamp", int),
+        ("idle_timestamp", int),
+    ]
+)
+
+presence_batch_event = event_dict_type(
+    required_keys=[
+        ("type", Equals("presence_batch")),
+        ("presences", StringDictType(modern_presence_type)),
+        ("server_timestamp", NumberType()),
+    ]
+)
+check_presence_batch = make_checker(presence_batch_event)
+
+
 # Type for the legacy user field; the `user_id` field is intended to
 # replace this and we expect to remove this once clients have migrated
 # to support the modern API.
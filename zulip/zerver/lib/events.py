@@ -17,10 +17,20 @@ from zerver.lib import emoji
 from zerver.lib.alert_words import user_alert_words
 from zerver.lib.avatar import avatar_url
 from zerver.lib.bot_config import load_bot_config_template
+from zerver.lib.cache import (
+    REALM_STATE_EVENT_SECTIONS,
+    REALM_STATE_SNAPSHOT_TIMEOUT,
+    bump_realm_state_generation,
+    realm_state_generation_cache_key,
+    realm_state_snapshot_cache_key,
+    safe_cache_get_many,
+    safe_cache_set_many,
+)
 from zerver.lib.compatibility import is_outdated_server
 from zerver.lib.default_streams import get_default_streams_for_realm_as_dicts
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.external_accounts import get_default_external_accounts
+from zerver.lib.initial_state_profiler import DEFERRABLE_STATE_SECTIONS, InitialStateProfiler
 from zerver.lib.integrations import (
     EMBEDDED_BOTS,
     WEBHOOK_INTEGRATIONS,
@@ -67,11 +77,15 @@ from zerver.lib.user_groups import (
 from zerver.lib.user_status import get_all_users_status_dict
 from zerver.lib.user_topics import get_topic_mutes, get_user_topics
 from zerver.lib.users import (
+    check_user_can_access_all_users,
     get_cross_realm_dicts,
     get_data_for_inaccessible_user,
+    get_realm_user_columns_for_api,
     get_users_for_api,
     is_administrator_role,
     max_message_id_for_user,
+    user_columns_to_dicts,
+    user_dicts_to_columns,
 )
 from zerver.lib.utils import optional_bytes_to_mib
 from zerver.models import (
@@ -123,6 +137,294 @@ def always_want(msg_type: str) -> bool:
     return True
 
 
+def fetch_realm_settings_state(realm: Realm) -> dict[str, Any]:
+    """The `realm` section of fetch_initial_state_data, except for the
+    few values which depend on the user; see get_realm_state_snapshot.
+    """
+    state: dict[str, Any] = {}
+    # The realm bundle includes both realm properties and server
+    # properties, since it's rare that one would want one and not
+    # the other. We expect most clients to want it.
+    #
+    # A note on naming: For some settings, one could imagine
+    # having a server-level value and a realm-level value (with
+    # the server value serving as the default for the realm
+    # value). For such settings, we prefer the following naming
+    # scheme:
+    #
+    # * realm_inline_image_preview (current realm setting)
+    # * server_inline_image_preview (server-level default)
+    #
+    # In situations where for backwards-compatibility reasons we
+    # have an unadorned name, we should arrange that clients using
+    # that unadorned name work correctly (i.e. that should be the
+    # currently active setting, not a server-level default).
+    #
+    # Other settings, which are just server-level settings or data
+    # about the version of Zulip, can be named without prefixes,
+    # e.g. giphy_rating_options or development_environment.
+    for property_name in Realm.property_types:
+        state["realm_" + property_name] = getattr(realm, property_name)
+
+    for (
+        setting_name,
+        permission_configuration,
+    ) in Realm.REALM_PERMISSION_GROUP_SETTINGS.items():
+        if setting_name in Realm.REALM_PERMISSION_GROUP_SETTINGS_WITH_NEW_API_FORMAT:
+            setting_value = getattr(realm, setting_name)
+            state["realm_" + setting_name] = get_group_setting_value_for_api(setting_value)
+            continue
+
+        state["realm_" + setting_name] = getattr(realm, permission_configuration.id_field_name)
+
+    state["realm_create_public_stream_policy"] = get_corresponding_policy_value_for_group_setting(
+        realm, "can_create_public_channel_group", Realm.COMMON_POLICY_TYPES
+    )
+    state["realm_create_private_stream_policy"] = get_corresponding_policy_value_for_group_setting(
+        realm, "can_create_private_channel_group", Realm.COMMON_POLICY_TYPES
+    )
+
+    # Most state is handled via the property_types framework;
+    # these manual entries are for those realm settings that don't
+    # fit into that framework.
+    realm_authentication_methods_dict = realm.authentication_methods_dict()
+    state["realm_authentication_methods"] = get_realm_authentication_methods_for_page_params_api(
+        realm, realm_authentication_methods_dict
+    )
+
+    # Important: Encode units in the client-facing API name.
+    state["max_avatar_file_size_mib"] = settings.MAX_AVATAR_FILE_SIZE_MIB
+    state["max_file_upload_size_mib"] = settings.MAX_FILE_UPLOAD_SIZE
+    state["max_icon_file_size_mib"] = settings.MAX_ICON_FILE_SIZE_MIB
+    upload_quota_bytes = realm.upload_quota_bytes()
+    state["realm_upload_quota_mib"] = optional_bytes_to_mib(upload_quota_bytes)
+
+    state["realm_icon_url"] = realm_icon_url(realm)
+    state["realm_icon_source"] = realm.icon_source
+    add_realm_logo_fields(state, realm)
+
+    # TODO/compatibility: realm_uri is a deprecated alias for realm_url that
+    # can be removed once there are no longer clients relying on it.
+    state["realm_url"] = state["realm_uri"] = realm.url
+    state["realm_bot_domain"] = realm.get_bot_domain()
+    state["realm_available_video_chat_providers"] = realm.VIDEO_CHAT_PROVIDERS
+    state["settings_send_digest_emails"] = settings.SEND_DIGEST_EMAILS
+
+    state["realm_digest_emails_enabled"] = (
+        realm.digest_emails_enabled and settings.SEND_DIGEST_EMAILS
+    )
+    state["realm_email_auth_enabled"] = email_auth_enabled(realm, realm_authentication_methods_dict)
+    state["realm_password_auth_enabled"] = password_auth_enabled(
+        realm, realm_authentication_methods_dict
+    )
+
+    state["server_generation"] = settings.SERVER_GENERATION
+    state["realm_is_zephyr_mirror_realm"] = realm.is_zephyr_mirror_realm
+    state["development_environment"] = settings.DEVELOPMENT
+    state["realm_org_type"] = realm.org_type
+    state["realm_plan_type"] = realm.plan_type
+    state["zulip_plan_is_not_limited"] = realm.plan_type != Realm.PLAN_TYPE_LIMITED
+    state["upgrade_text_for_wide_organization_logo"] = str(Realm.UPGRADE_TEXT_STANDARD)
+
+    if realm.push_notifications_enabled_end_timestamp is not None:
+        state["realm_push_notifications_enabled_end_timestamp"] = datetime_to_timestamp(
+            realm.push_notifications_enabled_end_timestamp
+        )
+    else:
+        state["realm_push_notifications_enabled_end_timestamp"] = None
+
+    state["password_min_length"] = settings.PASSWORD_MIN_LENGTH
+    state["password_min_guesses"] = settings.PASSWORD_MIN_GUESSES
+    state["server_inline_image_preview"] = settings.INLINE_IMAGE_PREVIEW
+    state["server_inline_url_embed_preview"] = settings.INLINE_URL_EMBED_PREVIEW
+    state["server_thumbnail_formats"] = [
+        {
+            "name": str(thumbnail_format),
+            "max_width": thumbnail_format.max_width,
+            "max_height": thumbnail_format.max_height,
+            "format": thumbnail_format.extension,
+            "animated": thumbnail_format.animated,
+        }
+        for thumbnail_format in THUMBNAIL_OUTPUT_FORMATS
+    ]
+    state["server_avatar_changes_disabled"] = settings.AVATAR_CHANGES_DISABLED
+    state["server_name_changes_disabled"] = settings.NAME_CHANGES_DISABLED
+    state["server_web_public_streams_enabled"] = settings.WEB_PUBLIC_STREAMS_ENABLED
+    state["giphy_rating_options"] = realm.get_giphy_rating_options()
+
+    state["server_emoji_data_url"] = emoji.data_url()
+
+    state["event_queue_longpoll_timeout_seconds"] = settings.EVENT_QUEUE_LONGPOLL_TIMEOUT_SECONDS
+
+    # TODO: This probably belongs on the server object.
+    state["realm_default_external_accounts"] = get_default_external_accounts()
+
+    server_default_jitsi_server_url = (
+        settings.JITSI_SERVER_URL.rstrip("/") if settings.JITSI_SERVER_URL is not None else None
+    )
+    state["server_jitsi_server_url"] = server_default_jitsi_server_url
+    state["jitsi_server_url"] = (
+        realm.jitsi_server_url
+        if realm.jitsi_server_url is not None
+        else server_default_jitsi_server_url
+    )
+
+    new_stream_announcements_stream = realm.get_new_stream_announcements_stream()
+    if new_stream_announcements_stream:
+        state["realm_new_stream_announcements_stream_id"] = new_stream_announcements_stream.id
+    else:
+        state["realm_new_stream_announcements_stream_id"] = -1
+
+    signup_announcements_stream = realm.get_signup_announcements_stream()
+    if signup_announcements_stream:
+        state["realm_signup_announcements_stream_id"] = signup_announcements_stream.id
+    else:
+        state["realm_signup_announcements_stream_id"] = -1
+
+    zulip_update_announcements_stream = realm.get_zulip_update_announcements_stream()
+    if zulip_update_announcements_stream:
+        state["realm_zulip_update_announcements_stream_id"] = zulip_update_announcements_stream.id
+    else:
+        state["realm_zulip_update_announcements_stream_id"] = -1
+
+    state["max_stream_name_length"] = Stream.MAX_NAME_LENGTH
+    state["max_stream_description_length"] = Stream.MAX_DESCRIPTION_LENGTH
+    state["max_topic_length"] = MAX_TOPIC_NAME_LENGTH
+    state["max_message_length"] = settings.MAX_MESSAGE_LENGTH
+    if realm.demo_organization_scheduled_deletion_date is not None:
+        state["demo_organization_scheduled_deletion_date"] = datetime_to_timestamp(
+            realm.demo_organization_scheduled_deletion_date
+        )
+    state["realm_date_created"] = datetime_to_timestamp(realm.date_created)
+
+    # Presence system parameters for client behavior.
+    state["server_presence_ping_interval_seconds"] = settings.PRESENCE_PING_INTERVAL_SECS
+    state["server_presence_offline_threshold_seconds"] = settings.OFFLINE_THRESHOLD_SECS
+    # Typing notifications protocol parameters for client behavior.
+    state["server_typing_started_expiry_period_milliseconds"] = (
+        settings.TYPING_STARTED_EXPIRY_PERIOD_MILLISECONDS
+    )
+    state["server_typing_stopped_wait_period_milliseconds"] = (
+        settings.TYPING_STOPPED_WAIT_PERIOD_MILLISECONDS
+    )
+    state["server_typing_started_wait_period_milliseconds"] = (
+        settings.TYPING_STARTED_WAIT_PERIOD_MILLISECONDS
+    )
+
+    state["server_supported_permission_settings"] = get_server_supported_permission_settings()
+
+    return state
+
+
+# The sections of fetch_initial_state_data which are the same for
+# every user in the realm, and thus can be shared between them; see
+# get_realm_state_snapshot.
+REALM_STATE_SNAPSHOT_SECTIONS: dict[str, Callable[[Realm], Any]] = {
+    "realm": fetch_realm_settings_state,
+    "realm_emoji": lambda realm: get_all_custom_emoji_for_realm(realm.id),
+    "realm_linkifiers": lambda realm: linkifiers_for_realm(realm.id),
+    "realm_playgrounds": get_realm_playgrounds,
+    "realm_user_groups": user_groups_in_realm_serialized,
+    "custom_profile_fields": lambda realm: [
+        field.as_dict() for field in custom_profile_fields_for_realm(realm.id)
+    ],
+    "default_streams": lambda realm: get_default_streams_for_realm_as_dicts(realm.id),
+}
+
+
+# The sections of fetch_initial_state_data which differ between users,
+# so we don't cache them, but which are versioned like the snapshot's
+# sections, with realm-wide generations; see get_realm_state_snapshot.
+USER_STATE_VERSIONED_SECTIONS = ["realm_user", "subscription"]
+
+
+def realm_state_version(generation: str, spectator: bool) -> str:
+    # Sections of the snapshot can also change when the server is
+    # upgraded or its settings change, so the version we give to
+    # clients includes the server's generation as well.  Spectators
+    # are sent different data for some sections than logged-in users
+    # (see fetch_initial_state_data), so their versions differ too.
+    if spectator:
+        return f"{settings.SERVER_GENERATION}-spectator-{generation}"
+    return f"{settings.SERVER_GENERATION}-{generation}"
+
+
+def get_realm_state_snapshot(
+    realm: Realm,
+    sections: Collection[str],
+    client_state_versions: Mapping[str, str] = {},
+    *,
+    spectator: bool = False,
+    user_sections: Mapping[str, str] = {},
+) -> tuple[dict[str, Any], dict[str, str]]:
+    """Returns the requested realm-wide sections of the initial state,
+    which we cache for each realm, so that a burst of clients
+    registering (for example, reconnecting after a server restart)
+    only computes them once, along with the current version of each
+    section.
+
+    Each cached section is tagged with its generation, which changes
+    whenever an event which could affect it is sent (see
+    bump_realm_state_generation); sections from an older generation
+    are recomputed.  Sections for which the client already has the
+    current version (see client_state_versions in
+    fetch_initial_state_data) are omitted from the returned data.
+    The returned data is a fresh copy, which the caller may modify.
+
+    `user_sections` maps sections in USER_STATE_VERSIONED_SECTIONS to
+    a key for the user and parameters they're computed for, which is
+    part of their versions; we only return their versions, leaving the
+    caller to compute them if the client doesn't have those versions.
+    """
+    if not sections and not user_sections:
+        return {}, {}
+
+    generation_keys = {
+        section: realm_state_generation_cache_key(realm.id, section)
+        for section in [*sections, *user_sections]
+    }
+    section_keys = {
+        section: realm_state_snapshot_cache_key(realm.id, section) for section in sections
+    }
+    cached = safe_cache_get_many([*generation_keys.values(), *section_keys.values()])
+
+    generations: dict[str, str] = {}
+    for section, key in generation_keys.items():
+        if key in cached:
+            (generations[section],) = cached[key]
+    missing_generations = [section for section in generation_keys if section not in generations]
+    if missing_generations:
+        generations.update(bump_realm_state_generation(realm.id, missing_generations))
+
+    snapshot: dict[str, Any] = {}
+    versions: dict[str, str] = {
+        section: f"{realm_state_version(generations[section], spectator)}-{key}"
+        for section, key in user_sections.items()
+    }
+    items_for_cache: dict[str, Any] = {}
+    for section, key in section_keys.items():
+        generation = generations[section]
+        versions[section] = realm_state_version(generation, spectator)
+        if client_state_versions.get(section) == versions[section]:
+            continue
+
+        if key in cached:
+            ((section_generation, data),) = cached[key]
+            if section_generation == generation:
+                snapshot[section] = data
+                continue
+
+        # We read the generation before computing the section, so if
+        # the data changes while we're computing it, the generation
+        # will have changed too, and this copy won't be used.
+        snapshot[section] = REALM_STATE_SNAPSHOT_SECTIONS[section](realm)
+        items_for_cache[key] = ((generation, snapshot[section]),)
+
+    if items_for_cache:
+        safe_cache_set_many(items_for_cache, timeout=REALM_STATE_SNAPSHOT_TIMEOUT)
+    return snapshot, versions
+
+
 def fetch_initial_state_data(
     user_profile: UserProfile | None,
     *,
@@ -135,11 +437,16 @@ def fetch_initial_state_data(
     slim_presence: bool = False,
     presence_last_update_id_fetched_by_client: int | None = None,
     include_subscribers: bool = True,
+    include_subscriber_counts: bool = False,
     include_streams: bool = True,
     spectator_requested_language: str | None = None,
     pronouns_field_type_supported: bool = True,
     linkifier_url_template: bool = False,
     user_list_incomplete: bool = False,
+    user_list_columnar: bool = False,
+    client_state_versions: Mapping[str, str] | None = None,
+    deferred_state_sections: bool = False,
+    profiler: InitialStateProfiler | None = None,
 ) -> dict[str, Any]:
     """When `event_types` is None, fetches the core data powering the
     web app's `page_params` and `/api/v1/register` (for mobile/terminal
@@ -148,6 +455,17 @@ def fetch_initial_state_data(
     The user_profile=None code path is used for logged-out public
     access to streams with is_web_public=True.
 
+    If `client_state_versions` is passed, the state includes the
+    current versions of its realm-wide sections in `state_versions`,
+    and omits the sections for which the client already has the
+    current version, listing them in `unchanged_state_sections`.
+
+    If `profiler` is passed, it records the time and queries spent on
+    each section.  With `deferred_state_sections`, the sections in
+    DEFERRABLE_STATE_SECTIONS which we reach after spending
+    settings.REGISTER_TIME_BUDGET_SECONDS are omitted, and listed in
+    `deferred_state_sections` for the client to fetch separately.
+
     Whenever you add new code to this function, you should also add
     corresponding events for changes in the data structures and new
     code to apply_events (and add a test in test_events.py).
@@ -165,17 +483,65 @@ def fetch_initial_state_data(
     state["zulip_feature_level"] = API_FEATURE_LEVEL
     state["zulip_merge_base"] = ZULIP_MERGE_BASE
 
-    if want("alert_words"):
-        state["alert_words"] = [] if user_profile is None else user_alert_words(user_profile)
+    if profiler is not None:
+        profiler.start_section("realm_state_snapshot")
 
-    if want("custom_profile_fields"):
+    snapshot_sections = {section for section in REALM_STATE_SNAPSHOT_SECTIONS if want(section)}
+    if not linkifier_url_template:
+        snapshot_sections.discard("realm_linkifiers")
+    if user_profile is None:
+        snapshot_sections.discard("custom_profile_fields")
+    if user_profile is None or user_profile.is_guest:
+        snapshot_sections.discard("default_streams")
+    user_sections: dict[str, str] = {}
+    if client_state_versions is not None:
+        # These sections also depend on who they're for, and on the
+        # parameters which change their format.
+        user_key = f"{0 if user_profile is None else user_profile.id}-"
+        if want("realm_user"):
+            user_sections["realm_user"] = user_key + "".join(
+                str(int(flag))
+                for flag in [
+                    client_gravatar,
+                    user_avatar_url_field_optional,
+                    user_list_incomplete,
+                    user_list_columnar,
+                ]
+            )
+        if want("subscription"):
+            user_sections["subscription"] = user_key + "".join(
+                str(int(flag)) for flag in [include_subscribers, include_subscriber_counts]
+            )
+    realm_state, state_versions = get_realm_state_snapshot(
+        realm,
+        snapshot_sections,
+        client_state_versions or {},
+        spectator=user_profile is None,
+        user_sections=user_sections,
+    )
+    unchanged_sections = (snapshot_sections - realm_state.keys()) | {
+        section
+        for section in user_sections
+        if client_state_versions is not None
+        and client_state_versions.get(section) == state_versions[section]
+    }
+
+    if profiler is not None:
+        want = profiler.wrap_want(
+            want,
+            time_budget=settings.REGISTER_TIME_BUDGET_SECONDS if deferred_state_sections else None,
+        )
+
+    def want_changed(section: str) -> bool:
+        return want(section) and section not in unchanged_sections
+
+    if want_changed("custom_profile_fields"):
         if user_profile is None:
             # Spectators can't access full user profiles or
             # personal settings, so we send an empty list.
             state["custom_profile_fields"] = []
         else:
-            fields = custom_profile_fields_for_realm(realm.id)
-            state["custom_profile_fields"] = [f.as_dict() for f in fields]
+            state["custom_profile_fields"] = realm_state["custom_profile_fields"]
         state["custom_profile_field_types"] = {
             item[4]: {"id": item[0], "name": str(item[1])}
             for item in CustomProfileField.ALL_FIELD_TYPES
@@ -232,86 +598,8 @@ def fetch_initial_state_data(
     ):
         state["muted_topics"] = [] if user_profile is None else get_topic_mutes(user_profile)
 
-    if want("muted_users"):
-        state["muted_users"] = [] if user_profile is None else get_user_mutes(user_profile)
-
-    if want("presence"):
-        if presence_last_update_id_fetched_by_client is not None:
-            # This param being submitted by the client, means they want to use
-            # the modern API.
-            slim_presence = True
-
-        if user_profile is not None:
-            presences, presence_last_update_id_fetched_by_server = get_presences_for_realm(
-                realm,
-                slim_presence,
-                last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
-                requesting_user_profile=user_profile,
-            )
-            state["presences"] = presences
-            state["presence_last_update_id"] = presence_last_update_id_fetched_by_server
-        else:
-            state["presences"] = {}
-
-        # Send server_timestamp, to match the format of `GET /presence` requests.
-        state["server_timestamp"] = time.time()
-
-    if want("realm"):
-        # The realm bundle includes both realm properties and server
-        # properties, since it's rare that one would want one and not
-        # the other. We expect most clients to want it.
-        #
-        # A note on naming: For some settings, one could imagine
-        # having a server-level value and a realm-level value (with
-        # the server value serving as the default for the realm
-        # value). For such settings, we prefer the following naming
-        # scheme:
-        #
-        # * realm_inline_image_preview (current realm setting)
-        # * server_inline_image_preview (server-level default)
-        #
-        # In situations where for backwards-compatibility reasons we
-        # have an unadorned name, we should arrange that clients using
-        # that unadorned name work correctly (i.e. that should be the
-        # currently active setting, not a server-level default).
-        #
-        # Other settings, which are just server-level settings or data
-        # about the version of Zulip, can be named without prefixes,
-        # e.g. giphy_rating_options or development_environment.
-        for property_name in Realm.property_types:
-            state["realm_" + property_name] = getattr(realm, property_name)
-
-        for (
-            setting_name,
-            permission_configuration,
-        ) in Realm.REALM_PERMISSION_GROUP_SETTINGS.items():
-            if setting_name in Realm.REALM_PERMISSION_GROUP_SETTINGS_WITH_NEW_API_FORMAT:
-                setting_value = getattr(realm, setting_name)
-                state["realm_" + setting_name] = get_group_setting_value_for_api(setting_value)
-                continue
-
-            state["realm_" + setting_name] = getattr(realm, permission_configuration.id_field_name)
-
-        state["realm_create_public_stream_policy"] = (
-            get_corresponding_policy_value_for_group_setting(
-                realm, "can_create_public_channel_group", Realm.COMMON_POLICY_TYPES
-            )
-        )
-        state["realm_create_private_stream_policy"] = (
-            get_corresponding_policy_value_for_group_setting(
-                realm, "can_create_private_channel_group", Realm.COMMON_POLICY_TYPES
-            )
-        )
-
-        # Most state is handled via the property_types framework;
-        # these manual entries are for those realm settings that don't
-        # fit into that framework.
-        realm_authentication_methods_dict = realm.authentication_methods_dict()
-        state["realm_authentication_methods"] = (
-            get_realm_authentication_methods_for_page_params_api(
-                realm, realm_authentication_methods_dict
-            )
-        )
+    if want_changed("realm"):
+        state.update(realm_state["realm"])
 
         # We pretend these features are disabled because anonymous
         # users can't access them.  In the future, we may want to move
@@ -335,133 +623,7 @@ def fetch_initial_state_data(
         # future choose to move this logic to the frontend.
         state["realm_presence_disabled"] = True if user_profile is None else realm.presence_disabled
 
-        # Important: Encode units in the client-facing API name.
-        state["max_avatar_file_size_mib"] = settings.MAX_AVATAR_FILE_SIZE_MIB
-        state["max_file_upload_size_mib"] = settings.MAX_FILE_UPLOAD_SIZE
-        state["max_icon_file_size_mib"] = settings.MAX_ICON_FILE_SIZE_MIB
-        upload_quota_bytes = realm.upload_quota_bytes()
-        state["realm_upload_quota_mib"] = optional_bytes_to_mib(upload_quota_bytes)
-
-        state["realm_icon_url"] = realm_icon_url(realm)
-        state["realm_icon_source"] = realm.icon_source
-        add_realm_logo_fields(state, realm)
-
-        # TODO/compatibility: realm_uri is a deprecated alias for realm_url that
-        # can be removed once there are no longer clients relying on it.
-        state["realm_url"] = state["realm_uri"] = realm.url
-        state["realm_bot_domain"] = realm.get_bot_domain()
-        state["realm_available_video_chat_providers"] = realm.VIDEO_CHAT_PROVIDERS
-        state["settings_send_digest_emails"] = settings.SEND_DIGEST_EMAILS
-
-        state["realm_digest_emails_enabled"] = (
-            realm.digest_emails_enabled and settings.SEND_DIGEST_EMAILS
-        )
-        state["realm_email_auth_enabled"] = email_auth_enabled(
-            realm, realm_authentication_methods_dict
-        )
-        state["realm_password_auth_enabled"] = password_auth_enabled(
-            realm, realm_authentication_methods_dict
-        )
-
-        state["server_generation"] = settings.SERVER_GENERATION
-        state["realm_is_zephyr_mirror_realm"] = realm.is_zephyr_mirror_realm
-        state["development_environment"] = settings.DEVELOPMENT
-        state["realm_org_type"] = realm.org_type
-        state["realm_plan_type"] = realm.plan_type
-        state["zulip_plan_is_not_limited"] = realm.plan_type != Realm.PLAN_TYPE_LIMITED
-        state["upgrade_text_for_wide_organization_logo"] = str(Realm.UPGRADE_TEXT_STANDARD)
-
-        if realm.push_notifications_enabled_end_timestamp is not None:
-            state["realm_push_notifications_enabled_end_timestamp"] = datetime_to_timestamp(
-                realm.push_notifications_enabled_end_timestamp
-            )
-        else:
-            state["realm_push_notifications_enabled_end_timestamp"] = None
-
-        state["password_min_length"] = settings.PASSWORD_MIN_LENGTH
-        state["password_min_guesses"] = settings.PASSWORD_MIN_GUESSES
-        state["server_inline_image_preview"] = settings.INLINE_IMAGE_PREVIEW
-        state["server_inline_url_embed_preview"] = settings.INLINE_URL_EMBED_PREVIEW
-        state["server_thumbnail_formats"] = [
-            {
-                "name": str(thumbnail_format),
-                "max_width": thumbnail_format.max_width,
-                "max_height": thumbnail_format.max_height,
-                "format": thumbnail_format.extension,
-                "animated": thumbnail_format.animated,
-            }
-            for thumbnail_format in THUMBNAIL_OUTPUT_FORMATS
-        ]
-        state["server_avatar_changes_disabled"] = settings.AVATAR_CHANGES_DISABLED
-        state["server_name_changes_disabled"] = settings.NAME_CHANGES_DISABLED
-        state["server_web_public_streams_enabled"] = settings.WEB_PUBLIC_STREAMS_ENABLED
-        state["giphy_rating_options"] = realm.get_giphy_rating_options()
-
-        state["server_emoji_data_url"] = emoji.data_url()
-
         state["server_needs_upgrade"] = is_outdated_server(user_profile)
-        state["event_queue_longpoll_timeout_seconds"] = (
-            settings.EVENT_QUEUE_LONGPOLL_TIMEOUT_SECONDS
-        )
-
-        # TODO: This probably belongs on the server object.
-        state["realm_default_external_accounts"] = get_default_external_accounts()
-
-        server_default_jitsi_server_url = (
-            settings.JITSI_SERVER_URL.rstrip("/") if settings.JITSI_SERVER_URL is not None else None
-        )
-        state["server_jitsi_server_url"] = server_default_jitsi_server_url
-        state["jitsi_server_url"] = (
-            realm.jitsi_server_url
-            if realm.jitsi_server_url is not None
-            else server_default_jitsi_server_url
-        )
-
-        new_stream_announcements_stream = realm.get_new_stream_announcements_stream()
-        if new_stream_announcements_stream:
-            state["realm_new_stream_announcements_stream_id"] = new_stream_announcements_stream.id
-        else:
-            state["realm_new_stream_announcements_stream_id"] = -1
-
-        signup_announcements_stream = realm.get_signup_announcements_stream()
-        if signup_announcements_stream:
-            state["realm_signup_announcements_stream_id"] = signup_announcements_stream.id
-        else:
-            state["realm_signup_announcements_stream_id"] = -1
-
-        zulip_update_announcements_stream = realm.get_zulip_update_announcements_stream()
-        if zulip_update_announcements_stream:
-            state["realm_zulip_update_announcements_stream_id"] = (
-                zulip_update_announcements_stream.id
-            )
-        else:
-            state["realm_zulip_update_announcements_stream_id"] = -1
-
-        state["max_stream_name_length"] = Stream.MAX_NAME_LENGTH
-        state["max_stream_description_length"] = Stream.MAX_DESCRIPTION_LENGTH
-        state["max_topic_length"] = MAX_TOPIC_NAME_LENGTH
-        state["max_message_length"] = settings.MAX_MESSAGE_LENGTH
-        if realm.demo_organization_scheduled_deletion_date is not None:
-            state["demo_organization_scheduled_deletion_date"] = datetime_to_timestamp(
-                realm.demo_organization_scheduled_deletion_date
-            )
-        state["realm_date_created"] = datetime_to_timestamp(realm.date_created)
-
-        # Presence system parameters for client behavior.
-        state["server_presence_ping_interval_seconds"] = settings.PRESENCE_PING_INTERVAL_SECS
-        state["server_presence_offline_threshold_seconds"] = settings.OFFLINE_THRESHOLD_SECS
-        # Typing notifications protocol parameters for client behavior.
-        state["server_typing_started_expiry_period_milliseconds"] = (
-            settings.TYPING_STARTED_EXPIRY_PERIOD_MILLISECONDS
-        )
-        state["server_typing_stopped_wait_period_milliseconds"] = (
-            settings.TYPING_STOPPED_WAIT_PERIOD_MILLISECONDS
-        )
-        state["server_typing_started_wait_period_milliseconds"] = (
-            settings.TYPING_STARTED_WAIT_PERIOD_MILLISECONDS
-        )
-
-        state["server_supported_permission_settings"] = get_server_supported_permission_settings()
     if want("realm_user_settings_defaults"):
         realm_user_default = RealmUserDefault.objects.get(realm=realm)
         state["realm_user_settings_defaults"] = {}
@@ -480,12 +642,12 @@ def fetch_initial_state_data(
     if want("realm_domains"):
         state["realm_domains"] = get_realm_domains(realm)
 
-    if want("realm_emoji"):
-        state["realm_emoji"] = get_all_custom_emoji_for_realm(realm.id)
+    if want_changed("realm_emoji"):
+        state["realm_emoji"] = realm_state["realm_emoji"]
 
-    if want("realm_linkifiers"):
+    if want_changed("realm_linkifiers"):
         if linkifier_url_template:
-            state["realm_linkifiers"] = linkifiers_for_realm(realm.id)
+            state["realm_linkifiers"] = realm_state["realm_linkifiers"]
         else:
             # When URL template is not supported by the client, return an empty list
             # because the new format is incompatible with the old URL format strings
@@ -499,11 +661,11 @@ def fetch_initial_state_data(
         # backwards-compatible `realm_filters` event would not render the it properly.
         state["realm_filters"] = []
 
-    if want("realm_playgrounds"):
-        state["realm_playgrounds"] = get_realm_playgrounds(realm)
+    if want_changed("realm_playgrounds"):
+        state["realm_playgrounds"] = realm_state["realm_playgrounds"]
 
-    if want("realm_user_groups"):
-        state["realm_user_groups"] = user_groups_in_realm_serialized(realm)
+    if want_changed("realm_user_groups"):
+        state["realm_user_groups"] = realm_state["realm_user_groups"]
 
     if user_profile is not None:
         settings_user = user_profile
@@ -533,18 +695,29 @@ def fetch_initial_state_data(
             # Set home view to recent conversations for spectators regardless of default.
             web_home_view="recent_topics",
         )
-    if want("realm_user"):
-        state["raw_users"] = get_users_for_api(
-            realm,
-            user_profile,
-            client_gravatar=client_gravatar,
-            user_avatar_url_field_optional=user_avatar_url_field_optional,
-            # Don't send custom profile field values to spectators.
-            include_custom_profile_fields=user_profile is not None,
-            user_list_incomplete=user_list_incomplete,
-        )
+    if want_changed("realm_user"):
+        if user_list_columnar and check_user_can_access_all_users(user_profile):
+            # For large realms, this avoids building a dictionary
+            # for every user; see post_process_state.
+            state["raw_user_columns"] = get_realm_user_columns_for_api(
+                realm,
+                user_profile,
+                client_gravatar=client_gravatar,
+                user_avatar_url_field_optional=user_avatar_url_field_optional,
+            )
+        else:
+            state["raw_users"] = get_users_for_api(
+                realm,
+                user_profile,
+                client_gravatar=client_gravatar,
+                user_avatar_url_field_optional=user_avatar_url_field_optional,
+                # Don't send custom profile field values to spectators.
+                include_custom_profile_fields=user_profile is not None,
+                user_list_incomplete=user_list_incomplete,
+            )
         state["cross_realm_bots"] = list(get_cross_realm_dicts())
 
+    if want("realm_user"):
         # For the user's own avatar URL, we force
         # client_gravatar=False, since that saves some unnecessary
         # client-side code for handing medium-size avatars.  See #8253
@@ -639,11 +812,12 @@ def fetch_initial_state_data(
             {} if user_profile is None else get_recent_private_conversations(user_profile)
         )
 
-    if want("subscription"):
+    if want_changed("subscription"):
         if user_profile is not None:
             sub_info = gather_subscriptions_helper(
                 user_profile,
                 include_subscribers=include_subscribers,
+                include_subscriber_counts=include_subscriber_counts,
             )
         else:
             sub_info = get_web_public_subs(realm)
@@ -687,14 +861,14 @@ def fetch_initial_state_data(
             # be used when the mobile apps support logged-out
             # access.
             state["streams"] = get_web_public_streams(realm)  # nocoverage
-    if want("default_streams"):
+    if want_changed("default_streams"):
         if settings_user.is_guest:
             # Guest users and logged-out users don't have access to
             # all default streams, so we pretend the organization
             # doesn't have any.
             state["realm_default_streams"] = []
         else:
-            state["realm_default_streams"] = get_default_streams_for_realm_as_dicts(realm.id)
+            state["realm_default_streams"] = realm_state["default_streams"]
 
     if want("default_stream_groups"):
         if settings_user.is_guest:
@@ -730,6 +904,35 @@ def fetch_initial_state_data(
             get_available_notification_sounds()
         )
 
+    # The sections in DEFERRABLE_STATE_SECTIONS come last, so that
+    # they are the ones we skip when earlier sections are slow.
+    if want("alert_words"):
+        state["alert_words"] = [] if user_profile is None else user_alert_words(user_profile)
+
+    if want("muted_users"):
+        state["muted_users"] = [] if user_profile is None else get_user_mutes(user_profile)
+
+    if want("presence"):
+        if presence_last_update_id_fetched_by_client is not None:
+            # This param being submitted by the client, means they want to use
+            # the modern API.
+            slim_presence = True
+
+        if user_profile is not None:
+            presences, presence_last_update_id_fetched_by_server = get_presences_for_realm(
+                realm,
+                slim_presence,
+                last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
+                requesting_user_profile=user_profile,
+            )
+            state["presences"] = presences
+            state["presence_last_update_id"] = presence_last_update_id_fetched_by_server
+        else:
+            state["presences"] = {}
+
+        # Send server_timestamp, to match the format of `GET /presence` requests.
+        state["server_timestamp"] = time.time()
+
     if want("user_status"):
         # We require creating an account to access statuses.
         state["user_status"] = (
@@ -762,6 +965,22 @@ def fetch_initial_state_data(
         assert state["is_owner"] is False
         assert state["is_guest"] is True
 
+    if client_state_versions is not None:
+        if "presence_last_update_id" in state:
+            # Presence data is versioned differently: the client can
+            # pass this back to fetch only the presence updates since.
+            state_versions["presence"] = str(state["presence_last_update_id"])
+        state["state_versions"] = state_versions
+        state["unchanged_state_sections"] = sorted(unchanged_sections)
+
+    if deferred_state_sections:
+        state["deferred_state_sections"] = (
+            [] if profiler is None else sorted(profiler.deferred_sections)
+        )
+
+    if profiler is not None:
+        profiler.end_section()
+
     return state
 
 
@@ -776,6 +995,7 @@ def apply_events(
     include_subscribers: bool,
     linkifier_url_template: bool,
     user_list_incomplete: bool,
+    include_subscriber_counts: bool = False,
 ) -> None:
     for event in events:
         if fetch_event_types is not None and event["type"] not in fetch_event_types:
@@ -797,6 +1017,7 @@ def apply_events(
             include_subscribers=include_subscribers,
             linkifier_url_template=linkifier_url_template,
             user_list_incomplete=user_list_incomplete,
+            include_subscriber_counts=include_subscriber_counts,
         )
 
 
@@ -810,6 +1031,7 @@ def apply_event(
     include_subscribers: bool,
     linkifier_url_template: bool,
     user_list_incomplete: bool,
+    include_subscriber_counts: bool = False,
 ) -> None:
     if event["type"] == "message":
         state["max_message_id"] = max(state["max_message_id"], event["message"]["id"])
@@ -1109,6 +1331,8 @@ def apply_event(
                 stream_data = copy.deepcopy(stream)
                 if include_subscribers:
                     stream_data["subscribers"] = []
+                if include_subscriber_counts:
+                    stream_data["subscriber_count"] = 0
 
                 # Here we need to query the database to check whether the
                 # user was previously subscribed. If they were, we need to
@@ -1132,6 +1356,8 @@ def apply_event(
                     )
                     if include_subscribers:
                         unsubscribed_stream_dict["subscribers"] = []
+                    if include_subscriber_counts:
+                        unsubscribed_stream_dict["subscriber_count"] = 0
                     state["unsubscribed"].append(unsubscribed_stream_dict)
                 else:
                     assert len(unsubscribed_stream_sub) == 0
@@ -1319,9 +1545,14 @@ def apply_event(
             # add the new subscriptions
             for sub in event["subscriptions"]:
                 if sub["stream_id"] not in existing_stream_ids:
-                    if "subscribers" in sub and not include_subscribers:
+                    if "subscribers" in sub and (
+                        include_subscriber_counts or not include_subscribers
+                    ):
                         sub = copy.deepcopy(sub)
-                        del sub["subscribers"]
+                        if include_subscriber_counts:
+                            sub["subscriber_count"] = len(sub["subscribers"])
+                        if not include_subscribers:
+                            del sub["subscribers"]
                     state["subscriptions"].append(sub)
 
             # remove them from unsubscribed if they had been there
@@ -1341,6 +1572,9 @@ def apply_event(
             if include_subscribers:
                 for sub in removed_subs:
                     sub["subscribers"].remove(user_profile.id)
+            if include_subscriber_counts:
+                for sub in removed_subs:
+                    sub["subscriber_count"] -= 1
 
             state["unsubscribed"] += removed_subs
 
@@ -1365,6 +1599,18 @@ def apply_event(
                         if sub["stream_id"] in stream_ids:
                             subscribers = set(sub["subscribers"]) | user_ids
                             sub["subscribers"] = sorted(subscribers)
+            if include_subscriber_counts:
+                # Users are never sent peer_add events about their own
+                # subscriptions, or the same subscription twice, so
+                # we can just count the new subscribers.
+                for sub_dict in [
+                    state["subscriptions"],
+                    state["unsubscribed"],
+                    state["never_subscribed"],
+                ]:
+                    for sub in sub_dict:
+                        if sub["stream_id"] in event["stream_ids"]:
+                            sub["subscriber_count"] += len(event["user_ids"])
         elif event["op"] == "peer_remove":
             if include_subscribers:
                 stream_ids = set(event["stream_ids"])
@@ -1379,6 +1625,15 @@ def apply_event(
                         if sub["stream_id"] in stream_ids:
                             subscribers = set(sub["subscribers"]) - user_ids
                             sub["subscribers"] = sorted(subscribers)
+            if include_subscriber_counts:
+                for sub_dict in [
+                    state["subscriptions"],
+                    state["unsubscribed"],
+                    state["never_subscribed"],
+                ]:
+                    for sub in sub_dict:
+                        if sub["stream_id"] in event["stream_ids"]:
+                            sub["subscriber_count"] -= len(event["user_ids"])
         else:
             raise AssertionError("Unexpected event type {type}/{op}".format(**event))
     elif event["type"] == "presence":
@@ -1398,6 +1653,12 @@ def apply_event(
         state["presences"][user_key] = get_presence_for_user(event["user_id"], slim_presence)[
             user_key
         ]
+    elif event["type"] == "presence_batch":
+        # Like for presence events, we don't try to update
+        # presence_last_update_id here.
+        for user_id in event["presences"]:
+            presence = get_presence_for_user(int(user_id), slim_presence)
+            state["presences"].update(presence)
     elif event["type"] == "update_message":
         # We don't return messages in /register, so we don't need to
         # do anything for content updates, but we may need to update
@@ -1651,12 +1912,15 @@ def do_events_register(
     queue_lifespan_secs: int = 0,
     all_public_streams: bool = False,
     include_subscribers: bool = True,
+    include_subscriber_counts: bool = False,
     include_streams: bool = True,
     client_capabilities: Mapping[str, bool] = {},
     narrow: Collection[NarrowTerm] = [],
     fetch_event_types: Collection[str] | None = None,
     spectator_requested_language: str | None = None,
     pronouns_field_type_supported: bool = True,
+    client_state_versions: Mapping[str, str] | None = None,
+    profiler: InitialStateProfiler | None = None,
 ) -> dict[str, Any]:
     # Technically we don't need to check this here because
     # build_narrow_predicate will check it, but it's nicer from an error
@@ -1672,6 +1936,9 @@ def do_events_register(
     user_settings_object = client_capabilities.get("user_settings_object", False)
     linkifier_url_template = client_capabilities.get("linkifier_url_template", False)
     user_list_incomplete = client_capabilities.get("user_list_incomplete", False)
+    user_list_columnar = client_capabilities.get("user_list_columnar", False)
+    batched_presence_events = client_capabilities.get("batched_presence_events", False)
+    deferred_state_sections = client_capabilities.get("deferred_state_sections", False)
 
     if fetch_event_types is not None:
         event_types_set: set[str] | None = set(fetch_event_types)
@@ -1692,6 +1959,7 @@ def do_events_register(
         # TODO: Unify the two fetch_initial_state_data code paths.
         assert client_gravatar is False
         assert include_subscribers is False
+        assert include_subscriber_counts is False
         assert include_streams is False
         ret = fetch_initial_state_data(
             user_profile,
@@ -1704,6 +1972,7 @@ def do_events_register(
             user_avatar_url_field_optional=user_avatar_url_field_optional,
             user_settings_object=user_settings_object,
             user_list_incomplete=user_list_incomplete,
+            user_list_columnar=user_list_columnar,
             # These presence params are a noop, because presence is not included.
             slim_presence=True,
             presence_last_update_id_fetched_by_client=None,
@@ -1712,14 +1981,33 @@ def do_events_register(
             # Force include_streams=False for security reasons.
             include_streams=include_streams,
             spectator_requested_language=spectator_requested_language,
+            # Spectators have no event queue, so unlike below, no
+            # events can arrive while we fetch the state.
+            client_state_versions=client_state_versions,
         )
 
-        post_process_state(user_profile, ret, notification_settings_null=False)
+        post_process_state(
+            user_profile,
+            ret,
+            notification_settings_null=False,
+            user_list_columnar=user_list_columnar,
+        )
         return ret
 
     # Fill up the UserMessage rows if a soft-deactivated user has returned
     reactivate_user_if_soft_deactivated(user_profile)
 
+    if (
+        client_state_versions is not None
+        and slim_presence
+        and presence_last_update_id_fetched_by_client is None
+    ):
+        # The presence version is the client's last presence_last_update_id;
+        # anything else means the client needs all the presence data.
+        presence_version = client_state_versions.get("presence", "")
+        if presence_version.isdecimal():
+            presence_last_update_id_fetched_by_client = int(presence_version)
+
     legacy_narrow = [[nt.operator, nt.operand] for nt in narrow]
 
     # Note that we pass event_types, not fetch_event_types here, since
@@ -1740,6 +2028,7 @@ def do_events_register(
         pronouns_field_type_supported=pronouns_field_type_supported,
         linkifier_url_template=linkifier_url_template,
         user_list_incomplete=user_list_incomplete,
+        batched_presence_events=batched_presence_events,
     )
 
     if queue_id is None:
@@ -1756,27 +2045,83 @@ def do_events_register(
         slim_presence=slim_presence,
         presence_last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
         include_subscribers=include_subscribers,
+        include_subscriber_counts=include_subscriber_counts,
         include_streams=include_streams,
         pronouns_field_type_supported=pronouns_field_type_supported,
         linkifier_url_template=linkifier_url_template,
         user_list_incomplete=user_list_incomplete,
+        user_list_columnar=user_list_columnar,
+        client_state_versions=client_state_versions,
+        deferred_state_sections=deferred_state_sections,
+        profiler=profiler,
     )
 
     # Apply events that came in while we were fetching initial data
     events = get_user_events(user_profile, queue_id, -1)
+
+    if client_state_versions is not None:
+        # A section we omitted because the client had its current
+        # version may have changed since we checked; since the event
+        # queue was created first, the change's event is in `events`.
+        # We fetch those sections again, so that the client gets
+        # their new version, and apply_events has data to update.
+        changed_sections = {
+            section
+            for event in events
+            for section in REALM_STATE_EVENT_SECTIONS.get(event["type"], [])
+        }.intersection(ret["unchanged_state_sections"])
+        if changed_sections:
+            changed_state = fetch_initial_state_data(
+                user_profile,
+                realm=get_realm_with_settings(realm_id=realm.id),
+                event_types=changed_sections,
+                queue_id=queue_id,
+                client_gravatar=client_gravatar,
+                user_avatar_url_field_optional=user_avatar_url_field_optional,
+                include_subscribers=include_subscribers,
+                include_subscriber_counts=include_subscriber_counts,
+                pronouns_field_type_supported=pronouns_field_type_supported,
+                linkifier_url_template=linkifier_url_template,
+                user_list_incomplete=user_list_incomplete,
+                user_list_columnar=user_list_columnar,
+                client_state_versions={},
+            )
+            ret["state_versions"].update(changed_state.pop("state_versions"))
+            del changed_state["unchanged_state_sections"]
+            ret.update(changed_state)
+            ret["unchanged_state_sections"] = sorted(
+                set(ret["unchanged_state_sections"]) - changed_sections
+            )
+    if "raw_user_columns" in ret and any(
+        event["type"] in ["realm_user", "custom_profile_fields"] for event in events
+    ):
+        # apply_events only knows how to update users in the format
+        # returned by get_users_for_api.
+        ret["raw_users"] = user_columns_to_dicts(ret.pop("raw_user_columns"))
+
+    # The client's later fetch of the sections we deferred will
+    # include any changes from these events.
+    deferred_event_types = {
+        event_type
+        for section in ret.get("deferred_state_sections", [])
+        for event_type in DEFERRABLE_STATE_SECTIONS[section]
+    }
     apply_events(
         user_profile,
         state=ret,
-        events=events,
+        events=[event for event in events if event["type"] not in deferred_event_types],
         fetch_event_types=fetch_event_types,
         client_gravatar=client_gravatar,
         slim_presence=slim_presence,
         include_subscribers=include_subscribers,
         linkifier_url_template=linkifier_url_template,
         user_list_incomplete=user_list_incomplete,
+        include_subscriber_counts=include_subscriber_counts,
     )
 
-    post_process_state(user_profile, ret, notification_settings_null)
+    post_process_state(
+        user_profile, ret, notification_settings_null, user_list_columnar=user_list_columnar
+    )
 
     if len(events) > 0:
         ret["last_event_id"] = events[-1]["id"]
@@ -1786,7 +2131,10 @@ def do_events_register(
 
 
 def post_process_state(
-    user_profile: UserProfile | None, ret: dict[str, Any], notification_settings_null: bool
+    user_profile: UserProfile | None,
+    ret: dict[str, Any],
+    notification_settings_null: bool,
+    user_list_columnar: bool = False,
 ) -> None:
     """
     NOTE:
@@ -1825,8 +2173,30 @@ def post_process_state(
         for d in user_dicts:
             d.pop("is_active")
 
+        if user_list_columnar:
+            spectator = user_profile is None
+            ret["realm_users"] = user_dicts_to_columns(ret["realm_users"], spectator)
+            ret["realm_non_active_users"] = user_dicts_to_columns(
+                ret["realm_non_active_users"], spectator
+            )
+
         del ret["raw_users"]
 
+    if "raw_user_columns" in ret:
+        columns = ret.pop("raw_user_columns")
+        is_active = columns.pop("is_active")
+        timezones = columns.pop("timezones")
+        for key, active in [("realm_users", True), ("realm_non_active_users", False)]:
+            ret[key] = {
+                column: [
+                    value
+                    for value, user_is_active in zip(values, is_active, strict=True)
+                    if user_is_active == active
+                ]
+                for column, values in columns.items()
+            }
+            ret[key]["timezones"] = timezones
+
     if "raw_recent_private_conversations" in ret:
         # Reformat recent_private_conversations to be a list of dictionaries, rather than a dict.
         ret["recent_private_conversations"] = sorted(
@@ -31,6 +31,7 @@ from analytics.models import RealmCount, StreamCount, UserCount
 from scripts.lib.zulip_tools import overwrite_symlink
 from zerver.lib.avatar_hash import user_avatar_base_path_from_ids
 from zerver.lib.pysa import mark_sanitized
+from zerver.lib.read_replica import read_from_replica
 from zerver.lib.upload.s3 import get_bucket
 from zerver.models import (
     AlertWord,
@@ -166,11 +167,13 @@ ALL_ZULIP_TABLES = {
     "zerver_scheduledmessagenotificationemail",
     "zerver_service",
     "zerver_stream",
+    "zerver_streamtopic",
     "zerver_submessage",
     "zerver_subscription",
     "zerver_useractivity",
     "zerver_useractivityinterval",
     "zerver_usergroup",
+    "zerver_usergroupclosure",
     "zerver_usergroupmembership",
     "zerver_usermessage",
     "zerver_userpresence",
@@ -253,6 +256,12 @@ NON_EXPORTED_TABLES = {
     # The importer cannot trust ImageAttachment objects anyway and needs to check
     # and process images for thumbnailing on its own.
     "zerver_imageattachment",
+    # StreamTopic is a summary of the Message table, which the
+    # importer rebuilds from the imported messages.
+    "zerver_streamtopic",
+    # UserGroupClosure is maintained by database triggers as user
+    # groups and their subgroups are imported.
+    "zerver_usergroupclosure",
     # For any tables listed below here, it's a bug that they are not present in the export.
 }
 
@@ -1257,6 +1266,7 @@ def fetch_usermessages(
     return user_message_chunk
 
 
+@read_from_replica
 def export_usermessages_batch(
     input_path: Path, output_path: Path, consent_message_id: int | None = None
 ) -> None:
@@ -1986,6 +1996,7 @@ def get_exportable_scheduled_message_ids(
     return set(ScheduledMessage.objects.filter(realm=realm).values_list("id", flat=True))
 
 
+@read_from_replica
 def do_export_realm(
     realm: Realm,
     output_dir: Path,
@@ -2151,6 +2162,7 @@ def launch_user_message_subprocesses(
         print(f"Shard {shard} finished, status {status}")
 
 
+@read_from_replica
 def do_export_user(user_profile: UserProfile, output_dir: Path) -> None:
     response: TableData = {}
 
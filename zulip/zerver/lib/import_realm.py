@@ -24,7 +24,11 @@ from zerver.actions.user_settings import do_change_avatar_fields
 from zerver.lib.avatar_hash import user_avatar_base_path_from_ids
 from zerver.lib.bulk_create import bulk_set_users_or_streams_recipient_fields
 from zerver.lib.export import DATE_FIELDS, Field, Path, Record, TableData, TableName
-from zerver.lib.markdown import markdown_convert
+from zerver.lib.markdown import (
+    MarkdownRenderRequest,
+    bulk_render_markdown_requests,
+    prepare_markdown_render,
+)
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.message import get_last_message_id
 from zerver.lib.mime_types import guess_type
@@ -35,6 +39,7 @@ from zerver.lib.server_initialization import create_internal_realm, server_initi
 from zerver.lib.streams import render_stream_description
 from zerver.lib.thumbnail import THUMBNAIL_ACCEPT_IMAGE_TYPES, BadImageError, maybe_thumbnail
 from zerver.lib.timestamp import datetime_to_timestamp
+from zerver.lib.topic import rebuild_stream_topics
 from zerver.lib.upload import ensure_avatar_image, sanitize_name, upload_backend, upload_emoji_image
 from zerver.lib.upload.s3 import get_bucket
 from zerver.lib.user_counts import realm_user_count_by_role
@@ -350,6 +355,8 @@ def fix_message_rendered_content(
     """
     This function sets the rendered_content of the messages we're importing.
     """
+    render_requests: list[MarkdownRenderRequest] = []
+    messages_to_render: list[Record] = []
     for message in messages:
         if content_key not in message:
             # Message-edit entries include topic moves, which don't
@@ -416,28 +423,39 @@ def fix_message_rendered_content(
             # words" type feature, and notifications aren't important anyway.
             realm_alert_words_automaton = None
 
-            rendered_content = markdown_convert(
-                content=content,
-                realm_alert_words_automaton=realm_alert_words_automaton,
-                message_realm=realm,
-                sent_by_bot=sent_by_bot,
-                translate_emoticons=translate_emoticons,
-            ).rendered_content
-
-            message[rendered_content_key] = rendered_content
-            if "scheduled_timestamp" not in message:
-                # This logic runs also for ScheduledMessage, which doesn't use
-                # the rendered_content_version field.
-                message["rendered_content_version"] = markdown_version
+            render_requests.append(
+                prepare_markdown_render(
+                    content=content,
+                    realm_alert_words_automaton=realm_alert_words_automaton,
+                    message_realm=realm,
+                    sent_by_bot=sent_by_bot,
+                    translate_emoticons=translate_emoticons,
+                )
+            )
+            messages_to_render.append(message)
         except Exception:
+            logging.warning(
+                "Error in Markdown rendering for message ID %s; continuing", message["id"]
+            )
+
+    # The messages are rendered in parallel, if we have Markdown
+    # renderer processes.
+    rendering_results = bulk_render_markdown_requests(render_requests)
+    for message, rendering_result in zip(messages_to_render, rendering_results, strict=True):
+        if rendering_result is None:
             # This generally happens with two possible causes:
             # * rendering Markdown throwing an uncaught exception
-            # * rendering Markdown failing with the exception being
-            #   caught in Markdown (which then returns None, causing the
-            #   rendered_content assert above to fire).
+            # * rendering Markdown timing out
             logging.warning(
                 "Error in Markdown rendering for message ID %s; continuing", message["id"]
             )
+            continue
+
+        message[rendered_content_key] = rendering_result.rendered_content
+        if "scheduled_timestamp" not in message:
+            # This logic runs also for ScheduledMessage, which doesn't use
+            # the rendered_content_version field.
+            message["rendered_content_version"] = markdown_version
 
 
 def fix_message_edit_history(
@@ -1675,6 +1693,13 @@ def do_import_realm(import_dir: Path, subdomain: str, processes: int = 1) -> Rea
     with connection.cursor() as cursor:
         cursor.execute(update_first_message_id_query, {"realm_id": realm.id})
 
+    # The StreamTopic summaries are not exported; rebuild them from
+    # the imported messages.
+    for recipient_id in Recipient.objects.filter(
+        type=Recipient.STREAM, type_id__in=Stream.objects.filter(realm=realm).values("id")
+    ).values_list("id", flat=True):
+        rebuild_stream_topics(realm.id, recipient_id)
+
     if "zerver_userstatus" in data:
         fix_datetime_fields(data, "zerver_userstatus")
         re_map_foreign_keys(data, "zerver_userstatus", "user_profile", related_table="user_profile")
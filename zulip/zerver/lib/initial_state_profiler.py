@@ -0,0 +1,110 @@
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import connection
+
+from zerver.lib.cache_helpers import SQLQueryCounter
+
+# Sections of the initial state which a client that declares the
+# `deferred_state_sections` client capability can fetch later, via
+# `GET /register/sections`, if /register runs out of time.  These are
+# optional for rendering the app, and mapped to the event types which
+# update them; those events replace the state they touch rather than
+# adding to it, so the client can apply the ones which arrive before
+# its follow-up fetch completes without double-counting anything.
+DEFERRABLE_STATE_SECTIONS: dict[str, list[str]] = {
+    "alert_words": ["alert_words"],
+    "muted_users": ["muted_users"],
+    "presence": ["presence", "presence_batch"],
+    "user_status": ["user_status"],
+}
+
+
+@dataclass
+class SectionProfile:
+    time: float = 0.0
+    queries: int = 0
+
+
+class InitialStateProfiler:
+    """Measures the time and database queries spent in each section of
+    fetch_initial_state_data, where a section runs from the first
+    want() check for it that succeeds until the next such check for
+    another section.  A section whose data is computed under several
+    want() checks, like unread messages, is credited to the first.
+
+    want() functions wrapped with a `time_budget` also skip the
+    deferrable sections reached after that many seconds, recording
+    them in `deferred_sections`.
+    """
+
+    def __init__(self) -> None:
+        self.sections: dict[str, SectionProfile] = {}
+        self.deferred_sections: set[str] = set()
+        self.query_counter = SQLQueryCounter()
+        self.start_time = time.perf_counter()
+        self.current_section: str | None = None
+        self.section_start_time = self.start_time
+        self.section_start_queries = 0
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        self.start_time = time.perf_counter()
+        with connection.execute_wrapper(self.query_counter):
+            try:
+                yield
+            finally:
+                self.end_section()
+
+    def start_section(self, section: str) -> None:
+        self.end_section()
+        self.current_section = section
+        self.section_start_time = time.perf_counter()
+        self.section_start_queries = self.query_counter.count
+
+    def end_section(self) -> None:
+        if self.current_section is None:
+            return
+        profile = self.sections.setdefault(self.current_section, SectionProfile())
+        profile.time += time.perf_counter() - self.section_start_time
+        profile.queries += self.query_counter.count - self.section_start_queries
+        self.current_section = None
+
+    def wrap_want(
+        self, want: Callable[[str], bool], *, time_budget: float | None
+    ) -> Callable[[str], bool]:
+        def profiled_want(section: str) -> bool:
+            if not want(section):
+                return False
+            if section in DEFERRABLE_STATE_SECTIONS and (
+                section in self.deferred_sections
+                or (time_budget is not None and time.perf_counter() - self.start_time > time_budget)
+            ):
+                self.deferred_sections.add(section)
+                return False
+            if section not in self.sections and section != self.current_section:
+                self.start_section(section)
+            return True
+
+        return profiled_want
+
+    def slowest_sections(self, limit: int) -> list[tuple[str, SectionProfile]]:
+        return sorted(self.sections.items(), key=lambda item: item[1].time, reverse=True)[:limit]
+
+    def log_data_summary(self, limit: int = 3) -> str:
+        return "[{}]".format(
+            ",".join(
+                f"{section}:{profile.time * 1000:.0f}ms/{profile.queries}q"
+                for section, profile in self.slowest_sections(limit)
+            )
+        )
+
+    def server_timing_header(self) -> str:
+        # See https://www.w3.org/TR/server-timing/; browsers show these
+        # in the network panel of their developer tools.
+        return ", ".join(
+            f'{section};dur={profile.time * 1000:.1f};desc="{profile.queries} queries"'
+            for section, profile in self.sections.items()
+        )
@@ -1,13 +1,15 @@
 # Zulip's main Markdown implementation.  See docs/subsystems/markdown.md for
 # detailed documentation on our Markdown syntax.
 import cgi
+import copy
+import hashlib
 import html
 import logging
 import mimetypes
 import re
 import time
-from collections import deque
-from collections.abc import Callable
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import lru_cache
@@ -41,7 +43,13 @@ from typing_extensions import Self, override
 from zerver.lib import mention
 from zerver.lib.cache import cache_with_key
 from zerver.lib.camo import get_camo_url
-from zerver.lib.emoji import EMOTICON_RE, codepoint_to_name, name_to_codepoint, translate_emoticons
+from zerver.lib.emoji import (
+    EMOTICON_RE,
+    codepoint_to_name,
+    get_active_realm_emoji,
+    name_to_codepoint,
+    translate_emoticons,
+)
 from zerver.lib.emoji_utils import emoji_to_hex_codepoint, unqualify_emoji
 from zerver.lib.exceptions import MarkdownRenderingError
 from zerver.lib.markdown import fenced_code
@@ -54,7 +62,7 @@ from zerver.lib.mention import (
 )
 from zerver.lib.outgoing_http import OutgoingSession
 from zerver.lib.subdomains import is_static_or_current_realm_url
-from zerver.lib.tex import render_tex
+from zerver.lib.tex import render_tex, render_tex_batch
 from zerver.lib.thumbnail import (
     MarkdownImageMetadata,
     get_user_upload_previews,
@@ -67,7 +75,7 @@ from zerver.lib.url_encoding import encode_stream, hash_util_encode
 from zerver.lib.url_preview.types import UrlEmbedData, UrlOEmbedData
 from zerver.models import Message, Realm
 from zerver.models.linkifiers import linkifiers_for_realm
-from zerver.models.realm_emoji import EmojiInfo, get_name_keyed_dict_for_active_realm_emoji
+from zerver.models.realm_emoji import EmojiInfo
 
 ReturnT = TypeVar("ReturnT")
 
@@ -1565,6 +1573,33 @@ def content_has_emoji_syntax(content: str) -> bool:
     return re.search(EMOJI_REGEX, content) is not None
 
 
+TEX_RE = r"\B(?<!\$)\$\$(?P<body>[^\n_$](\\\$|[^$\n])*)\$\$(?!\$)\B"
+
+
+def find_message_tex(content: str) -> list[tuple[str, bool]]:
+    """The TeX which rendering the content will most likely render, as
+    (tex, is_inline) pairs, so we can render it all in one batch.
+    This only approximates how the Markdown processor parses the
+    content; any formulas it misses are rendered when they're found."""
+    formulas = [(match.group("body"), True) for match in re.finditer(TEX_RE, content)]
+    fence = None
+    lines: list[str] = []
+    for line in content.split("\n"):
+        if fence is None:
+            m = FENCE_RE.match(line)
+            if m is not None and (m.group("lang") or "").lower() == "math":
+                fence = m.group("fence")
+                lines = []
+        elif line.rstrip() == fence:
+            # Like TexHandler, which renders each paragraph separately.
+            if lines:
+                formulas += [(paragraph, False) for paragraph in "\n".join(lines).split("\n\n")]
+            fence = None
+        else:
+            lines.append(line.rstrip())
+    return formulas
+
+
 class Tex(markdown.inlinepatterns.Pattern):
     @override
     def handleMatch(self, match: Match[str]) -> str | Element:
@@ -1836,6 +1871,103 @@ def prepare_linkifier_pattern(source: str) -> str:
     return rf"""(?P<{BEFORE_CAPTURE_GROUP}>^|\s|{next_line}|\pZ|['"\(,:<])(?P<{OUTER_CAPTURE_GROUP}>{source})(?P<{AFTER_CAPTURE_GROUP}>$|[^\pL\pN])"""
 
 
+class LinkifierMatcher:
+    """The compiled linkifiers of a realm, which also finds which of
+    them match a string in a single pass, using an RE2 set of their
+    patterns.  Realms can have hundreds of linkifiers, and searching
+    the content with each in turn is the bulk of the time spent
+    rendering such realms' messages and topic links; since most
+    content matches few linkifiers, if any, we only search with the
+    ones the set matches."""
+
+    def __init__(self, linkifiers: list[LinkifierDict]) -> None:
+        self.linkifiers = linkifiers
+
+        # Do not write errors to stderr (this still raises exceptions)
+        options = re2.Options()
+        options.log_errors = False
+
+        self.patterns: list[Pattern[str] | None] = []
+        self.prepared_url_templates: list[uri_template.URITemplate] = []
+        regex_set = re2.Set.SearchSet(options)
+        set_indexes: list[int] = []
+        for i, linkifier in enumerate(linkifiers):
+            try:
+                pattern = re2.compile(
+                    prepare_linkifier_pattern(linkifier["pattern"]), options=options
+                )
+                # A match for the prepared pattern is a match for the
+                # linkifier's own pattern, which makes a smaller set.
+                regex_set.Add(linkifier["pattern"])
+            except re2.error:
+                # An invalid regex shouldn't be possible here, and
+                # logging here on an invalid regex would spam the logs
+                # with every message sent; simply skip the linkifier.
+                pattern = None
+            else:
+                set_indexes.append(i)
+            self.patterns.append(pattern)
+            self.prepared_url_templates.append(uri_template.URITemplate(linkifier["url_template"]))
+
+        self.regex_set: re2.Set | None = None
+        if set_indexes:
+            try:
+                regex_set.Compile()
+                self.regex_set = regex_set
+            except re2.error:  # nocoverage
+                # Too large to compile; search with each linkifier.
+                pass
+        self.set_indexes = set_indexes
+
+        # The inline patterns search the same text with each
+        # linkifier in turn, so we remember the last result.
+        self.last_text: str | None = None
+        self.last_matching_linkifiers: set[int] = set()
+
+    def matching_linkifiers(self, text: str) -> set[int]:
+        """The indexes of the linkifiers whose patterns might match
+        somewhere in the text; this includes every linkifier which
+        does match it."""
+        if text != self.last_text:
+            if self.regex_set is None:
+                self.last_matching_linkifiers = set(self.set_indexes)
+            else:
+                self.last_matching_linkifiers = {
+                    self.set_indexes[i] for i in self.regex_set.Match(text) or []
+                }
+            self.last_text = text
+        return self.last_matching_linkifiers
+
+
+linkifier_matchers: dict[int, LinkifierMatcher] = {}
+
+
+def get_linkifier_matcher(linkifiers_key: int, linkifiers: list[LinkifierDict]) -> LinkifierMatcher:
+    matcher = linkifier_matchers.get(linkifiers_key)
+    if matcher is None or matcher.linkifiers != linkifiers:
+        matcher = LinkifierMatcher(linkifiers)
+        linkifier_matchers[linkifiers_key] = matcher
+    return matcher
+
+
+class PrefilteredLinkifierRegex:
+    """Stands in for a linkifier's compiled regex in LinkifierPattern,
+    skipping the search when the LinkifierMatcher's single pass over
+    the text found that the linkifier can't match it."""
+
+    def __init__(self, matcher: LinkifierMatcher, index: int) -> None:
+        self.matcher = matcher
+        self.index = index
+        pattern = matcher.patterns[index]
+        assert pattern is not None
+        self.pattern = pattern
+
+    def finditer(self, string: str, pos: int = 0) -> Iterator[Match[str]]:
+        if self.index not in self.matcher.matching_linkifiers(string):
+            return iter(())
+        return self.pattern.finditer(string, pos)
+
+
 # Given a regular expression pattern, linkifies groups that match it
 # using the provided format string to construct the URL.
 class LinkifierPattern(CompiledInlineProcessor):
@@ -1843,19 +1975,14 @@ class LinkifierPattern(CompiledInlineProcessor):
 
     def __init__(
         self,
-        source_pattern: str,
-        url_template: str,
+        matcher: LinkifierMatcher,
+        index: int,
         zmd: "ZulipMarkdown",
     ) -> None:
-        # Do not write errors to stderr (this still raises exceptions)
-        options = re2.Options()
-        options.log_errors = False
-
-        compiled_re2 = re2.compile(prepare_linkifier_pattern(source_pattern), options=options)
-
-        self.prepared_url_template = uri_template.URITemplate(url_template)
+        self.prepared_url_template = matcher.prepared_url_templates[index]
 
-        super().__init__(compiled_re2, zmd)
+        # Python-Markdown only calls finditer on the compiled regex.
+        super().__init__(cast(Pattern[str], PrefilteredLinkifierRegex(matcher, index)), zmd)
 
     @override
     def handleMatch(  # type: ignore[override] # https://github.com/python/mypy/issues/10197
@@ -2290,7 +2417,6 @@ class ZulipMarkdown(markdown.Markdown):
         EMPHASIS_RE = r"(\*)(?!\s+)([^\*^\n]+)(?<!\s)\*"
         STRONG_RE = r"(\*\*)([^\n]+?)\2"
         STRONG_EM_RE = r"(\*\*\*)(?!\s+)([^\*^\n]+)(?<!\s)\*\*\*"
-        TEX_RE = r"\B(?<!\$)\$\$(?P<body>[^\n_$](\\\$|[^$\n])*)\$\$(?!\$)\B"
         TIMESTAMP_RE = r"<time:(?P<time>[^>]*?)>"
 
         # Add inline patterns.  We use a custom numbering of the
@@ -2337,10 +2463,13 @@ class ZulipMarkdown(markdown.Markdown):
     def register_linkifiers(
         self, registry: markdown.util.Registry[markdown.inlinepatterns.Pattern]
     ) -> markdown.util.Registry[markdown.inlinepatterns.Pattern]:
-        for linkifier in self.linkifiers:
+        matcher = get_linkifier_matcher(self.linkifiers_key, self.linkifiers)
+        for index, linkifier in enumerate(self.linkifiers):
+            if matcher.patterns[index] is None:
+                continue
             pattern = linkifier["pattern"]
             registry.register(
-                LinkifierPattern(pattern, linkifier["url_template"], self),
+                LinkifierPattern(matcher, index, self),
                 f"linkifiers/{pattern}",
                 45,
             )
@@ -2440,23 +2569,19 @@ class TopicLinkMatch:
 # function on the URLs; they are expected to be HTML-escaped when
 # rendered by clients (just as links rendered into message bodies
 # are validated and escaped inside `url_to_a`).
-def topic_links(linkifiers_key: int, topic_name: str) -> list[dict[str, str]]:
+def topic_links(
+    linkifiers_key: int, topic_name: str, linkifiers: list[LinkifierDict] | None = None
+) -> list[dict[str, str]]:
     matches: list[TopicLinkMatch] = []
-    linkifiers = linkifiers_for_realm(linkifiers_key)
-    precedence = 0
-
-    options = re2.Options()
-    options.log_errors = False
-    for linkifier in linkifiers:
-        raw_pattern = linkifier["pattern"]
-        prepared_url_template = uri_template.URITemplate(linkifier["url_template"])
-        try:
-            pattern = re2.compile(prepare_linkifier_pattern(raw_pattern), options=options)
-        except re2.error:
-            # An invalid regex shouldn't be possible here, and logging
-            # here on an invalid regex would spam the logs with every
-            # message sent; simply move on.
-            continue
+    if linkifiers is None:
+        linkifiers = linkifiers_for_realm(linkifiers_key)
+    matcher = get_linkifier_matcher(linkifiers_key, linkifiers)
+
+    # Linkifiers earlier in the list take precedence.
+    for precedence in sorted(matcher.matching_linkifiers(topic_name)):
+        pattern = matcher.patterns[precedence]
+        assert pattern is not None
+        prepared_url_template = matcher.prepared_url_templates[precedence]
         pos = 0
         while pos < len(topic_name):
             m = pattern.search(topic_name, pos)
@@ -2483,7 +2608,6 @@ def topic_links(linkifiers_key: int, topic_name: str) -> list[dict[str, str]]:
                     precedence=precedence,
                 )
             ]
-        precedence += 1
 
     # Sort the matches beforehand so we favor the match with a higher priority and tie-break with the starting index.
     # Note that we sort it before processing the raw URLs so that linkifiers will be prioritized over them.
@@ -2546,8 +2670,11 @@ def topic_links(linkifiers_key: int, topic_name: str) -> list[dict[str, str]]:
     return [{"url": match.url, "text": match.text} for match in applied_matches]
 
 
-def maybe_update_markdown_engines(linkifiers_key: int, email_gateway: bool) -> None:
-    linkifiers = linkifiers_for_realm(linkifiers_key)
+def maybe_update_markdown_engines(
+    linkifiers_key: int, email_gateway: bool, linkifiers: list[LinkifierDict] | None = None
+) -> None:
+    if linkifiers is None:
+        linkifiers = linkifiers_for_realm(linkifiers_key)
     if linkifiers_key not in linkifier_data or linkifier_data[linkifiers_key] != linkifiers:
         # Linkifier data has changed, update `linkifier_data` and any
         # of the existing Markdown engines using this set of linkifiers.
@@ -2575,7 +2702,148 @@ def privacy_clean_markdown(content: str) -> str:
     return repr(_privacy_re.sub("x", content))
 
 
-def do_convert(
+@dataclass
+class MarkdownRenderRequest:
+    """Everything the Markdown engine needs to render a message, fetched
+    from the database beforehand; this can be sent to a renderer
+    process (see zerver/lib/markdown_rendering_pool.py)."""
+
+    content: str
+    linkifiers_key: int
+    linkifiers: list[LinkifierDict]
+    email_gateway: bool
+    realm: Realm | None
+    # The rendering sets has_image and has_link on the message being
+    # rendered, if any; see MarkdownRenderResponse.
+    has_message: bool
+    db_data: DbData | None
+    image_preview_enabled: bool
+    url_embed_preview_enabled: bool
+    url_embed_data: dict[str, UrlEmbedData | None] | None
+
+
+@dataclass
+class MarkdownRenderResponse:
+    rendering_result: MessageRenderingResult
+    has_image: bool
+    has_link: bool
+
+
+def markdown_render_cache_key(request: MarkdownRenderRequest) -> str | None:
+    """A hash of everything rendering the request depends on: the
+    content, the linkifiers, and the parts of the database state the
+    content actually references.  Returns None for content whose
+    rendering depends on who will receive the message (alert words),
+    or on the results of fetching URL previews."""
+    if request.url_embed_data is not None:
+        return None
+
+    context: tuple[object, ...] | None = None
+    db_data = request.db_data
+    if db_data is not None:
+        automaton = db_data.realm_alert_words_automaton
+        if automaton is not None and next(automaton.iter(request.content.lower()), None):
+            return None
+
+        mention_data = db_data.mention_data
+        context = (
+            db_data.realm_url,
+            db_data.sent_by_bot,
+            db_data.translate_emoticons,
+            sorted(
+                (name, row.id, row.full_name, row.is_active)
+                for name, row in mention_data.full_name_info.items()
+            ),
+            sorted(
+                (row.id, row.full_name, row.is_active) for row in mention_data.user_id_info.values()
+            ),
+            sorted(
+                (name, group.id, group.name)
+                for name, group in mention_data.user_group_name_info.items()
+            ),
+            sorted(db_data.stream_names.items()),
+            # Only the realm emoji the content might use.
+            sorted(
+                (name, sorted(emoji.items()))
+                for name, emoji in db_data.active_realm_emoji.items()
+                if f":{name}:" in request.content
+            ),
+            sorted(
+                (path, repr(metadata)) for path, metadata in db_data.user_upload_previews.items()
+            ),
+        )
+
+    key = (
+        request.content,
+        request.linkifiers_key,
+        request.linkifiers,
+        request.email_gateway,
+        # The realm's host decides which links are local, and its
+        # default code block language how code blocks are rendered.
+        (request.realm.id, request.realm.host, request.realm.default_code_block_language)
+        if request.realm is not None
+        else None,
+        request.has_message,
+        request.image_preview_enabled,
+        request.url_embed_preview_enabled,
+        context,
+    )
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+class MarkdownRenderCache:
+    """A process-local cache of rendered Markdown, used if
+    settings.MARKDOWN_RENDER_CACHE_SIZE is set, since bots and
+    integrations often send the same content over and over.  Entries
+    are keyed on everything their rendering depends on, so never need
+    to be invalidated; once the cache is full, the least recently used
+    entry is evicted."""
+
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, MarkdownRenderResponse] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def get(
+        self, request: MarkdownRenderRequest
+    ) -> tuple[str | None, MarkdownRenderResponse | None]:
+        """Returns the key to cache the rendering of the request under,
+        or None if it can't be cached, and the cached rendering, if any."""
+        if not settings.MARKDOWN_RENDER_CACHE_SIZE:
+            return None, None
+        key = markdown_render_cache_key(request)
+        if key is None:
+            self.bypasses += 1
+            return None, None
+        response = self.entries.get(key)
+        if response is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        # Callers modify the rendering result, so each gets a copy.
+        return key, copy.deepcopy(response)
+
+    def set(self, key: str, response: MarkdownRenderResponse) -> None:
+        self.entries[key] = copy.deepcopy(response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > settings.MARKDOWN_RENDER_CACHE_SIZE:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.bypasses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = self.bypasses = 0
+
+
+markdown_render_cache = MarkdownRenderCache()
+
+
+def prepare_markdown_render(
     content: str,
     realm_alert_words_automaton: ahocorasick.Automaton | None = None,
     message: Message | None = None,
@@ -2586,8 +2854,7 @@ def do_convert(
     mention_data: MentionData | None = None,
     email_gateway: bool = False,
     no_previews: bool = False,
-) -> MessageRenderingResult:
-    """Convert Markdown to HTML, with Zulip-specific settings and hacks."""
+) -> MarkdownRenderRequest:
     # This logic is a bit convoluted, but the overall goal is to support a range of use cases:
     # * Nothing is passed in other than content -> just run default options (e.g. for docs)
     # * message is passed, but no realm is -> look up realm from message
@@ -2599,11 +2866,6 @@ def do_convert(
     else:
         linkifiers_key = message_realm.id
 
-    if message and hasattr(message, "id") and message.id:
-        logging_message_id = "id# " + str(message.id)
-    else:
-        logging_message_id = "unknown"
-
     if (
         message is not None
         and message_realm is not None
@@ -2614,38 +2876,8 @@ def do_convert(
         # delivered via zephyr_mirror
         linkifiers_key = ZEPHYR_MIRROR_MARKDOWN_KEY
 
-    maybe_update_markdown_engines(linkifiers_key, email_gateway)
-    md_engine_key = (linkifiers_key, email_gateway)
-    _md_engine = md_engines[md_engine_key]
-    # Reset the parser; otherwise it will get slower over time.
-    _md_engine.reset()
-
-    # Filters such as UserMentionPattern need a message.
-    rendering_result: MessageRenderingResult = MessageRenderingResult(
-        rendered_content="",
-        mentions_topic_wildcard=False,
-        mentions_stream_wildcard=False,
-        mentions_user_ids=set(),
-        mentions_user_group_ids=set(),
-        alert_words=set(),
-        links_for_preview=set(),
-        user_ids_with_alert_words=set(),
-        potential_attachment_path_ids=[],
-        thumbnail_spinners=set(),
-    )
-
-    _md_engine.zulip_message = message
-    _md_engine.zulip_rendering_result = rendering_result
-    _md_engine.zulip_realm = message_realm
-    _md_engine.zulip_db_data = None  # for now
-    _md_engine.image_preview_enabled = image_preview_enabled(message, message_realm, no_previews)
-    _md_engine.url_embed_preview_enabled = url_embed_preview_enabled(
-        message, message_realm, no_previews
-    )
-    _md_engine.url_embed_data = url_embed_data
-
     # Pre-fetch data from the DB that is used in the Markdown thread
-    user_upload_previews = None
+    db_data = None
     if message_realm is not None:
         # Here we fetch the data structures needed to render
         # mentions/stream mentions from the database, but only
@@ -2664,12 +2896,11 @@ def do_convert(
         stream_name_info = mention_data.get_stream_name_map(stream_names)
 
         if content_has_emoji_syntax(content):
-            active_realm_emoji = get_name_keyed_dict_for_active_realm_emoji(message_realm.id)
+            active_realm_emoji = get_active_realm_emoji(message_realm.id)
         else:
             active_realm_emoji = {}
 
-        user_upload_previews = get_user_upload_previews(message_realm.id, content)
-        _md_engine.zulip_db_data = DbData(
+        db_data = DbData(
             realm_alert_words_automaton=realm_alert_words_automaton,
             mention_data=mention_data,
             active_realm_emoji=active_realm_emoji,
@@ -2677,35 +2908,163 @@ def do_convert(
             sent_by_bot=sent_by_bot,
             stream_names=stream_name_info,
             translate_emoticons=translate_emoticons,
-            user_upload_previews=user_upload_previews,
+            user_upload_previews=get_user_upload_previews(message_realm.id, content),
+        )
+
+    return MarkdownRenderRequest(
+        content=content,
+        linkifiers_key=linkifiers_key,
+        linkifiers=linkifiers_for_realm(linkifiers_key),
+        email_gateway=email_gateway,
+        realm=message_realm,
+        has_message=message is not None,
+        db_data=db_data,
+        image_preview_enabled=image_preview_enabled(message, message_realm, no_previews),
+        url_embed_preview_enabled=url_embed_preview_enabled(message, message_realm, no_previews),
+        url_embed_data=url_embed_data,
+    )
+
+
+def render_markdown_request(request: MarkdownRenderRequest) -> MarkdownRenderResponse:
+    """Runs the Markdown engine; this doesn't access the database, so
+    that it can run in a renderer process."""
+    maybe_update_markdown_engines(request.linkifiers_key, request.email_gateway, request.linkifiers)
+    md_engine_key = (request.linkifiers_key, request.email_gateway)
+    _md_engine = md_engines[md_engine_key]
+    # Reset the parser; otherwise it will get slower over time.
+    _md_engine.reset()
+
+    # Filters such as UserMentionPattern need a message.
+    rendering_result: MessageRenderingResult = MessageRenderingResult(
+        rendered_content="",
+        mentions_topic_wildcard=False,
+        mentions_stream_wildcard=False,
+        mentions_user_ids=set(),
+        mentions_user_group_ids=set(),
+        alert_words=set(),
+        links_for_preview=set(),
+        user_ids_with_alert_words=set(),
+        potential_attachment_path_ids=[],
+        thumbnail_spinners=set(),
+    )
+
+    # The engine records whether the message has images and links on
+    # this stand-in, which the caller copies to the real message.
+    message = Message() if request.has_message else None
+
+    _md_engine.zulip_message = message
+    _md_engine.zulip_rendering_result = rendering_result
+    _md_engine.zulip_realm = request.realm
+    _md_engine.zulip_db_data = request.db_data
+    _md_engine.image_preview_enabled = request.image_preview_enabled
+    _md_engine.url_embed_preview_enabled = request.url_embed_preview_enabled
+    _md_engine.url_embed_data = request.url_embed_data
+    if settings.KATEX_WORKER_PROCESSES:
+        render_tex_batch(find_message_tex(request.content))
+    try:
+        rendering_result.rendered_content = _md_engine.convert(request.content)
+    finally:
+        # These next three lines are slightly paranoid, since
+        # we always set these right before actually using the
+        # engine, but better safe then sorry.
+        _md_engine.zulip_message = None
+        _md_engine.zulip_realm = None
+        _md_engine.zulip_db_data = None
+
+    return MarkdownRenderResponse(
+        rendering_result=rendering_result,
+        has_image=message is not None and message.has_image,
+        has_link=message is not None and message.has_link,
+    )
+
+
+def finish_markdown_render(
+    request: MarkdownRenderRequest,
+    response: MarkdownRenderResponse,
+    message: Message | None,
+    logging_message_id: str,
+) -> MessageRenderingResult:
+    rendering_result = response.rendering_result
+    if message is not None:
+        message.has_image = response.has_image
+        message.has_link = response.has_link
+
+    # Post-process the result with the rendered image previews:
+    if request.db_data is not None:
+        content_with_thumbnails, thumbnail_spinners = rewrite_thumbnailed_images(
+            rendering_result.rendered_content, request.db_data.user_upload_previews
         )
+        rendering_result.thumbnail_spinners = thumbnail_spinners
+        if content_with_thumbnails is not None:
+            rendering_result.rendered_content = content_with_thumbnails
+
+    # Throw an exception if the content is huge; this protects the
+    # rest of the codebase from any bugs where we end up rendering
+    # something huge.
+    MAX_MESSAGE_LENGTH = settings.MAX_MESSAGE_LENGTH
+    if len(rendering_result.rendered_content) > MAX_MESSAGE_LENGTH * 100:
+        raise MarkdownRenderingError(
+            f"Rendered content exceeds {MAX_MESSAGE_LENGTH * 100} characters (message {logging_message_id})"
+        )
+    return rendering_result
+
+
+# Spend at most 5 seconds rendering; this protects the backend from
+# being overloaded by bugs (e.g. Markdown logic that is extremely
+# inefficient in corner cases) as well as user errors (e.g. a
+# linkifier that makes some syntax infinite-loop).
+MARKDOWN_RENDERING_TIMEOUT_SECONDS = 5
+
+
+def do_convert(
+    content: str,
+    realm_alert_words_automaton: ahocorasick.Automaton | None = None,
+    message: Message | None = None,
+    message_realm: Realm | None = None,
+    sent_by_bot: bool = False,
+    translate_emoticons: bool = False,
+    url_embed_data: dict[str, UrlEmbedData | None] | None = None,
+    mention_data: MentionData | None = None,
+    email_gateway: bool = False,
+    no_previews: bool = False,
+) -> MessageRenderingResult:
+    """Convert Markdown to HTML, with Zulip-specific settings and hacks."""
+    if message and hasattr(message, "id") and message.id:
+        logging_message_id = "id# " + str(message.id)
+    else:
+        logging_message_id = "unknown"
+
+    request = prepare_markdown_render(
+        content,
+        realm_alert_words_automaton,
+        message,
+        message_realm,
+        sent_by_bot,
+        translate_emoticons,
+        url_embed_data,
+        mention_data,
+        email_gateway,
+        no_previews,
+    )
 
     try:
-        # Spend at most 5 seconds rendering; this protects the backend
-        # from being overloaded by bugs (e.g. Markdown logic that is
-        # extremely inefficient in corner cases) as well as user
-        # errors (e.g. a linkifier that makes some syntax
-        # infinite-loop).
-        rendering_result.rendered_content = unsafe_timeout(5, lambda: _md_engine.convert(content))
-
-        # Post-process the result with the rendered image previews:
-        if user_upload_previews is not None:
-            content_with_thumbnails, thumbnail_spinners = rewrite_thumbnailed_images(
-                rendering_result.rendered_content, user_upload_previews
-            )
-            rendering_result.thumbnail_spinners = thumbnail_spinners
-            if content_with_thumbnails is not None:
-                rendering_result.rendered_content = content_with_thumbnails
-
-        # Throw an exception if the content is huge; this protects the
-        # rest of the codebase from any bugs where we end up rendering
-        # something huge.
-        MAX_MESSAGE_LENGTH = settings.MAX_MESSAGE_LENGTH
-        if len(rendering_result.rendered_content) > MAX_MESSAGE_LENGTH * 100:
-            raise MarkdownRenderingError(
-                f"Rendered content exceeds {MAX_MESSAGE_LENGTH * 100} characters (message {logging_message_id})"
-            )
-        return rendering_result
+        cache_key, response = markdown_render_cache.get(request)
+        if response is None:
+            if settings.MARKDOWN_RENDERING_PROCESSES:
+                # Rendering in a separate process lets us kill it if it
+                # takes too long, which unsafe_timeout can't reliably do.
+                from zerver.lib.markdown_rendering_pool import get_markdown_rendering_pool
+
+                response = get_markdown_rendering_pool().render(
+                    request, MARKDOWN_RENDERING_TIMEOUT_SECONDS
+                )
+            else:
+                response = unsafe_timeout(
+                    MARKDOWN_RENDERING_TIMEOUT_SECONDS, lambda: render_markdown_request(request)
+                )
+            if cache_key is not None:
+                markdown_render_cache.set(cache_key, response)
+        return finish_markdown_render(request, response, message, logging_message_id)
     except Exception:
         cleaned = privacy_clean_markdown(content)
         markdown_logger.exception(
@@ -2715,13 +3074,72 @@ def do_convert(
         )
 
         raise MarkdownRenderingError
-    finally:
-        # These next three lines are slightly paranoid, since
-        # we always set these right before actually using the
-        # engine, but better safe then sorry.
-        _md_engine.zulip_message = None
-        _md_engine.zulip_realm = None
-        _md_engine.zulip_db_data = None
+
+
+def bulk_render_markdown_requests(
+    requests: list[MarkdownRenderRequest], messages: list[Message] | None = None
+) -> list[MessageRenderingResult | None]:
+    """Renders many messages prepared with prepare_markdown_render,
+    for example when importing or re-rendering messages, in parallel
+    if we have renderer processes.  Messages which fail to render
+    are logged, and have None as their result.  If the requests are
+    for existing messages, passing them in `messages` sets their
+    has_image and has_link flags."""
+    cache_keys: list[str | None] = []
+    responses: list[MarkdownRenderResponse | Exception | None] = []
+    for request in requests:
+        cache_key, response = markdown_render_cache.get(request)
+        cache_keys.append(cache_key)
+        responses.append(response)
+    uncached = [i for i, response in enumerate(responses) if response is None]
+
+    if settings.MARKDOWN_RENDERING_PROCESSES:
+        from zerver.lib.markdown_rendering_pool import get_markdown_rendering_pool
+
+        rendered = get_markdown_rendering_pool().render_many(
+            [requests[i] for i in uncached], MARKDOWN_RENDERING_TIMEOUT_SECONDS
+        )
+    else:
+        rendered = []
+        for i in uncached:
+            try:
+                rendered.append(
+                    unsafe_timeout(
+                        MARKDOWN_RENDERING_TIMEOUT_SECONDS,
+                        lambda: render_markdown_request(requests[i]),  # noqa: B023
+                    )
+                )
+            except Exception as e:
+                rendered.append(e)
+
+    for i, response in zip(uncached, rendered, strict=True):
+        responses[i] = response
+        cache_key = cache_keys[i]
+        if cache_key is not None and not isinstance(response, Exception):
+            markdown_render_cache.set(cache_key, response)
+
+    results: list[MessageRenderingResult | None] = []
+    for i, (request, response) in enumerate(zip(requests, responses, strict=True)):
+        message = messages[i] if messages is not None else None
+        try:
+            if isinstance(response, Exception):
+                raise response
+            assert response is not None
+            results.append(
+                finish_markdown_render(
+                    request,
+                    response,
+                    message,
+                    f"id# {message.id}" if message is not None else "unknown",
+                )
+            )
+        except Exception:
+            markdown_logger.exception(
+                "Exception in Markdown parser; input (sanitized) was: %s",
+                privacy_clean_markdown(request.content),
+            )
+            results.append(None)
+    return results
 
 
 markdown_time_start = 0.0
@@ -0,0 +1,155 @@
+# A pool of renderer processes for Markdown, used when
+# settings.MARKDOWN_RENDERING_PROCESSES is set.
+#
+# Rendering in the process handling the request, with unsafe_timeout,
+# can't stop a pathological message (e.g. a linkifier regex with
+# catastrophic backtracking) from tying up the process, since the
+# timeout exception can't interrupt a long-running regex, and holds
+# the GIL while it runs.  A renderer process that takes too long is
+# instead killed, and replaced.
+#
+# Each renderer is a long-lived process, which keeps its own Markdown
+# engines for each set of linkifiers, and renders the
+# MarkdownRenderRequests it receives over a pipe; those contain all
+# the data from the database the rendering needs, so renderers never
+# access the database.  Renderers are started with the "spawn" method,
+# rather than forked, since a forked child would share the parent's
+# database and memcached connections.
+#
+# This module is imported by the renderer processes before Django is
+# set up, so must not import anything that requires it at the top
+# level; hence it is not part of the zerver.lib.markdown package.
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from queue import SimpleQueue
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+
+from zerver.lib.timeout import TimeoutExpiredError
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnContext, SpawnProcess
+
+    from zerver.lib.markdown import MarkdownRenderRequest, MarkdownRenderResponse
+
+
+# How long a new renderer process may take to set up Django.
+RENDERER_STARTUP_TIMEOUT_SECONDS = 60
+
+
+class MarkdownRendererError(Exception):
+    pass
+
+
+def renderer_main(connection: Connection) -> None:
+    import django
+
+    django.setup()
+
+    from zerver.lib.markdown import render_markdown_request
+
+    # Tell the parent we're ready, so that the time we took to start
+    # doesn't count against the first message's rendering timeout.
+    connection.send(None)
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            # The parent process exited.
+            return
+        try:
+            connection.send((render_markdown_request(request), None))
+        except Exception:
+            # Exceptions may not be picklable, so we send the traceback.
+            connection.send((None, traceback.format_exc()))
+
+
+class MarkdownRenderer:
+    def __init__(self, context: "SpawnContext") -> None:
+        self.context = context
+        self.start()
+
+    def start(self) -> None:
+        self.connection, child_connection = self.context.Pipe()
+        self.process: SpawnProcess = self.context.Process(
+            target=renderer_main, args=(child_connection,), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+
+    def render(self, request: "MarkdownRenderRequest", timeout: float) -> "MarkdownRenderResponse":
+        try:
+            if not self.ready:
+                if not self.connection.poll(RENDERER_STARTUP_TIMEOUT_SECONDS):
+                    raise TimeoutExpiredError
+                self.connection.recv()
+                self.ready = True
+            self.connection.send(request)
+            if not self.connection.poll(timeout):
+                raise TimeoutExpiredError
+            response, error = self.connection.recv()
+        except (TimeoutExpiredError, EOFError, OSError):
+            # The process is stuck or gone; replace it.
+            self.restart()
+            raise
+        if error is not None:
+            raise MarkdownRendererError(error)
+        return response
+
+    def restart(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+        self.start()
+
+
+class MarkdownRenderingPool:
+    def __init__(self, processes: int) -> None:
+        self.processes = processes
+        context = multiprocessing.get_context("spawn")
+        # Under uWSGI, sys.executable is the uWSGI binary, rather than
+        # the virtualenv's Python.
+        context.set_executable(os.path.join(sys.exec_prefix, "bin", "python3"))
+        self.idle_renderers: SimpleQueue[MarkdownRenderer] = SimpleQueue()
+        for i in range(processes):
+            self.idle_renderers.put(MarkdownRenderer(context))
+
+    def render(self, request: "MarkdownRenderRequest", timeout: float) -> "MarkdownRenderResponse":
+        renderer = self.idle_renderers.get()
+        try:
+            return renderer.render(request, timeout)
+        finally:
+            self.idle_renderers.put(renderer)
+
+    def render_many(
+        self, requests: list["MarkdownRenderRequest"], timeout: float
+    ) -> list["MarkdownRenderResponse | Exception"]:
+        def render(request: "MarkdownRenderRequest") -> "MarkdownRenderResponse | Exception":
+            try:
+                return self.render(request, timeout)
+            except Exception as e:
+                return e
+
+        # Each thread just waits on a renderer process.
+        with ThreadPoolExecutor(max_workers=self.processes) as executor:
+            return list(executor.map(render, requests))
+
+
+rendering_pool: MarkdownRenderingPool | None = None
+rendering_pool_lock = threading.Lock()
+
+
+def get_markdown_rendering_pool() -> MarkdownRenderingPool:
+    global rendering_pool
+    with rendering_pool_lock:
+        if rendering_pool is None:
+            rendering_pool = MarkdownRenderingPool(settings.MARKDOWN_RENDERING_PROCESSES)
+        return rendering_pool
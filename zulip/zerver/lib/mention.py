@@ -1,13 +1,23 @@
 import functools
 import re
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable
 from dataclasses import dataclass
 from re import Match
+from typing import TypeVar
 
 from django.conf import settings
 from django.db.models import Q
 
+from zerver.lib.cache import (
+    bump_realm_state_generation,
+    bump_realm_user_mention_generation,
+    cache_get,
+    realm_state_generation_cache_key,
+    realm_user_mention_generation_cache_key,
+)
 from zerver.lib.users import get_inaccessible_user_ids
-from zerver.models import NamedUserGroup, UserProfile
+from zerver.models import NamedUserGroup, UserGroupMembership, UserProfile
 from zerver.models.streams import get_linkable_streams
 
 BEFORE_MENTION_ALLOWED_REGEX = r"(?<![^\s\'\"\(\{\[\/<])"
@@ -62,6 +72,130 @@ class PossibleMentions:
     message_has_stream_wildcards: bool
 
 
+@dataclass
+class RealmMentionIndex:
+    # The generation of the realm's data the index was built from.
+    generation: str
+
+
+@dataclass
+class RealmUserMentionIndex(RealmMentionIndex):
+    users_by_id: dict[int, FullNameInfo]
+    # Keyed by the upper-cased full name, like the database's
+    # case-insensitive comparison.
+    users_by_full_name: dict[str, list[FullNameInfo]]
+
+    def get_matching_users(self, user_filter: UserFilter) -> list[FullNameInfo]:
+        if user_filter.id is not None:
+            user = self.users_by_id.get(user_filter.id)
+            if user is None or (
+                user_filter.full_name is not None
+                and user.full_name.upper() != user_filter.full_name.upper()
+            ):
+                return []
+            return [user]
+        elif user_filter.full_name is not None:
+            return self.users_by_full_name.get(user_filter.full_name.upper(), [])
+        else:
+            raise AssertionError("totally empty filter makes no sense")
+
+
+@dataclass
+class RealmUserGroupMentionIndex(RealmMentionIndex):
+    groups_by_name: dict[str, NamedUserGroup]
+    group_members: dict[int, list[int]]
+
+
+# Each process's indexes of the data needed to resolve mentions, by
+# realm ID, used if settings.MENTION_INDEX_MAX_REALMS is set.  They're
+# rebuilt when the generation of the realm's users' names (see
+# flush_user_profile) or of its user groups (bumped with every
+# user_group event) changes, and the least recently used realms'
+# indexes are dropped.
+realm_user_mention_indexes: OrderedDict[int, RealmUserMentionIndex] = OrderedDict()
+realm_user_group_mention_indexes: OrderedDict[int, RealmUserGroupMentionIndex] = OrderedDict()
+
+IndexT = TypeVar("IndexT", bound=RealmMentionIndex)
+
+
+def get_cached_mention_index(
+    indexes: OrderedDict[int, IndexT],
+    realm_id: int,
+    generation: str,
+    build_index: Callable[[int, str], IndexT],
+) -> IndexT:
+    index = indexes.get(realm_id)
+    if index is None or index.generation != generation:
+        index = build_index(realm_id, generation)
+        indexes[realm_id] = index
+    indexes.move_to_end(realm_id)
+    while len(indexes) > settings.MENTION_INDEX_MAX_REALMS:
+        indexes.popitem(last=False)
+    return index
+
+
+def build_realm_user_mention_index(realm_id: int, generation: str) -> RealmUserMentionIndex:
+    users_by_id: dict[int, FullNameInfo] = {}
+    users_by_full_name: dict[str, list[FullNameInfo]] = defaultdict(list)
+    # Cross-realm bots can be mentioned in any realm.  Changes to them
+    # aren't reflected until the realm's users' generation changes,
+    # but they're only ever renamed by server upgrades.
+    rows = UserProfile.objects.filter(
+        Q(realm_id=realm_id) | Q(email__in=settings.CROSS_REALM_BOT_EMAILS)
+    ).values("id", "full_name", "is_active")
+    for row in rows:
+        user = FullNameInfo(id=row["id"], full_name=row["full_name"], is_active=row["is_active"])
+        users_by_id[user.id] = user
+        users_by_full_name[user.full_name.upper()].append(user)
+    return RealmUserMentionIndex(
+        generation=generation, users_by_id=users_by_id, users_by_full_name=dict(users_by_full_name)
+    )
+
+
+def get_realm_user_mention_index(realm_id: int) -> RealmUserMentionIndex:
+    cached = cache_get(realm_user_mention_generation_cache_key(realm_id))
+    if cached is None:
+        generation = bump_realm_user_mention_generation(realm_id)
+    else:
+        (generation,) = cached
+    return get_cached_mention_index(
+        realm_user_mention_indexes, realm_id, generation, build_realm_user_mention_index
+    )
+
+
+def build_realm_user_group_mention_index(
+    realm_id: int, generation: str
+) -> RealmUserGroupMentionIndex:
+    groups_by_name = {
+        group.name: group
+        for group in NamedUserGroup.objects.filter(realm_id=realm_id, is_system_group=False)
+    }
+    group_members: dict[int, list[int]] = {group.id: [] for group in groups_by_name.values()}
+    for group_id, user_id in UserGroupMembership.objects.filter(
+        user_group_id__in=group_members.keys()
+    ).values_list("user_group_id", "user_profile_id"):
+        group_members[group_id].append(user_id)
+    return RealmUserGroupMentionIndex(
+        generation=generation, groups_by_name=groups_by_name, group_members=group_members
+    )
+
+
+def get_realm_user_group_mention_index(realm_id: int) -> RealmUserGroupMentionIndex:
+    cached = cache_get(realm_state_generation_cache_key(realm_id, "realm_user_groups"))
+    if cached is None:
+        generation = bump_realm_state_generation(realm_id, ["realm_user_groups"])[
+            "realm_user_groups"
+        ]
+    else:
+        (generation,) = cached
+    return get_cached_mention_index(
+        realm_user_group_mention_indexes,
+        realm_id,
+        generation,
+        build_realm_user_group_mention_index,
+    )
+
+
 class MentionBackend:
     # Be careful about reuse: MentionBackend contains caches which are
     # designed to only have the lifespan of a sender user (typically a
@@ -78,6 +212,22 @@ class MentionBackend:
     def get_full_name_info_list(
         self, user_filters: list[UserFilter], message_sender: UserProfile | None
     ) -> list[FullNameInfo]:
+        if settings.MENTION_INDEX_MAX_REALMS:
+            index = get_realm_user_mention_index(self.realm_id)
+            possible_users = {
+                user.id: user
+                for user_filter in user_filters
+                for user in index.get_matching_users(user_filter)
+            }
+            inaccessible_user_ids = get_inaccessible_user_ids(
+                list(possible_users.keys()), message_sender
+            )
+            return [
+                user
+                for user_id, user in possible_users.items()
+                if user_id not in inaccessible_user_ids
+            ]
+
         result: list[FullNameInfo] = []
         unseen_user_filters: list[UserFilter] = []
 
@@ -268,7 +418,14 @@ class MentionData:
         self.user_group_name_info: dict[str, NamedUserGroup] = {}
         self.user_group_members: dict[int, list[int]] = {}
         user_group_names = possible_user_group_mentions(content)
-        if user_group_names:
+        if user_group_names and settings.MENTION_INDEX_MAX_REALMS:
+            index = get_realm_user_group_mention_index(realm_id)
+            for name in user_group_names:
+                group = index.groups_by_name.get(name)
+                if group is not None:
+                    self.user_group_name_info[group.name.lower()] = group
+                    self.user_group_members[group.id] = index.group_members[group.id]
+        elif user_group_names:
             for group in NamedUserGroup.objects.filter(
                 realm_id=realm_id, name__in=user_group_names, is_system_group=False
             ).prefetch_related("direct_members"):
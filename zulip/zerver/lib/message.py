@@ -1,7 +1,10 @@
 import re
+import time
+from collections import defaultdict
 from collections.abc import Callable, Collection, Mapping, Sequence
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from enum import Enum
 from typing import Any, TypedDict
 
 from django.conf import settings
@@ -24,7 +27,6 @@ from zerver.lib.partial import partial
 from zerver.lib.request import RequestVariableConversionError
 from zerver.lib.stream_subscription import (
     get_stream_subscriptions_for_user,
-    get_subscribed_stream_recipient_ids_for_user,
     num_subscribers_for_stream_id,
 )
 from zerver.lib.streams import can_access_stream_history, get_web_public_streams_queryset
@@ -209,9 +211,13 @@ def messages_for_ids(
     allow_edit_history: bool,
     user_profile: UserProfile | None,
     realm: Realm,
+    stage_timings: dict[str, float] | None = None,
 ) -> list[dict[str, Any]]:
+    """If stage_timings is passed, the time spent in each stage of
+    building the message dictionaries is recorded in it, in seconds."""
     id_fetcher = lambda row: row["id"]
 
+    start = time.perf_counter()
     message_dicts = generic_bulk_cached_fetch(
         to_dict_cache_key_id,
         MessageDict.ids_to_dict,
@@ -224,8 +230,10 @@ def messages_for_ids(
 
     message_list: list[dict[str, Any]] = []
 
+    dicts_done = time.perf_counter()
     sender_ids = [message_dicts[message_id]["sender_id"] for message_id in message_ids]
     inaccessible_sender_ids = get_inaccessible_user_ids(sender_ids, user_profile)
+    access_done = time.perf_counter()
 
     for message_id in message_ids:
         msg_dict = message_dicts[message_id]
@@ -249,6 +257,11 @@ def messages_for_ids(
 
     MessageDict.post_process_dicts(message_list, apply_markdown, client_gravatar, realm)
 
+    if stage_timings is not None:
+        stage_timings["dicts"] = dicts_done - start
+        stage_timings["access"] = access_done - dicts_done
+        stage_timings["hydrate"] = time.perf_counter() - access_done
+
     return message_list
 
 
@@ -357,6 +370,42 @@ def access_web_public_message(
     return message
 
 
+class StreamMessageAccess(Enum):
+    # The user can access every message in the stream.
+    ALL = 1
+    # The user can access only the messages they have a UserMessage row for.
+    USER_MESSAGE_ONLY = 2
+    # The user cannot access any message in the stream.
+    NONE = 3
+
+
+def get_stream_message_access(
+    user_profile: UserProfile, stream: Stream, *, is_subscribed: Callable[[], bool]
+) -> StreamMessageAccess:
+    """The core access-control decision for messages in a stream, which
+    is the same for every message in the stream; has_message_access and
+    bulk_access_message_ids are both implemented in terms of this."""
+    if stream.realm_id != user_profile.realm_id:
+        # You can't access public stream messages in other realms
+        return StreamMessageAccess.NONE
+
+    if stream.is_public() and user_profile.can_access_public_streams():
+        return StreamMessageAccess.ALL
+
+    if not is_subscribed():
+        return StreamMessageAccess.NONE
+
+    if not stream.is_history_public_to_subscribers():
+        # Unless history is public to subscribers, you need to both:
+        # (1) Have directly received the message.
+        # AND
+        # (2) Be subscribed to the stream.
+        return StreamMessageAccess.USER_MESSAGE_ONLY
+
+    # is_history_public_to_subscribers, and you're subscribed
+    return StreamMessageAccess.ALL
+
+
 def has_message_access(
     user_profile: UserProfile,
     message: Message,
@@ -371,6 +420,9 @@ def has_message_access(
     * The user_message parameter must be provided if the user has a UserMessage
       row for the target message.
     * The optional stream parameter is validated; is_subscribed is not.
+
+    To check access to several messages, use bulk_access_message_ids,
+    which does a constant number of database queries.
     """
 
     if message.recipient.type != Recipient.STREAM:
@@ -382,10 +434,6 @@ def has_message_access(
     else:
         assert stream.recipient_id == message.recipient_id
 
-    if stream.realm_id != user_profile.realm_id:
-        # You can't access public stream messages in other realms
-        return False
-
     def is_subscribed_helper() -> bool:
         if is_subscribed is not None:
             return is_subscribed
@@ -394,18 +442,116 @@ def has_message_access(
             user_profile=user_profile, active=True, recipient=message.recipient
         ).exists()
 
-    if stream.is_public() and user_profile.can_access_public_streams():
-        return True
+    access = get_stream_message_access(user_profile, stream, is_subscribed=is_subscribed_helper)
+    if access == StreamMessageAccess.USER_MESSAGE_ONLY:
+        return has_user_message()
+    return access == StreamMessageAccess.ALL
 
-    if not stream.is_history_public_to_subscribers():
-        # Unless history is public to subscribers, you need to both:
-        # (1) Have directly received the message.
-        # AND
-        # (2) Be subscribed to the stream.
-        return has_user_message() and is_subscribed_helper()
 
-    # is_history_public_to_subscribers, so check if you're subscribed
-    return is_subscribed_helper()
+def bulk_access_message_ids(
+    user_profile: UserProfile,
+    message_ids: Collection[int],
+    *,
+    recipients: Mapping[int, Recipient] | None = None,
+    stream: Stream | None = None,
+) -> set[int]:
+    """Returns the subset of message_ids that the user can access,
+    following the same rules as has_message_access.
+
+    Messages are grouped by recipient, so that the stream and
+    subscription state is resolved once per stream rather than once
+    per message, and UserMessage rows are only fetched for messages
+    where they determine access (direct messages and streams with
+    protected history).  This does at most 4 database queries,
+    regardless of the number of messages:
+
+    * Fetching the recipients of the messages, unless the caller
+      passes `recipients`, a map from message ID to Recipient.
+    * Fetching the streams, unless the caller passes `stream`.
+    * Fetching the user's subscriptions to those streams.
+    * Fetching the user's UserMessage rows for the messages.
+
+    Throws AssertionError if stream is passed and any of the messages
+    were not sent to that stream.
+    """
+    if not message_ids:
+        return set()
+
+    if recipients is None:
+        recipients = {
+            message_id: Recipient(id=recipient_id, type=recipient_type, type_id=type_id)
+            for message_id, recipient_id, recipient_type, type_id in Message.objects.filter(
+                # Uses index: zerver_message_pkey
+                id__in=message_ids
+            ).values_list("id", "recipient_id", "recipient__type", "recipient__type_id")
+        }
+
+    message_ids_by_recipient_id: dict[int, list[int]] = defaultdict(list)
+    recipients_by_id: dict[int, Recipient] = {}
+    for message_id in message_ids:
+        if message_id not in recipients:
+            # Nonexistent messages are inaccessible.
+            continue
+        recipient = recipients[message_id]
+        message_ids_by_recipient_id[recipient.id].append(message_id)
+        recipients_by_id[recipient.id] = recipient
+
+    stream_ids = {
+        recipient.type_id
+        for recipient in recipients_by_id.values()
+        if recipient.type == Recipient.STREAM
+    }
+    if stream is not None:
+        assert all(recipient_id == stream.recipient_id for recipient_id in recipients_by_id)
+        streams_by_recipient_id = {stream.recipient_id: stream}
+    else:
+        streams_by_recipient_id = {
+            stream.recipient_id: stream for stream in Stream.objects.filter(id__in=stream_ids)
+        }
+
+    subscribed_recipient_ids: set[int] | None = None
+
+    def is_subscribed(recipient_id: int) -> bool:
+        nonlocal subscribed_recipient_ids
+        if subscribed_recipient_ids is None:
+            # Fetched lazily, and only once, since users can access
+            # public streams regardless of their subscriptions.
+            subscribed_recipient_ids = set(
+                Subscription.objects.filter(
+                    user_profile=user_profile,
+                    active=True,
+                    recipient_id__in=[
+                        recipient_id
+                        for recipient_id, recipient in recipients_by_id.items()
+                        if recipient.type == Recipient.STREAM
+                    ],
+                ).values_list("recipient_id", flat=True)
+            )
+        return recipient_id in subscribed_recipient_ids
+
+    accessible_message_ids: set[int] = set()
+    user_message_only_ids: list[int] = []
+    for recipient_id, recipient_message_ids in message_ids_by_recipient_id.items():
+        if recipients_by_id[recipient_id].type != Recipient.STREAM:
+            # You can only access direct messages you received
+            user_message_only_ids.extend(recipient_message_ids)
+            continue
+
+        access = get_stream_message_access(
+            user_profile,
+            streams_by_recipient_id[recipient_id],
+            is_subscribed=partial(is_subscribed, recipient_id),
+        )
+        if access == StreamMessageAccess.ALL:
+            accessible_message_ids.update(recipient_message_ids)
+        elif access == StreamMessageAccess.USER_MESSAGE_ONLY:
+            user_message_only_ids.extend(recipient_message_ids)
+
+    if user_message_only_ids:
+        accessible_message_ids.update(
+            get_messages_with_usermessage_rows_for_user(user_profile.id, user_message_only_ids)
+        )
+    return accessible_message_ids
 
 
 def bulk_access_messages(
@@ -415,46 +561,25 @@ def bulk_access_messages(
     stream: Stream | None = None,
 ) -> list[Message]:
     """This function does the full has_message_access check for each
-    message.  If stream is provided, it is used to avoid unnecessary
-    database queries, and will use exactly 2 bulk queries instead.
+    message, via bulk_access_message_ids.  If stream is provided, or
+    the messages' recipients were fetched (e.g. via select_related),
+    they are used to avoid unnecessary database queries.
 
     Throws AssertionError if stream is passed and any of the messages
     were not sent to that stream.
 
     """
-    filtered_messages = []
-
-    user_message_set = set(
-        get_messages_with_usermessage_rows_for_user(
-            user_profile.id, [message.id for message in messages]
-        )
+    messages = list(messages)
+    recipients: dict[int, Recipient] | None = None
+    if all(Message.recipient.is_cached(message) for message in messages):
+        recipients = {message.id: message.recipient for message in messages}
+    accessible_message_ids = bulk_access_message_ids(
+        user_profile,
+        [message.id for message in messages],
+        recipients=recipients,
+        stream=stream,
     )
-
-    if stream is None:
-        streams = {
-            stream.recipient_id: stream
-            for stream in Stream.objects.filter(
-                id__in={
-                    message.recipient.type_id
-                    for message in messages
-                    if message.recipient.type == Recipient.STREAM
-                }
-            )
-        }
-
-    subscribed_recipient_ids = set(get_subscribed_stream_recipient_ids_for_user(user_profile))
-
-    for message in messages:
-        is_subscribed = message.recipient_id in subscribed_recipient_ids
-        if has_message_access(
-            user_profile,
-            message,
-            has_user_message=partial(lambda m: m.id in user_message_set, message),
-            stream=streams.get(message.recipient_id) if stream is None else stream,
-            is_subscribed=is_subscribed,
-        ):
-            filtered_messages.append(message)
-    return filtered_messages
+    return [message for message in messages if message.id in accessible_message_ids]
 
 
 def bulk_access_stream_messages_query(
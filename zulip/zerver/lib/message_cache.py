@@ -1,15 +1,28 @@
 import copy
 import zlib
-from collections.abc import Iterable
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
 from datetime import datetime
 from email.headerregistry import Address
 from typing import Any, TypedDict
 
 import orjson
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+from django.db.models.functions import JSONObject
 
 from zerver.lib.avatar import get_avatar_field, get_avatar_for_inaccessible_user
-from zerver.lib.cache import cache_set_many, cache_with_key, to_dict_cache_key, to_dict_cache_key_id
-from zerver.lib.display_recipient import bulk_fetch_display_recipients
+from zerver.lib.cache import (
+    BatchedCacheGet,
+    bulk_cached_fetch,
+    cache_get_many,
+    cache_set_many,
+    cache_with_key,
+    message_sender_cache_key,
+    to_dict_cache_key,
+    to_dict_cache_key_id,
+)
+from zerver.lib.display_recipient import bulk_fetch_display_recipients, display_recipient_cache_keys
 from zerver.lib.markdown import render_message_markdown, topic_links
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.query_helpers import query_for_ids
@@ -95,6 +108,49 @@ def update_message_cache(
     return message_ids
 
 
+def cache_new_messages(messages: Sequence[tuple[Message, int | None]]) -> dict[int, bytes]:
+    """Populates the to_dict cache for a batch of newly sent messages,
+    each paired with the realm_id to render it for (see
+    update_message_cache).  This uses a constant number of database
+    queries and a single memcached round trip, rather than a cache
+    miss for each message; we return the encoded messages for the
+    caller's use, to avoid fetching them back from the cache."""
+    messages_by_realm_id: dict[int | None, list[Message]] = defaultdict(list)
+    for message, realm_id in messages:
+        messages_by_realm_id[realm_id].append(message)
+
+    encoded_messages: dict[int, bytes] = {}
+    for realm_id, realm_messages in messages_by_realm_id.items():
+        encoded_messages.update(MessageDict.messages_to_encoded_cache(realm_messages, realm_id))
+
+    cache_set_many(
+        {to_dict_cache_key_id(msg_id): (msg,) for msg_id, msg in encoded_messages.items()},
+        timeout=3600 * 24,
+    )
+    return encoded_messages
+
+
+def fill_message_cache(message_ids: list[int]) -> int:
+    """Ensures that the to_dict cache has entries for the given
+    messages, fetching any which are missing from the database.
+    Returns the number of cache entries added."""
+    cached = cache_get_many([to_dict_cache_key_id(message_id) for message_id in message_ids])
+    missing_ids = [
+        message_id for message_id in message_ids if to_dict_cache_key_id(message_id) not in cached
+    ]
+    if not missing_ids:
+        return 0
+
+    cache_set_many(
+        {
+            to_dict_cache_key_id(message_dict["id"]): (stringify_message_dict(message_dict),)
+            for message_dict in MessageDict.ids_to_dict(missing_ids)
+        },
+        timeout=3600 * 24,
+    )
+    return len(missing_ids)
+
+
 def save_message_rendered_content(message: Message, content: str) -> str:
     rendering_result = render_message_markdown(message, content, realm=message.get_realm())
     rendered_content = None
@@ -152,13 +208,19 @@ class MessageDict:
     """
 
     @staticmethod
-    def wide_dict(message: Message, realm_id: int | None = None) -> dict[str, Any]:
+    def wide_dict(
+        message: Message,
+        realm_id: int | None = None,
+        encoded_object_bytes: bytes | None = None,
+    ) -> dict[str, Any]:
         """
-        The next two lines get the cacheable field related
+        The next lines get the cacheable field related
         to our message object, with the side effect of
-        populating the cache.
+        populating the cache; callers which already have
+        the encoded form (see cache_new_messages) can pass it.
         """
-        encoded_object_bytes = message_to_encoded_cache(message, realm_id)
+        if encoded_object_bytes is None:
+            encoded_object_bytes = message_to_encoded_cache(message, realm_id)
         obj = extract_message_dict(encoded_object_bytes)
 
         """
@@ -187,8 +249,7 @@ class MessageDict:
               is somewhat important here, as we are
               often fetching hundreds of messages.
         """
-        MessageDict.bulk_hydrate_sender_info(objs)
-        MessageDict.bulk_hydrate_recipient_info(objs)
+        MessageDict.bulk_hydrate_cached_sender_and_recipient_info(objs)
 
         for obj in objs:
             can_access_sender = obj.get("can_access_sender", True)
@@ -341,9 +402,42 @@ class MessageDict:
             "sending_client__name",
             "sender__realm_id",
         ]
+        # We fetch the submessages and reactions as arrays in the same
+        # query, rather than in separate queries as
+        # sew_submessages_and_reactions_to_msgs does, since this is
+        # on the critical path for cache misses in GET /messages.
+        submessages = ArraySubquery(
+            SubMessage.objects.filter(message_id=OuterRef("id"))
+            .order_by("id")
+            .values(
+                json=JSONObject(
+                    id="id",
+                    message_id="message_id",
+                    sender_id="sender_id",
+                    msg_type="msg_type",
+                    content="content",
+                )
+            )
+        )
+        reactions = ArraySubquery(
+            Reaction.objects.filter(message_id=OuterRef("id"))
+            .order_by("id")
+            .values(
+                json=JSONObject(
+                    message_id="message_id",
+                    emoji_name="emoji_name",
+                    emoji_code="emoji_code",
+                    reaction_type="reaction_type",
+                    user_profile__email="user_profile__email",
+                    user_profile_id="user_profile_id",
+                    user_profile__full_name="user_profile__full_name",
+                )
+            )
+        )
         # Uses index: zerver_message_pkey
-        messages = Message.objects.filter(id__in=needed_ids).values(*fields)
-        MessageDict.sew_submessages_and_reactions_to_msgs(messages)
+        messages = Message.objects.filter(id__in=needed_ids).values(
+            *fields, submessages=submessages, reactions=reactions
+        )
         return [MessageDict.build_dict_from_raw_db_row(row) for row in messages]
 
     @staticmethod
@@ -456,12 +550,7 @@ class MessageDict:
         return obj
 
     @staticmethod
-    def bulk_hydrate_sender_info(objs: list[dict[str, Any]]) -> None:
-        sender_ids = list({obj["sender_id"] for obj in objs})
-
-        if not sender_ids:
-            return
-
+    def fetch_sender_rows(sender_ids: list[int]) -> list[dict[str, Any]]:
         query = UserProfile.objects.values(
             "id",
             "full_name",
@@ -474,10 +563,22 @@ class MessageDict:
             "email_address_visibility",
         )
 
-        rows = query_for_ids(query, sender_ids, "zerver_userprofile.id")
+        return list(query_for_ids(query, sender_ids, "zerver_userprofile.id"))
+
+    @staticmethod
+    def bulk_hydrate_sender_info(objs: list[dict[str, Any]]) -> None:
+        sender_ids = list({obj["sender_id"] for obj in objs})
+
+        if not sender_ids:
+            return
 
-        sender_dict = {row["id"]: row for row in rows}
+        rows = MessageDict.fetch_sender_rows(sender_ids)
+        MessageDict.hydrate_sender_info(objs, {row["id"]: row for row in rows})
 
+    @staticmethod
+    def hydrate_sender_info(
+        objs: list[dict[str, Any]], sender_dict: dict[int, dict[str, Any]]
+    ) -> None:
         for obj in objs:
             sender_id = obj["sender_id"]
             user_row = sender_dict[sender_id]
@@ -490,6 +591,44 @@ class MessageDict:
             obj["sender_is_mirror_dummy"] = user_row["is_mirror_dummy"]
             obj["sender_email_address_visibility"] = user_row["email_address_visibility"]
 
+    @staticmethod
+    def bulk_hydrate_cached_sender_and_recipient_info(objs: list[dict[str, Any]]) -> None:
+        """
+        Equivalent to bulk_hydrate_sender_info followed by
+        bulk_hydrate_recipient_info, but using cached sender data,
+        and looking up the senders and display recipients in a
+        single memcached round trip.
+        """
+        sender_ids = list({obj["sender_id"] for obj in objs})
+        recipient_tuples = {
+            (
+                obj["recipient_id"],
+                obj["recipient_type"],
+                obj["recipient_type_id"],
+            )
+            for obj in objs
+        }
+
+        cache_batch = BatchedCacheGet()
+        cache_batch.add(message_sender_cache_key(sender_id) for sender_id in sender_ids)
+        cache_batch.add(display_recipient_cache_keys(recipient_tuples))
+        cache_batch.fetch()
+
+        sender_dict = bulk_cached_fetch(
+            cache_key_function=message_sender_cache_key,
+            query_function=MessageDict.fetch_sender_rows,
+            object_ids=sender_ids,
+            id_fetcher=lambda row: row["id"],
+            cache_batch=cache_batch,
+        )
+        MessageDict.hydrate_sender_info(objs, sender_dict)
+
+        display_recipients = bulk_fetch_display_recipients(
+            recipient_tuples, cache_batch=cache_batch
+        )
+        for obj in objs:
+            MessageDict.hydrate_recipient_info(obj, display_recipients[obj["recipient_id"]])
+
     @staticmethod
     def hydrate_recipient_info(obj: dict[str, Any], display_recipient: DisplayRecipientT) -> None:
         """
@@ -0,0 +1,140 @@
+# Warming of the message to_dict cache (see messages_for_ids).
+#
+# After memcached is restarted, or the cache key prefix changes on
+# deploy (see get_or_create_key_prefix), every message fetch misses
+# the cache and has to build the message dictionaries from the
+# database.  To avoid slow page loads while the cache refills, we
+# keep track of the channel and topic narrows in each realm which
+# are fetched most often, and prefill the cache with their recent
+# messages (along with the realm's most recent messages) from the
+# deferred_work queue processor, or `manage.py fill_memcached_caches`.
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+import orjson
+import redis
+from django.utils.timezone import now as timezone_now
+
+from zerver.lib.message_cache import fill_message_cache
+from zerver.lib.narrow import NarrowParameter
+from zerver.lib.narrow_predicate import channel_operators
+from zerver.lib.read_replica import read_from_replica
+from zerver.lib.redis_utils import get_redis_client
+from zerver.lib.streams import get_stream_by_narrow_operand_access_unchecked
+from zerver.lib.topic import messages_for_topic
+from zerver.models import Message, Realm, Stream
+
+# We count fetches in a sorted set per realm and day, and consider
+# the last two days' counts when warming the cache.
+HOT_NARROWS_KEY_FORMAT = "zulip:hot_narrows:{realm_id}:{day}"
+HOT_NARROWS_EXPIRY_SECONDS = 2 * 24 * 3600
+# The number of narrows we track for each realm, per day.
+MAX_TRACKED_NARROWS = 1000
+
+# Defaults for how much of each realm's history we load into the cache.
+HOT_NARROWS_TO_WARM = 50
+MESSAGES_TO_WARM_PER_NARROW = 100
+
+logger = logging.getLogger(__name__)
+
+redis_client = get_redis_client()
+
+
+def hot_narrows_key(realm_id: int, day: date) -> str:
+    return HOT_NARROWS_KEY_FORMAT.format(realm_id=realm_id, day=day.isoformat())
+
+
+def get_hot_narrow_member(narrow: list[NarrowParameter] | None) -> bytes | None:
+    """Returns how we identify the narrow in the sorted set, if it's a
+    channel or channel and topic narrow; we don't track other narrows,
+    since their results generally depend on the user."""
+    if narrow is None:
+        return None
+
+    channel: str | int | None = None
+    topic: str | None = None
+    for term in narrow:
+        if term.negated:
+            return None
+        if term.operator in channel_operators and isinstance(term.operand, str | int):
+            channel = term.operand
+        elif term.operator == "topic" and isinstance(term.operand, str):
+            topic = term.operand
+        else:
+            return None
+
+    if channel is None:
+        return None
+    return orjson.dumps([channel, topic])
+
+
+def record_narrow_fetch(realm_id: int, narrow: list[NarrowParameter] | None) -> None:
+    member = get_hot_narrow_member(narrow)
+    if member is None:
+        return
+
+    key = hot_narrows_key(realm_id, timezone_now().date())
+    try:
+        with redis_client.pipeline() as pipeline:
+            pipeline.zincrby(key, 1, member)
+            pipeline.zremrangebyrank(key, 0, -MAX_TRACKED_NARROWS - 1)
+            pipeline.expire(key, HOT_NARROWS_EXPIRY_SECONDS)
+            pipeline.execute()
+    except redis.RedisError:
+        # This is only an optimization, so we shouldn't fail the
+        # request if Redis is unavailable.
+        logger.warning("Failed to record narrow fetch for realm %s", realm_id, exc_info=True)
+
+
+def get_hot_narrows(realm_id: int, limit: int) -> list[tuple[str | int, str | None]]:
+    """Returns the realm's most frequently fetched narrows, as
+    (channel operand, topic or None) pairs."""
+    today = timezone_now().date()
+    scores: dict[bytes, float] = defaultdict(float)
+    for day in [today, today - timedelta(days=1)]:
+        for member, score in redis_client.zrevrange(
+            hot_narrows_key(realm_id, day), 0, limit - 1, withscores=True
+        ):
+            scores[member] += score
+
+    hot_narrows: list[tuple[str | int, str | None]] = []
+    for member in sorted(scores, key=lambda member: scores[member], reverse=True)[:limit]:
+        channel, topic = orjson.loads(member)
+        hot_narrows.append((channel, topic))
+    return hot_narrows
+
+
+@read_from_replica
+def warm_realm_message_cache(
+    realm: Realm,
+    *,
+    num_narrows: int = HOT_NARROWS_TO_WARM,
+    num_messages: int = MESSAGES_TO_WARM_PER_NARROW,
+) -> int:
+    """Fills the message cache with the most recent messages in the
+    realm, and in each of its hottest narrows.  Returns the number of
+    messages added to the cache."""
+    count = fill_message_cache(
+        # Uses index: zerver_message_realm_id
+        list(
+            Message.objects.filter(realm_id=realm.id)
+            .order_by("-id")
+            .values_list("id", flat=True)[:num_messages]
+        )
+    )
+
+    for channel, topic_name in get_hot_narrows(realm.id, num_narrows):
+        try:
+            stream = get_stream_by_narrow_operand_access_unchecked(channel, realm)
+        except Stream.DoesNotExist:
+            continue
+        assert stream.recipient_id is not None
+        if topic_name is None:
+            query = Message.objects.filter(realm_id=realm.id, recipient_id=stream.recipient_id)
+        else:
+            query = messages_for_topic(realm.id, stream.recipient_id, topic_name)
+        message_ids = list(query.order_by("-id").values_list("id", flat=True)[:num_messages])
+        count += fill_message_cache(message_ids)
+
+    return count
@@ -0,0 +1,234 @@
+# Re-rendering of existing messages when a realm's linkifiers or
+# custom emoji change.
+#
+# Messages are rendered when they're sent or edited, so a change to
+# the realm's linkifiers or custom emoji only affects new messages.
+# If settings.RERENDER_MESSAGES_ON_REALM_CHANGES is set, such changes
+# queue a `rerender_messages` event for the deferred_work queue
+# processor, which scans the realm's existing messages in batches,
+# and renders again just those whose content matches one of the
+# linkifiers or emoji names that changed.  Messages whose rendering
+# changed are saved, and their recipients sent a rendering-only
+# update_message event.
+#
+# Each batch is a separate transaction, with a short pause between
+# them to leave the database some room; after a while, the processor
+# re-queues the event with its progress, so other deferred work can
+# run, and an interrupted re-render picks up where it left off.
+import re
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from re import Pattern
+from typing import Any
+
+import re2
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now as timezone_now
+
+from zerver.lib.markdown import (
+    MessageRenderingResult,
+    bulk_render_markdown_requests,
+    prepare_markdown_render,
+)
+from zerver.lib.markdown import version as markdown_version
+from zerver.lib.message_cache import update_message_cache
+from zerver.lib.queue import queue_event_on_commit
+from zerver.lib.timestamp import datetime_to_timestamp
+from zerver.models import Message, Realm, UserMessage
+from zerver.tornado.django_api import send_event_on_commit
+
+# How many messages we scan for content matching the changes at once.
+RERENDER_SCAN_BATCH_SIZE = 1000
+# How long we pause between batches.
+RERENDER_BATCH_DELAY_SECONDS = 0.1
+# How long we run before re-queueing the rest of the work.
+RERENDER_TIME_LIMIT_SECONDS = 30
+
+
+@dataclass
+class MessageRerenderProgress:
+    scanned_count: int
+    rerendered_count: int
+    # The ID of the last message scanned; the next run continues after it.
+    last_message_id: int
+    complete: bool
+
+
+def queue_message_rerender(
+    realm: Realm, *, linkifier_patterns: Sequence[str] = (), emoji_names: Sequence[str] = ()
+) -> None:
+    if not settings.RERENDER_MESSAGES_ON_REALM_CHANGES:
+        return
+    queue_event_on_commit(
+        "deferred_work",
+        {
+            "type": "rerender_messages",
+            "realm_id": realm.id,
+            "linkifier_patterns": list(linkifier_patterns),
+            "emoji_names": list(emoji_names),
+        },
+    )
+
+
+def get_rerender_prefilter(linkifier_patterns: list[str], emoji_names: list[str]) -> Pattern[str]:
+    """A regular expression matching the content of any message whose
+    rendering the changes could affect.  Linkifiers only match after
+    whitespace or some punctuation (see prepare_linkifier_pattern), so
+    this matches a superset of those messages."""
+    alternatives = [f"(?:{pattern})" for pattern in linkifier_patterns]
+    alternatives += [re.escape(f":{name}:") for name in emoji_names]
+    return re2.compile("|".join(alternatives))
+
+
+def rerender_messages(
+    realm: Realm,
+    linkifier_patterns: list[str],
+    emoji_names: list[str],
+    *,
+    min_id: int,
+    max_id: int,
+) -> MessageRerenderProgress:
+    progress = MessageRerenderProgress(
+        scanned_count=0, rerendered_count=0, last_message_id=min_id, complete=False
+    )
+    if not linkifier_patterns and not emoji_names:
+        progress.complete = True
+        return progress
+
+    # Linkifier patterns use re2 syntax, which PostgreSQL's regular
+    # expressions don't support, so we filter the content here.
+    prefilter = get_rerender_prefilter(linkifier_patterns, emoji_names)
+    start_time = time.perf_counter()
+    while True:
+        rows = list(
+            Message.objects.filter(
+                # Uses index: zerver_message_realm_id
+                realm_id=realm.id,
+                id__gt=progress.last_message_id,
+                id__lte=max_id,
+            )
+            .order_by("id")
+            .values_list("id", "content")[:RERENDER_SCAN_BATCH_SIZE]
+        )
+        matching_message_ids = [
+            message_id for message_id, content in rows if prefilter.search(content)
+        ]
+        if matching_message_ids:
+            progress.rerendered_count += rerender_message_batch(realm, matching_message_ids)
+        progress.scanned_count += len(rows)
+        if len(rows) < RERENDER_SCAN_BATCH_SIZE:
+            progress.complete = True
+            return progress
+        progress.last_message_id = rows[-1][0]
+        if time.perf_counter() - start_time > RERENDER_TIME_LIMIT_SECONDS:
+            return progress
+        time.sleep(RERENDER_BATCH_DELAY_SECONDS)
+
+
+def rerender_message_batch(realm: Realm, message_ids: list[int]) -> int:
+    """Renders the messages again, and saves and sends updates for
+    those whose rendering changed.  Returns how many changed."""
+    messages = list(
+        Message.objects.filter(id__in=message_ids)
+        .select_related("sender", "sending_client")
+        .order_by("id")
+    )
+    original_rendering = {
+        message.id: (message.rendered_content, message.has_link, message.has_image)
+        for message in messages
+    }
+    # Rendering is slow, so we do it before locking the messages, and
+    # skip any which are edited in the meantime.
+    rendering_results = bulk_render_markdown_requests(
+        [
+            prepare_markdown_render(
+                message.content,
+                message=message,
+                message_realm=realm,
+                sent_by_bot=message.sender.is_bot,
+                translate_emoticons=message.sender.translate_emoticons,
+            )
+            for message in messages
+        ],
+        messages,
+    )
+
+    changed_messages: dict[int, tuple[Message, MessageRenderingResult]] = {}
+    for message, rendering_result in zip(messages, rendering_results, strict=True):
+        if rendering_result is None:
+            # Already logged; we leave the message as it was.
+            continue
+        if original_rendering[message.id] != (
+            rendering_result.rendered_content,
+            message.has_link,
+            message.has_image,
+        ):
+            changed_messages[message.id] = (message, rendering_result)
+    if not changed_messages:
+        return 0
+
+    with transaction.atomic(savepoint=False):
+        current_content = dict(
+            Message.objects.select_for_update()
+            .filter(id__in=changed_messages.keys())
+            .values_list("id", "content")
+        )
+        messages_to_update = []
+        for message_id, (message, rendering_result) in changed_messages.items():
+            if current_content.get(message_id) != message.content:
+                # Edited or deleted since we rendered it; editing
+                # renders the message with the current linkifiers.
+                continue
+            if rendering_result.links_for_preview:
+                # Let the embed_links queue processor render the
+                # message with its URL previews, rather than saving
+                # a rendering which doesn't have them.
+                queue_event_on_commit(
+                    "embed_links",
+                    {
+                        "message_id": message.id,
+                        "message_content": message.content,
+                        "message_realm_id": realm.id,
+                        "urls": list(rendering_result.links_for_preview),
+                    },
+                )
+                continue
+            message.rendered_content = rendering_result.rendered_content
+            message.rendered_content_version = markdown_version
+            messages_to_update.append(message)
+
+        Message.objects.bulk_update(
+            messages_to_update,
+            ["rendered_content", "rendered_content_version", "has_link", "has_image"],
+        )
+        update_message_cache(messages_to_update, realm.id)
+        send_rendering_update_events(realm, messages_to_update)
+    return len(messages_to_update)
+
+
+def send_rendering_update_events(realm: Realm, messages: list[Message]) -> None:
+    users_by_message_id: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for message_id, user_profile_id, flags in UserMessage.objects.filter(
+        message_id__in=[message.id for message in messages]
+    ).values_list("message_id", "user_profile_id", "flags"):
+        users_by_message_id[message_id].append(
+            {"id": user_profile_id, "flags": UserMessage.flags_list_for_flags(flags)}
+        )
+
+    edit_timestamp = datetime_to_timestamp(timezone_now())
+    for message in messages:
+        # Like the updates for URL previews (see do_update_embedded_data).
+        event: dict[str, Any] = {
+            "type": "update_message",
+            "user_id": None,
+            "edit_timestamp": edit_timestamp,
+            "message_id": message.id,
+            "message_ids": [message.id],
+            "content": message.content,
+            "rendered_content": message.rendered_content,
+            "rendering_only": True,
+        }
+        send_event_on_commit(realm, event, users_by_message_id[message.id])
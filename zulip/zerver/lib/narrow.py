@@ -1418,11 +1418,41 @@ def fetch_messages(
         )
 
         main_query = query.subquery()
-        query = (
-            select(*main_query.c)
-            .select_from(main_query)
-            .order_by(column("message_id", Integer).asc())
-        )
+        if include_history and user_profile is not None:
+            # The user's flags for these messages are needed too, so we
+            # fetch them with an outer join, rather than in a separate
+            # query; the flags are NULL for messages the user didn't
+            # receive.  The flags column is second, matching the
+            # queries which use zerver_usermessage directly.
+            user_message = table(
+                "zerver_usermessage",
+                column("message_id", Integer),
+                column("user_profile_id", Integer),
+                column("flags", Integer),
+            )
+            query = (
+                select(
+                    main_query.c.message_id,
+                    user_message.c.flags,
+                    *(col for col in main_query.c if col.name != "message_id"),
+                )
+                .select_from(
+                    main_query.outerjoin(
+                        user_message,
+                        and_(
+                            user_message.c.message_id == main_query.c.message_id,
+                            user_message.c.user_profile_id == literal(user_profile.id),
+                        ),
+                    )
+                )
+                .order_by(main_query.c.message_id.asc())
+            )
+        else:
+            query = (
+                select(*main_query.c)
+                .select_from(main_query)
+                .order_by(column("message_id", Integer).asc())
+            )
         # This is a hack to tag the query we use for testing
         query = query.prefix_with("/* get_messages */")
         rows = list(sa_conn.execute(query).fetchall())
@@ -7,9 +7,11 @@ from typing import Any
 from django.conf import settings
 from django.utils.timezone import now as timezone_now
 
+from zerver.lib import presence_store
 from zerver.lib.timestamp import datetime_to_timestamp
 from zerver.lib.users import check_user_can_access_all_users, get_accessible_user_ids
 from zerver.models import Realm, UserPresence, UserProfile
+from zerver.models.users import get_realm_user_dicts, get_user_profile_by_id
 
 
 def get_presence_dicts_for_rows(
@@ -131,9 +133,50 @@ def format_legacy_presence_dict(
     return dict(client="website", status=status, timestamp=timestamp, pushable=pushable)
 
 
+def get_presence_rows_from_redis(
+    realm: Realm, presences: list[UserPresence], *, since: datetime
+) -> list[dict[str, Any]]:
+    """Converts presence data from zerver.lib.presence_store into the
+    format of the UserPresence rows we fetch from the database,
+    applying the same filters on the users."""
+    users = {row["id"]: row for row in get_realm_user_dicts(realm.id)}
+    presence_rows = []
+    for presence in presences:
+        user = users.get(presence.user_profile_id)
+        if user is None or not user["is_active"] or user["is_bot"]:
+            continue
+        if presence.last_connected_time is None or presence.last_connected_time < since:
+            continue
+        presence_rows.append(
+            {
+                "last_active_time": presence.last_active_time,
+                "last_connected_time": presence.last_connected_time,
+                "user_profile__email": user["email"],
+                "user_profile_id": presence.user_profile_id,
+                "user_profile__date_joined": user["date_joined"],
+                "last_update_id": presence.last_update_id,
+            }
+        )
+    return presence_rows
+
+
 def get_presence_for_user(
     user_profile_id: int, slim_presence: bool = False
 ) -> dict[str, dict[str, Any]]:
+    if settings.PRESENCE_UPDATES_IN_REDIS:
+        user_profile = get_user_profile_by_id(user_profile_id)
+        presence, _ = presence_store.get_user_presence(user_profile)
+        if presence is None:
+            return {}
+        presence_row = {
+            "last_active_time": presence.last_active_time,
+            "last_connected_time": presence.last_connected_time,
+            "user_profile__email": user_profile.email,
+            "user_profile_id": user_profile.id,
+            "user_profile__date_joined": user_profile.date_joined,
+        }
+        return get_presence_dicts_for_rows([presence_row], slim_presence)
+
     query = UserPresence.objects.filter(user_profile_id=user_profile_id).values(
         "last_active_time",
         "last_connected_time",
@@ -154,39 +197,56 @@ def get_presence_dict_by_realm(
     requesting_user_profile: UserProfile | None = None,
 ) -> tuple[dict[str, dict[str, Any]], int]:
     two_weeks_ago = timezone_now() - timedelta(weeks=2)
-    kwargs: dict[str, object] = dict()
-    if last_update_id_fetched_by_client is not None:
-        kwargs["last_update_id__gt"] = last_update_id_fetched_by_client
-
-    query = UserPresence.objects.filter(
-        realm_id=realm.id,
-        user_profile__is_active=True,
-        user_profile__is_bot=False,
-        # We can consider tweaking this value when last_update_id is being used,
-        # to potentially fetch more data since such a client is expected to only
-        # do it once and then only do small, incremental fetches.
-        last_connected_time__gte=two_weeks_ago,
-        **kwargs,
+    limit_to_accessible_users = (
+        settings.CAN_ACCESS_ALL_USERS_GROUP_LIMITS_PRESENCE
+        and not check_user_can_access_all_users(requesting_user_profile)
     )
 
-    if settings.CAN_ACCESS_ALL_USERS_GROUP_LIMITS_PRESENCE and not check_user_can_access_all_users(
-        requesting_user_profile
-    ):
-        assert requesting_user_profile is not None
-        accessible_user_ids = get_accessible_user_ids(realm, requesting_user_profile)
-        query = query.filter(user_profile_id__in=accessible_user_ids)
-
-    presence_rows = list(
-        query.values(
-            "last_active_time",
-            "last_connected_time",
-            "user_profile__email",
-            "user_profile_id",
-            "user_profile__enable_offline_push_notifications",
-            "user_profile__date_joined",
-            "last_update_id",
+    if settings.PRESENCE_UPDATES_IN_REDIS:
+        presence_rows = get_presence_rows_from_redis(
+            realm,
+            presence_store.get_realm_presences(realm.id, last_update_id_fetched_by_client),
+            since=two_weeks_ago,
         )
-    )
+        if limit_to_accessible_users:
+            assert requesting_user_profile is not None
+            accessible_user_ids = set(get_accessible_user_ids(realm, requesting_user_profile))
+            presence_rows = [
+                row for row in presence_rows if row["user_profile_id"] in accessible_user_ids
+            ]
+    else:
+        kwargs: dict[str, object] = dict()
+        if last_update_id_fetched_by_client is not None:
+            kwargs["last_update_id__gt"] = last_update_id_fetched_by_client
+
+        query = UserPresence.objects.filter(
+            realm_id=realm.id,
+            user_profile__is_active=True,
+            user_profile__is_bot=False,
+            # We can consider tweaking this value when last_update_id is being used,
+            # to potentially fetch more data since such a client is expected to only
+            # do it once and then only do small, incremental fetches.
+            last_connected_time__gte=two_weeks_ago,
+            **kwargs,
+        )
+
+        if limit_to_accessible_users:
+            assert requesting_user_profile is not None
+            accessible_user_ids = get_accessible_user_ids(realm, requesting_user_profile)
+            query = query.filter(user_profile_id__in=accessible_user_ids)
+
+        presence_rows = list(
+            query.values(
+                "last_active_time",
+                "last_connected_time",
+                "user_profile__email",
+                "user_profile_id",
+                "user_profile__enable_offline_push_notifications",
+                "user_profile__date_joined",
+                "last_update_id",
+            )
+        )
+
     # Get max last_update_id from the list.
     if presence_rows:
         last_update_id_fetched_by_server: int | None = max(
@@ -0,0 +1,335 @@
+# Redis-backed storage for UserPresence data, used instead of writing
+# each presence update to the database when
+# settings.PRESENCE_UPDATES_IN_REDIS is enabled.
+#
+# In the database, every presence update which changes a user's
+# presence takes a lock on the realm's PresenceSequence row to
+# allocate its last_update_id; with thousands of users pinging every
+# minute, those writes contend with each other.  Here, each realm's
+# presence data lives in a Redis hash, whose "last_update_id" field
+# plays the role of the PresenceSequence row, and updates are applied
+# atomically by a Lua script.  The users whose presence changed are
+# tracked in a per-realm set, and `manage.py flush_presence_updates`
+# periodically writes their rows to the database in bulk.
+#
+# The hash is loaded from the database the first time a realm's
+# presence is accessed.  Our Redis configuration doesn't persist data,
+# so changes made since the last flush are lost if Redis restarts;
+# presence is ephemeral, so that's fine, but we must not hand out a
+# last_update_id which clients have already seen.  So we start the
+# reloaded sequence well past the last value written to the database.
+from collections.abc import Collection
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+
+from zerver.lib import redis_utils
+from zerver.lib.redis_utils import get_redis_client
+from zerver.models import UserPresence, UserProfile
+from zerver.models.presence import PresenceSequence
+
+PRESENCE_KEY_FORMAT = "zulip:presence:{realm_id}"
+# A sorted set of user IDs, scored by their last_update_id, which lets
+# us efficiently find the users whose presence changed since a given
+# last_update_id.
+PRESENCE_UPDATES_KEY_FORMAT = "zulip:presence:{realm_id}:updates"
+# The users whose presence has changed since the last flush.
+PRESENCE_DIRTY_KEY_FORMAT = "zulip:presence:{realm_id}:dirty"
+PRESENCE_DIRTY_REALMS_KEY = "zulip:presence:dirty_realms"
+SEQUENCE_FIELD = "last_update_id"
+
+# Comfortably more than the number of presence updates a realm can
+# make between two flushes.
+PRESENCE_SEQUENCE_RESTART_GAP = 1_000_000
+
+# The number of rows we write to the database in each query.
+FLUSH_BATCH_SIZE = 1000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+redis_client = get_redis_client()
+
+# KEYS: the presence hash and updates sorted set.
+# ARGV: the initial sequence value, followed by a (user ID, value,
+# last_update_id) triple for each UserPresence row.
+load_realm_presence_script = redis_client.register_script("""
+if redis.call("HEXISTS", KEYS[1], "last_update_id") == 1 then
+    return 0
+end
+redis.call("DEL", KEYS[1], KEYS[2])
+for i = 2, #ARGV, 3 do
+    redis.call("HSET", KEYS[1], ARGV[i], ARGV[i + 1])
+    redis.call("ZADD", KEYS[2], ARGV[i + 2], ARGV[i])
+end
+redis.call("HSET", KEYS[1], "last_update_id", ARGV[1])
+return 1
+""")
+
+# KEYS: the presence hash, updates sorted set, dirty set, and dirty
+# realms set.
+# ARGV: the user ID, the user's value we based the update on ("" if
+# none), the new timestamps, and the realm ID.
+#
+# Returns the new last_update_id, 0 if the user's presence was changed
+# concurrently, or -1 if the realm's presence isn't loaded.
+update_user_presence_script = redis_client.register_script("""
+if redis.call("HEXISTS", KEYS[1], "last_update_id") == 0 then
+    return -1
+end
+local current = redis.call("HGET", KEYS[1], ARGV[1]) or ""
+if current ~= ARGV[2] then
+    return 0
+end
+local last_update_id = redis.call("HINCRBY", KEYS[1], "last_update_id", 1)
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[3] .. "," .. last_update_id)
+redis.call("ZADD", KEYS[2], last_update_id, ARGV[1])
+redis.call("SADD", KEYS[3], ARGV[1])
+redis.call("SADD", KEYS[4], ARGV[4])
+return last_update_id
+""")
+
+
+class PresenceNotLoadedError(Exception):
+    pass
+
+
+def presence_key(realm_id: int) -> str:
+    return redis_utils.REDIS_KEY_PREFIX + PRESENCE_KEY_FORMAT.format(realm_id=realm_id)
+
+
+def presence_updates_key(realm_id: int) -> str:
+    return redis_utils.REDIS_KEY_PREFIX + PRESENCE_UPDATES_KEY_FORMAT.format(realm_id=realm_id)
+
+
+def presence_dirty_key(realm_id: int) -> str:
+    return redis_utils.REDIS_KEY_PREFIX + PRESENCE_DIRTY_KEY_FORMAT.format(realm_id=realm_id)
+
+
+def presence_dirty_realms_key() -> str:
+    return redis_utils.REDIS_KEY_PREFIX + PRESENCE_DIRTY_REALMS_KEY
+
+
+def format_presence_time(dt: datetime | None) -> str:
+    # We store integer microseconds, so that values round-trip exactly.
+    if dt is None:
+        return ""
+    return str((dt - EPOCH) // timedelta(microseconds=1))
+
+
+def parse_presence_time(value: str) -> datetime | None:
+    if value == "":
+        return None
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def format_presence_times(presence: UserPresence) -> str:
+    return ",".join(
+        [
+            format_presence_time(presence.last_active_time),
+            format_presence_time(presence.last_connected_time),
+        ]
+    )
+
+
+def parse_presence_value(user_id: int, realm_id: int, value: bytes) -> UserPresence:
+    """Returns an unsaved UserPresence object for a value stored in the
+    presence hash."""
+    last_active_time, last_connected_time, last_update_id = value.decode().split(",")
+    return UserPresence(
+        user_profile_id=user_id,
+        realm_id=realm_id,
+        last_active_time=parse_presence_time(last_active_time),
+        last_connected_time=parse_presence_time(last_connected_time),
+        last_update_id=int(last_update_id),
+    )
+
+
+def load_realm_presence(realm_id: int) -> None:
+    """Loads the realm's presence data from the database into Redis,
+    unless it's already there."""
+    last_update_id = (
+        PresenceSequence.objects.filter(realm_id=realm_id)
+        .values_list("last_update_id", flat=True)
+        .first()
+    ) or 0
+    args: list[object] = [last_update_id + PRESENCE_SEQUENCE_RESTART_GAP]
+    for presence in UserPresence.objects.filter(realm_id=realm_id).only(
+        "user_profile_id", "last_active_time", "last_connected_time", "last_update_id"
+    ):
+        args += [
+            presence.user_profile_id,
+            f"{format_presence_times(presence)},{presence.last_update_id}",
+            presence.last_update_id,
+        ]
+    load_realm_presence_script(
+        keys=[presence_key(realm_id), presence_updates_key(realm_id)], args=args
+    )
+
+
+def get_user_presence(user_profile: UserProfile) -> tuple[UserPresence | None, str]:
+    """Returns the user's presence, if any, along with its raw value,
+    which set_user_presence uses to detect concurrent updates."""
+    key = presence_key(user_profile.realm_id)
+    for _attempt in range(2):
+        with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.hexists(key, SEQUENCE_FIELD)
+            pipeline.hget(key, str(user_profile.id))
+            loaded, value = pipeline.execute()
+        if loaded:
+            break
+        load_realm_presence(user_profile.realm_id)
+    else:  # nocoverage
+        raise PresenceNotLoadedError
+
+    if value is None:
+        return None, ""
+    return parse_presence_value(user_profile.id, user_profile.realm_id, value), value.decode()
+
+
+def set_user_presence(
+    user_profile: UserProfile, presence: UserPresence, raw_value: str
+) -> int | None:
+    """Saves the user's presence, allocating a new last_update_id for
+    it, as long as the user's presence in Redis is still raw_value.
+    Returns the new last_update_id, or None if the user's presence was
+    changed concurrently; in that case, like when two database
+    transactions race, we let the other update win."""
+    realm_id = user_profile.realm_id
+    last_update_id = update_user_presence_script(
+        keys=[
+            presence_key(realm_id),
+            presence_updates_key(realm_id),
+            presence_dirty_key(realm_id),
+            presence_dirty_realms_key(),
+        ],
+        args=[user_profile.id, raw_value, format_presence_times(presence), realm_id],
+    )
+    if last_update_id == -1:
+        # Redis was restarted since we read the user's presence.
+        raise PresenceNotLoadedError  # nocoverage
+    if last_update_id == 0:
+        return None
+    presence.last_update_id = last_update_id
+    return last_update_id
+
+
+def delete_user_presence(user_profile: UserProfile) -> None:
+    realm_id = user_profile.realm_id
+    with redis_client.pipeline() as pipeline:
+        pipeline.hdel(presence_key(realm_id), str(user_profile.id))
+        pipeline.zrem(presence_updates_key(realm_id), str(user_profile.id))
+        pipeline.srem(presence_dirty_key(realm_id), str(user_profile.id))
+        pipeline.execute()
+
+
+def get_realm_presences(
+    realm_id: int, last_update_id_fetched_by_client: int | None = None
+) -> list[UserPresence]:
+    """Returns unsaved UserPresence objects for the realm's users,
+    or just those which changed after last_update_id_fetched_by_client."""
+    key = presence_key(realm_id)
+    if not redis_client.hexists(key, SEQUENCE_FIELD):
+        load_realm_presence(realm_id)
+
+    if last_update_id_fetched_by_client is None:
+        values = {
+            field: value
+            for field, value in redis_client.hgetall(key).items()
+            if field != SEQUENCE_FIELD.encode()
+        }
+    else:
+        user_ids = redis_client.zrangebyscore(
+            presence_updates_key(realm_id), f"({last_update_id_fetched_by_client}", "+inf"
+        )
+        if not user_ids:
+            return []
+        values = dict(zip(user_ids, redis_client.hmget(key, user_ids), strict=True))
+
+    return [
+        parse_presence_value(int(user_id), realm_id, value)
+        for user_id, value in values.items()
+        if value is not None
+    ]
+
+
+def get_users_presences(realm_id: int, user_ids: Collection[int]) -> list[UserPresence]:
+    """Returns unsaved UserPresence objects for those of the given
+    users in the realm who have presence data."""
+    key = presence_key(realm_id)
+    if not redis_client.hexists(key, SEQUENCE_FIELD):
+        load_realm_presence(realm_id)
+
+    sorted_user_ids = sorted(user_ids)
+    values = redis_client.hmget(key, [str(user_id) for user_id in sorted_user_ids])
+    return [
+        parse_presence_value(user_id, realm_id, value)
+        for user_id, value in zip(sorted_user_ids, values, strict=True)
+        if value is not None
+    ]
+
+
+def flush_realm_presence_updates(realm_id: int) -> int:
+    """Writes the presence of the realm's users whose presence changed
+    since the last flush to the database.  Returns the number of rows
+    written."""
+    dirty_key = presence_dirty_key(realm_id)
+    with redis_client.pipeline() as pipeline:
+        pipeline.smembers(dirty_key)
+        pipeline.delete(dirty_key)
+        dirty_user_ids, _ = pipeline.execute()
+    if not dirty_user_ids:
+        return 0
+
+    user_ids = sorted(int(user_id) for user_id in dirty_user_ids)
+    try:
+        # Users may have been deleted since their last presence update.
+        existing_user_ids = set(
+            UserProfile.objects.filter(id__in=user_ids, realm_id=realm_id).values_list(
+                "id", flat=True
+            )
+        )
+        values = redis_client.hmget(presence_key(realm_id), [str(user_id) for user_id in user_ids])
+        presences = [
+            parse_presence_value(user_id, realm_id, value)
+            for user_id, value in zip(user_ids, values, strict=True)
+            if value is not None and user_id in existing_user_ids
+        ]
+        last_update_id = max((presence.last_update_id for presence in presences), default=0)
+        with transaction.atomic(durable=True):
+            UserPresence.objects.bulk_create(
+                presences,
+                batch_size=FLUSH_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["user_profile"],
+                update_fields=["last_active_time", "last_connected_time", "last_update_id"],
+            )
+            PresenceSequence.objects.filter(
+                realm_id=realm_id, last_update_id__lt=last_update_id
+            ).update(last_update_id=last_update_id)
+    except BaseException:
+        # Leave these users for the next flush to retry.
+        with redis_client.pipeline() as pipeline:
+            pipeline.sadd(dirty_key, *user_ids)
+            pipeline.sadd(presence_dirty_realms_key(), realm_id)
+            pipeline.execute()
+        raise
+    return len(presences)
+
+
+def flush_presence_updates() -> int:
+    """Writes all presence changes stored in Redis to the database.
+    Returns the number of rows written."""
+    count = 0
+    while (realm_id := redis_client.spop(presence_dirty_realms_key())) is not None:
+        count += flush_realm_presence_updates(int(realm_id))
+    return count
+
+
+def clear_presence_store() -> None:
+    """Removes all presence data from Redis, after writing any pending
+    changes to the database.  Used when the Redis store is disabled, so
+    that it is reloaded from the database if it's enabled again."""
+    flush_presence_updates()
+    keys = list(redis_client.scan_iter(match=redis_utils.REDIS_KEY_PREFIX + "zulip:presence:*"))
+    if keys:
+        redis_client.delete(*keys)
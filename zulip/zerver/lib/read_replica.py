@@ -0,0 +1,160 @@
+# Support for sending some read-only database queries to a PostgreSQL
+# streaming replica, configured via REMOTE_POSTGRES_REPLICA_HOST.
+#
+# Routing is opt-in: queries go to the primary database unless they
+# are made inside a `reads_from_replica` block.  Code paths which
+# need to read their own writes (e.g. computing the first unread
+# message, or fetching messages which may have just been sent) must
+# not use the replica, since replication is asynchronous.
+#
+# Before routing anything, we check (at most every few seconds, per
+# process) that the replica is reachable and that its replication lag
+# is below settings.DATABASE_REPLICA_MAX_LAG_SECONDS; otherwise, we
+# fall back to the primary.
+import logging
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, ParamSpec, TypeVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Model
+
+REPLICA_DB_ALIAS = "replica"
+
+# How long to trust a replica health check before repeating it.
+REPLICA_STATUS_CHECK_INTERVAL_SECONDS = 5
+
+ParamT = ParamSpec("ParamT")
+ReturnT = TypeVar("ReturnT")
+
+logger = logging.getLogger(__name__)
+
+read_database_alias: ContextVar[str] = ContextVar("read_database_alias", default=DEFAULT_DB_ALIAS)
+
+
+@dataclass
+class ReplicaStatus:
+    checked_at: float
+    usable: bool
+    # The largest message ID which has been replicated, used to check
+    # whether a message fetch is far enough in the past.
+    max_message_id: int
+
+
+replica_status: ReplicaStatus | None = None
+
+
+def replica_configured() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def get_replica_status() -> ReplicaStatus:
+    global replica_status
+    now = time.monotonic()
+    if (
+        replica_status is not None
+        and now - replica_status.checked_at < REPLICA_STATUS_CHECK_INTERVAL_SECONDS
+    ):
+        return replica_status
+
+    try:
+        with connections[REPLICA_DB_ALIAS].cursor() as cursor:
+            # pg_last_xact_replay_timestamp only advances when the
+            # primary commits a transaction, so we treat a replica
+            # which has replayed all the WAL it received as having
+            # no lag, even if the primary has been idle for a while.
+            cursor.execute(
+                """
+                SELECT
+                    CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                    END,
+                    (SELECT COALESCE(max(id), 0) FROM zerver_message)
+                """
+            )
+            lag, max_message_id = cursor.fetchone()
+    except DatabaseError:
+        logger.warning("Database replica is unavailable; reading from the primary")
+        replica_status = ReplicaStatus(checked_at=now, usable=False, max_message_id=0)
+        return replica_status
+
+    usable = lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS
+    if not usable:
+        logger.warning("Database replica lag of %ss is too high; reading from the primary", lag)
+    replica_status = ReplicaStatus(checked_at=now, usable=usable, max_message_id=max_message_id)
+    return replica_status
+
+
+def choose_read_database(*, max_message_id: int | None = None) -> str:
+    """Returns the database alias to use for a read-only query.
+
+    If max_message_id is passed, the replica is only used if it has
+    already replicated messages up to that ID; this is how callers
+    ensure that historical fetches don't miss recent messages."""
+    if not replica_configured():
+        return DEFAULT_DB_ALIAS
+
+    status = get_replica_status()
+    if not status.usable:
+        return DEFAULT_DB_ALIAS
+    if max_message_id is not None and max_message_id > status.max_message_id:
+        return DEFAULT_DB_ALIAS
+    return REPLICA_DB_ALIAS
+
+
+@contextmanager
+def reads_from_replica(*, max_message_id: int | None = None) -> Iterator[str]:
+    """Routes ORM reads (and raw queries made via read_connection) made
+    inside this block to the replica, if it's usable; yields the
+    database alias in use.  Writes always go to the primary."""
+    alias = choose_read_database(max_message_id=max_message_id)
+    token = read_database_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        read_database_alias.reset(token)
+
+
+def read_from_replica(func: Callable[ParamT, ReturnT]) -> Callable[ParamT, ReturnT]:
+    """Decorator version of reads_from_replica, for functions which
+    only need a consistent (but possibly slightly stale) view of the
+    database, like analytics and exports."""
+
+    @wraps(func)
+    def _wrapped_func(*args: ParamT.args, **kwargs: ParamT.kwargs) -> ReturnT:
+        with reads_from_replica():
+            return func(*args, **kwargs)
+
+    return _wrapped_func
+
+
+def read_connection() -> BaseDatabaseWrapper:
+    """The database connection to use for raw read-only SQL queries."""
+    return connections[read_database_alias.get()]
+
+
+class ReadReplicaRouter:
+    """Django database router, installed when a replica is configured."""
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str:
+        return read_database_alias.get()
+
+    def db_for_write(self, model: type[Model], **hints: Any) -> str:
+        # Objects fetched from the replica remember that database;
+        # we need to be explicit to ensure they're saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool:
+        # The replica is a copy of the primary.
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints: Any) -> bool:
+        return db == DEFAULT_DB_ALIAS
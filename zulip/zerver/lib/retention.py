@@ -40,6 +40,7 @@ from psycopg2.sql import SQL, Composable, Identifier, Literal
 
 from zerver.lib.logging_util import log_to_file
 from zerver.lib.request import RequestVariableConversionError
+from zerver.lib.topic import get_stream_topics_for_message_ids, refresh_stream_topics
 from zerver.models import (
     ArchivedAttachment,
     ArchivedReaction,
@@ -327,8 +328,14 @@ def delete_messages(msg_ids: list[int]) -> None:
     # configuration), so we need to be sure we've taken care of
     # archiving the messages before doing this step.
     #
+    #
+    # We also keep the StreamTopic summaries for the affected topics
+    # up to date, which needs to happen in the same transaction.
+    topics = get_stream_topics_for_message_ids(msg_ids)
     # Uses index: zerver_message_pkey
     Message.objects.filter(id__in=msg_ids).delete()
+    for (realm_id, recipient_id), topic_names in topics.items():
+        refresh_stream_topics(realm_id, recipient_id, topic_names)
 
 
 def delete_expired_attachments(realm: Realm) -> None:
@@ -600,6 +607,9 @@ def restore_data_from_archive(archive_transaction: ArchiveTransaction) -> int:
         restore_models_with_message_key_from_archive(archive_transaction.id)
         restore_attachments_from_archive(archive_transaction.id)
         restore_attachment_messages_from_archive(archive_transaction.id)
+        topics = get_stream_topics_for_message_ids(msg_ids)
+        for (realm_id, recipient_id), topic_names in topics.items():
+            refresh_stream_topics(realm_id, recipient_id, topic_names)
 
         archive_transaction.restored = True
         archive_transaction.restored_timestamp = timezone_now()
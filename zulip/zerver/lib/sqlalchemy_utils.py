@@ -2,11 +2,12 @@ from collections.abc import Iterator
 from contextlib import contextmanager
 
 import sqlalchemy
-from django.db import connection
+from django.db import connections
 from sqlalchemy.engine import Connection, Engine
 from typing_extensions import override
 
 from zerver.lib.db import TimeTrackingConnection
+from zerver.lib.read_replica import read_database_alias
 
 
 # This is a Pool that doesn't close connections.  Therefore it can be used with
@@ -20,23 +21,28 @@ class NonClosingPool(sqlalchemy.pool.NullPool):
         pass
 
 
-sqlalchemy_engine: Engine | None = None
+# One engine per Django database alias; see zerver/lib/read_replica.py.
+sqlalchemy_engines: dict[str, Engine] = {}
 
 
 @contextmanager
 def get_sqlalchemy_connection() -> Iterator[Connection]:
-    global sqlalchemy_engine
-    if sqlalchemy_engine is None:
+    """A SQLAlchemy connection wrapping the Django database connection
+    for reads, which is the primary database unless inside a
+    reads_from_replica block."""
+    alias = read_database_alias.get()
+    if alias not in sqlalchemy_engines:
 
         def get_dj_conn() -> TimeTrackingConnection:
+            connection = connections[alias]
             connection.ensure_connection()
             return connection.connection
 
-        sqlalchemy_engine = sqlalchemy.create_engine(
+        sqlalchemy_engines[alias] = sqlalchemy.create_engine(
             "postgresql://",
             creator=get_dj_conn,
             poolclass=NonClosingPool,
             pool_reset_on_return=None,
         )
-    with sqlalchemy_engine.connect().execution_options(autocommit=False) as sa_connection:
+    with sqlalchemy_engines[alias].connect().execution_options(autocommit=False) as sa_connection:
         yield sa_connection
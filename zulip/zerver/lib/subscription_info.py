@@ -5,7 +5,7 @@ from typing import Any
 
 from django.core.exceptions import ValidationError
 from django.db import connection
-from django.db.models import QuerySet
+from django.db.models import Count, QuerySet
 from django.utils.translation import gettext as _
 from psycopg2.sql import SQL
 
@@ -14,6 +14,7 @@ from zerver.lib.stream_color import STREAM_ASSIGNMENT_COLORS
 from zerver.lib.stream_subscription import (
     get_active_subscriptions_for_stream_id,
     get_stream_subscriptions_for_user,
+    get_subscribed_stream_ids_for_user,
 )
 from zerver.lib.stream_traffic import get_average_weekly_stream_traffic, get_streams_traffic
 from zerver.lib.streams import get_web_public_streams_queryset, subscribed_to_stream
@@ -338,12 +339,11 @@ def validate_user_access_to_subscribers_helper(
         raise JsonableError(_("Unable to retrieve subscribers for private channel"))
 
 
-def bulk_get_subscriber_user_ids(
+def get_stream_dicts_with_subscriber_access(
     stream_dicts: Collection[Mapping[str, Any]],
     user_profile: UserProfile,
     subscribed_stream_ids: set[int],
-) -> dict[int, list[int]]:
-    """sub_dict maps stream_id => whether the user is subscribed to that stream."""
+) -> list[Mapping[str, Any]]:
     target_stream_dicts = []
     is_subscribed: bool
     check_user_subscribed = lambda user_profile: is_subscribed
@@ -361,6 +361,20 @@ def bulk_get_subscriber_user_ids(
         except JsonableError:
             continue
         target_stream_dicts.append(stream_dict)
+    return target_stream_dicts
+
+
+def bulk_get_subscriber_user_ids(
+    stream_dicts: Collection[Mapping[str, Any]],
+    user_profile: UserProfile,
+    subscribed_stream_ids: set[int],
+) -> dict[int, list[int]]:
+    """subscribed_stream_ids is the set of streams the user is
+    subscribed to; we use it to check which streams' subscribers the
+    user may see."""
+    target_stream_dicts = get_stream_dicts_with_subscriber_access(
+        stream_dicts, user_profile, subscribed_stream_ids
+    )
 
     recip_to_stream_id = {stream["recipient_id"]: stream["id"] for stream in target_stream_dicts}
     recipient_ids = sorted(stream["recipient_id"] for stream in target_stream_dicts)
@@ -410,6 +424,72 @@ def bulk_get_subscriber_user_ids(
     return result
 
 
+def bulk_get_subscriber_counts(
+    stream_dicts: Collection[Mapping[str, Any]],
+    user_profile: UserProfile,
+    subscribed_stream_ids: set[int],
+) -> dict[int, int]:
+    """Like bulk_get_subscriber_user_ids, but only counts the
+    subscribers, which is much cheaper for large streams."""
+    target_stream_dicts = get_stream_dicts_with_subscriber_access(
+        stream_dicts, user_profile, subscribed_stream_ids
+    )
+
+    recip_to_stream_id = {stream["recipient_id"]: stream["id"] for stream in target_stream_dicts}
+
+    result: dict[int, int] = {stream["id"]: 0 for stream in stream_dicts}
+    if not recip_to_stream_id:
+        return result
+
+    counts = (
+        Subscription.objects.filter(
+            recipient_id__in=list(recip_to_stream_id), active=True, is_user_active=True
+        )
+        .values_list("recipient_id")
+        .annotate(Count("id"))
+        .order_by()
+    )
+    for recipient_id, count in counts:
+        result[recip_to_stream_id[recipient_id]] = count
+    return result
+
+
+def bulk_access_stream_subscriber_user_ids(
+    user_profile: UserProfile, stream_ids: Collection[int]
+) -> dict[int, list[int]]:
+    """Returns the sorted subscriber IDs of the given streams, for
+    clients which didn't fetch subscribers in /register and fetch
+    them as needed.  Raises an error if the user can't see the
+    subscribers of any of the streams."""
+    stream_dicts = list(
+        get_active_streams(user_profile.realm)
+        .filter(id__in=stream_ids)
+        .values("id", "invite_only", "is_web_public", "recipient_id")
+    )
+    subscribed_stream_ids = set(
+        get_subscribed_stream_ids_for_user(user_profile).filter(recipient__type_id__in=stream_ids)
+    )
+    target_stream_dicts = get_stream_dicts_with_subscriber_access(
+        stream_dicts, user_profile, subscribed_stream_ids
+    )
+    if len(target_stream_dicts) != len(set(stream_ids)):
+        # We don't distinguish streams which don't exist from those
+        # the user can't access, to avoid leaking private streams.
+        raise JsonableError(_("Invalid channel ID"))
+    return bulk_get_subscriber_user_ids(target_stream_dicts, user_profile, subscribed_stream_ids)
+
+
+def delta_encode_user_ids(user_ids: list[int]) -> list[int]:
+    """Encodes a sorted list of user IDs as the first ID followed by
+    the differences between consecutive IDs, which are small numbers
+    for the dense ranges of IDs typical of large streams, and so much
+    shorter in JSON."""
+    return [
+        user_id - previous_user_id
+        for previous_user_id, user_id in itertools.pairwise([0, *user_ids])
+    ]
+
+
 def get_subscribers_query(
     stream: Stream, requesting_user: UserProfile | None
 ) -> QuerySet[Subscription]:
@@ -447,6 +527,7 @@ def has_metadata_access_to_previously_subscribed_stream(
 def gather_subscriptions_helper(
     user_profile: UserProfile,
     include_subscribers: bool = True,
+    include_subscriber_counts: bool = False,
 ) -> SubscriptionInfo:
     realm = user_profile.realm
     all_streams = get_active_streams(realm).values(
@@ -535,14 +616,14 @@ def gather_subscriptions_helper(
 
             never_subscribed.append(slim_stream_dict)
 
-    if include_subscribers:
-        # The highly optimized bulk_get_subscriber_user_ids wants to know which
-        # streams we are subscribed to, for validation purposes, and it uses that
-        # info to know if it's allowed to find OTHER subscribers.
-        subscribed_stream_ids = {
-            get_stream_id(sub_dict) for sub_dict in sub_dicts if sub_dict["active"]
-        }
+    # The highly optimized bulk_get_subscriber_user_ids wants to know which
+    # streams we are subscribed to, for validation purposes, and it uses that
+    # info to know if it's allowed to find OTHER subscribers.
+    subscribed_stream_ids = {
+        get_stream_id(sub_dict) for sub_dict in sub_dicts if sub_dict["active"]
+    }
 
+    if include_subscribers:
         subscriber_map = bulk_get_subscriber_user_ids(
             all_streams,
             user_profile,
@@ -560,6 +641,26 @@ def gather_subscriptions_helper(
             stream_id = slim_stream_dict["stream_id"]
             slim_stream_dict["subscribers"] = subscriber_map[stream_id]
 
+    if include_subscriber_counts:
+        # Clients which only display subscriber counts for most
+        # streams can skip fetching the subscriber lists, and fetch
+        # them for individual streams via GET /streams/members.
+        if include_subscribers:
+            subscriber_counts = {
+                stream_id: len(subscribers) for stream_id, subscribers in subscriber_map.items()
+            }
+        else:
+            subscriber_counts = bulk_get_subscriber_counts(
+                all_streams, user_profile, subscribed_stream_ids
+            )
+
+        for lst in [subscribed, unsubscribed]:
+            for stream_dict in lst:
+                stream_dict["subscriber_count"] = subscriber_counts[stream_dict["stream_id"]]
+
+        for slim_stream_dict in never_subscribed:
+            slim_stream_dict["subscriber_count"] = subscriber_counts[slim_stream_dict["stream_id"]]
+
     subscribed.sort(key=lambda x: x["name"])
     unsubscribed.sort(key=lambda x: x["name"])
     never_subscribed.sort(key=lambda x: x["name"])
@@ -1,9 +1,16 @@
+import hashlib
 import logging
 import os
+import select
+import struct
 import subprocess
-from typing import Any
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any
 
 import lxml.html
+import orjson
 import requests
 from django.conf import settings
 
@@ -19,6 +26,14 @@ class KatexSession(OutgoingSession):
         super().__init__(role="katex", timeout=0.5, **kwargs)
 
 
+# How long a new KaTeX worker has to start node and load KaTeX.
+KATEX_WORKER_STARTUP_TIMEOUT_SECONDS = 10.0
+# How long a KaTeX worker has to render a batch of formulas.
+KATEX_WORKER_TIMEOUT_SECONDS = 1.0
+# How many rendered formulas each process keeps, when using workers.
+KATEX_CACHE_SIZE = 1000
+
+
 def render_tex(tex: str, is_inline: bool = True) -> str | None:
     r"""Render a TeX string into HTML using KaTeX
 
@@ -33,43 +48,60 @@ def render_tex(tex: str, is_inline: bool = True) -> str | None:
                  (default True)
     """
 
+    if settings.KATEX_WORKER_PROCESSES:
+        return render_tex_batch([(tex, is_inline)])[0]
+    return render_tex_without_workers(tex, is_inline)
+
+
+def render_tex_without_workers(tex: str, is_inline: bool) -> str | None:
     if settings.KATEX_SERVER:
-        try:
-            resp = KatexSession().post(
-                # We explicitly disable the Smokescreen proxy for this
-                # call, since it intentionally connects to localhost.
-                # This is safe because the host is explicitly fixed, and
-                # the port is pulled from our own configuration.
-                f"http://localhost:{settings.KATEX_SERVER_PORT}/",
-                data={
-                    "content": tex,
-                    "is_display": "false" if is_inline else "true",
-                    "shared_secret": settings.SHARED_SECRET,
-                },
-                proxies={"http": ""},
-            )
-        except requests.exceptions.Timeout:
-            logging.warning("KaTeX rendering service timed out with %d byte long input", len(tex))
-            return None
-        except requests.exceptions.RequestException as e:
-            logging.warning("KaTeX rendering service failed: %s", type(e).__name__)
-            return None
+        return render_tex_with_server(tex, is_inline)
+    return render_tex_with_node(tex, is_inline)
 
-        if resp.status_code == 200:
-            return resp.content.decode().strip()
-        elif resp.status_code == 400:
-            return None
-        else:
-            logging.warning(
-                "KaTeX rendering service failed: (%s) %s", resp.status_code, resp.content.decode()
-            )
-            return None
 
-    katex_path = (
-        static_path("webpack-bundles/katex-cli.js")
+def render_tex_with_server(tex: str, is_inline: bool) -> str | None:
+    try:
+        resp = KatexSession().post(
+            # We explicitly disable the Smokescreen proxy for this
+            # call, since it intentionally connects to localhost.
+            # This is safe because the host is explicitly fixed, and
+            # the port is pulled from our own configuration.
+            f"http://localhost:{settings.KATEX_SERVER_PORT}/",
+            data={
+                "content": tex,
+                "is_display": "false" if is_inline else "true",
+                "shared_secret": settings.SHARED_SECRET,
+            },
+            proxies={"http": ""},
+        )
+    except requests.exceptions.Timeout:
+        logging.warning("KaTeX rendering service timed out with %d byte long input", len(tex))
+        return None
+    except requests.exceptions.RequestException as e:
+        logging.warning("KaTeX rendering service failed: %s", type(e).__name__)
+        return None
+
+    if resp.status_code == 200:
+        return resp.content.decode().strip()
+    elif resp.status_code == 400:
+        return None
+    else:
+        logging.warning(
+            "KaTeX rendering service failed: (%s) %s", resp.status_code, resp.content.decode()
+        )
+        return None
+
+
+def get_katex_script_path(name: str, dev_path: str) -> str:
+    return (
+        static_path(f"webpack-bundles/{name}.js")
         if settings.PRODUCTION
-        else os.path.join(settings.DEPLOY_ROOT, "node_modules/katex/cli.js")
+        else os.path.join(settings.DEPLOY_ROOT, dev_path)
     )
+
+
+def render_tex_with_node(tex: str, is_inline: bool) -> str | None:
+    katex_path = get_katex_script_path("katex-cli", "node_modules/katex/cli.js")
     if not os.path.isfile(katex_path):
         logging.error("Cannot find KaTeX for latex rendering!")
         return None
@@ -84,6 +116,185 @@ def render_tex(tex: str, is_inline: bool = True) -> str | None:
         return None
 
 
+def get_katex_worker_command() -> list[str] | None:
+    if settings.PRODUCTION:
+        katex_worker_path = static_path("webpack-bundles/katex_worker.js")
+        command = ["node", katex_worker_path]
+    else:
+        # In development, we run the TypeScript source directly,
+        # rather than requiring a webpack build of the server bundles.
+        katex_worker_path = os.path.join(settings.DEPLOY_ROOT, "web/server/katex_worker.ts")
+        ts_node_path = os.path.join(settings.DEPLOY_ROOT, "node_modules/.bin/ts-node")
+        if not os.path.isfile(ts_node_path):
+            return None
+        command = [ts_node_path, "--script-mode", "--transpile-only", katex_worker_path]
+    if not os.path.isfile(katex_worker_path):
+        return None
+    return command
+
+
+class KatexWorker:
+    """A long-running node process which renders batches of TeX with
+    KaTeX; see web/server/katex_worker.ts for the protocol."""
+
+    def __init__(self, command: list[str]) -> None:
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.ready = False
+
+    def render(self, formulas: list[tuple[str, bool]]) -> list[str | None]:
+        assert self.process.stdin is not None
+        request = orjson.dumps(
+            {
+                "formulas": [
+                    {"content": tex, "is_display": not is_inline} for tex, is_inline in formulas
+                ]
+            }
+        )
+        self.process.stdin.write(struct.pack(">I", len(request)) + request)
+
+        if not self.ready:
+            self.wait_until_ready()
+        results = self.read_frame(time.monotonic() + KATEX_WORKER_TIMEOUT_SECONDS)["results"]
+        if len(results) != len(formulas):
+            raise ValueError("KaTeX worker returned the wrong number of results")
+        return results
+
+    def wait_until_ready(self) -> None:
+        # Starting node and loading KaTeX can take much longer than
+        # rendering, so we don't count it against the first batch.
+        frame = self.read_frame(time.monotonic() + KATEX_WORKER_STARTUP_TIMEOUT_SECONDS)
+        if frame != {"ready": True}:
+            raise ValueError("KaTeX worker didn't report that it was ready")
+        self.ready = True
+
+    def read_frame(self, deadline: float) -> dict[str, Any]:
+        (length,) = struct.unpack(">I", self.read(4, deadline))
+        return orjson.loads(self.read(length, deadline))
+
+    def read(self, size: int, deadline: float) -> bytes:
+        stdout: IO[bytes] | None = self.process.stdout
+        assert stdout is not None
+        data = b""
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([stdout], [], [], remaining)[0]:
+                raise TimeoutError
+            chunk = stdout.read(size - len(data))
+            if not chunk:
+                raise EOFError("KaTeX worker exited")
+            data += chunk
+        return data
+
+    def stop(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class KatexWorkerPool:
+    """The KaTeX workers of this process, up to
+    settings.KATEX_WORKER_PROCESSES of them, which are started when
+    first needed.  A worker which fails, or takes too long, is
+    killed."""
+
+    def __init__(self) -> None:
+        self.idle_workers: list[KatexWorker] = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def render(self, formulas: list[tuple[str, bool]]) -> list[str | None] | None:
+        """Returns None if no worker could render the formulas."""
+        with self.lock:
+            if self.pid != os.getpid():
+                # We were forked; those are our parent's workers.
+                self.idle_workers = []
+                self.pid = os.getpid()
+            worker = self.idle_workers.pop() if self.idle_workers else None
+
+        if worker is None:
+            command = get_katex_worker_command()
+            if command is None:
+                return None
+            try:
+                worker = KatexWorker(command)
+            except OSError as e:
+                logging.warning("Failed to start KaTeX worker: %s", e)
+                return None
+
+        try:
+            results = worker.render(formulas)
+        except (OSError, EOFError, TimeoutError, ValueError) as e:
+            logging.warning(
+                "KaTeX worker failed with %d formulas: %s", len(formulas), type(e).__name__
+            )
+            worker.stop()
+            return None
+
+        with self.lock:
+            if len(self.idle_workers) < settings.KATEX_WORKER_PROCESSES:
+                self.idle_workers.append(worker)
+                worker = None
+        if worker is not None:
+            worker.stop()
+        return results
+
+    def stop(self) -> None:
+        with self.lock:
+            for worker in self.idle_workers:
+                worker.stop()
+            self.idle_workers = []
+
+
+katex_worker_pool = KatexWorkerPool()
+# Rendered formulas, keyed by a hash of the TeX and display mode.
+katex_cache: OrderedDict[str, str | None] = OrderedDict()
+katex_cache_lock = threading.Lock()
+
+
+def katex_cache_key(tex: str, is_inline: bool) -> str:
+    return hashlib.sha256(f"{is_inline}:{tex}".encode()).hexdigest()
+
+
+def render_tex_batch(formulas: list[tuple[str, bool]]) -> list[str | None]:
+    """Renders (tex, is_inline) pairs with the KaTeX workers, sending
+    all those we haven't rendered recently to a worker at once.  The
+    Markdown processor renders the formulas in a message one at a
+    time, so we render those it's likely to find first."""
+    keys = [katex_cache_key(tex, is_inline) for tex, is_inline in formulas]
+    rendered: dict[str, str | None] = {}
+    to_render: dict[str, tuple[str, bool]] = {}
+    with katex_cache_lock:
+        for key, formula in zip(keys, formulas, strict=True):
+            if key in katex_cache:
+                katex_cache.move_to_end(key)
+                rendered[key] = katex_cache[key]
+            else:
+                to_render[key] = formula
+
+    if to_render:
+        results = katex_worker_pool.render(list(to_render.values()))
+        if results is None:
+            # Fall back to rendering each formula as we would without
+            # workers, and don't cache the results, which may be
+            # failures to render.
+            for key, (tex, is_inline) in to_render.items():
+                rendered[key] = render_tex_without_workers(tex, is_inline)
+        else:
+            # A worker returns None only for TeX it can't render.
+            with katex_cache_lock:
+                for key, result in zip(to_render.keys(), results, strict=True):
+                    rendered[key] = katex_cache[key] = result
+                    if len(katex_cache) > KATEX_CACHE_SIZE:
+                        katex_cache.popitem(last=False)
+
+    return [rendered[key] for key in keys]
+
+
 def change_katex_to_raw_latex(fragment: lxml.html.HtmlElement) -> None:
     # Selecting the <span> elements with class 'katex'
     katex_spans = fragment.xpath("//span[@class='katex']")
@@ -1,4 +1,5 @@
-from collections.abc import Callable
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Sequence
 from datetime import datetime
 from typing import Any
 
@@ -10,7 +11,15 @@ from django.db.models.functions import Cast
 from zerver.lib.request import REQ
 from zerver.lib.types import EditHistoryEvent
 from zerver.lib.utils import assert_is_not_none
-from zerver.models import Message, Reaction, Stream, UserMessage, UserProfile
+from zerver.models import (
+    Message,
+    Reaction,
+    Recipient,
+    Stream,
+    StreamTopic,
+    UserMessage,
+    UserProfile,
+)
 
 # Only use these constants for events.
 ORIG_TOPIC = "orig_subject"
@@ -236,67 +245,244 @@ def generate_topic_history_from_db_rows(rows: list[tuple[str, int]]) -> list[dic
     return sorted(history, key=lambda x: -x["max_id"])
 
 
-def get_topic_history_for_public_stream(realm_id: int, recipient_id: int) -> list[dict[str, Any]]:
-    cursor = connection.cursor()
-    # Uses index: zerver_message_realm_recipient_subject
-    # Note that this is *case-sensitive*, so that we can display the
-    # most recently-used case (in generate_topic_history_from_db_rows)
-    query = """
-    SELECT
-        "zerver_message"."subject" as topic,
-        max("zerver_message".id) as max_message_id
-    FROM "zerver_message"
-    WHERE (
-        "zerver_message"."realm_id" = %s AND
-        "zerver_message"."recipient_id" = %s
-    )
-    GROUP BY (
-        "zerver_message"."subject"
-    )
-    ORDER BY max("zerver_message".id) DESC
+def get_topic_history_for_public_stream(
+    realm_id: int,
+    recipient_id: int,
+    *,
+    before_max_id: int | None = None,
+    num_topics: int | None = None,
+) -> list[dict[str, Any]]:
+    """Topic history for a stream whose history is visible to the
+    user, read from the StreamTopic summary table.
+
+    The optional before_max_id/num_topics arguments implement keyset
+    pagination: pass the max_id of the last topic of the previous
+    page as before_max_id to fetch the next page.
     """
-    cursor.execute(query, [realm_id, recipient_id])
-    rows = cursor.fetchall()
-    cursor.close()
+    # Uses index: zerver_streamtopic_recipient_last_message_id
+    query = StreamTopic.objects.filter(realm_id=realm_id, recipient_id=recipient_id)
+    if before_max_id is not None:
+        query = query.filter(last_message_id__lt=before_max_id)
+    query = query.order_by("-last_message_id")
+    if num_topics is not None:
+        query = query[:num_topics]
 
-    return generate_topic_history_from_db_rows(rows)
+    return [
+        dict(name=topic_name, max_id=last_message_id)
+        for topic_name, last_message_id in query.values_list("topic_name", "last_message_id")
+    ]
 
 
 def get_topic_history_for_stream(
-    user_profile: UserProfile, recipient_id: int, public_history: bool
+    user_profile: UserProfile,
+    recipient_id: int,
+    public_history: bool,
+    *,
+    before_max_id: int | None = None,
+    num_topics: int | None = None,
 ) -> list[dict[str, Any]]:
     if public_history:
-        return get_topic_history_for_public_stream(user_profile.realm_id, recipient_id)
+        return get_topic_history_for_public_stream(
+            user_profile.realm_id,
+            recipient_id,
+            before_max_id=before_max_id,
+            num_topics=num_topics,
+        )
 
     cursor = connection.cursor()
     # Uses index: zerver_message_realm_recipient_subject
-    # Note that this is *case-sensitive*, so that we can display the
-    # most recently-used case (in generate_topic_history_from_db_rows)
+    # We group case-insensitively, but select the most recently used
+    # casing of each topic name, so that each topic appears in exactly
+    # one page of results when paginating.
     query = """
     SELECT
-        "zerver_message"."subject" as topic,
+        (array_agg("zerver_message"."subject" ORDER BY "zerver_message".id DESC))[1] as topic,
         max("zerver_message".id) as max_message_id
     FROM "zerver_message"
     INNER JOIN "zerver_usermessage" ON (
         "zerver_usermessage"."message_id" = "zerver_message"."id"
     )
     WHERE (
-        "zerver_usermessage"."user_profile_id" = %s AND
-        "zerver_message"."realm_id" = %s AND
-        "zerver_message"."recipient_id" = %s
+        "zerver_usermessage"."user_profile_id" = %(user_profile_id)s AND
+        "zerver_message"."realm_id" = %(realm_id)s AND
+        "zerver_message"."recipient_id" = %(recipient_id)s
     )
     GROUP BY (
-        "zerver_message"."subject"
+        upper("zerver_message"."subject")
     )
+    """
+    params: dict[str, int] = dict(
+        user_profile_id=user_profile.id,
+        realm_id=user_profile.realm_id,
+        recipient_id=recipient_id,
+    )
+    if before_max_id is not None:
+        query += """
+    HAVING max("zerver_message".id) < %(before_max_id)s
+    """
+        params["before_max_id"] = before_max_id
+    query += """
     ORDER BY max("zerver_message".id) DESC
     """
-    cursor.execute(query, [user_profile.id, user_profile.realm_id, recipient_id])
+    if num_topics is not None:
+        query += """
+    LIMIT %(num_topics)s
+    """
+        params["num_topics"] = num_topics
+    cursor.execute(query, params)
     rows = cursor.fetchall()
     cursor.close()
 
     return generate_topic_history_from_db_rows(rows)
 
 
+# Recomputes the StreamTopic rows for a stream from the Message table.
+# The caller can restrict this to a single topic; the ON CONFLICT
+# clause relies on the zerver_streamtopic_recipient_upper_topic_uniq
+# unique index.
+REFRESH_STREAM_TOPICS_QUERY = """
+INSERT INTO zerver_streamtopic (
+    realm_id, recipient_id, topic_name, last_message_id, message_count, is_resolved
+)
+SELECT
+    realm_id,
+    recipient_id,
+    topic_name,
+    last_message_id,
+    message_count,
+    starts_with(topic_name, %(resolved_prefix)s)
+FROM (
+    SELECT
+        realm_id,
+        recipient_id,
+        (array_agg(subject ORDER BY id DESC))[1] AS topic_name,
+        max(id) AS last_message_id,
+        count(*) AS message_count
+    FROM zerver_message
+    WHERE realm_id = %(realm_id)s AND recipient_id = %(recipient_id)s {topic_condition}
+    GROUP BY realm_id, recipient_id, upper(subject)
+) AS topics
+ON CONFLICT (recipient_id, upper(topic_name)) DO UPDATE SET
+    topic_name = EXCLUDED.topic_name,
+    last_message_id = EXCLUDED.last_message_id,
+    message_count = EXCLUDED.message_count,
+    is_resolved = EXCLUDED.is_resolved
+"""
+
+
+def refresh_stream_topics(realm_id: int, recipient_id: int, topic_names: Iterable[str]) -> None:
+    """Recompute the StreamTopic summaries for the given topics of a
+    stream from the Message table; used after messages are moved
+    or deleted, where incremental bookkeeping would be error-prone.
+    Topics with no remaining messages have their summary removed.
+    """
+    seen: set[str] = set()
+    with connection.cursor() as cursor:
+        for topic_name in topic_names:
+            if topic_name.upper() in seen:
+                continue
+            seen.add(topic_name.upper())
+            # Uses index: zerver_message_realm_recipient_upper_subject
+            cursor.execute(
+                REFRESH_STREAM_TOPICS_QUERY.format(
+                    topic_condition="AND upper(subject) = upper(%(topic_name)s)"
+                ),
+                dict(
+                    realm_id=realm_id,
+                    recipient_id=recipient_id,
+                    topic_name=topic_name,
+                    resolved_prefix=RESOLVED_TOPIC_PREFIX,
+                ),
+            )
+            if cursor.rowcount == 0:
+                StreamTopic.objects.filter(
+                    recipient_id=recipient_id, topic_name__iexact=topic_name
+                ).delete()
+
+
+def rebuild_stream_topics(realm_id: int, recipient_id: int) -> None:
+    """Recompute all StreamTopic summaries for a stream; used for
+    data imports and other bulk operations that bypass
+    do_send_messages."""
+    StreamTopic.objects.filter(recipient_id=recipient_id).delete()
+    with connection.cursor() as cursor:
+        # Uses index: zerver_message_realm_recipient_upper_subject
+        cursor.execute(
+            REFRESH_STREAM_TOPICS_QUERY.format(topic_condition=""),
+            dict(
+                realm_id=realm_id,
+                recipient_id=recipient_id,
+                resolved_prefix=RESOLVED_TOPIC_PREFIX,
+            ),
+        )
+
+
+def update_stream_topics_for_new_messages(messages: Sequence[Message]) -> None:
+    """Incrementally update the StreamTopic summaries for newly sent
+    stream messages.  Concurrent sends to the same topic are safe,
+    since each update is a single atomic upsert."""
+    topics: dict[tuple[int, int, str], list[Message]] = defaultdict(list)
+    for message in messages:
+        if message.recipient.type != Recipient.STREAM:
+            continue
+        topic_name = message.topic_name()
+        topics[(message.realm_id, message.recipient_id, topic_name.upper())].append(message)
+
+    with connection.cursor() as cursor:
+        for (realm_id, recipient_id, ignored), topic_messages in topics.items():
+            last_message = max(topic_messages, key=lambda message: message.id)
+            topic_name = last_message.topic_name()
+            cursor.execute(
+                """
+                INSERT INTO zerver_streamtopic (
+                    realm_id, recipient_id, topic_name, last_message_id, message_count, is_resolved
+                )
+                VALUES (
+                    %(realm_id)s, %(recipient_id)s, %(topic_name)s,
+                    %(last_message_id)s, %(message_count)s, %(is_resolved)s
+                )
+                ON CONFLICT (recipient_id, upper(topic_name)) DO UPDATE SET
+                    topic_name = CASE
+                        WHEN EXCLUDED.last_message_id > zerver_streamtopic.last_message_id
+                        THEN EXCLUDED.topic_name ELSE zerver_streamtopic.topic_name
+                    END,
+                    is_resolved = CASE
+                        WHEN EXCLUDED.last_message_id > zerver_streamtopic.last_message_id
+                        THEN EXCLUDED.is_resolved ELSE zerver_streamtopic.is_resolved
+                    END,
+                    last_message_id = GREATEST(
+                        zerver_streamtopic.last_message_id, EXCLUDED.last_message_id
+                    ),
+                    message_count = zerver_streamtopic.message_count + EXCLUDED.message_count
+                """,
+                dict(
+                    realm_id=realm_id,
+                    recipient_id=recipient_id,
+                    topic_name=topic_name,
+                    last_message_id=last_message.id,
+                    message_count=len(topic_messages),
+                    is_resolved=topic_name.startswith(RESOLVED_TOPIC_PREFIX),
+                ),
+            )
+
+
+def get_stream_topics_for_message_ids(
+    message_ids: Iterable[int],
+) -> dict[tuple[int, int], set[str]]:
+    """Returns the topics containing the given stream messages, as a
+    map from (realm_id, recipient_id) to topic names, in the format
+    needed to call refresh_stream_topics after modifying them."""
+    topics: dict[tuple[int, int], set[str]] = defaultdict(set)
+    rows = (
+        Message.objects.filter(id__in=message_ids, recipient__type=Recipient.STREAM)
+        .values_list("realm_id", "recipient_id", "subject")
+        .distinct()
+    )
+    for realm_id, recipient_id, topic_name in rows:
+        topics[(realm_id, recipient_id)].add(topic_name)
+    return topics
+
+
 def get_topic_resolution_and_bare_name(stored_name: str) -> tuple[bool, str]:
     """
     Resolved topics are denoted only by a title change, not by a boolean toggle in a database column. This
@@ -203,6 +203,7 @@ class SubscriptionStreamDict(TypedDict):
     stream_post_policy: int
     stream_weekly_traffic: int | None
     subscribers: NotRequired[list[int]]
+    subscriber_count: NotRequired[int]
     wildcard_mentions_notify: bool | None
 
 
@@ -223,6 +224,7 @@ class NeverSubscribedStreamDict(TypedDict):
     stream_post_policy: int
     stream_weekly_traffic: int | None
     subscribers: NotRequired[list[int]]
+    subscriber_count: NotRequired[int]
 
 
 class DefaultStreamDict(TypedDict):
@@ -1,8 +1,12 @@
+import logging
 import re
-from collections.abc import Callable
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from re import Match
-from typing import Any
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 
 import magic
 import requests
@@ -10,7 +14,12 @@ from django.conf import settings
 from django.utils.encoding import smart_str
 
 from version import ZULIP_VERSION
-from zerver.lib.cache import cache_with_key, preview_url_cache_key
+from zerver.lib.cache import (
+    cache_get,
+    cache_set,
+    preview_url_cache_key,
+    preview_url_failure_cache_key,
+)
 from zerver.lib.outgoing_http import OutgoingSession
 from zerver.lib.pysa import mark_sanitized
 from zerver.lib.url_preview.oembed import get_oembed_data
@@ -36,6 +45,17 @@ ZULIP_URL_PREVIEW_USER_AGENT = (
 HEADERS = {"User-Agent": ZULIP_URL_PREVIEW_USER_AGENT}
 TIMEOUT = 15
 
+# How long we cache the previews of URLs; how long we cache that a URL
+# has no preview, which may change as the page does; and how long we
+# remember a network error fetching a URL, which is usually temporary.
+PREVIEW_CACHE_TIMEOUT_SECONDS = 30 * 24 * 3600
+PREVIEW_MISSING_CACHE_TIMEOUT_SECONDS = 24 * 3600
+PREVIEW_FAILURE_CACHE_TIMEOUT_SECONDS = 10 * 60
+
+# How many URLs we fetch at once, in total and from any one host.
+PREVIEW_FETCH_THREADS = 8
+PREVIEW_FETCH_THREADS_PER_HOST = 2
+
 
 class PreviewSession(OutgoingSession):
     def __init__(self) -> None:
@@ -72,19 +92,34 @@ def valid_content_type(url: str) -> bool:
     return content_type.startswith("text/html")
 
 
-def catch_network_errors(func: Callable[..., Any]) -> Callable[..., Any]:
-    def wrapper(*args: Any, **kwargs: Any) -> Any:
-        try:
-            return func(*args, **kwargs)
-        except requests.exceptions.RequestException:
-            pass
+def get_link_embed_data(url: str, maxwidth: int = 640, maxheight: int = 480) -> UrlEmbedData | None:
+    cached_data = cache_get(preview_url_cache_key(url))
+    if cached_data is not None:
+        return cached_data[0]
+    if cache_get(preview_url_failure_cache_key(url)) is not None:
+        return None
 
-    return wrapper
+    try:
+        data = fetch_link_embed_data(url, maxwidth, maxheight)
+    except requests.exceptions.RequestException:
+        cache_set(
+            preview_url_failure_cache_key(url),
+            True,
+            timeout=PREVIEW_FAILURE_CACHE_TIMEOUT_SECONDS,
+        )
+        return None
 
+    cache_set(
+        preview_url_cache_key(url),
+        data,
+        timeout=PREVIEW_CACHE_TIMEOUT_SECONDS
+        if data is not None
+        else PREVIEW_MISSING_CACHE_TIMEOUT_SECONDS,
+    )
+    return data
 
-@catch_network_errors
-@cache_with_key(preview_url_cache_key)
-def get_link_embed_data(url: str, maxwidth: int = 640, maxheight: int = 480) -> UrlEmbedData | None:
+
+def fetch_link_embed_data(url: str, maxwidth: int, maxheight: int) -> UrlEmbedData | None:
     if not is_link(url):
         return None
 
@@ -113,3 +148,101 @@ def get_link_embed_data(url: str, maxwidth: int = 640, maxheight: int = 480) ->
     if data.image:
         data.image = urljoin(response.url, data.image)
     return data
+
+
+class LinkEmbedDataFetcher:
+    """Fetches the previews of URLs on a pool of threads, so that one
+    slow site doesn't hold up the others, with at most
+    `threads_per_host` requests to any one host at once.  A URL which
+    is already being fetched, for any caller, isn't fetched again.
+
+    Each host's URLs wait in a queue of their own until one of its
+    slots is free, rather than in the pool, so no thread ever waits
+    for a host while other hosts' URLs could be fetched."""
+
+    def __init__(self, threads: int, threads_per_host: int) -> None:
+        self.threads = threads
+        self.threads_per_host = threads_per_host
+        # Started on first use, so that it's not shared across forks.
+        self.executor: ThreadPoolExecutor | None = None
+        self.lock = threading.Lock()
+        self.in_flight: dict[str, Future[UrlEmbedData | None]] = {}
+        self.queued_urls: dict[str, deque[str]] = defaultdict(deque)
+        self.host_fetch_counts: Counter[str] = Counter()
+
+    def fetch(self, urls: Iterable[str]) -> dict[str, UrlEmbedData | None]:
+        return {url: future.result() for url, future in self.submit(urls).items()}
+
+    def submit(self, urls: Iterable[str]) -> dict[str, Future[UrlEmbedData | None]]:
+        """Starts fetching the URLs, returning a future for each."""
+        futures: dict[str, Future[UrlEmbedData | None]] = {}
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="url_preview"
+                )
+            hosts = set()
+            for url in urls:
+                if url in futures:
+                    continue
+                future = self.in_flight.get(url)
+                if future is None:
+                    future = Future()
+                    self.in_flight[url] = future
+                    host = url_host(url)
+                    self.queued_urls[host].append(url)
+                    hosts.add(host)
+                futures[url] = future
+            for host in hosts:
+                self.start_fetches(host)
+        return futures
+
+    def start_fetches(self, host: str) -> None:
+        # Called with self.lock held.
+        assert self.executor is not None
+        queued_urls = self.queued_urls[host]
+        while queued_urls and self.host_fetch_counts[host] < self.threads_per_host:
+            self.host_fetch_counts[host] += 1
+            self.executor.submit(self.fetch_url, host, queued_urls.popleft())
+        if not queued_urls:
+            del self.queued_urls[host]
+
+    def fetch_url(self, host: str, url: str) -> None:
+        future = self.in_flight[url]
+        try:
+            start_time = time.time()
+            data = get_link_embed_data(url)
+            logging.info(
+                "Time spent on get_link_embed_data for %s: %s", url, time.time() - start_time
+            )
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(data)
+        finally:
+            with self.lock:
+                del self.in_flight[url]
+                self.host_fetch_counts[host] -= 1
+                if not self.host_fetch_counts[host]:
+                    del self.host_fetch_counts[host]
+                self.start_fetches(host)
+
+
+def url_host(url: str) -> str:
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+
+
+link_embed_data_fetcher = LinkEmbedDataFetcher(
+    PREVIEW_FETCH_THREADS, PREVIEW_FETCH_THREADS_PER_HOST
+)
+
+
+def get_link_embed_data_batch(urls: Iterable[str]) -> dict[str, UrlEmbedData | None]:
+    return link_embed_data_fetcher.fetch(urls)
+
+
+def start_link_embed_data_fetches(urls: Iterable[str]) -> dict[str, Future[UrlEmbedData | None]]:
+    return link_embed_data_fetcher.submit(urls)
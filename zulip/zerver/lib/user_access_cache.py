@@ -0,0 +1,553 @@
+# Redis-backed cache of which users each guest can access, for
+# organizations which restrict guests' access to other users (see
+# can_access_all_users_group), used when
+# settings.USER_ACCESS_CACHE_IN_REDIS is enabled.
+#
+# A guest can access the users they share a channel or group direct
+# message conversation with, and those they've exchanged direct
+# messages with.  Computing that requires scanning the subscribers of
+# all of the guest's subscriptions and their direct message history,
+# which is expensive to do on every message fetch, presence update
+# and event we send.  So, the first time we need a guest's accessible
+# users, we compute them and store them in Redis, as a set of user
+# IDs for each of those three ways of gaining access; the sets include
+# deactivated users, since whether those are accessible depends on
+# the caller.
+#
+# Afterwards, the sets are maintained incrementally: new subscriptions
+# and direct messages add users to the sets of the guests involved.
+# When access may be lost (unsubscribing, deactivating a channel,
+# deleting messages), we just discard the affected sets, since a user
+# may still be accessible in another way, and they are recomputed the
+# next time they're needed.
+#
+# Each user's sets have a version counter, which every change to them
+# increments, so that sets computed from data that was changed
+# concurrently aren't stored.  We track the users whose sets are
+# stored or being computed, and mark a user as such in the same Redis
+# transaction in which we read their version, before reading the
+# database.  Changes only read the tracked users once the database
+# transaction commits, so either a change sees the user and
+# increments their version, or the computation sees the change.
+#
+# Redis isn't rolled back with the database, so we only add users to
+# the sets once the transaction commits; until then, we compute access
+# in the realm from the database, which includes the changes the
+# transaction hasn't committed yet.  Sets are discarded both
+# immediately and after the transaction commits, so that a set
+# recomputed in between from data the transaction hadn't committed
+# yet is corrected.  For the same reason, sets computed inside a
+# transaction are only stored once it commits.  The sets expire after
+# a day, which bounds the effects of any change we don't track, like
+# messages being archived by the retention policy.
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Collection, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from zerver.lib import redis_utils
+from zerver.lib.redis_utils import get_redis_client
+from zerver.models import Message, Recipient, Subscription, UserProfile
+from zerver.models.users import active_non_guest_user_ids, active_user_ids
+
+USER_ACCESS_KEY_PREFIX = "zulip:user_access:{realm_id}"
+# The user IDs of the realm's users whose sets are stored or being
+# computed.
+LOADED_USERS_KEY_FORMAT = USER_ACCESS_KEY_PREFIX + ":loaded"
+USER_KEY_FORMAT = USER_ACCESS_KEY_PREFIX + ":{user_id}:{kind}"
+
+STREAMS = "streams"
+DIRECT_MESSAGE_GROUPS = "direct_message_groups"
+DIRECT_MESSAGES = "direct_messages"
+USER_SET_KINDS = [STREAMS, DIRECT_MESSAGE_GROUPS, DIRECT_MESSAGES]
+RECIPIENT_TYPE_KINDS = {
+    Recipient.STREAM: STREAMS,
+    Recipient.DIRECT_MESSAGE_GROUP: DIRECT_MESSAGE_GROUPS,
+}
+
+USER_ACCESS_EXPIRY_SECONDS = 24 * 3600
+
+redis_client = get_redis_client()
+
+# KEYS: the realm's loaded users key, followed by the user's version
+# key, marker key and three sets.
+# ARGV: the user's version the sets were computed at, the user ID, the
+# expiry, the number of members of the first two sets, followed by
+# the members of all three sets.
+#
+# Returns 1 if the sets were stored, or 0 if the user's version
+# changed, in which case the sets may be out of date.
+store_user_access_script = redis_client.register_script("""
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[4], KEYS[5], KEYS[6])
+local first = 6
+local counts = {tonumber(ARGV[4]), tonumber(ARGV[5]), #ARGV - 5 - ARGV[4] - ARGV[5]}
+for i = 1, 3 do
+    for j = first, first + counts[i] - 1, 1000 do
+        redis.call("SADD", KEYS[3 + i], unpack(ARGV, j, math.min(j + 999, first + counts[i] - 1)))
+    end
+    first = first + counts[i]
+    redis.call("EXPIRE", KEYS[3 + i], ARGV[3])
+end
+redis.call("SET", KEYS[3], "1", "EX", ARGV[3])
+redis.call("SADD", KEYS[1], ARGV[2])
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+return 1
+""")
+
+# KEYS: a (version key, marker key, set) triple for each user whose
+# set we're adding to.
+# ARGV: the expiry, followed by the user IDs to add.
+add_user_access_script = redis_client.register_script("""
+for i = 1, #KEYS, 3 do
+    redis.call("INCR", KEYS[i])
+    redis.call("EXPIRE", KEYS[i], ARGV[1])
+    if redis.call("EXISTS", KEYS[i + 1]) == 1 then
+        for j = 2, #ARGV, 1000 do
+            redis.call("SADD", KEYS[i + 2], unpack(ARGV, j, math.min(j + 999, #ARGV)))
+        end
+    end
+end
+""")
+
+# KEYS: a (marker key, three sets) quadruple for each guest.
+# ARGV: the target user ID.
+#
+# Returns, for each guest, 0 if their sets aren't stored, 1 if they
+# don't contain the target user, or 2 if they do.
+check_user_access_script = redis_client.register_script("""
+local results = {}
+for i = 1, #KEYS, 4 do
+    local result = 0
+    if redis.call("EXISTS", KEYS[i]) == 1 then
+        result = 1
+        for j = i + 1, i + 3 do
+            if redis.call("SISMEMBER", KEYS[j], ARGV[1]) == 1 then
+                result = 2
+                break
+            end
+        end
+    end
+    results[#results + 1] = result
+end
+return results
+""")
+
+# The realms with additions to the sets which are pending until the
+# current transaction commits.
+pending_additions = threading.local()
+
+
+@dataclass
+class UserAccessSets:
+    stream_user_ids: set[int] = field(default_factory=set)
+    direct_message_group_user_ids: set[int] = field(default_factory=set)
+    direct_message_user_ids: set[int] = field(default_factory=set)
+
+    def get_accessible_user_ids(
+        self, active_user_ids: Collection[int], *, include_deactivated_users: bool
+    ) -> set[int]:
+        """Users sharing a channel with the user are only accessible
+        while active; users sharing a group direct message conversation
+        or a direct message conversation with them are only accessible
+        while active if include_deactivated_users is False."""
+        accessible_user_ids = {
+            user_id for user_id in self.stream_user_ids if user_id in active_user_ids
+        }
+        other_user_ids = self.direct_message_group_user_ids | self.direct_message_user_ids
+        if include_deactivated_users:
+            accessible_user_ids |= other_user_ids
+        else:
+            accessible_user_ids |= {
+                user_id for user_id in other_user_ids if user_id in active_user_ids
+            }
+        return accessible_user_ids
+
+    def can_access_user(self, user_id: int, active_user_ids: Collection[int]) -> bool:
+        """Matches check_can_access_user: users sharing a channel or
+        group direct message conversation with the user are only
+        accessible while active."""
+        if user_id in self.direct_message_user_ids:
+            return True
+        return user_id in active_user_ids and (
+            user_id in self.stream_user_ids or user_id in self.direct_message_group_user_ids
+        )
+
+
+def loaded_users_key(realm_id: int) -> str:
+    return redis_utils.REDIS_KEY_PREFIX + LOADED_USERS_KEY_FORMAT.format(realm_id=realm_id)
+
+
+def user_key(realm_id: int, user_id: int, kind: str) -> str:
+    return redis_utils.REDIS_KEY_PREFIX + USER_KEY_FORMAT.format(
+        realm_id=realm_id, user_id=user_id, kind=kind
+    )
+
+
+def compute_user_access_sets(user_profiles: list[UserProfile]) -> dict[int, UserAccessSets]:
+    """Computes the users' access sets from the database, in a fixed
+    number of queries.  The user profiles must be in the same realm."""
+    user_ids = [user_profile.id for user_profile in user_profiles]
+    access_sets = {user_id: UserAccessSets() for user_id in user_ids}
+    if not user_profiles:
+        return access_sets
+    realm_id = user_profiles[0].realm_id
+
+    subscriptions = Subscription.objects.filter(
+        user_profile_id__in=user_ids,
+        active=True,
+        recipient__type__in=list(RECIPIENT_TYPE_KINDS),
+    ).values_list("user_profile_id", "recipient_id", "recipient__type")
+    recipient_user_ids: dict[int, list[tuple[int, int]]] = defaultdict(list)
+    for user_id, recipient_id, recipient_type in subscriptions:
+        recipient_user_ids[recipient_id].append((user_id, recipient_type))
+
+    for recipient_id, subscriber_id in Subscription.objects.filter(
+        recipient_id__in=list(recipient_user_ids), active=True
+    ).values_list("recipient_id", "user_profile_id"):
+        for user_id, recipient_type in recipient_user_ids[recipient_id]:
+            if subscriber_id == user_id:
+                continue
+            access_set = access_sets[user_id]
+            if recipient_type == Recipient.STREAM:
+                access_set.stream_user_ids.add(subscriber_id)
+            else:
+                access_set.direct_message_group_user_ids.add(subscriber_id)
+
+    direct_message_query = Message.objects.filter(
+        realm_id=realm_id, recipient__type=Recipient.PERSONAL
+    )
+    for sender_id, recipient_user_id in (
+        direct_message_query.filter(sender_id__in=user_ids)
+        .values_list("sender_id", "recipient__type_id")
+        .order_by()
+        .distinct()
+    ):
+        access_sets[sender_id].direct_message_user_ids.add(recipient_user_id)
+    for sender_id, recipient_user_id in (
+        direct_message_query.filter(
+            recipient_id__in=[user_profile.recipient_id for user_profile in user_profiles]
+        )
+        .values_list("sender_id", "recipient__type_id")
+        .order_by()
+        .distinct()
+    ):
+        access_sets[recipient_user_id].direct_message_user_ids.add(sender_id)
+
+    for user_id, access_set in access_sets.items():
+        access_set.direct_message_user_ids.discard(user_id)
+    return access_sets
+
+
+def parse_user_access_sets(results: list[Any]) -> UserAccessSets | None:
+    """Parses the results of the EXISTS and SMEMBERS commands for a
+    user's marker key and sets, in that order."""
+    loaded, stream_user_ids, direct_message_group_user_ids, direct_message_user_ids = results
+    if not loaded:
+        return None
+    return UserAccessSets(
+        stream_user_ids={int(user_id) for user_id in stream_user_ids},
+        direct_message_group_user_ids={int(user_id) for user_id in direct_message_group_user_ids},
+        direct_message_user_ids={int(user_id) for user_id in direct_message_user_ids},
+    )
+
+
+def get_pending_realm_ids() -> set[int]:
+    """Returns the realms with additions pending until the current
+    transaction commits; outside of a transaction, there are none,
+    even if a transaction with additions was rolled back."""
+    if (
+        not hasattr(pending_additions, "realm_ids")
+        or not transaction.get_connection().in_atomic_block
+    ):
+        pending_additions.realm_ids = set()
+    return pending_additions.realm_ids
+
+
+def store_user_access_sets(
+    realm_id: int, versions: dict[int, bytes | None], access_sets: dict[int, UserAccessSets]
+) -> None:
+    """The sets may have been computed from changes the current
+    transaction hasn't committed, so we only store them once it
+    commits; if any sets changed since, the version check in
+    store_user_access_script drops them."""
+
+    def store() -> None:
+        with redis_client.pipeline(transaction=False) as pipeline:
+            for user_id, access_set in access_sets.items():
+                store_user_access_script(
+                    keys=[
+                        loaded_users_key(realm_id),
+                        user_key(realm_id, user_id, "version"),
+                        user_key(realm_id, user_id, "loaded"),
+                        *(user_key(realm_id, user_id, kind) for kind in USER_SET_KINDS),
+                    ],
+                    args=[
+                        versions[user_id] or b"0",
+                        user_id,
+                        USER_ACCESS_EXPIRY_SECONDS,
+                        len(access_set.stream_user_ids),
+                        len(access_set.direct_message_group_user_ids),
+                        *access_set.stream_user_ids,
+                        *access_set.direct_message_group_user_ids,
+                        *access_set.direct_message_user_ids,
+                    ],
+                    client=pipeline,
+                )
+            pipeline.execute()
+
+    transaction.on_commit(store)
+
+
+def get_user_access_sets(user_profiles: list[UserProfile]) -> dict[int, UserAccessSets]:
+    """Returns the access sets of the given users, who must be in the
+    same realm, computing and storing any which aren't stored yet."""
+    if not user_profiles:
+        return {}
+    realm_id = user_profiles[0].realm_id
+    if realm_id in get_pending_realm_ids():
+        return compute_user_access_sets(user_profiles)
+
+    with redis_client.pipeline() as pipeline:
+        # Mark the users as being computed, in the same transaction as
+        # reading their versions; see the comment at the top.
+        pipeline.sadd(
+            loaded_users_key(realm_id), *(user_profile.id for user_profile in user_profiles)
+        )
+        pipeline.expire(loaded_users_key(realm_id), USER_ACCESS_EXPIRY_SECONDS)
+        for user_profile in user_profiles:
+            pipeline.get(user_key(realm_id, user_profile.id, "version"))
+            pipeline.exists(user_key(realm_id, user_profile.id, "loaded"))
+            for kind in USER_SET_KINDS:
+                pipeline.smembers(user_key(realm_id, user_profile.id, kind))
+        results = pipeline.execute()[2:]
+
+    access_sets: dict[int, UserAccessSets] = {}
+    versions: dict[int, bytes | None] = {}
+    missing_user_profiles = []
+    for i, user_profile in enumerate(user_profiles):
+        versions[user_profile.id] = results[5 * i]
+        access_set = parse_user_access_sets(results[5 * i + 1 : 5 * i + 5])
+        if access_set is None:
+            missing_user_profiles.append(user_profile)
+        else:
+            access_sets[user_profile.id] = access_set
+
+    if missing_user_profiles:
+        computed_access_sets = compute_user_access_sets(missing_user_profiles)
+        store_user_access_sets(realm_id, versions, computed_access_sets)
+        access_sets.update(computed_access_sets)
+    return access_sets
+
+
+def get_user_access_set(user_profile: UserProfile) -> UserAccessSets:
+    return get_user_access_sets([user_profile])[user_profile.id]
+
+
+def get_guest_user_ids_who_can_access_user(target_user: UserProfile) -> set[int]:
+    """Returns the active guests in the target user's realm who can
+    access them.  Since access is symmetric, these are the guests whose
+    sets contain the target user; for guests whose sets aren't stored,
+    we use the target user's sets, computed from the database, rather
+    than computing each of theirs."""
+    realm_id = target_user.realm_id
+    guest_user_ids = sorted(
+        set(active_user_ids(realm_id)) - set(active_non_guest_user_ids(realm_id))
+    )
+    if realm_id in get_pending_realm_ids():
+        results = [0] * len(guest_user_ids)
+    elif guest_user_ids:
+        results = check_user_access_script(
+            keys=[
+                user_key(realm_id, user_id, kind)
+                for user_id in guest_user_ids
+                for kind in ["loaded", *USER_SET_KINDS]
+            ],
+            args=[target_user.id],
+        )
+    else:
+        results = []
+
+    user_ids = {
+        user_id for user_id, result in zip(guest_user_ids, results, strict=True) if result == 2
+    }
+    missing_user_ids = {
+        user_id for user_id, result in zip(guest_user_ids, results, strict=True) if result == 0
+    }
+    if missing_user_ids:
+        target_access_set = compute_user_access_sets([target_user])[target_user.id]
+        user_ids.update(
+            missing_user_ids
+            & (
+                target_access_set.stream_user_ids
+                | target_access_set.direct_message_group_user_ids
+                | target_access_set.direct_message_user_ids
+            )
+        )
+    return user_ids
+
+
+# Users to add to some of the sets: the users whose sets to add to,
+# the kind of set, and the users to add.
+UserAccessAddition = tuple[Collection[int], str, Collection[int]]
+
+
+def run_now_and_on_commit(callback: Callable[[], None]) -> None:
+    if not settings.USER_ACCESS_CACHE_IN_REDIS:
+        return
+    callback()
+    transaction.on_commit(callback)
+
+
+def get_loaded_user_ids(realm_id: int) -> set[int]:
+    return {int(user_id) for user_id in redis_client.smembers(loaded_users_key(realm_id))}
+
+
+def add_to_user_access_sets(
+    realm_id: int, user_ids: Iterable[int], kind: str, added_user_ids: Collection[int]
+) -> None:
+    keys: list[str] = []
+    for user_id in user_ids:
+        keys += [
+            user_key(realm_id, user_id, "version"),
+            user_key(realm_id, user_id, "loaded"),
+            user_key(realm_id, user_id, kind),
+        ]
+    if keys and added_user_ids:
+        add_user_access_script(keys=keys, args=[USER_ACCESS_EXPIRY_SECONDS, *added_user_ids])
+
+
+def discard_user_access_sets(realm_id: int, user_ids: Collection[int]) -> None:
+    if not user_ids:
+        return
+    with redis_client.pipeline() as pipeline:
+        for user_id in user_ids:
+            pipeline.incr(user_key(realm_id, user_id, "version"))
+            pipeline.expire(user_key(realm_id, user_id, "version"), USER_ACCESS_EXPIRY_SECONDS)
+        pipeline.delete(
+            *(
+                user_key(realm_id, user_id, kind)
+                for user_id in user_ids
+                for kind in ["loaded", *USER_SET_KINDS]
+            )
+        )
+        pipeline.srem(loaded_users_key(realm_id), *user_ids)
+        pipeline.execute()
+
+
+def add_on_commit(realm_id: int, get_additions: Callable[[], list[UserAccessAddition]]) -> None:
+    """Adds users to the stored sets once the current transaction
+    commits; until then, access in the realm is computed from the
+    database."""
+    if not settings.USER_ACCESS_CACHE_IN_REDIS:
+        return
+    if transaction.get_connection().in_atomic_block:
+        get_pending_realm_ids().add(realm_id)
+
+    def add() -> None:
+        get_pending_realm_ids().discard(realm_id)
+        for user_ids, kind, added_user_ids in get_additions():
+            add_to_user_access_sets(realm_id, user_ids, kind, added_user_ids)
+
+    transaction.on_commit(add)
+
+
+def update_user_access_for_new_subscriptions(
+    realm_id: int, recipient_type: int, new_subscriber_ids: dict[int, Collection[int]]
+) -> None:
+    """Called when users are subscribed to channels or group direct
+    message conversations; new_subscriber_ids maps the recipient IDs
+    to the IDs of the users who were subscribed to them."""
+
+    def get_additions() -> list[UserAccessAddition]:
+        loaded_user_ids = get_loaded_user_ids(realm_id)
+        if not loaded_user_ids:
+            return []
+
+        # We only need the complete list of subscribers if a new
+        # subscriber has a stored set.
+        recipient_ids_with_loaded_new_subscribers = [
+            recipient_id
+            for recipient_id, user_ids in new_subscriber_ids.items()
+            if loaded_user_ids.intersection(user_ids)
+        ]
+        subscriptions = Subscription.objects.filter(
+            Q(user_profile_id__in=loaded_user_ids)
+            | Q(recipient_id__in=recipient_ids_with_loaded_new_subscribers),
+            recipient_id__in=list(new_subscriber_ids),
+            active=True,
+        )
+        subscriber_ids: dict[int, set[int]] = defaultdict(set)
+        for recipient_id, user_id in subscriptions.values_list("recipient_id", "user_profile_id"):
+            subscriber_ids[recipient_id].add(user_id)
+
+        kind = RECIPIENT_TYPE_KINDS[recipient_type]
+        additions: list[UserAccessAddition] = []
+        for recipient_id, user_ids in new_subscriber_ids.items():
+            loaded_subscriber_ids = loaded_user_ids & subscriber_ids[recipient_id]
+            additions.append((loaded_subscriber_ids.difference(user_ids), kind, user_ids))
+            additions.extend(
+                ([user_id], kind, subscriber_ids[recipient_id] - {user_id})
+                for user_id in loaded_user_ids.intersection(user_ids)
+            )
+        return additions
+
+    add_on_commit(realm_id, get_additions)
+
+
+def update_user_access_for_removed_subscriptions(
+    realm_id: int, recipient_ids: Collection[int], user_ids: Collection[int]
+) -> None:
+    """Called when users are unsubscribed from channels, or channels
+    are deactivated."""
+
+    def update() -> None:
+        loaded_user_ids = get_loaded_user_ids(realm_id)
+        affected_user_ids = loaded_user_ids.intersection(user_ids)
+        if loaded_user_ids:
+            affected_user_ids.update(
+                Subscription.objects.filter(
+                    recipient_id__in=recipient_ids,
+                    user_profile_id__in=loaded_user_ids,
+                    active=True,
+                ).values_list("user_profile_id", flat=True)
+            )
+        discard_user_access_sets(realm_id, affected_user_ids)
+
+    run_now_and_on_commit(update)
+
+
+def update_user_access_for_direct_message(
+    realm_id: int, sender_id: int, recipient_user_id: int
+) -> None:
+    if sender_id == recipient_user_id:
+        return
+
+    add_on_commit(
+        realm_id,
+        lambda: [
+            ([sender_id], DIRECT_MESSAGES, [recipient_user_id]),
+            ([recipient_user_id], DIRECT_MESSAGES, [sender_id]),
+        ],
+    )
+
+
+def discard_user_access_for_users(realm_id: int, user_ids: Collection[int]) -> None:
+    """Called when the users may have lost access to other users in
+    ways we don't track incrementally, like their direct messages
+    being deleted."""
+    run_now_and_on_commit(lambda: discard_user_access_sets(realm_id, user_ids))
+
+
+def clear_realm_user_access(realm_id: int) -> None:
+    def clear() -> None:
+        discard_user_access_sets(realm_id, get_loaded_user_ids(realm_id))
+
+    run_now_and_on_commit(clear)
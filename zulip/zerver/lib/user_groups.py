@@ -5,10 +5,9 @@ from typing import TypedDict
 
 from django.conf import settings
 from django.db import connection, transaction
-from django.db.models import F, Prefetch, QuerySet
+from django.db.models import Prefetch, QuerySet
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
-from django_cte import With
 from django_stubs_ext import ValuesQuerySet
 from psycopg2.sql import SQL, Literal
 
@@ -25,6 +24,7 @@ from zerver.models import (
     RealmAuditLog,
     Stream,
     UserGroup,
+    UserGroupClosure,
     UserGroupMembership,
     UserProfile,
 )
@@ -431,51 +431,44 @@ def get_direct_memberships_of_users(user_group: UserGroup, members: list[UserPro
     )
 
 
-# These recursive lookups use standard PostgreSQL common table
-# expression (CTE) queries. These queries use the django-cte library,
-# because upstream Django does not yet support CTE.
-#
-# https://www.postgresql.org/docs/current/queries-with.html
-# https://pypi.org/project/django-cte/
-# https://code.djangoproject.com/ticket/28919
+# These recursive lookups use the UserGroupClosure table, which
+# database triggers keep up to date with the transitive closure of
+# GroupGroupMembership, so that they are simple indexed queries no
+# matter how deeply groups are nested.  UserGroupClosure includes a
+# row pairing each group with itself.
 
 
-def get_recursive_subgroups(user_group: UserGroup) -> QuerySet[UserGroup]:
-    cte = With.recursive(
-        lambda cte: UserGroup.objects.filter(id=user_group.id)
-        .values(group_id=F("id"))
-        .union(
-            cte.join(NamedUserGroup, direct_supergroups=cte.col.group_id).values(group_id=F("id"))
-        )
+def get_recursive_subgroup_ids(user_group: UserGroup) -> ValuesQuerySet[UserGroupClosure, int]:
+    return UserGroupClosure.objects.filter(supergroup_id=user_group.id).values_list(
+        "subgroup_id", flat=True
     )
-    return cte.join(UserGroup, id=cte.col.group_id).with_cte(cte)
+
+
+def get_recursive_subgroups(user_group: UserGroup) -> QuerySet[UserGroup]:
+    return UserGroup.objects.filter(id__in=get_recursive_subgroup_ids(user_group))
 
 
 def get_recursive_strict_subgroups(user_group: UserGroup) -> QuerySet[NamedUserGroup]:
     # Same as get_recursive_subgroups but does not include the
     # user_group passed.
-    direct_subgroup_ids = user_group.direct_subgroups.all().values("id")
-    cte = With.recursive(
-        lambda cte: NamedUserGroup.objects.filter(id__in=direct_subgroup_ids)
-        .values(group_id=F("id"))
-        .union(
-            cte.join(NamedUserGroup, direct_supergroups=cte.col.group_id).values(group_id=F("id"))
-        )
+    return NamedUserGroup.objects.filter(
+        id__in=get_recursive_subgroup_ids(user_group).exclude(subgroup_id=user_group.id)
     )
-    return cte.join(NamedUserGroup, id=cte.col.group_id).with_cte(cte)
 
 
 def get_recursive_group_members(user_group: UserGroup) -> QuerySet[UserProfile]:
-    return UserProfile.objects.filter(direct_groups__in=get_recursive_subgroups(user_group))
+    return UserProfile.objects.filter(direct_groups__in=get_recursive_subgroup_ids(user_group))
 
 
 def get_recursive_membership_groups(user_profile: UserProfile) -> QuerySet[UserGroup]:
-    cte = With.recursive(
-        lambda cte: user_profile.direct_groups.values(group_id=F("id")).union(
-            cte.join(UserGroup, direct_subgroups=cte.col.group_id).values(group_id=F("id"))
+    direct_group_ids = UserGroupMembership.objects.filter(user_profile=user_profile).values(
+        "user_group_id"
+    )
+    return UserGroup.objects.filter(
+        id__in=UserGroupClosure.objects.filter(subgroup_id__in=direct_group_ids).values(
+            "supergroup_id"
         )
     )
-    return cte.join(UserGroup, id=cte.col.group_id).with_cte(cte)
 
 
 def is_user_in_group(
@@ -484,7 +477,9 @@ def is_user_in_group(
     if direct_member_only:
         return get_user_group_direct_members(user_group=user_group).filter(id=user.id).exists()
 
-    return get_recursive_group_members(user_group=user_group).filter(id=user.id).exists()
+    return UserGroupMembership.objects.filter(
+        user_profile_id=user.id, user_group_id__in=get_recursive_subgroup_ids(user_group)
+    ).exists()
 
 
 def is_any_user_in_group(
@@ -493,7 +488,9 @@ def is_any_user_in_group(
     if direct_member_only:
         return get_user_group_direct_members(user_group=user_group).filter(id__in=user_ids).exists()
 
-    return get_recursive_group_members(user_group=user_group).filter(id__in=user_ids).exists()
+    return UserGroupMembership.objects.filter(
+        user_profile_id__in=user_ids, user_group_id__in=get_recursive_subgroup_ids(user_group)
+    ).exists()
 
 
 def get_user_group_member_ids(
@@ -519,15 +516,12 @@ def get_subgroup_ids(user_group: UserGroup, *, direct_subgroup_only: bool = Fals
 def get_recursive_subgroups_for_groups(
     user_group_ids: Iterable[int], realm: Realm
 ) -> QuerySet[NamedUserGroup]:
-    cte = With.recursive(
-        lambda cte: NamedUserGroup.objects.filter(id__in=user_group_ids, realm=realm)
-        .values(group_id=F("id"))
-        .union(
-            cte.join(NamedUserGroup, direct_supergroups=cte.col.group_id).values(group_id=F("id"))
-        )
+    return NamedUserGroup.objects.filter(
+        realm=realm,
+        id__in=UserGroupClosure.objects.filter(supergroup_id__in=user_group_ids).values(
+            "subgroup_id"
+        ),
     )
-    recursive_subgroups = cte.join(NamedUserGroup, id=cte.col.group_id).with_cte(cte)
-    return recursive_subgroups
 
 
 def get_role_based_system_groups_dict(realm: Realm) -> dict[str, NamedUserGroup]:
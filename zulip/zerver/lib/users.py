@@ -16,7 +16,12 @@ from typing_extensions import NotRequired
 from zulip_bots.custom_exceptions import ConfigValidationError
 
 from zerver.lib.avatar import avatar_url, get_avatar_field, get_avatar_for_inaccessible_user
-from zerver.lib.cache import cache_with_key, get_cross_realm_dicts_key
+from zerver.lib.cache import (
+    cache_with_key,
+    get_cross_realm_dicts_key,
+    realm_custom_profile_field_values_cache_key,
+    realm_user_columns_cache_key,
+)
 from zerver.lib.exceptions import (
     JsonableError,
     OrganizationAdministratorRequiredError,
@@ -25,6 +30,7 @@ from zerver.lib.exceptions import (
 from zerver.lib.timestamp import timestamp_to_datetime
 from zerver.lib.timezone import canonicalize_timezone
 from zerver.lib.types import ProfileDataElementUpdateDict, ProfileDataElementValue, RawUserDict
+from zerver.lib.user_access_cache import get_guest_user_ids_who_can_access_user, get_user_access_set
 from zerver.lib.user_groups import is_user_in_group
 from zerver.models import (
     CustomProfileField,
@@ -605,6 +611,11 @@ def check_can_access_user(
     if target_user.id == user_profile.id:
         return True
 
+    if settings.USER_ACCESS_CACHE_IN_REDIS:
+        return get_user_access_set(user_profile).can_access_user(
+            target_user.id, active_user_ids(user_profile.realm_id)
+        )
+
     # These include Subscription objects for streams as well as group DMs.
     subscribed_recipient_ids = Subscription.objects.filter(
         user_profile=user_profile,
@@ -652,6 +663,16 @@ def get_inaccessible_user_ids(
     if not target_human_user_ids:
         return set()
 
+    if settings.USER_ACCESS_CACHE_IN_REDIS:
+        access_set = get_user_access_set(acting_user)
+        realm_active_user_ids = set(active_user_ids(acting_user.realm_id))
+        return {
+            user_id
+            for user_id in target_human_user_ids
+            if user_id != acting_user.id
+            and not access_set.can_access_user(user_id, realm_active_user_ids)
+        }
+
     subscribed_recipient_ids = Subscription.objects.filter(
         user_profile=acting_user,
         active=True,
@@ -706,6 +727,13 @@ def get_user_ids_who_can_access_user(target_user: UserProfile) -> list[int]:
 
     active_non_guest_user_ids_in_realm = active_non_guest_user_ids(realm.id)
 
+    if settings.USER_ACCESS_CACHE_IN_REDIS:
+        return list(
+            {target_user.id}
+            | set(active_non_guest_user_ids_in_realm)
+            | get_guest_user_ids_who_can_access_user(target_user)
+        )
+
     users_sharing_any_subscription = get_subscribers_of_target_user_subscriptions([target_user])
     users_involved_in_dms_dict = get_users_involved_in_dms_with_target_users([target_user], realm)
 
@@ -915,6 +943,13 @@ def get_data_for_inaccessible_user(realm: Realm, user_id: int) -> APIUserDict:
 def get_accessible_user_ids(
     realm: Realm, user_profile: UserProfile, include_deactivated_users: bool = False
 ) -> list[int]:
+    if settings.USER_ACCESS_CACHE_IN_REDIS:
+        access_set = get_user_access_set(user_profile)
+        accessible_user_ids = access_set.get_accessible_user_ids(
+            set(active_user_ids(realm.id)), include_deactivated_users=include_deactivated_users
+        )
+        return list(accessible_user_ids | {user_profile.id})
+
     subscribers_dict_of_target_user_subscriptions = get_subscribers_of_target_user_subscriptions(
         [user_profile], include_deactivated_users_for_dm_groups=include_deactivated_users
     )
@@ -977,6 +1012,15 @@ def get_custom_profile_field_values(
     return profiles_by_user_id
 
 
+@cache_with_key(realm_custom_profile_field_values_cache_key, timeout=3600 * 24 * 7)
+def get_realm_custom_profile_field_values(realm_id: int) -> dict[int, dict[str, Any]]:
+    return dict(
+        get_custom_profile_field_values(
+            CustomProfileFieldValue.objects.select_related("field").filter(field__realm_id=realm_id)
+        )
+    )
+
+
 def get_users_for_api(
     realm: Realm,
     acting_user: UserProfile | None,
@@ -1003,13 +1047,14 @@ def get_users_for_api(
         accessible_user_dicts, inaccessible_user_dicts = get_user_dicts_in_realm(realm, acting_user)
 
     if include_custom_profile_fields:
-        base_query = CustomProfileFieldValue.objects.select_related("field")
-        # TODO: Consider optimizing this query away with caching.
         if target_user is not None:
-            custom_profile_field_values = base_query.filter(user_profile=target_user)
+            profiles_by_user_id = get_custom_profile_field_values(
+                CustomProfileFieldValue.objects.select_related("field").filter(
+                    user_profile=target_user
+                )
+            )
         else:
-            custom_profile_field_values = base_query.filter(field__realm_id=realm.id)
-        profiles_by_user_id = get_custom_profile_field_values(custom_profile_field_values)
+            profiles_by_user_id = get_realm_custom_profile_field_values(realm.id)
 
     result = {}
     for row in accessible_user_dicts:
@@ -1038,6 +1083,208 @@ def get_users_for_api(
     return result
 
 
+# The fields of each user in the columnar format for realm_users, used
+# by clients with the user_list_columnar capability.  is_admin,
+# is_owner and is_guest are left out, since they're implied by role.
+USER_COLUMNS = [
+    "user_id",
+    "email",
+    "full_name",
+    "role",
+    "is_bot",
+    "bot_type",
+    "bot_owner_id",
+    "is_system_bot",
+    "is_billing_admin",
+    "timezone",
+    "date_joined",
+    "avatar_version",
+    "avatar_url",
+    "delivery_email",
+    "profile_data",
+]
+
+# As in format_user_row, we don't send these to spectators.
+SPECTATOR_HIDDEN_USER_COLUMNS = ["is_billing_admin", "timezone", "profile_data"]
+
+
+def get_user_columns(spectator: bool) -> list[str]:
+    if spectator:
+        return [column for column in USER_COLUMNS if column not in SPECTATOR_HIDDEN_USER_COLUMNS]
+    return USER_COLUMNS
+
+
+def intern_timezones(timezones: Iterable[str]) -> tuple[list[int], list[str]]:
+    indexes: dict[str, int] = {}
+    column = [indexes.setdefault(timezone, len(indexes)) for timezone in timezones]
+    return column, list(indexes)
+
+
+def user_dicts_to_columns(user_dicts: Sequence[APIUserDict], spectator: bool) -> dict[str, Any]:
+    """Converts users in the format returned by get_users_for_api into
+    the columnar format: a list of values for each field, in the same
+    order as user_dicts, with timezones replaced by their index in
+    the `timezones` list.  An avatar_url of False means that the
+    client should fetch the avatar using GET /avatar/{user_id}.
+    """
+    columns: dict[str, Any] = {}
+    for column in get_user_columns(spectator):
+        default = False if column in ["avatar_url", "is_system_bot"] else None
+        columns[column] = [user_dict.get(column, default) for user_dict in user_dicts]
+    columns["timezones"] = []
+    if not spectator:
+        columns["timezone"], columns["timezones"] = intern_timezones(columns["timezone"])
+    return columns
+
+
+def user_columns_to_dicts(columns: Mapping[str, Any]) -> dict[int, APIUserDict]:
+    """The inverse of user_dicts_to_columns, for the rare cases where
+    we need to apply events to data fetched in the columnar format."""
+    user_dicts: dict[int, APIUserDict] = {}
+    for i, user_id in enumerate(columns["user_id"]):
+        row = {column: values[i] for column, values in columns.items() if column != "timezones"}
+        role = row["role"]
+        user_dict = APIUserDict(
+            email=row["email"],
+            user_id=user_id,
+            avatar_version=row["avatar_version"],
+            is_admin=is_administrator_role(role),
+            is_owner=role == UserProfile.ROLE_REALM_OWNER,
+            is_guest=role == UserProfile.ROLE_GUEST,
+            role=role,
+            is_bot=row["is_bot"],
+            full_name=row["full_name"],
+            is_active=row["is_active"],
+            date_joined=row["date_joined"],
+            delivery_email=row["delivery_email"],
+        )
+        if "is_billing_admin" in row:
+            user_dict["is_billing_admin"] = row["is_billing_admin"]
+        if "timezone" in row:
+            user_dict["timezone"] = columns["timezones"][row["timezone"]]
+        if row["avatar_url"] is not False:
+            user_dict["avatar_url"] = row["avatar_url"]
+        if row["is_bot"]:
+            user_dict["bot_type"] = row["bot_type"]
+            if row["is_system_bot"]:
+                user_dict["is_system_bot"] = True
+            user_dict["bot_owner_id"] = row["bot_owner_id"]
+        elif row.get("profile_data") is not None:
+            user_dict["profile_data"] = row["profile_data"]
+        user_dicts[user_id] = user_dict
+    return user_dicts
+
+
+@cache_with_key(realm_user_columns_cache_key, timeout=3600 * 24 * 7)
+def get_realm_user_columns(realm_id: int) -> dict[str, list[Any]]:
+    """The data about all the users in the realm which doesn't depend
+    on who is asking for it, in the columnar format.  This lets us
+    avoid building a dictionary for each user in large realms; see
+    get_realm_user_columns_for_api."""
+    rows = sorted(get_realm_user_dicts(realm_id), key=itemgetter("id"))
+    profiles_by_user_id = get_realm_custom_profile_field_values(realm_id)
+    timezone_column, timezones = intern_timezones(
+        canonicalize_timezone(row["timezone"]) for row in rows
+    )
+    return {
+        "user_id": [row["id"] for row in rows],
+        "email": [row["email"] for row in rows],
+        "full_name": [row["full_name"] for row in rows],
+        "role": [row["role"] for row in rows],
+        "is_bot": [row["is_bot"] for row in rows],
+        "bot_type": [row["bot_type"] if row["is_bot"] else None for row in rows],
+        "bot_owner_id": [row["bot_owner_id"] if row["is_bot"] else None for row in rows],
+        "is_system_bot": [row["is_bot"] and is_cross_realm_bot_email(row["email"]) for row in rows],
+        "is_billing_admin": [row["is_billing_admin"] for row in rows],
+        "timezone": timezone_column,
+        "timezones": timezones,
+        "date_joined": [row["date_joined"].isoformat(timespec="minutes") for row in rows],
+        "avatar_version": [row["avatar_version"] for row in rows],
+        "avatar_source": [row["avatar_source"] for row in rows],
+        "avatar_url": [
+            get_avatar_field(
+                user_id=row["id"],
+                realm_id=realm_id,
+                email=row["delivery_email"],
+                avatar_source=row["avatar_source"],
+                avatar_version=row["avatar_version"],
+                medium=False,
+                client_gravatar=False,
+            )
+            for row in rows
+        ],
+        "long_term_idle": [row["long_term_idle"] for row in rows],
+        "delivery_email": [row["delivery_email"] for row in rows],
+        "email_address_visibility": [row["email_address_visibility"] for row in rows],
+        "profile_data": [
+            None if row["is_bot"] else profiles_by_user_id.get(row["id"], {}) for row in rows
+        ],
+        "is_active": [row["is_active"] for row in rows],
+    }
+
+
+def get_realm_user_columns_for_api(
+    realm: Realm,
+    acting_user: UserProfile | None,
+    *,
+    client_gravatar: bool,
+    user_avatar_url_field_optional: bool,
+) -> dict[str, Any]:
+    """Equivalent to user_dicts_to_columns applied to the result of
+    get_users_for_api for all the users in the realm (along with an
+    is_active column), but computed from the cached columns of
+    get_realm_user_columns.  Must only be used if acting_user can
+    access all users in the realm.
+    """
+    assert check_user_can_access_all_users(acting_user)
+    spectator = acting_user is None
+    realm_columns = get_realm_user_columns(realm.id)
+    columns: dict[str, Any] = {
+        column: realm_columns[column] for column in [*get_user_columns(spectator), "is_active"]
+    }
+    columns["timezones"] = [] if spectator else realm_columns["timezones"]
+
+    if spectator:
+        # Only send day level precision date_joined data to spectators.
+        columns["date_joined"] = [date_joined[:10] for date_joined in columns["date_joined"]]
+        columns["delivery_email"] = [None] * len(columns["user_id"])
+    else:
+        assert acting_user is not None
+        columns["delivery_email"] = [
+            delivery_email
+            if can_access_delivery_email(acting_user, user_id, email_address_visibility)
+            else None
+            for user_id, delivery_email, email_address_visibility in zip(
+                columns["user_id"],
+                realm_columns["delivery_email"],
+                realm_columns["email_address_visibility"],
+                strict=True,
+            )
+        ]
+
+    # See format_user_row for details on these avatar optimizations.
+    columns["avatar_url"] = [
+        False
+        if user_avatar_url_field_optional and long_term_idle
+        else None
+        if (
+            client_gravatar
+            and settings.ENABLE_GRAVATAR
+            and avatar_source == UserProfile.AVATAR_FROM_GRAVATAR
+            and email_address_visibility == UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE
+        )
+        else avatar_url
+        for avatar_url, avatar_source, long_term_idle, email_address_visibility in zip(
+            realm_columns["avatar_url"],
+            realm_columns["avatar_source"],
+            realm_columns["long_term_idle"],
+            realm_columns["email_address_visibility"],
+            strict=True,
+        )
+    ]
+    return columns
+
+
 def get_active_bots_owned_by_user(user_profile: UserProfile) -> QuerySet[UserProfile]:
     return UserProfile.objects.filter(is_bot=True, is_active=True, bot_owner=user_profile)
 
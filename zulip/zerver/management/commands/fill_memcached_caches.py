@@ -3,7 +3,12 @@ from typing import Any
 
 from typing_extensions import override
 
-from zerver.lib.cache_helpers import cache_fillers, fill_remote_cache
+from zerver.lib.cache_helpers import (
+    cache_fillers,
+    fill_remote_cache,
+    fill_remote_message_cache,
+    queue_message_cache_warming,
+)
 from zerver.lib.management import ZulipBaseCommand
 
 
@@ -11,14 +16,31 @@ class Command(ZulipBaseCommand):
     @override
     def add_arguments(self, parser: ArgumentParser) -> None:
         parser.add_argument(
-            "--cache", help="Populate one specific cache", choices=cache_fillers.keys()
+            "--cache",
+            help="Populate one specific cache",
+            choices=[*cache_fillers.keys(), "message"],
+        )
+        parser.add_argument(
+            "--processes",
+            default=4,
+            type=int,
+            help="Number of processes to use when populating the message cache",
         )
 
     @override
-    def handle(self, *args: Any, **options: str | None) -> None:
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["cache"] == "message":
+            fill_remote_message_cache(options["processes"])
+            return
+
         if options["cache"] is not None:
             fill_remote_cache(options["cache"])
             return
 
         for cache in cache_fillers:
             fill_remote_cache(cache)
+
+        # Warming the message cache takes longer, so we leave it to
+        # the deferred_work queue processor, rather than delaying
+        # server restarts.
+        queue_message_cache_warming()
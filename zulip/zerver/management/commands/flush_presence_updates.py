@@ -0,0 +1,44 @@
+import logging
+import time
+from typing import Any
+
+from django.conf import settings
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.presence_store import clear_presence_store, flush_presence_updates
+
+logger = logging.getLogger(__name__)
+
+
+class Command(ZulipBaseCommand):
+    help = """Write presence updates stored in Redis to the database.
+
+Only does anything if PRESENCE_UPDATES_IN_REDIS is enabled; see
+zerver/lib/presence_store.py.  If it is disabled, any presence data
+left in Redis is written to the database and removed once, when the
+command starts.
+
+This management command is run via supervisor.
+
+Usage: ./manage.py flush_presence_updates
+"""
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not settings.PRESENCE_UPDATES_IN_REDIS:
+            clear_presence_store()
+
+        try:
+            while True:
+                start = time.monotonic()
+                count = flush_presence_updates()
+                if count:
+                    logger.info(
+                        "Flushed %d presence updates (%dms)",
+                        count,
+                        (time.monotonic() - start) * 1000,
+                    )
+                time.sleep(settings.PRESENCE_REDIS_FLUSH_INTERVAL_SECS)
+        except KeyboardInterrupt:
+            pass
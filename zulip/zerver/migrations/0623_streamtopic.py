@@ -0,0 +1,54 @@
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("zerver", "0622_backfill_imageattachment_again"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StreamTopic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("topic_name", models.CharField(max_length=60)),
+                ("last_message_id", models.IntegerField()),
+                ("message_count", models.IntegerField(default=0)),
+                ("is_resolved", models.BooleanField(default=False)),
+                (
+                    "realm",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="zerver.realm"
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="zerver.recipient"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["recipient", "-last_message_id"],
+                        name="zerver_streamtopic_recipient_last_message_id",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("recipient"),
+                        django.db.models.functions.text.Upper("topic_name"),
+                        name="zerver_streamtopic_recipient_upper_topic_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
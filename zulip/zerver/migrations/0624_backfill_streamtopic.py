@@ -0,0 +1,78 @@
+from django.db import connection, migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+
+RESOLVED_TOPIC_PREFIX = "✔ "
+
+# Equivalent to zerver.lib.topic.rebuild_stream_topics, inlined so
+# that this migration is not affected by future changes to that code.
+BACKFILL_QUERY = """
+INSERT INTO zerver_streamtopic (
+    realm_id, recipient_id, topic_name, last_message_id, message_count, is_resolved
+)
+SELECT
+    realm_id,
+    recipient_id,
+    topic_name,
+    last_message_id,
+    message_count,
+    starts_with(topic_name, %(resolved_prefix)s)
+FROM (
+    SELECT
+        realm_id,
+        recipient_id,
+        (array_agg(subject ORDER BY id DESC))[1] AS topic_name,
+        max(id) AS last_message_id,
+        count(*) AS message_count
+    FROM zerver_message
+    WHERE realm_id = %(realm_id)s AND recipient_id = %(recipient_id)s
+    GROUP BY realm_id, recipient_id, upper(subject)
+) AS topics
+ON CONFLICT (recipient_id, upper(topic_name)) DO UPDATE SET
+    topic_name = EXCLUDED.topic_name,
+    last_message_id = EXCLUDED.last_message_id,
+    message_count = EXCLUDED.message_count,
+    is_resolved = EXCLUDED.is_resolved
+"""
+
+
+def backfill_streamtopic(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Stream = apps.get_model("zerver", "Stream")
+
+    # We process one stream per transaction, so that this migration
+    # doesn't hold locks on the whole Message table.
+    for realm_id, recipient_id in (
+        Stream.objects.exclude(recipient_id=None)
+        .order_by("id")
+        .values_list("realm_id", "recipient_id")
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                BACKFILL_QUERY,
+                dict(
+                    realm_id=realm_id,
+                    recipient_id=recipient_id,
+                    resolved_prefix=RESOLVED_TOPIC_PREFIX,
+                ),
+            )
+
+
+def clear_streamtopic(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    StreamTopic = apps.get_model("zerver", "StreamTopic")
+    StreamTopic.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("zerver", "0623_streamtopic"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_streamtopic,
+            reverse_code=clear_streamtopic,
+            elidable=True,
+        ),
+    ]
@@ -0,0 +1,164 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The triggers which maintain zerver_usergroupclosure.  Every user
+# group has a row pairing it with itself; when a GroupGroupMembership
+# row changes, we recompute the rows for the changed supergroup and
+# all of its recursive supergroups, which are the only groups whose
+# recursive subgroups can have changed.
+#
+# Changes to subgroups lock the groups involved (see
+# lock_subgroups_with_respect_to_supergroup), but not their
+# supergroups, so two transactions changing unrelated groups can
+# recompute the rows of a shared supergroup concurrently.  Each would
+# recompute them from a snapshot without the other's change, leaving
+# stale rows behind, so the trigger first takes a transaction-level
+# advisory lock for the realm, which serializes changes to the
+# subgroups in a realm; every statement after it sees the changes
+# committed by the transactions it waited for.
+CREATE_TRIGGERS_SQL = """
+CREATE FUNCTION zerver_usergroup_closure_insert_trigger_function() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO zerver_usergroupclosure (supergroup_id, subgroup_id)
+    VALUES (NEW.id, NEW.id)
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER zerver_usergroup_closure_insert_trigger
+AFTER INSERT ON zerver_usergroup
+FOR EACH ROW
+EXECUTE PROCEDURE zerver_usergroup_closure_insert_trigger_function();
+
+CREATE FUNCTION zerver_usergroup_closure_delete_trigger_function() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM zerver_usergroupclosure
+    WHERE supergroup_id = OLD.id OR subgroup_id = OLD.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER zerver_usergroup_closure_delete_trigger
+AFTER DELETE ON zerver_usergroup
+FOR EACH ROW
+EXECUTE PROCEDURE zerver_usergroup_closure_delete_trigger_function();
+
+CREATE FUNCTION zerver_groupgroupmembership_closure_trigger_function() RETURNS trigger AS $$
+DECLARE
+    changed_group_ids integer[];
+    affected_group_ids integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed_group_ids := ARRAY[NEW.supergroup_id];
+    ELSIF TG_OP = 'DELETE' THEN
+        changed_group_ids := ARRAY[OLD.supergroup_id];
+    ELSE
+        changed_group_ids := ARRAY[OLD.supergroup_id, NEW.supergroup_id];
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('zerver_usergroupclosure'), realm_id)
+    FROM zerver_usergroup
+    WHERE id = ANY(changed_group_ids)
+    LIMIT 1;
+
+    affected_group_ids := ARRAY(
+        SELECT DISTINCT closure.supergroup_id
+        FROM zerver_usergroupclosure AS closure
+        WHERE closure.subgroup_id = ANY(changed_group_ids)
+    );
+
+    DELETE FROM zerver_usergroupclosure
+    WHERE supergroup_id = ANY(affected_group_ids);
+
+    INSERT INTO zerver_usergroupclosure (supergroup_id, subgroup_id)
+    WITH RECURSIVE recursive_subgroups(supergroup_id, subgroup_id) AS (
+        SELECT group_id, group_id FROM unnest(affected_group_ids) AS group_id
+        UNION
+        SELECT recursive_subgroups.supergroup_id, membership.subgroup_id
+        FROM recursive_subgroups
+        JOIN zerver_groupgroupmembership AS membership
+        ON membership.supergroup_id = recursive_subgroups.subgroup_id
+    )
+    SELECT supergroup_id, subgroup_id FROM recursive_subgroups
+    ON CONFLICT DO NOTHING;
+
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER zerver_groupgroupmembership_closure_trigger
+AFTER INSERT OR UPDATE OR DELETE ON zerver_groupgroupmembership
+FOR EACH ROW
+EXECUTE PROCEDURE zerver_groupgroupmembership_closure_trigger_function();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER zerver_groupgroupmembership_closure_trigger ON zerver_groupgroupmembership;
+DROP FUNCTION zerver_groupgroupmembership_closure_trigger_function();
+DROP TRIGGER zerver_usergroup_closure_delete_trigger ON zerver_usergroup;
+DROP FUNCTION zerver_usergroup_closure_delete_trigger_function();
+DROP TRIGGER zerver_usergroup_closure_insert_trigger ON zerver_usergroup;
+DROP FUNCTION zerver_usergroup_closure_insert_trigger_function();
+"""
+
+BACKFILL_SQL = """
+INSERT INTO zerver_usergroupclosure (supergroup_id, subgroup_id)
+WITH RECURSIVE recursive_subgroups(supergroup_id, subgroup_id) AS (
+    SELECT id, id FROM zerver_usergroup
+    UNION
+    SELECT recursive_subgroups.supergroup_id, membership.subgroup_id
+    FROM recursive_subgroups
+    JOIN zerver_groupgroupmembership AS membership
+    ON membership.supergroup_id = recursive_subgroups.subgroup_id
+)
+SELECT supergroup_id, subgroup_id FROM recursive_subgroups
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("zerver", "0624_backfill_streamtopic"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserGroupClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "supergroup",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="zerver.usergroup",
+                    ),
+                ),
+                (
+                    "subgroup",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="zerver.usergroup",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("supergroup", "subgroup"), name="zerver_usergroupclosure_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, reverse_sql=DROP_TRIGGERS_SQL),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop, elidable=True),
+    ]
@@ -10,6 +10,7 @@ from zerver.models.drafts import Draft as Draft
 from zerver.models.groups import GroupGroupMembership as GroupGroupMembership
 from zerver.models.groups import NamedUserGroup as NamedUserGroup
 from zerver.models.groups import UserGroup as UserGroup
+from zerver.models.groups import UserGroupClosure as UserGroupClosure
 from zerver.models.groups import UserGroupMembership as UserGroupMembership
 from zerver.models.linkifiers import RealmFilter as RealmFilter
 from zerver.models.messages import AbstractAttachment as AbstractAttachment
@@ -61,6 +62,7 @@ from zerver.models.scheduled_jobs import (
 from zerver.models.streams import DefaultStream as DefaultStream
 from zerver.models.streams import DefaultStreamGroup as DefaultStreamGroup
 from zerver.models.streams import Stream as Stream
+from zerver.models.streams import StreamTopic as StreamTopic
 from zerver.models.streams import Subscription as Subscription
 from zerver.models.user_activity import UserActivity as UserActivity
 from zerver.models.user_activity import UserActivityInterval as UserActivityInterval
@@ -3,8 +3,8 @@ from django.db.models import CASCADE
 from django.db.models.signals import post_delete, post_save
 
 from zerver.lib.cache import (
+    bump_realm_alert_words_generation,
     cache_delete,
-    realm_alert_words_automaton_cache_key,
     realm_alert_words_cache_key,
 )
 from zerver.models.realms import Realm
@@ -27,7 +27,7 @@ class AlertWord(models.Model):
 
 def flush_realm_alert_words(realm_id: int) -> None:
     cache_delete(realm_alert_words_cache_key(realm_id))
-    cache_delete(realm_alert_words_automaton_cache_key(realm_id))
+    bump_realm_alert_words_generation(realm_id)
 
 
 def flush_alert_word(*, instance: AlertWord, **kwargs: object) -> None:
@@ -3,13 +3,15 @@ from typing import Any
 
 import orjson
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.db.models import CASCADE, QuerySet
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy
 from django_stubs_ext import StrPromise
 from typing_extensions import override
 
+from zerver.lib.cache import flush_realm_custom_profile_field_values
 from zerver.lib.types import (
     ExtendedFieldElement,
     ExtendedValidator,
@@ -198,3 +200,29 @@ class CustomProfileFieldValue(models.Model):
     @override
     def __str__(self) -> str:
         return f"{self.user_profile!r} {self.field!r} {self.value}"
+
+
+def flush_custom_profile_field(*, instance: CustomProfileField, **kwargs: object) -> None:
+    # Users' values for a field are deleted along with it, and how
+    # they're formatted depends on its type.
+    #
+    # We flush once the transaction commits, so that a reader can't
+    # cache the old values again in the meantime.
+    realm_id = instance.realm_id
+    transaction.on_commit(lambda: flush_realm_custom_profile_field_values(realm_id))
+
+
+post_save.connect(flush_custom_profile_field, sender=CustomProfileField)
+post_delete.connect(flush_custom_profile_field, sender=CustomProfileField)
+
+
+def flush_custom_profile_field_value(
+    *, instance: CustomProfileFieldValue, **kwargs: object
+) -> None:
+    # Values don't record their realm, but their field does.
+    realm_id = instance.field.realm_id
+    transaction.on_commit(lambda: flush_realm_custom_profile_field_values(realm_id))
+
+
+post_save.connect(flush_custom_profile_field_value, sender=CustomProfileFieldValue)
+post_delete.connect(flush_custom_profile_field_value, sender=CustomProfileFieldValue)
@@ -121,3 +121,30 @@ class GroupGroupMembership(models.Model):
                 fields=["supergroup", "subgroup"], name="zerver_groupgroupmembership_uniq"
             )
         ]
+
+
+class UserGroupClosure(models.Model):
+    """The transitive closure of GroupGroupMembership: a row for each
+    user group and each of its recursive subgroups, including a row
+    pairing each group with itself.  This turns the recursive lookups
+    needed by group-based permission checks into indexed queries.
+
+    This table is maintained entirely by database triggers on the
+    UserGroup and GroupGroupMembership tables (see migration 0625), so
+    application code should never write to it.  For that reason, it
+    uses foreign keys without database constraints; the triggers
+    remove a group's rows when it is deleted."""
+
+    supergroup = models.ForeignKey(
+        UserGroup, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    subgroup = models.ForeignKey(
+        UserGroup, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["supergroup", "subgroup"], name="zerver_usergroupclosure_uniq"
+            )
+        ]
@@ -10,7 +10,7 @@ from django.utils.translation import gettext as _
 from typing_extensions import override
 
 from zerver.lib import cache
-from zerver.lib.cache import cache_delete, cache_with_key
+from zerver.lib.cache import bump_realm_state_generation, cache_delete, cache_with_key
 from zerver.lib.per_request_cache import (
     flush_per_request_cache,
     return_same_value_during_entire_request,
@@ -129,6 +129,7 @@ def flush_linkifiers(*, instance: RealmFilter, **kwargs: object) -> None:
     realm_id = instance.realm_id
     cache_delete(get_linkifiers_cache_key(realm_id))
     flush_per_request_cache("linkifiers_for_realm")
+    bump_realm_state_generation(realm_id, ["realm_linkifiers"])
 
 
 post_save.connect(flush_linkifiers, sender=RealmFilter)
@@ -160,6 +160,7 @@ def get_or_create_direct_message_group(id_list: list[int]) -> DirectMessageGroup
     DirectMessageGroup object does not yet exist, it will be
     transparently created.
     """
+    from zerver.lib.user_access_cache import update_user_access_for_new_subscriptions
     from zerver.models import Subscription, UserProfile
 
     direct_message_group_hash = get_direct_message_group_hash(id_list)
@@ -173,15 +174,26 @@ def get_or_create_direct_message_group(id_list: list[int]) -> DirectMessageGroup
             )
             direct_message_group.recipient = recipient
             direct_message_group.save(update_fields=["recipient"])
+            users = (
+                UserProfile.objects.filter(id__in=id_list)
+                .distinct("id")
+                .values_list("id", "is_active", "realm_id")
+            )
             subs_to_create = [
                 Subscription(
                     recipient=recipient,
                     user_profile_id=user_profile_id,
                     is_user_active=is_active,
                 )
-                for user_profile_id, is_active in UserProfile.objects.filter(id__in=id_list)
-                .distinct("id")
-                .values_list("id", "is_active")
+                for user_profile_id, is_active, realm_id in users
             ]
             Subscription.objects.bulk_create(subs_to_create)
+            # Cross-realm bots may be in a different realm from the
+            # other users.
+            for realm_id in {realm_id for user_profile_id, is_active, realm_id in users}:
+                update_user_access_for_new_subscriptions(
+                    realm_id,
+                    Recipient.DIRECT_MESSAGE_GROUP,
+                    {recipient.id: [sub.user_profile_id for sub in subs_to_create]},
+                )
         return direct_message_group
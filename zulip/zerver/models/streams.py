@@ -13,6 +13,7 @@ from typing_extensions import override
 from zerver.lib.cache import flush_stream
 from zerver.lib.timestamp import datetime_to_timestamp
 from zerver.lib.types import DefaultStreamDict, GroupPermissionSetting
+from zerver.models.constants import MAX_TOPIC_NAME_LENGTH
 from zerver.models.groups import SystemGroups, UserGroup
 from zerver.models.realms import Realm
 from zerver.models.recipients import Recipient
@@ -358,6 +359,53 @@ class Subscription(models.Model):
     ]
 
 
+class StreamTopic(models.Model):
+    """A denormalized summary of a single topic in a stream, used to
+    serve topic history (the left sidebar's topic list) without
+    aggregating over every message in the stream.
+
+    Topics are case-insensitive, so there is one row per
+    (recipient, upper(topic_name)) pair; `topic_name` holds the
+    casing used by the most recent message in the topic.
+
+    These rows are derived data, maintained by the message send,
+    move, and delete code paths (see zerver/lib/topic.py), and can be
+    rebuilt from the Message table at any time.
+    """
+
+    realm = models.ForeignKey(Realm, on_delete=CASCADE)
+    # Foreign key to the stream's Recipient object, matching Message.recipient.
+    recipient = models.ForeignKey(Recipient, on_delete=CASCADE)
+    topic_name = models.CharField(max_length=MAX_TOPIC_NAME_LENGTH)
+
+    last_message_id = models.IntegerField()
+    message_count = models.IntegerField(default=0)
+    # Denormalization of whether topic_name starts with
+    # RESOLVED_TOPIC_PREFIX, to support filtering by resolved state.
+    is_resolved = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                "recipient",
+                Upper("topic_name"),
+                name="zerver_streamtopic_recipient_upper_topic_uniq",
+            ),
+        ]
+        indexes = [
+            # Supports keyset pagination of a stream's topics, most
+            # recently active first.
+            models.Index(
+                fields=("recipient", "-last_message_id"),
+                name="zerver_streamtopic_recipient_last_message_id",
+            ),
+        ]
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.recipient!r} / {self.topic_name} ({self.last_message_id})"
+
+
 class DefaultStream(models.Model):
     realm = models.ForeignKey(Realm, on_delete=CASCADE)
     stream = models.ForeignKey(Stream, on_delete=CASCADE)
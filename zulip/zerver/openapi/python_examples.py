@@ -818,6 +818,22 @@ def get_subscribers(client: Client) -> None:
     assert result["subscribers"] == user_ids
 
 
+@openapi_test_function("/streams/members:get")
+def get_bulk_subscribers(client: Client) -> None:
+    user_ids = [11, 25]
+    ensure_users(user_ids, ["iago", "newbie"])
+    stream_id = client.get_stream_id("python-test")["stream_id"]
+    # {code_example|start}
+    # Get the subscribers of several channels at once, with each
+    # list of user IDs delta-encoded.
+    request = {"stream_ids": [stream_id], "delta_encoded": True}
+    result = client.call_endpoint(url="/streams/members", method="GET", request=request)
+    # {code_example|end}
+    assert_success_response(result)
+    validate_against_openapi_schema(result, "/streams/members", "get", "200")
+    assert result["subscribers"] == {str(stream_id): [11, 14]}
+
+
 def get_user_agent(client: Client) -> None:
     result = client.get_user_agent()
     assert result.startswith("ZulipPython/")
@@ -1350,6 +1366,20 @@ def register_queue(client: Client) -> str:
     return result["queue_id"]
 
 
+@openapi_test_function("/register/sections:get")
+def get_register_sections(client: Client) -> None:
+    # {code_example|start}
+    # Fetch the sections of the initial state which a `/register`
+    # request listed in `deferred_state_sections`.
+    request = {"sections": ["alert_words", "presence"], "slim_presence": True}
+    result = client.call_endpoint(url="/register/sections", method="GET", request=request)
+    # {code_example|end}
+    assert_success_response(result)
+    validate_against_openapi_schema(result, "/register/sections", "get", "200")
+    assert "alert_words" in result
+    assert "presences" in result
+
+
 @openapi_test_function("/events:delete")
 def deregister_queue(client: Client, queue_id: str) -> None:
     # {code_example|start}
@@ -1765,6 +1795,7 @@ def test_streams(client: Client, nonadmin_client: Client) -> None:
     update_stream(client, stream_id)
     get_streams(client)
     get_subscribers(client)
+    get_bulk_subscribers(client)
     remove_subscriptions(client)
     toggle_mute_topic(client)
     update_user_topic(client)
@@ -1793,6 +1824,7 @@ def test_queues(client: Client) -> None:
     get_queue(client, queue_id)
     deregister_queue(client, queue_id)
     register_queue_all_events(client)
+    get_register_sections(client)
 
 
 def test_server_organizations(client: Client) -> None:
@@ -1,7 +1,7 @@
 import orjson
 
 from zerver.actions.alert_words import do_add_alert_words, do_remove_alert_words
-from zerver.lib.alert_words import alert_words_in_realm, user_alert_words
+from zerver.lib.alert_words import alert_words_in_realm, get_alert_word_automaton, user_alert_words
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import most_recent_message, most_recent_usermessage
 from zerver.models import AlertWord, UserProfile
@@ -111,6 +111,42 @@ class AlertWordTests(ZulipTestCase):
         self.assertEqual(set(realm_words[user1.id]), set(self.interesting_alert_word_list))
         self.assertEqual(set(realm_words[user2.id]), {"another"})
 
+    def test_alert_word_automaton(self) -> None:
+        user = self.get_user()
+        othello = self.example_user("othello")
+        realm = user.realm
+
+        do_add_alert_words(user, ["alert"])
+        automaton = get_alert_word_automaton(realm)
+        assert automaton is not None
+        self.assertEqual(automaton.get("alert"), ("alert", {user.id}))
+
+        # The process keeps its automaton until the realm's alert words change.
+        with self.assert_database_query_count(0):
+            self.assertIs(get_alert_word_automaton(realm), automaton)
+
+        # Changes build a new automaton, leaving the old one, which
+        # another thread may be searching, unchanged.
+        do_add_alert_words(othello, ["ALERT", "another"])
+        new_automaton = get_alert_word_automaton(realm)
+        assert new_automaton is not None
+        self.assertIsNot(new_automaton, automaton)
+        self.assertEqual(new_automaton.get("alert"), ("alert", {user.id, othello.id}))
+        self.assertEqual(new_automaton.get("another"), ("another", {othello.id}))
+        self.assertEqual(automaton.get("alert"), ("alert", {user.id}))
+        self.assertFalse(automaton.exists("another"))
+
+        do_remove_alert_words(user, ["alert"])
+        do_remove_alert_words(othello, ["another"])
+        automaton = get_alert_word_automaton(realm)
+        assert automaton is not None
+        self.assertEqual(automaton.get("alert"), ("alert", {othello.id}))
+        self.assertFalse(automaton.exists("another"))
+
+        # Without any alert words in the realm, there's no automaton.
+        AlertWord.objects.filter(realm=realm).delete()
+        self.assertIsNone(get_alert_word_automaton(realm))
+
     def test_json_list_default(self) -> None:
         user = self.get_user()
         self.login_user(user)
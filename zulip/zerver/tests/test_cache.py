@@ -1,10 +1,14 @@
+from datetime import timedelta
 from unittest.mock import Mock, patch
 
 from django.conf import settings
+from django.utils.timezone import now as timezone_now
+from typing_extensions import override
 
 from zerver.apps import flush_cache
 from zerver.lib.cache import (
     MEMCACHED_MAX_KEY_LENGTH,
+    BatchedCacheGet,
     InvalidCacheKeyError,
     bulk_cached_fetch,
     cache_delete,
@@ -16,9 +20,19 @@ from zerver.lib.cache import (
     cache_with_key,
     safe_cache_get_many,
     safe_cache_set_many,
+    to_dict_cache_key_id,
     user_profile_by_id_cache_key,
     validate_cache_key,
 )
+from zerver.lib.message_cache import fill_message_cache
+from zerver.lib.message_cache_warming import (
+    get_hot_narrows,
+    hot_narrows_key,
+    record_narrow_fetch,
+    redis_client,
+    warm_realm_message_cache,
+)
+from zerver.lib.narrow import NarrowParameter
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.models import UserProfile
 from zerver.models.realms import get_realm
@@ -300,3 +314,99 @@ class GenericBulkCachedFetchTest(ZulipTestCase):
             id_fetcher=get_user_email,
         )
         self.assertEqual(result, {})
+
+    def test_cache_batch(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        cordelia = self.example_user("cordelia")
+        get_user_profile_by_id(hamlet.id)
+        cache_delete(user_profile_by_id_cache_key(othello.id))
+
+        cache_batch = BatchedCacheGet()
+        cache_batch.add(user_profile_by_id_cache_key(user.id) for user in [hamlet, othello])
+        with self.assert_memcached_count(1):
+            cache_batch.fetch()
+
+        queried_ids: list[int] = []
+
+        def query_function(ids: list[int]) -> list[UserProfile]:
+            queried_ids.extend(ids)
+            return list(UserProfile.objects.filter(id__in=ids))
+
+        # Both keys were looked up by the batch, so we don't need to
+        # talk to memcached again; only the uncached user is queried.
+        with self.assert_memcached_count(0):
+            result = bulk_cached_fetch(
+                cache_key_function=user_profile_by_id_cache_key,
+                query_function=query_function,
+                object_ids=[hamlet.id, othello.id],
+                id_fetcher=get_user_id,
+                cache_batch=cache_batch,
+            )
+        self.assertEqual(result, {hamlet.id: hamlet, othello.id: othello})
+        self.assertEqual(queried_ids, [othello.id])
+
+        # Keys which weren't added to the batch are fetched separately.
+        with self.assert_memcached_count(1):
+            result = bulk_cached_fetch(
+                cache_key_function=user_profile_by_id_cache_key,
+                query_function=query_function,
+                object_ids=[hamlet.id, cordelia.id],
+                id_fetcher=get_user_id,
+                cache_batch=cache_batch,
+            )
+        self.assertEqual(result, {hamlet.id: hamlet, cordelia.id: cordelia})
+
+
+class MessageCacheWarmingTest(ZulipTestCase):
+    @override
+    def setUp(self) -> None:
+        super().setUp()
+        today = timezone_now().date()
+        for day in [today, today - timedelta(days=1)]:
+            redis_client.delete(hot_narrows_key(get_realm("zulip").id, day))
+
+    def test_record_narrow_fetch(self) -> None:
+        realm = get_realm("zulip")
+
+        def narrow(*terms: tuple[str, str | int]) -> list[NarrowParameter]:
+            return [
+                NarrowParameter(operator=operator, operand=operand) for operator, operand in terms
+            ]
+
+        for _ in range(3):
+            record_narrow_fetch(realm.id, narrow(("channel", "Verona"), ("topic", "lunch")))
+        record_narrow_fetch(realm.id, narrow(("stream", 3)))
+        record_narrow_fetch(realm.id, narrow(("channel", "Denmark")))
+        record_narrow_fetch(realm.id, narrow(("channel", "Denmark")))
+        # Narrows whose results depend on the user aren't tracked.
+        record_narrow_fetch(realm.id, narrow(("is", "starred")))
+        record_narrow_fetch(realm.id, narrow(("channel", "Denmark"), ("sender", "iago@zulip.com")))
+        record_narrow_fetch(realm.id, None)
+
+        self.assertEqual(
+            get_hot_narrows(realm.id, 10), [("Verona", "lunch"), ("Denmark", None), (3, None)]
+        )
+        self.assertEqual(get_hot_narrows(realm.id, 1), [("Verona", "lunch")])
+
+    def test_warm_realm_message_cache(self) -> None:
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        message_id = self.send_stream_message(hamlet, "Verona", topic_name="warming")
+        record_narrow_fetch(
+            realm.id,
+            [
+                NarrowParameter(operator="channel", operand="Verona"),
+                NarrowParameter(operator="topic", operand="warming"),
+            ],
+        )
+        # A channel which no longer exists is skipped.
+        record_narrow_fetch(realm.id, [NarrowParameter(operator="channel", operand="nonexistent")])
+
+        cache_delete(to_dict_cache_key_id(message_id))
+        self.assertGreater(warm_realm_message_cache(realm), 0)
+        self.assertIsNotNone(cache_get(to_dict_cache_key_id(message_id)))
+
+        # Everything is now cached.
+        with self.assert_database_query_count(0):
+            self.assertEqual(fill_message_cache([message_id]), 0)
@@ -6,16 +6,19 @@ import orjson
 from typing_extensions import override
 
 from zerver.actions.custom_profile_fields import (
+    check_remove_custom_profile_field_value,
     do_remove_realm_custom_profile_field,
     do_update_user_custom_profile_data_if_changed,
     try_add_realm_custom_profile_field,
     try_reorder_realm_custom_profile_fields,
 )
 from zerver.actions.user_settings import do_change_user_setting
+from zerver.actions.users import do_delete_user
 from zerver.lib.external_accounts import DEFAULT_EXTERNAL_ACCOUNTS
 from zerver.lib.markdown import markdown_convert
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.types import ProfileDataElementUpdateDict, ProfileDataElementValue
+from zerver.lib.users import get_realm_custom_profile_field_values
 from zerver.models import CustomProfileField, CustomProfileFieldValue, UserProfile
 from zerver.models.custom_profile_fields import custom_profile_fields_for_realm
 from zerver.models.realms import get_realm
@@ -1045,6 +1048,50 @@ class ListCustomProfileFieldTest(CustomProfileFieldTestCase):
             with self.assertRaises(KeyError):
                 user_dict["profile_data"]
 
+    def test_custom_profile_field_values_cached(self) -> None:
+        hamlet = self.example_user("hamlet")
+        field = CustomProfileField.objects.get(realm=self.realm, name="Phone number")
+
+        def hamlet_phone_number() -> str | None:
+            profile_data = get_realm_custom_profile_field_values(self.realm.id).get(hamlet.id, {})
+            return profile_data.get(str(field.id), {}).get("value")
+
+        get_realm_custom_profile_field_values(self.realm.id)
+        with self.assert_database_query_count(0, keep_cache_warm=True):
+            get_realm_custom_profile_field_values(self.realm.id)
+
+        # The cache is flushed when the transaction commits, so the
+        # old values can't be cached again before then.
+        old_phone_number = hamlet_phone_number()
+        with self.captureOnCommitCallbacks(execute=True):
+            do_update_user_custom_profile_data_if_changed(
+                hamlet, [{"id": field.id, "value": "+1-234-567-8900"}]
+            )
+            self.assertEqual(hamlet_phone_number(), old_phone_number)
+        self.assertEqual(hamlet_phone_number(), "+1-234-567-8900")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            check_remove_custom_profile_field_value(hamlet, field.id)
+        self.assertIsNone(hamlet_phone_number())
+
+        # Values are flushed however they're changed.
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomProfileFieldValue.objects.create(
+                user_profile=hamlet, field=field, value="+1-234-567-8900"
+            )
+        self.assertEqual(hamlet_phone_number(), "+1-234-567-8900")
+        with self.captureOnCommitCallbacks(execute=True):
+            do_delete_user(hamlet, acting_user=None)
+        self.assertIsNone(get_realm_custom_profile_field_values(self.realm.id).get(hamlet.id))
+
+        othello = self.example_user("othello")
+        with self.captureOnCommitCallbacks(execute=True):
+            do_update_user_custom_profile_data_if_changed(
+                othello, [{"id": field.id, "value": "+1-234-567-8900"}]
+            )
+            do_remove_realm_custom_profile_field(self.realm, field)
+        self.assertEqual(get_realm_custom_profile_field_values(self.realm.id).get(othello.id), {})
+
     def test_get_custom_profile_fields_from_api_for_single_user(self) -> None:
         self.login("iago")
         do_change_user_setting(
@@ -14,11 +14,15 @@ from typing_extensions import override
 from zerver.actions.custom_profile_fields import try_update_realm_custom_profile_field
 from zerver.actions.message_send import check_send_message
 from zerver.actions.presence import do_update_user_presence
+from zerver.actions.realm_playgrounds import check_add_realm_playground
+from zerver.actions.streams import do_deactivate_stream
 from zerver.actions.user_settings import do_change_user_setting
-from zerver.actions.users import do_change_user_role
+from zerver.actions.users import do_change_user_role, do_deactivate_user
+from zerver.lib.cache import bump_realm_state_generation
 from zerver.lib.event_schema import check_web_reload_client_event
-from zerver.lib.events import fetch_initial_state_data
+from zerver.lib.events import fetch_initial_state_data, post_process_state
 from zerver.lib.exceptions import AccessDeniedError
+from zerver.lib.initial_state_profiler import InitialStateProfiler
 from zerver.lib.request import RequestVariableMissingError
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import (
@@ -27,7 +31,12 @@ from zerver.lib.test_helpers import (
     reset_email_visibility_to_everyone_in_zulip_realm,
     stub_event_queue_user_events,
 )
-from zerver.lib.users import get_api_key, get_users_for_api
+from zerver.lib.users import (
+    get_api_key,
+    get_users_for_api,
+    user_columns_to_dicts,
+    user_dicts_to_columns,
+)
 from zerver.models import CustomProfileField, UserMessage, UserPresence, UserProfile
 from zerver.models.clients import get_client
 from zerver.models.realms import get_realm, get_realm_with_settings
@@ -746,6 +755,65 @@ class FetchInitialStateDataTest(ZulipTestCase):
             else:
                 self.assertFalse("avatar_url" in user_dict)
 
+    def test_user_list_columnar(self) -> None:
+        iago = self.example_user("iago")
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        othello.long_term_idle = True
+        othello.save()
+        do_deactivate_user(self.example_user("cordelia"), acting_user=None)
+        reset_email_visibility_to_everyone_in_zulip_realm()
+
+        for user_profile, client_gravatar, user_avatar_url_field_optional in [
+            (None, False, False),
+            (iago, False, False),
+            (hamlet, True, True),
+        ]:
+            kwargs: dict[str, Any] = dict(
+                realm=get_realm_with_settings(realm_id=iago.realm_id),
+                event_types=["realm_user"],
+                client_gravatar=client_gravatar,
+                user_avatar_url_field_optional=user_avatar_url_field_optional,
+                spectator_requested_language="en",
+            )
+            state = fetch_initial_state_data(user_profile, **kwargs)
+            columnar_state = fetch_initial_state_data(
+                user_profile, user_list_columnar=True, **kwargs
+            )
+            self.assertIn("raw_user_columns", columnar_state)
+            post_process_state(user_profile, state, False, user_list_columnar=True)
+            post_process_state(user_profile, columnar_state, False, user_list_columnar=True)
+
+            # Building the columns from the cached realm-wide copy gives
+            # the same data as converting the usual user dictionaries.
+            for key in ["realm_users", "realm_non_active_users"]:
+                columns = columnar_state[key]
+                expected_columns = state[key]
+                self.assertEqual(
+                    [columns["timezones"][index] for index in columns.pop("timezone", [])],
+                    [
+                        expected_columns["timezones"][index]
+                        for index in expected_columns.pop("timezone", [])
+                    ],
+                )
+                del columns["timezones"], expected_columns["timezones"]
+                self.assertEqual(columns, expected_columns)
+
+        self.assertIn(False, state["realm_users"]["avatar_url"])
+        self.assertIn(None, state["realm_users"]["avatar_url"])
+
+    def test_user_columns_to_dicts(self) -> None:
+        hamlet = self.example_user("hamlet")
+        raw_users = get_users_for_api(
+            hamlet.realm,
+            hamlet,
+            client_gravatar=False,
+            user_avatar_url_field_optional=False,
+        )
+        columns = user_dicts_to_columns(list(raw_users.values()), spectator=False)
+        columns["is_active"] = [user_dict["is_active"] for user_dict in raw_users.values()]
+        self.assertEqual(user_columns_to_dicts(columns), raw_users)
+
     def test_user_settings_based_on_client_capabilities(self) -> None:
         hamlet = self.example_user("hamlet")
         result = fetch_initial_state_data(
@@ -1238,6 +1306,360 @@ class FetchQueriesTest(ZulipTestCase):
                 fetch_initial_state_data(user, realm=realm, event_types=event_types)
 
 
+class RealmStateSnapshotTest(ZulipTestCase):
+    def test_snapshot_shared_between_users(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        realm = get_realm_with_settings(realm_id=hamlet.realm_id)
+        event_types = ["realm_playgrounds", "realm_user_groups"]
+
+        hamlet_state = fetch_initial_state_data(hamlet, realm=realm, event_types=event_types)
+
+        # Another user in the realm gets the same data from the cache.
+        with self.assert_database_query_count(0, keep_cache_warm=True):
+            cordelia_state = fetch_initial_state_data(
+                cordelia, realm=realm, event_types=event_types
+            )
+        self.assertEqual(hamlet_state, cordelia_state)
+
+        # Sending an event which changes the data invalidates it.
+        with self.captureOnCommitCallbacks(execute=True):
+            check_add_realm_playground(
+                realm,
+                acting_user=None,
+                name="Python playground",
+                pygments_language="Python",
+                url_template="https://python.example.com{#code}",
+            )
+        state = fetch_initial_state_data(cordelia, realm=realm, event_types=event_types)
+        self.assertEqual(
+            [playground["name"] for playground in state["realm_playgrounds"]],
+            ["Python playground"],
+        )
+        self.assertEqual(state["realm_user_groups"], hamlet_state["realm_user_groups"])
+
+        # Only the sections which were requested are computed.
+        bump_realm_state_generation(realm.id, ["realm_playgrounds", "realm_user_groups"])
+        with self.assert_database_query_count(1, keep_cache_warm=True):
+            state = fetch_initial_state_data(
+                cordelia, realm=realm, event_types=["realm_playgrounds"]
+            )
+        self.assertIn("realm_playgrounds", state)
+        self.assertNotIn("realm_user_groups", state)
+
+    def test_register_with_state_versions(self) -> None:
+        user = self.example_user("hamlet")
+        fetch_event_types = ["realm_emoji", "realm_playgrounds", "presence"]
+
+        def register(
+            state_versions: dict[str, str], events: list[dict[str, Any]]
+        ) -> dict[str, Any]:
+            with stub_event_queue_user_events("15:11", events):
+                result = self.api_post(
+                    user,
+                    "/api/v1/register",
+                    dict(
+                        fetch_event_types=orjson.dumps(fetch_event_types).decode(),
+                        slim_presence="true",
+                        state_versions=orjson.dumps(state_versions).decode(),
+                    ),
+                )
+            return self.assert_json_success(result)
+
+        state = register({}, [])
+        self.assertEqual(state["unchanged_state_sections"], [])
+        self.assertEqual(
+            set(state["state_versions"]), {"realm_emoji", "realm_playgrounds", "presence"}
+        )
+        self.assertEqual(state["state_versions"]["presence"], str(state["presence_last_update_id"]))
+        self.assertIn("realm_emoji", state)
+        state_versions = state["state_versions"]
+
+        # Sections the client already has are omitted, and only newer
+        # presence data is sent.
+        state = register(state_versions, [])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_emoji", "realm_playgrounds"])
+        self.assertEqual(state["state_versions"], state_versions)
+        self.assertNotIn("realm_emoji", state)
+        self.assertNotIn("realm_playgrounds", state)
+        self.assertEqual(state["presences"], {})
+
+        # An unknown version means the client needs the data.
+        state = register({**state_versions, "realm_emoji": "bogus"}, [])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_playgrounds"])
+        self.assertIn("realm_emoji", state)
+
+        # A section which changed while we were fetching the state is
+        # sent, so that the queued event can be applied to it.
+        test_event = dict(id=6, type="realm_emoji", realm_emoji={})
+        state = register(state_versions, [test_event])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_playgrounds"])
+        self.assertEqual(state["realm_emoji"], {})
+        self.assertEqual(state["last_event_id"], 6)
+
+        # Changing a section gives it a new version.
+        with self.captureOnCommitCallbacks(execute=True):
+            check_add_realm_playground(
+                user.realm,
+                acting_user=None,
+                name="Python playground",
+                pygments_language="Python",
+                url_template="https://python.example.com{#code}",
+            )
+        state = register(state_versions, [])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_emoji"])
+        self.assertNotEqual(
+            state["state_versions"]["realm_playgrounds"], state_versions["realm_playgrounds"]
+        )
+        self.assert_length(state["realm_playgrounds"], 1)
+
+    def test_register_with_user_state_versions(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+
+        def register(
+            user: UserProfile,
+            state_versions: dict[str, str],
+            events: list[dict[str, Any]],
+            client_gravatar: bool = False,
+        ) -> dict[str, Any]:
+            with stub_event_queue_user_events("15:11", events):
+                result = self.api_post(
+                    user,
+                    "/api/v1/register",
+                    dict(
+                        fetch_event_types=orjson.dumps(["realm_user", "subscription"]).decode(),
+                        client_gravatar=orjson.dumps(client_gravatar).decode(),
+                        state_versions=orjson.dumps(state_versions).decode(),
+                    ),
+                )
+            return self.assert_json_success(result)
+
+        state = register(hamlet, {}, [])
+        self.assertEqual(state["unchanged_state_sections"], [])
+        self.assertEqual(set(state["state_versions"]), {"realm_user", "subscription"})
+        state_versions = state["state_versions"]
+
+        state = register(hamlet, state_versions, [])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_user", "subscription"])
+        self.assertEqual(state["state_versions"], state_versions)
+        self.assertNotIn("realm_users", state)
+        self.assertNotIn("subscriptions", state)
+        # The user's own avatar isn't part of the versioned data.
+        self.assertIn("avatar_url", state)
+
+        # The versions are specific to the user, and to the
+        # parameters which change the data's format.
+        state = register(othello, state_versions, [])
+        self.assertEqual(state["unchanged_state_sections"], [])
+        state = register(hamlet, state_versions, [], client_gravatar=True)
+        self.assertEqual(state["unchanged_state_sections"], ["subscription"])
+
+        # A section which changed while we were fetching the state is
+        # sent, so that the queued event can be applied to it.
+        test_event = dict(
+            id=6,
+            type="realm_user",
+            op="update",
+            person=dict(user_id=othello.id, full_name="Othello, the Moor"),
+        )
+        state = register(hamlet, state_versions, [test_event])
+        self.assertEqual(state["unchanged_state_sections"], [])
+        self.assertIn(
+            "Othello, the Moor",
+            [user["full_name"] for user in state["realm_users"] if user["user_id"] == othello.id],
+        )
+
+        # Changing the user's subscriptions gives them a new version.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscribe(hamlet, "new stream")
+        state = register(hamlet, state_versions, [])
+        self.assertEqual(state["unchanged_state_sections"], ["realm_user"])
+        self.assertNotEqual(state["state_versions"]["subscription"], state_versions["subscription"])
+        self.assertIn("new stream", [sub["name"] for sub in state["subscriptions"]])
+
+    def test_state_versions_after_deactivating_announcements_stream(self) -> None:
+        user = self.example_user("hamlet")
+        stream = user.realm.get_new_stream_announcements_stream()
+        assert stream is not None
+
+        def register(state_versions: dict[str, str]) -> dict[str, Any]:
+            result = self.api_post(
+                user,
+                "/api/v1/register",
+                dict(
+                    fetch_event_types=orjson.dumps(["realm"]).decode(),
+                    state_versions=orjson.dumps(state_versions).decode(),
+                ),
+            )
+            return self.assert_json_success(result)
+
+        state = register({})
+        self.assertEqual(state["realm_new_stream_announcements_stream_id"], stream.id)
+        state_versions = state["state_versions"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            do_deactivate_stream(stream, acting_user=None)
+        state = register(state_versions)
+        self.assertEqual(state["unchanged_state_sections"], [])
+        self.assertEqual(state["realm_new_stream_announcements_stream_id"], -1)
+
+    def test_spectator_state_versions(self) -> None:
+        user = self.example_user("hamlet")
+        result = self.api_post(
+            user,
+            "/api/v1/register",
+            dict(fetch_event_types=orjson.dumps(["realm"]).decode(), state_versions="{}"),
+        )
+        user_realm_version = self.assert_json_success(result)["state_versions"]["realm"]
+
+        def spectator_register(state_versions: dict[str, str]) -> dict[str, Any]:
+            result = self.client_post(
+                "/json/register", dict(state_versions=orjson.dumps(state_versions).decode())
+            )
+            return self.assert_json_success(result)
+
+        # Spectators get different data, so they can't use the
+        # versions of a logged-in user's state, nor the reverse.
+        state = spectator_register({"realm": user_realm_version})
+        self.assertNotIn("realm", state["unchanged_state_sections"])
+        self.assertTrue(state["realm_presence_disabled"])
+        spectator_realm_version = state["state_versions"]["realm"]
+        self.assertNotEqual(spectator_realm_version, user_realm_version)
+
+        result = self.api_post(
+            user,
+            "/api/v1/register",
+            dict(
+                fetch_event_types=orjson.dumps(["realm"]).decode(),
+                state_versions=orjson.dumps({"realm": spectator_realm_version}).decode(),
+            ),
+        )
+        self.assertEqual(self.assert_json_success(result)["unchanged_state_sections"], [])
+
+        state = spectator_register({"realm": spectator_realm_version})
+        self.assertIn("realm", state["unchanged_state_sections"])
+        self.assertNotIn("realm_presence_disabled", state)
+
+
+class InitialStateProfilerTest(ZulipTestCase):
+    def test_section_profiles(self) -> None:
+        user = self.example_user("hamlet")
+        realm = get_realm_with_settings(realm_id=user.realm_id)
+
+        profiler = InitialStateProfiler()
+        with profiler.profile():
+            fetch_initial_state_data(
+                user,
+                realm=realm,
+                event_types=["update_message_flags", "message", "alert_words", "realm_emoji"],
+                profiler=profiler,
+            )
+        self.assertEqual(
+            set(profiler.sections),
+            {
+                "realm_state_snapshot",
+                "message",
+                "realm_emoji",
+                "update_message_flags",
+                "alert_words",
+            },
+        )
+        # The unread messages, fetched when both update_message_flags
+        # and message are wanted, are credited to the former.
+        self.assertEqual(profiler.sections["message"].queries, 1)
+        self.assertEqual(profiler.sections["realm_emoji"].queries, 0)
+        self.assertEqual(profiler.sections["update_message_flags"].queries, 4)
+        self.assertEqual(profiler.sections["alert_words"].queries, 1)
+
+        self.assertRegex(profiler.log_data_summary(limit=1), r"^\[[a-z_]+:\d+ms/\d+q\]$")
+        self.assertIn("alert_words;dur=", profiler.server_timing_header())
+
+    def test_register_with_deferred_sections(self) -> None:
+        user = self.example_user("hamlet")
+        fetch_event_types = ["alert_words", "presence", "realm_emoji"]
+        do_update_user_presence(
+            user, get_client("website"), timezone_now(), UserPresence.LEGACY_STATUS_ACTIVE_INT
+        )
+
+        def register(client_capabilities: dict[str, bool]) -> HttpResponse:
+            # A presence event in the queue must not be applied to the
+            # presence data if we deferred it.
+            presence_event = dict(id=6, type="presence", user_id=user.id, email=user.email)
+            with stub_event_queue_user_events("15:11", [presence_event]):
+                return self.api_post(
+                    user,
+                    "/api/v1/register",
+                    dict(
+                        fetch_event_types=orjson.dumps(fetch_event_types).decode(),
+                        slim_presence="true",
+                        client_capabilities=orjson.dumps(
+                            {"notification_settings_null": True, **client_capabilities}
+                        ).decode(),
+                    ),
+                )
+
+        with override_settings(REGISTER_TIME_BUDGET_SECONDS=0):
+            state = self.assert_json_success(register({"deferred_state_sections": True}))
+            self.assertEqual(state["deferred_state_sections"], ["alert_words", "presence"])
+            self.assertNotIn("alert_words", state)
+            self.assertNotIn("presences", state)
+            self.assertIn("realm_emoji", state)
+            self.assertEqual(state["last_event_id"], 6)
+
+            # Clients without the capability get everything.
+            state = self.assert_json_success(register({}))
+            self.assertNotIn("deferred_state_sections", state)
+            self.assertIn("alert_words", state)
+            self.assertIn(str(user.id), state["presences"])
+
+        state = self.assert_json_success(register({"deferred_state_sections": True}))
+        self.assertEqual(state["deferred_state_sections"], [])
+        self.assertIn("alert_words", state)
+
+        result = self.api_get(
+            user,
+            "/api/v1/register/sections",
+            dict(sections=orjson.dumps(["alert_words", "presence"]).decode(), slim_presence="true"),
+        )
+        state = self.assert_json_success(result)
+        self.assertEqual(state["alert_words"], [])
+        self.assertIn("presences", state)
+        self.assertIn("presence_last_update_id", state)
+        self.assertNotIn("queue_id", state)
+
+        result = self.api_get(
+            user,
+            "/api/v1/register/sections",
+            dict(sections=orjson.dumps(["realm_emoji"]).decode()),
+        )
+        self.assert_json_error(result, "Invalid section: realm_emoji")
+
+    def test_register_server_timing_header(self) -> None:
+        user = self.example_user("hamlet")
+        self.login_user(user)
+        with stub_event_queue_user_events("15:11", []):
+            result = self.client_post(
+                "/json/register", dict(event_types=orjson.dumps(["alert_words"]).decode())
+            )
+        self.assert_json_success(result)
+        self.assertNotIn("Server-Timing", result)
+
+        with (
+            override_settings(REGISTER_SERVER_TIMING_HEADER=True),
+            stub_event_queue_user_events("15:11", []),
+        ):
+            result = self.client_post(
+                "/json/register", dict(event_types=orjson.dumps(["alert_words"]).decode())
+            )
+        self.assert_json_success(result)
+        self.assertRegex(
+            result["Server-Timing"],
+            r'^realm_state_snapshot;dur=[\d.]+;desc="0 queries", '
+            r'alert_words;dur=[\d.]+;desc="1 queries"$',
+        )
+
+
 class TestEventsRegisterAllPublicStreamsDefaults(ZulipTestCase):
     @override
     def setUp(self) -> None:
@@ -153,6 +153,7 @@ from zerver.lib.event_schema import (
     check_muted_users,
     check_onboarding_steps,
     check_presence,
+    check_presence_batch,
     check_reaction_add,
     check_reaction_remove,
     check_realm_bot_add,
@@ -256,6 +257,7 @@ from zerver.tornado.event_queue import (
     allocate_client_descriptor,
     clear_client_event_queues_for_testing,
     create_heartbeat_event,
+    flush_presence_events,
     mark_clients_to_reload,
     send_restart_events,
     send_web_reload_client_events,
@@ -283,6 +285,7 @@ class BaseAction(ZulipTestCase):
         *,
         event_types: list[str] | None = None,
         include_subscribers: bool = True,
+        include_subscriber_counts: bool = False,
         state_change_expected: bool = True,
         notification_settings_null: bool = False,
         client_gravatar: bool = True,
@@ -296,6 +299,7 @@ class BaseAction(ZulipTestCase):
         pronouns_field_type_supported: bool = True,
         linkifier_url_template: bool = True,
         user_list_incomplete: bool = False,
+        batched_presence_events: bool = False,
         client_is_old: bool = False,
     ) -> Iterator[list[dict[str, Any]]]:
         """
@@ -327,6 +331,7 @@ class BaseAction(ZulipTestCase):
                 pronouns_field_type_supported=pronouns_field_type_supported,
                 linkifier_url_template=linkifier_url_template,
                 user_list_incomplete=user_list_incomplete,
+                batched_presence_events=batched_presence_events,
             )
         )
 
@@ -340,6 +345,7 @@ class BaseAction(ZulipTestCase):
             user_avatar_url_field_optional=user_avatar_url_field_optional,
             slim_presence=slim_presence,
             include_subscribers=include_subscribers,
+            include_subscriber_counts=include_subscriber_counts,
             include_streams=include_streams,
             pronouns_field_type_supported=pronouns_field_type_supported,
             linkifier_url_template=linkifier_url_template,
@@ -357,6 +363,10 @@ class BaseAction(ZulipTestCase):
         with self.captureOnCommitCallbacks(execute=True):
             yield events
 
+        # Deliver any presence changes that Tornado is holding back
+        # due to PRESENCE_EVENT_AGGREGATION_WINDOW_SECS.
+        flush_presence_events()
+
         # Append to an empty list so the result is accessible through the
         # reference we just yielded.
         events += client.event_queue.contents()
@@ -384,6 +394,7 @@ class BaseAction(ZulipTestCase):
             include_subscribers=include_subscribers,
             linkifier_url_template=linkifier_url_template,
             user_list_incomplete=user_list_incomplete,
+            include_subscriber_counts=include_subscriber_counts,
         )
         post_process_state(self.user_profile, hybrid_state, notification_settings_null)
         after = orjson.dumps(hybrid_state)
@@ -409,6 +420,7 @@ class BaseAction(ZulipTestCase):
             user_avatar_url_field_optional=user_avatar_url_field_optional,
             slim_presence=slim_presence,
             include_subscribers=include_subscribers,
+            include_subscriber_counts=include_subscriber_counts,
             include_streams=include_streams,
             pronouns_field_type_supported=pronouns_field_type_supported,
             linkifier_url_template=linkifier_url_template,
@@ -1524,6 +1536,54 @@ class NormalActionsTest(BaseAction):
             status="active",
         )
 
+    def test_presence_batch_events(self) -> None:
+        with (
+            self.settings(PRESENCE_EVENT_AGGREGATION_WINDOW_SECS=1),
+            self.verify_action(slim_presence=True, batched_presence_events=True) as events,
+        ):
+            for user in [self.example_user("cordelia"), self.example_user("othello")]:
+                do_update_user_presence(
+                    user,
+                    get_client("website"),
+                    timezone_now(),
+                    UserPresence.LEGACY_STATUS_ACTIVE_INT,
+                )
+
+        check_presence_batch("events[0]", events[0])
+        self.assertEqual(
+            set(events[0]["presences"]),
+            {str(self.example_user("cordelia").id), str(self.example_user("othello").id)},
+        )
+
+        # Clients which don't support presence_batch events get an
+        # event for each user whose presence changed, with only the
+        # latest change for each user.
+        users = [
+            self.example_user("cordelia"),
+            self.example_user("othello"),
+            self.example_user("cordelia"),
+        ]
+        with (
+            self.settings(PRESENCE_EVENT_AGGREGATION_WINDOW_SECS=1),
+            self.verify_action(slim_presence=True, num_events=2) as events,
+        ):
+            for i, user in enumerate(users):
+                do_update_user_presence(
+                    user,
+                    get_client("website"),
+                    timezone_now() + timedelta(minutes=10 * (i + 1)),
+                    UserPresence.LEGACY_STATUS_ACTIVE_INT,
+                )
+
+        for i in range(2):
+            check_presence(
+                f"events[{i}]",
+                events[i],
+                has_email=False,
+                presence_key="website",
+                status="active",
+            )
+
     def test_presence_events_multiple_clients(self) -> None:
         now = timezone_now()
         initial_presence = now - timedelta(days=365)
@@ -4085,6 +4145,52 @@ class SubscribeActionTest(BaseAction):
     def test_subscribe_events_no_include_subscribers(self) -> None:
         self.do_test_subscribe_events(include_subscribers=False)
 
+    def test_subscribe_events_with_subscriber_counts(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        iago = self.example_user("iago")
+        realm = hamlet.realm
+
+        with self.verify_action(
+            event_types=["subscription"], include_subscribers=False, include_subscriber_counts=True
+        ) as events:
+            self.subscribe(hamlet, "test_stream")
+        check_subscription_add("events[0]", events[0])
+        stream = get_stream("test_stream", realm)
+
+        with self.verify_action(
+            include_subscribers=False, include_subscriber_counts=True
+        ) as events:
+            self.subscribe(othello, "test_stream")
+        check_subscription_peer_add("events[0]", events[0])
+
+        with self.verify_action(
+            include_subscribers=False, include_subscriber_counts=True
+        ) as events:
+            bulk_remove_subscriptions(realm, [othello], [stream], acting_user=None)
+        check_subscription_peer_remove("events[0]", events[0])
+
+        with self.verify_action(
+            include_subscribers=False, include_subscriber_counts=True, include_streams=False
+        ) as events:
+            bulk_remove_subscriptions(realm, [hamlet], [stream], acting_user=None)
+        check_subscription_remove("events[0]", events[0])
+
+        # The counts of streams the user isn't subscribed to are
+        # updated too.
+        with self.verify_action(
+            event_types=["subscription"],
+            include_subscribers=False,
+            include_subscriber_counts=True,
+        ) as events:
+            self.subscribe(iago, "test_stream")
+        check_subscription_peer_add("events[0]", events[0])
+
+        # Both can be requested together.
+        with self.verify_action(include_subscribers=True, include_subscriber_counts=True) as events:
+            self.subscribe(othello, "test_stream")
+        check_subscription_peer_add("events[0]", events[0])
+
     def do_test_subscribe_events(self, include_subscribers: bool) -> None:
         # Subscribe to a totally new stream, so it's just Hamlet on it
         with self.verify_action(
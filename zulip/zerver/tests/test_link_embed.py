@@ -1,4 +1,6 @@
 import re
+import threading
+import time
 from collections import OrderedDict
 from typing import Any
 from unittest import mock
@@ -12,14 +14,20 @@ from requests.exceptions import ConnectionError
 from typing_extensions import override
 
 from zerver.actions.message_delete import do_delete_messages
-from zerver.lib.cache import cache_delete, cache_get, preview_url_cache_key
+from zerver.lib.cache import (
+    cache_delete,
+    cache_get,
+    preview_url_cache_key,
+    preview_url_failure_cache_key,
+)
 from zerver.lib.camo import get_camo_url
 from zerver.lib.queue import queue_json_publish
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import mock_queue_publish
+from zerver.lib.url_preview import preview as url_preview
 from zerver.lib.url_preview.oembed import get_oembed_data, strip_cdata
 from zerver.lib.url_preview.parsers import GenericParser, OpenGraphParser
-from zerver.lib.url_preview.preview import get_link_embed_data
+from zerver.lib.url_preview.preview import LinkEmbedDataFetcher, get_link_embed_data
 from zerver.lib.url_preview.types import UrlEmbedData, UrlOEmbedData
 from zerver.models import Message, Realm, UserProfile
 from zerver.worker.embed_links import FetchLinksEmbedData
@@ -875,6 +883,173 @@ class PreviewTestCase(ZulipTestCase):
             '<p><a href="http://test.org/">http://test.org/</a></p>', msg.rendered_content
         )
 
+    @responses.activate
+    def test_network_error_cached(self) -> None:
+        url = "http://test.org/"
+        self.create_mock_response(url, body=ConnectionError())
+
+        with (
+            mock.patch(
+                "zerver.lib.url_preview.preview.get_oembed_data",
+                side_effect=lambda *args, **kwargs: None,
+            ),
+            mock.patch(
+                "zerver.lib.url_preview.preview.valid_content_type", side_effect=lambda k: True
+            ),
+            self.settings(TEST_SUITE=False),
+        ):
+            self.assertIsNone(get_link_embed_data(url))
+            self.assertIsNotNone(cache_get(preview_url_failure_cache_key(url)))
+            self.assertIsNone(cache_get(preview_url_cache_key(url)))
+
+            # We don't try again until the failure expires from the cache.
+            self.assertIsNone(get_link_embed_data(url))
+            self.assertTrue(responses.assert_call_count(url, 1))
+
+            cache_delete(preview_url_failure_cache_key(url))
+            self.assertIsNone(get_link_embed_data(url))
+            self.assertTrue(responses.assert_call_count(url, 2))
+
+    @override_settings(INLINE_URL_EMBED_PREVIEW=True)
+    def test_fetch_batch(self) -> None:
+        url = "http://test.org/"
+        other_url = "http://other.org/"
+        events = []
+        for content in [url, f"{url} {other_url}"]:
+            with mock_queue_publish("zerver.actions.message_send.queue_event_on_commit"):
+                msg_id = self.send_personal_message(
+                    self.example_user("hamlet"),
+                    self.example_user("cordelia"),
+                    content=content,
+                )
+            events.append(
+                {
+                    "message_id": msg_id,
+                    "urls": content.split(" "),
+                    "message_realm_id": self.example_user("hamlet").realm_id,
+                    "message_content": content,
+                }
+            )
+
+        mocked_data = UrlEmbedData(title="The Rock", description="Description text")
+        with (
+            self.settings(TEST_SUITE=False),
+            self.assertLogs(level="INFO") as info_logs,
+            mock.patch(
+                "zerver.worker.embed_links.url_preview.get_link_embed_data",
+                return_value=mocked_data,
+            ) as mock_get_link_embed_data,
+        ):
+            FetchLinksEmbedData().consume_batch(events)
+
+        # Each URL is fetched once, though both messages link to the first.
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_get_link_embed_data.call_args_list),
+            [other_url, url],
+        )
+        self.assert_length(info_logs.output, 2)
+        for event in events:
+            msg = Message.objects.get(id=event["message_id"])
+            assert msg.rendered_content is not None
+            self.assertEqual(msg.rendered_content.count('<div class="message_embed">'), 1)
+
+    def test_fetch_batch_timeout(self) -> None:
+        slow_url = "http://slow.example.com/"
+        fast_url = "http://fast.example.com/"
+        events = []
+        for content in [slow_url, fast_url]:
+            with mock_queue_publish("zerver.actions.message_send.queue_event_on_commit"):
+                msg_id = self.send_personal_message(
+                    self.example_user("hamlet"),
+                    self.example_user("cordelia"),
+                    content=content,
+                )
+            events.append(
+                {
+                    "message_id": msg_id,
+                    "urls": [content],
+                    "message_realm_id": self.example_user("hamlet").realm_id,
+                    "message_content": content,
+                }
+            )
+
+        slow_fetch_released = threading.Event()
+        mocked_data = UrlEmbedData(title="The Rock", description="Description text")
+
+        def fetch(url: str) -> UrlEmbedData:
+            if url == slow_url:
+                slow_fetch_released.wait(timeout=5)
+            return mocked_data
+
+        worker = FetchLinksEmbedData()
+        worker.FETCH_TIMEOUT_SECONDS = 0.1
+        with (
+            self.assertLogs(level="WARNING") as warn_logs,
+            mock.patch(
+                "zerver.worker.embed_links.url_preview.get_link_embed_data", side_effect=fetch
+            ),
+        ):
+            worker.consume_batch(events)
+            slow_fetch_released.set()
+            url_preview.get_link_embed_data_batch([slow_url])
+
+        # Only the message whose URL timed out is skipped.
+        self.assertEqual(
+            warn_logs.output,
+            [
+                "WARNING:root:Timed out in embed_links after 0.1 seconds while fetching URLs for message "
+                f"{events[0]['message_id']}: ['{slow_url}']"
+            ],
+        )
+        slow_msg = Message.objects.get(id=events[0]["message_id"])
+        assert slow_msg.rendered_content is not None
+        self.assertNotIn('<div class="message_embed">', slow_msg.rendered_content)
+        fast_msg = Message.objects.get(id=events[1]["message_id"])
+        assert fast_msg.rendered_content is not None
+        self.assertIn('<div class="message_embed">', fast_msg.rendered_content)
+
+    def test_fetch_per_host_limit(self) -> None:
+        fetcher = LinkEmbedDataFetcher(threads=4, threads_per_host=1)
+        active: dict[str, int] = {}
+        most_active: dict[str, int] = {}
+
+        def fetch(url: str) -> None:
+            host = urlsplit(url).netloc
+            active[host] = active.get(host, 0) + 1
+            most_active[host] = max(most_active.get(host, 0), active[host])
+            time.sleep(0.01)
+            active[host] -= 1
+
+        with (
+            self.assertLogs(level="INFO"),
+            mock.patch("zerver.lib.url_preview.preview.get_link_embed_data", side_effect=fetch),
+        ):
+            results = fetcher.fetch(
+                [f"http://slow.example.com/{i}" for i in range(4)]
+                + [f"http://fast.example.com/{i}" for i in range(4)]
+            )
+        self.assert_length(results, 8)
+        self.assertEqual(most_active, {"slow.example.com": 1, "fast.example.com": 1})
+
+    def test_fetch_slow_host_does_not_block_others(self) -> None:
+        fetcher = LinkEmbedDataFetcher(threads=4, threads_per_host=1)
+        finished: list[str] = []
+
+        def fetch(url: str) -> None:
+            if urlsplit(url).netloc == "slow.example.com":
+                time.sleep(0.1)
+            finished.append(url)
+
+        fast_urls = [f"http://fast.example.com/{i}" for i in range(4)]
+        with (
+            self.assertLogs(level="INFO"),
+            mock.patch("zerver.lib.url_preview.preview.get_link_embed_data", side_effect=fetch),
+        ):
+            fetcher.fetch([f"http://slow.example.com/{i}" for i in range(4)] + fast_urls)
+        # The slow host's waiting URLs don't take up the pool's threads,
+        # so the fast host's are all fetched while its first one is.
+        self.assertEqual(finished[:4], fast_urls)
+
     @responses.activate
     @override_settings(INLINE_URL_EMBED_PREVIEW=True)
     def test_invalid_url(self) -> None:
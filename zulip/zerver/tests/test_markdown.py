@@ -20,33 +20,49 @@ from zerver.actions.create_realm import do_create_realm
 from zerver.actions.realm_emoji import do_remove_realm_emoji
 from zerver.actions.realm_settings import do_set_realm_property
 from zerver.actions.user_groups import check_add_user_group
-from zerver.actions.user_settings import do_change_user_setting
+from zerver.actions.user_settings import do_change_full_name, do_change_user_setting
 from zerver.actions.users import change_user_is_active
 from zerver.lib.alert_words import get_alert_word_automaton
 from zerver.lib.camo import get_camo_url
 from zerver.lib.create_user import create_user
-from zerver.lib.emoji import codepoint_to_name, get_emoji_url
+from zerver.lib.emoji import (
+    EMOTICON_CONVERSIONS,
+    codepoint_to_name,
+    get_active_realm_emoji,
+    get_emoji_url,
+    name_to_codepoint,
+    realm_emoji_indexes,
+    translate_emoticons,
+)
 from zerver.lib.emoji_utils import hex_codepoint_to_emoji
 from zerver.lib.exceptions import JsonableError, MarkdownRenderingError
 from zerver.lib.markdown import (
     POSSIBLE_EMOJI_RE,
     InlineInterestingLinkProcessor,
     MarkdownListPreprocessor,
+    MarkdownRenderRequest,
+    MarkdownRenderResponse,
     MessageRenderingResult,
+    bulk_render_markdown_requests,
     clear_web_link_regex_for_testing,
     content_has_emoji_syntax,
     fetch_tweet_data,
+    get_linkifier_matcher,
     get_tweet_id,
     image_preview_enabled,
     markdown_convert,
+    markdown_render_cache,
     maybe_update_markdown_engines,
     possible_linked_stream_names,
+    prepare_markdown_render,
+    render_markdown_request,
     render_message_markdown,
     topic_links,
     url_embed_preview_enabled,
     url_to_a,
 )
 from zerver.lib.markdown.fenced_code import FencedBlockPreprocessor
+from zerver.lib.markdown_rendering_pool import MarkdownRenderingPool
 from zerver.lib.mdiff import diff_strings
 from zerver.lib.mention import (
     FullNameInfo,
@@ -56,12 +72,21 @@ from zerver.lib.mention import (
     get_possible_mentions_info,
     possible_mentions,
     possible_user_group_mentions,
+    realm_user_group_mention_indexes,
+    realm_user_mention_indexes,
     stream_wildcards,
     topic_wildcards,
 )
 from zerver.lib.per_request_cache import flush_per_request_caches
+from zerver.lib.storage import static_path
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.lib.tex import render_tex
+from zerver.lib.tex import (
+    KatexWorker,
+    katex_cache,
+    katex_worker_pool,
+    render_tex,
+    render_tex_with_node,
+)
 from zerver.models import Message, NamedUserGroup, RealmEmoji, RealmFilter, UserMessage, UserProfile
 from zerver.models.clients import get_client
 from zerver.models.groups import SystemGroups
@@ -293,6 +318,45 @@ class MarkdownMiscTest(ZulipTestCase):
         mention_data = MentionData(mention_backend, content, message_sender=None)
         self.assertTrue(mention_data.message_has_topic_wildcards())
 
+    @override_settings(MENTION_INDEX_MAX_REALMS=1)
+    def test_mention_index(self) -> None:
+        self.addCleanup(realm_user_mention_indexes.clear)
+        self.addCleanup(realm_user_group_mention_indexes.clear)
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        content = f"@**king hamlet** @**|{cordelia.id}** @*hamletcharacters*"
+
+        mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id, cordelia.id})
+        user_group = mention_data.get_user_group("hamletcharacters")
+        assert user_group is not None
+        self.assertEqual(
+            set(mention_data.get_group_members(user_group.id)), {hamlet.id, cordelia.id}
+        )
+
+        # Once the realm's indexes are built, mentions are resolved
+        # without querying the database.
+        with self.assert_database_query_count(0):
+            mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id, cordelia.id})
+        self.assertIsNotNone(mention_data.get_user_group("hamletcharacters"))
+
+        # Changes to users' names, and to user groups, are reflected.
+        do_change_full_name(hamlet, "Prince Hamlet", acting_user=None)
+        check_add_user_group(realm, "support", [cordelia], acting_user=None)
+        content = "@**King Hamlet** @**prince hamlet** @*support*"
+        mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id})
+        user_group = mention_data.get_user_group("support")
+        assert user_group is not None
+        self.assertEqual(mention_data.get_group_members(user_group.id), [cordelia.id])
+
+        # Only the most recently used realms' indexes are kept.
+        zephyr = get_realm("zephyr")
+        MentionData(MentionBackend(zephyr.id), "@**Prince Hamlet**", message_sender=None)
+        self.assertEqual(list(realm_user_mention_indexes), [zephyr.id])
+
     def test_invalid_katex_path(self) -> None:
         with self.settings(DEPLOY_ROOT="/nonexistent"):
             with self.assertLogs(level="ERROR") as m:
@@ -372,6 +436,88 @@ class MarkdownMiscTest(ZulipTestCase):
             )
             self.assertEqual(render_tex("foo"), "<i>html</i>")
 
+    @override_settings(KATEX_WORKER_PROCESSES=1)
+    def test_katex_worker(self) -> None:
+        self.addCleanup(katex_worker_pool.stop)
+        self.addCleanup(katex_cache.clear)
+        katex_cache.clear()
+        inline = render_tex_with_node("x^2", True)
+        display = render_tex_with_node("x^2", False)
+        assert inline is not None and display is not None
+
+        with mock.patch("zerver.lib.tex.render_tex_with_node") as m:
+            self.assertEqual(render_tex("x^2"), inline)
+            self.assertEqual(render_tex("x^2", is_inline=False), display)
+            self.assertIsNone(render_tex("\\"))
+        m.assert_not_called()
+
+        # All the formulas in a message are rendered at once.
+        with mock.patch.object(
+            KatexWorker, "render", autospec=True, side_effect=KatexWorker.render
+        ) as m:
+            converted = markdown_convert_wrapper(
+                "$$x^2$$ and $$y^2$$ and $$z^2$$\n```math\nx^2\n\nw^2\n```"
+            )
+        m.assert_called_once()
+        self.assertEqual(m.call_args.args[1], [("y^2", True), ("z^2", True), ("w^2", False)])
+        self.assertIn(inline, converted)
+        self.assertIn(display, converted)
+
+        # A worker which fails is replaced; until then, we start
+        # node for each formula.
+        with (
+            mock.patch.object(KatexWorker, "render", side_effect=TimeoutError),
+            self.assertLogs(level="WARNING") as logs,
+        ):
+            self.assertEqual(render_tex("v^2"), render_tex_with_node("v^2", True))
+        self.assertEqual(
+            logs.output, ["WARNING:root:KaTeX worker failed with 1 formulas: TimeoutError"]
+        )
+        self.assertEqual(katex_worker_pool.idle_workers, [])
+        self.assertEqual(render_tex("v^2"), render_tex_with_node("v^2", True))
+        self.assert_length(katex_worker_pool.idle_workers, 1)
+
+        # A new worker has its own time limit to start up, separate
+        # from that for rendering its first batch.
+        katex_worker_pool.stop()
+        with (
+            mock.patch("zerver.lib.tex.KATEX_WORKER_STARTUP_TIMEOUT_SECONDS", 0),
+            self.assertLogs(level="WARNING") as logs,
+        ):
+            self.assertEqual(render_tex("t^2"), render_tex_with_node("t^2", True))
+        self.assertEqual(
+            logs.output, ["WARNING:root:KaTeX worker failed with 1 formulas: TimeoutError"]
+        )
+
+    @responses.activate
+    @override_settings(KATEX_WORKER_PROCESSES=1, KATEX_SERVER=True, KATEX_SERVER_PORT=9701)
+    def test_katex_worker_server_fallback(self) -> None:
+        self.addCleanup(katex_worker_pool.stop)
+        self.addCleanup(katex_cache.clear)
+        katex_cache.clear()
+        responses.post(
+            "http://localhost:9701/",
+            body="<i>html</i>",
+            content_type="text/html; charset=utf-8",
+        )
+
+        # With a KaTeX server, we still render batches with the workers...
+        self.assertEqual(render_tex("x^2"), render_tex_with_node("x^2", True))
+        self.assert_length(responses.calls, 0)
+
+        # ... but a batch which fails falls back to the server.
+        with (
+            mock.patch.object(KatexWorker, "render", side_effect=TimeoutError),
+            mock.patch("zerver.lib.tex.render_tex_with_node") as m,
+            self.assertLogs(level="WARNING") as logs,
+        ):
+            self.assertEqual(render_tex("v^2"), "<i>html</i>")
+        m.assert_not_called()
+        self.assertEqual(
+            logs.output, ["WARNING:root:KaTeX worker failed with 1 formulas: TimeoutError"]
+        )
+        self.assert_length(responses.calls, 1)
+
 
 class MarkdownListPreprocessorTest(ZulipTestCase):
     # We test that the preprocessor inserts blank lines at correct places.
@@ -1167,6 +1313,47 @@ class MarkdownEmojiTest(ZulipTestCase):
         converted = markdown_convert(":green_tick:", message_realm=realm, message=msg)
         self.assertEqual(converted.rendered_content, "<p>:green_tick:</p>")
 
+    @override_settings(REALM_EMOJI_CACHE_MAX_REALMS=1)
+    def test_realm_emoji_cache(self) -> None:
+        self.addCleanup(realm_emoji_indexes.clear)
+        realm = get_realm("zulip")
+        self.assertIn("green_tick", get_active_realm_emoji(realm.id))
+
+        # Once a realm's emoji are cached, they're used until they change.
+        with mock.patch(
+            "zerver.lib.emoji.get_name_keyed_dict_for_active_realm_emoji"
+        ) as mock_get_emoji:
+            self.assertIn("green_tick", get_active_realm_emoji(realm.id))
+        mock_get_emoji.assert_not_called()
+
+        do_remove_realm_emoji(realm, "green_tick", acting_user=None)
+        self.assertNotIn("green_tick", get_active_realm_emoji(realm.id))
+        msg = Message(sender=self.example_user("hamlet"), realm=realm)
+        converted = markdown_convert(":green_tick:", message_realm=realm, message=msg)
+        self.assertEqual(converted.rendered_content, "<p>:green_tick:</p>")
+
+        # Only the most recently used realms' emoji are kept.
+        zephyr = get_realm("zephyr")
+        get_active_realm_emoji(zephyr.id)
+        self.assertEqual(list(realm_emoji_indexes), [zephyr.id])
+
+    def test_emoji_index(self) -> None:
+        with open(static_path("generated/emoji/emoji_codes.json"), "rb") as f:
+            emoji_codes = orjson.loads(f.read())
+        self.assertEqual(dict(name_to_codepoint), emoji_codes["name_to_codepoint"])
+        self.assertEqual(dict(codepoint_to_name), emoji_codes["codepoint_to_name"])
+        self.assertEqual(
+            list(EMOTICON_CONVERSIONS.items()),
+            list(emoji_codes["emoticon_conversions"].items()),
+        )
+        self.assertEqual(name_to_codepoint["coffee"], "2615")
+        self.assertNotIn("not_an_emoji", name_to_codepoint)
+
+        self.assertEqual(
+            translate_emoticons(":) <3 :P and (:"),
+            ":smile: :heart: :stuck_out_tongue: and :smile:",
+        )
+
     def test_deactivated_realm_emoji(self) -> None:
         # Deactivate realm emoji.
         realm = get_realm("zulip")
@@ -1709,6 +1896,60 @@ class MarkdownLinkifierTest(ZulipTestCase):
         converted_boring_topic = topic_links(realm.id, boring_msg.topic_name())
         self.assertEqual(converted_boring_topic, [])
 
+    def test_linkifier_matcher(self) -> None:
+        realm = get_realm("zulip")
+        RealmFilter.objects.filter(realm=realm).delete()
+        for i in range(50):
+            RealmFilter(
+                realm=realm,
+                pattern=f"PROJ{i}-(?P<id>[0-9]+)",
+                url_template=f"https://example.com/proj{i}/{{id}}",
+                order=i,
+            ).save()
+        # Overlaps with all the others, which take precedence.
+        RealmFilter(
+            realm=realm,
+            pattern=r"(?P<project>PROJ[0-9]+)-(?P<id>[0-9]+)",
+            url_template="https://example.com/{project}/{id}",
+            order=50,
+        ).save()
+        linkifiers = linkifiers_for_realm(realm.id)
+
+        matcher = get_linkifier_matcher(realm.id, linkifiers)
+        self.assertEqual(matcher.matching_linkifiers("PROJ7-12 and PROJ99-1"), {7, 50})
+        self.assertEqual(matcher.matching_linkifiers("PROJ7 and PROJ99"), set())
+        self.assertIs(get_linkifier_matcher(realm.id, linkifiers), matcher)
+
+        content = "Fixed PROJ7-12, PROJ42-3 and PROJ99-1, but not xPROJ7-13."
+        with mock.patch.object(matcher, "regex_set", wraps=matcher.regex_set) as m:
+            converted = markdown_convert(content, message_realm=realm)
+        self.assertEqual(
+            converted.rendered_content,
+            '<p>Fixed <a href="https://example.com/proj7/12">PROJ7-12</a>, '
+            '<a href="https://example.com/proj42/3">PROJ42-3</a> and '
+            '<a href="https://example.com/PROJ99/1">PROJ99-1</a>, but not xPROJ7-13.</p>',
+        )
+        # Each version of the text is searched with the set once,
+        # rather than with each of the 51 linkifiers.
+        self.assertEqual(m.Match.call_count, 4)
+
+        self.assertEqual(
+            topic_links(realm.id, "PROJ7-12 PROJ99-1"),
+            [
+                {"url": "https://example.com/proj7/12", "text": "PROJ7-12"},
+                {"url": "https://example.com/PROJ99/1", "text": "PROJ99-1"},
+            ],
+        )
+
+        # Changing the linkifiers replaces the matcher.
+        RealmFilter.objects.filter(realm=realm, order=7).delete()
+        linkifiers = linkifiers_for_realm(realm.id)
+        self.assertIsNot(get_linkifier_matcher(realm.id, linkifiers), matcher)
+        self.assertEqual(
+            topic_links(realm.id, "PROJ7-12"),
+            [{"url": "https://example.com/PROJ7/12", "text": "PROJ7-12"}],
+        )
+
     def test_is_status_message(self) -> None:
         user_profile = self.example_user("othello")
         msg = Message(
@@ -3264,6 +3505,109 @@ class MarkdownApiTests(ZulipTestCase):
         )
 
 
+class MarkdownRenderCacheTest(ZulipTestCase):
+    @override_settings(MARKDOWN_RENDER_CACHE_SIZE=2)
+    def test_render_cache(self) -> None:
+        self.addCleanup(markdown_render_cache.clear)
+        markdown_render_cache.clear()
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        content = "@**King Hamlet** deployed **version 1**"
+
+        rendering_result = markdown_convert(content, message_realm=realm)
+        self.assertEqual(markdown_render_cache.misses, 1)
+        with mock.patch("zerver.lib.markdown.render_markdown_request") as render:
+            cached_result = markdown_convert(content, message_realm=realm)
+        render.assert_not_called()
+        self.assertEqual(cached_result, rendering_result)
+        self.assertEqual(markdown_render_cache.hits, 1)
+
+        # Callers modifying their result don't affect the cache.
+        cached_result.mentions_user_ids.add(0)
+        self.assertEqual(markdown_convert(content, message_realm=realm), rendering_result)
+        self.assertEqual(markdown_render_cache.hits, 2)
+
+        # The key includes the data about users the message mentions.
+        do_change_full_name(hamlet, "Prince Hamlet", acting_user=None)
+        rendering_result = markdown_convert("@**Prince Hamlet** deployed", message_realm=realm)
+        self.assertIn("@Prince Hamlet", rendering_result.rendered_content)
+        self.assertEqual(markdown_render_cache.misses, 2)
+        self.assertEqual(markdown_convert(content, message_realm=realm).mentions_user_ids, set())
+        self.assertEqual(markdown_render_cache.misses, 3)
+
+        # Only the least recently used entries are kept.
+        self.assert_length(markdown_render_cache.entries, 2)
+
+        # Content which alert words match isn't cached, since the
+        # rendering depends on which users have those alert words.
+        do_add_alert_words(hamlet, ["deployed"])
+        realm_alert_words_automaton = get_alert_word_automaton(realm)
+        rendering_result = markdown_convert(
+            content,
+            message_realm=realm,
+            realm_alert_words_automaton=realm_alert_words_automaton,
+        )
+        self.assertEqual(rendering_result.user_ids_with_alert_words, {hamlet.id})
+        self.assertEqual(markdown_render_cache.bypasses, 1)
+        self.assertEqual(markdown_render_cache.hit_rate(), 2 / 6)
+
+        # The key includes the realm's default code block language.
+        content = "```\nprint('hello')\n```"
+        rendering_result = markdown_convert(content, message_realm=realm)
+        do_set_realm_property(realm, "default_code_block_language", "quote", acting_user=None)
+        quoted_result = markdown_convert(content, message_realm=realm)
+        self.assertEqual(markdown_render_cache.misses, 5)
+        self.assertNotEqual(quoted_result.rendered_content, rendering_result.rendered_content)
+        self.assertIn("<blockquote>", quoted_result.rendered_content)
+
+
+class MarkdownRenderingPoolTest(ZulipTestCase):
+    @override_settings(MARKDOWN_RENDERING_PROCESSES=1)
+    def test_rendering_pool(self) -> None:
+        realm = get_realm("zulip")
+        message = Message(sender=self.example_user("othello"), sending_client=get_client("test"))
+        content = "@**King Hamlet** see https://example.com :smile:"
+        expected = markdown_convert(content, message_realm=realm, message=message)
+        self.assertTrue(message.has_link)
+        message.has_link = False
+
+        pool = MarkdownRenderingPool(1)
+        renderer = pool.idle_renderers.get()
+        pool.idle_renderers.put(renderer)
+        self.addCleanup(lambda: renderer.process.kill())
+        with mock.patch("zerver.lib.markdown_rendering_pool.rendering_pool", pool):
+            rendering_result = markdown_convert(content, message_realm=realm, message=message)
+            self.assertEqual(rendering_result, expected)
+            # Flags set on the message by the renderer process are
+            # copied to the message.
+            self.assertTrue(message.has_link)
+
+            requests = [
+                prepare_markdown_render(f"**message {i}**", message_realm=realm) for i in range(4)
+            ]
+            results = bulk_render_markdown_requests(requests)
+            self.assertEqual(
+                [result.rendered_content if result else None for result in results],
+                [f"<p><strong>message {i}</strong></p>" for i in range(4)],
+            )
+
+            # A renderer which takes too long is killed, and replaced.
+            process = renderer.process
+            with (
+                mock.patch("zerver.lib.markdown.MARKDOWN_RENDERING_TIMEOUT_SECONDS", 0),
+                self.assertLogs(level="ERROR"),
+                self.assertRaises(MarkdownRenderingError),
+            ):
+                markdown_convert("**slow**", message_realm=realm)
+            self.assertFalse(process.is_alive())
+            self.assertNotEqual(renderer.process, process)
+
+            self.assertEqual(
+                markdown_convert("**fast**", message_realm=realm).rendered_content,
+                "<p><strong>fast</strong></p>",
+            )
+
+
 class MarkdownErrorTests(ZulipTestCase):
     def test_markdown_error_handling(self) -> None:
         with self.simulated_markdown_failure(), self.assertRaises(MarkdownRenderingError):
@@ -3285,8 +3629,13 @@ class MarkdownErrorTests(ZulipTestCase):
         throws an exception"""
         msg = "mock rendered message\n" * 10 * settings.MAX_MESSAGE_LENGTH
 
+        def render(request: MarkdownRenderRequest) -> MarkdownRenderResponse:
+            response = render_markdown_request(request)
+            response.rendering_result.rendered_content = msg
+            return response
+
         with (
-            mock.patch("zerver.lib.markdown.unsafe_timeout", return_value=msg),
+            mock.patch("zerver.lib.markdown.render_markdown_request", side_effect=render),
             mock.patch("zerver.lib.markdown.markdown_logger"),
             self.assertRaises(MarkdownRenderingError),
         ):
@@ -3,9 +3,15 @@ from unittest import mock
 
 import orjson
 from django.db import connection, transaction
+from django.db.models import F
 from typing_extensions import override
 
-from zerver.actions.message_flags import do_update_message_flags
+from zerver.actions.message_flags import (
+    bulk_mark_as_read,
+    do_mark_all_as_read,
+    do_mark_stream_messages_as_read,
+    do_update_message_flags,
+)
 from zerver.actions.streams import do_change_stream_permission
 from zerver.actions.user_topics import do_set_user_topic_visibility_policy
 from zerver.lib.fix_unreads import fix, fix_unsubscribed
@@ -17,12 +23,15 @@ from zerver.lib.message import (
     add_message_to_unread_msgs,
     aggregate_unread_data,
     apply_unread_message_event,
+    bulk_access_message_ids,
     bulk_access_messages,
     bulk_access_stream_messages_query,
     format_unread_message_details,
     get_raw_unread_data,
+    has_message_access,
 )
 from zerver.lib.message_cache import MessageDict
+from zerver.lib.partial import partial
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import get_subscription
 from zerver.lib.user_message import DEFAULT_HISTORICAL_FLAGS, create_historical_user_messages
@@ -913,6 +922,60 @@ class MarkAllAsReadEndpointTest(ZulipTestCase):
             result_dict = self.assert_json_success(result)
             self.assertFalse(result_dict["complete"])
 
+    def test_mark_as_read_in_batches(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        UserMessage.objects.filter(user_profile=hamlet).update(
+            flags=F("flags").bitor(UserMessage.flags.read)
+        )
+        stream = get_stream("Verona", hamlet.realm)
+        assert stream.recipient_id is not None
+        message_ids = [self.send_stream_message(othello, "Verona", "test") for i in range(5)]
+
+        with (
+            mock.patch("zerver.actions.message_flags.MARK_AS_READ_BATCH_SIZE", 2),
+            self.capture_send_event_calls(expected_num_events=3) as events,
+        ):
+            count = do_mark_stream_messages_as_read(hamlet, stream.recipient_id)
+        self.assertEqual(count, 5)
+        # Each batch sends a single event for its messages.
+        self.assertEqual(
+            [event["event"]["messages"] for event in events],
+            [message_ids[0:2], message_ids[2:4], message_ids[4:5]],
+        )
+
+        message_ids += [self.send_personal_message(othello, hamlet, "test") for i in range(3)]
+
+        # If we run out of time, we can resume where we stopped.
+        with (
+            mock.patch("zerver.actions.message_flags.MARK_AS_READ_BATCH_SIZE", 2),
+            mock.patch("time.monotonic", side_effect=[10000, 10000, 10051]),
+            self.capture_send_event_calls(expected_num_events=0),
+        ):
+            progress = do_mark_all_as_read(hamlet, timeout=50)
+        self.assertFalse(progress.complete)
+        self.assertEqual(progress.updated_count, 2)
+        self.assertEqual(progress.last_message_id, message_ids[6])
+
+        with (
+            mock.patch("zerver.actions.message_flags.MARK_AS_READ_BATCH_SIZE", 2),
+            self.capture_send_event_calls(expected_num_events=1) as events,
+        ):
+            progress = bulk_mark_as_read(
+                hamlet,
+                UserMessage.objects.filter(user_profile=hamlet),
+                send_batch_events=True,
+                progress=progress,
+            )
+        self.assertTrue(progress.complete)
+        self.assertEqual(progress.updated_count, 3)
+        self.assertEqual(events[0]["event"]["messages"], [message_ids[7]])
+        self.assertFalse(
+            UserMessage.objects.filter(user_profile=hamlet)
+            .extra(where=[UserMessage.where_unread()])  # noqa: S610
+            .exists()
+        )
+
 
 class GetUnreadMsgsTest(ZulipTestCase):
     def mute_stream(self, user_profile: UserProfile, stream: Stream) -> None:
@@ -1789,13 +1852,13 @@ class MessageAccessTests(ZulipTestCase):
         # Message sent before subscribing are accessible by user as stream
         # now don't have protected history
         filtered_messages = self.assert_bulk_access(
-            later_subscribed_user, message_ids, stream, 4, 2
+            later_subscribed_user, message_ids, stream, 3, 2
         )
         self.assert_length(filtered_messages, 2)
 
         # Testing messages accessibility for an unsubscribed user
         unsubscribed_user = self.example_user("ZOE")
-        filtered_messages = self.assert_bulk_access(unsubscribed_user, message_ids, stream, 4, 1)
+        filtered_messages = self.assert_bulk_access(unsubscribed_user, message_ids, stream, 3, 1)
         self.assert_length(filtered_messages, 0)
 
         # Adding more message ids to the list increases the query size
@@ -1844,14 +1907,70 @@ class MessageAccessTests(ZulipTestCase):
 
         # All public stream messages are always accessible
         filtered_messages = self.assert_bulk_access(
-            later_subscribed_user, message_ids, stream, 4, 1
+            later_subscribed_user, message_ids, stream, 2, 1
         )
         self.assert_length(filtered_messages, 2)
 
         unsubscribed_user = self.example_user("ZOE")
-        filtered_messages = self.assert_bulk_access(unsubscribed_user, message_ids, stream, 4, 1)
+        filtered_messages = self.assert_bulk_access(unsubscribed_user, message_ids, stream, 2, 1)
         self.assert_length(filtered_messages, 2)
 
+    def test_bulk_access_message_ids(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+
+        self.make_stream("private", invite_only=True, history_public_to_subscribers=False)
+        self.subscribe(hamlet, "private")
+        private_before_id = self.send_stream_message(hamlet, "private")
+        self.subscribe(cordelia, "private")
+        private_after_id = self.send_stream_message(hamlet, "private")
+
+        self.subscribe(hamlet, "Verona")
+        public_ids = [self.send_stream_message(hamlet, "Verona") for i in range(3)]
+        direct_id = self.send_personal_message(hamlet, cordelia)
+        other_direct_id = self.send_personal_message(hamlet, othello)
+
+        zephyr_user = self.mit_user("sipbtest")
+        zephyr_stream = "zephyr-stream"
+        self.subscribe(zephyr_user, zephyr_stream)
+        other_realm_id = self.send_stream_message(zephyr_user, zephyr_stream)
+
+        message_ids = [
+            private_before_id,
+            private_after_id,
+            *public_ids,
+            direct_id,
+            other_direct_id,
+            other_realm_id,
+            # A message ID which does not exist.
+            other_realm_id + 1000,
+        ]
+
+        # The query count doesn't depend on the number of messages:
+        # recipients, streams, subscriptions, and UserMessage rows.
+        with self.assert_database_query_count(4):
+            accessible_ids = bulk_access_message_ids(cordelia, message_ids)
+        self.assertEqual(accessible_ids, {private_after_id, *public_ids, direct_id})
+
+        def has_user_message(message_id: int) -> bool:
+            return UserMessage.objects.filter(user_profile=cordelia, message_id=message_id).exists()
+
+        # Verify that the results match has_message_access.
+        for message_id in message_ids[:-1]:
+            message = Message.objects.get(id=message_id)
+            self.assertEqual(
+                message_id in accessible_ids,
+                has_message_access(
+                    cordelia, message, has_user_message=partial(has_user_message, message_id)
+                ),
+            )
+
+        # Public stream messages need no subscription or UserMessage checks.
+        with self.assert_database_query_count(2):
+            accessible_ids = bulk_access_message_ids(cordelia, public_ids)
+        self.assertEqual(accessible_ids, set(public_ids))
+
 
 class PersonalMessagesFlagTest(ZulipTestCase):
     def test_is_private_flag_not_leaked(self) -> None:
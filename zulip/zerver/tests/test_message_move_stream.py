@@ -1101,7 +1101,7 @@ class MessageMoveStreamTest(ZulipTestCase):
             "iago", "test move stream", "new stream", "test"
         )
 
-        with self.assert_database_query_count(51), self.assert_memcached_count(14):
+        with self.assert_database_query_count(51), self.assert_memcached_count(12):
             result = self.client_patch(
                 f"/json/messages/{msg_id}",
                 {
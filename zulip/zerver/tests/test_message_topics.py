@@ -2,9 +2,11 @@ from unittest import mock
 
 from django.utils.timezone import now as timezone_now
 
+from zerver.actions.message_delete import do_delete_messages
 from zerver.actions.streams import do_change_stream_permission
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.models import Message, UserMessage
+from zerver.lib.topic import RESOLVED_TOPIC_PREFIX, update_stream_topics_for_new_messages
+from zerver.models import Message, StreamTopic, UserMessage
 from zerver.models.clients import get_client
 from zerver.models.realms import get_realm
 from zerver.models.streams import get_stream
@@ -52,6 +54,7 @@ class TopicHistoryTest(ZulipTestCase):
             )
             message.set_topic_name(topic_name)
             message.save()
+            update_stream_topics_for_new_messages([message])
 
             UserMessage.objects.create(
                 user_profile=user_profile,
@@ -212,6 +215,93 @@ class TopicHistoryTest(ZulipTestCase):
         result = self.client_get(endpoint)
         self.assert_json_error(result, "Invalid channel ID", 400)
 
+    def test_topics_history_pagination(self) -> None:
+        iago = self.example_user("iago")
+        self.login_user(iago)
+        stream = self.make_stream("paginated-stream")
+        self.subscribe(iago, stream.name)
+
+        message_ids = [
+            self.send_stream_message(iago, stream.name, topic_name=f"topic{i}") for i in range(5)
+        ]
+        endpoint = f"/json/users/me/{stream.id}/topics"
+
+        result = self.client_get(endpoint, {"num_topics": 2})
+        history = self.assert_json_success(result)["topics"]
+        self.assertEqual([topic["name"] for topic in history], ["topic4", "topic3"])
+
+        result = self.client_get(endpoint, {"num_topics": 2, "before_max_id": message_ids[3]})
+        history = self.assert_json_success(result)["topics"]
+        self.assertEqual([topic["name"] for topic in history], ["topic2", "topic1"])
+
+        result = self.client_get(endpoint, {"num_topics": 2, "before_max_id": message_ids[1]})
+        history = self.assert_json_success(result)["topics"]
+        self.assertEqual([topic["name"] for topic in history], ["topic0"])
+
+        # Protected history streams use a different code path, which
+        # should paginate the same way.
+        do_change_stream_permission(
+            stream,
+            invite_only=True,
+            history_public_to_subscribers=False,
+            is_web_public=False,
+            acting_user=iago,
+        )
+        result = self.client_get(endpoint, {"num_topics": 2, "before_max_id": message_ids[3]})
+        history = self.assert_json_success(result)["topics"]
+        self.assertEqual([topic["name"] for topic in history], ["topic2", "topic1"])
+
+        result = self.client_get(endpoint, {"num_topics": 0})
+        self.assert_json_error(result, "num_topics is too small")
+
+    def test_stream_topic_summary(self) -> None:
+        hamlet = self.example_user("hamlet")
+        self.login_user(hamlet)
+        stream = self.make_stream("summary-stream")
+        self.subscribe(hamlet, stream.name)
+        assert stream.recipient_id is not None
+
+        def get_summary() -> list[tuple[str, int, int, bool]]:
+            return list(
+                StreamTopic.objects.filter(recipient_id=stream.recipient_id)
+                .order_by("-last_message_id")
+                .values_list("topic_name", "last_message_id", "message_count", "is_resolved")
+            )
+
+        first_id = self.send_stream_message(hamlet, stream.name, topic_name="Topic")
+        second_id = self.send_stream_message(hamlet, stream.name, topic_name="topic")
+        other_id = self.send_stream_message(hamlet, stream.name, topic_name="other")
+        # Topics are case-insensitive; the most recent casing is used.
+        self.assertEqual(
+            get_summary(), [("other", other_id, 1, False), ("topic", second_id, 2, False)]
+        )
+
+        # Resolving a topic moves its messages to a new topic name.
+        result = self.client_patch(
+            f"/json/messages/{first_id}",
+            {"topic": RESOLVED_TOPIC_PREFIX + "topic", "propagate_mode": "change_all"},
+        )
+        self.assert_json_success(result)
+        self.assertEqual(
+            get_summary(),
+            [("other", other_id, 1, False), (RESOLVED_TOPIC_PREFIX + "topic", second_id, 2, True)],
+        )
+
+        # Moving a single message recomputes both the old and new topic.
+        result = self.client_patch(
+            f"/json/messages/{second_id}",
+            {"topic": "other", "propagate_mode": "change_one"},
+        )
+        self.assert_json_success(result)
+        self.assertEqual(
+            get_summary(),
+            [("other", other_id, 2, False), (RESOLVED_TOPIC_PREFIX + "topic", first_id, 1, True)],
+        )
+
+        # Deleting the last message in a topic removes its summary.
+        do_delete_messages(hamlet.realm, [Message.objects.get(id=first_id)], acting_user=None)
+        self.assertEqual(get_summary(), [("other", other_id, 2, False)])
+
 
 class TopicDeleteTest(ZulipTestCase):
     def test_topic_delete(self) -> None:
@@ -5,11 +5,23 @@ from unittest import mock
 import time_machine
 from django.conf import settings
 from django.db import connection
+from django.test import override_settings
 from django.utils.timezone import now as timezone_now
 from typing_extensions import override
 
+from zerver.actions.user_settings import do_change_user_setting
 from zerver.actions.users import do_deactivate_user
-from zerver.lib.presence import format_legacy_presence_dict, get_presence_dict_by_realm
+from zerver.lib import presence_store
+from zerver.lib.presence import (
+    format_legacy_presence_dict,
+    get_presence_dict_by_realm,
+    get_presence_for_user,
+)
+from zerver.lib.presence_store import (
+    PRESENCE_SEQUENCE_RESTART_GAP,
+    clear_presence_store,
+    flush_presence_updates,
+)
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import make_client, reset_email_visibility_to_everyone_in_zulip_realm
 from zerver.lib.timestamp import datetime_to_timestamp
@@ -20,6 +32,7 @@ from zerver.models import (
     UserPresence,
     UserProfile,
 )
+from zerver.models.presence import PresenceSequence
 from zerver.models.realms import get_realm
 
 
@@ -502,36 +515,52 @@ class UserPresenceTests(ZulipTestCase):
 
         # Ensure we're starting with a clean slate.
         UserPresence.objects.all().delete()
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [user_profile.id])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id),
+            [user_profile.id],
+        )
 
         # Create a first presence for the user. It's the first one and has status idle,
         # so it'll initialize just last_connected time with the current time and last_active_time with None.
         # Thus the user will be considered idle.
         self.client_post("/json/users/me/presence", {"status": "idle"})
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [user_profile.id])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id),
+            [user_profile.id],
+        )
 
         # Now create a first presence with active status and check that the user is not filtered.
         # This initializes the presence with both last_connected_time and last_active_time set to
         # current time.
         self.client_post("/json/users/me/presence", {"status": "active"})
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id), []
+        )
 
         # Make last_active_time be older than OFFLINE_THRESHOLD_SECS. That should
         # get the user filtered.
         UserPresence.objects.filter(user_profile=user_profile).update(
             last_active_time=timezone_now() - timedelta(seconds=settings.OFFLINE_THRESHOLD_SECS + 1)
         )
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [user_profile.id])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id),
+            [user_profile.id],
+        )
 
         # Sending an idle presence doesn't change anything for filtering.
         self.client_post("/json/users/me/presence", {"status": "idle"})
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [user_profile.id])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id),
+            [user_profile.id],
+        )
 
         # Active presence from the mobile app should count (in the old API it didn't)
         self.client_post(
             "/json/users/me/presence", {"status": "active"}, HTTP_USER_AGENT="ZulipMobile/1.0"
         )
-        self.assertEqual(filter_presence_idle_user_ids({user_profile.id}), [])
+        self.assertEqual(
+            filter_presence_idle_user_ids({user_profile.id}, user_profile.realm_id), []
+        )
 
     def test_no_mit(self) -> None:
         """Zephyr mirror realms such as MIT never get a list of users"""
@@ -1030,3 +1059,158 @@ class FormatLegacyPresenceDictTest(ZulipTestCase):
                 pushable=False,
             ),
         )
+
+
+@override_settings(PRESENCE_UPDATES_IN_REDIS=True)
+class RedisPresenceStoreTest(ZulipTestCase):
+    def test_updates_are_flushed_to_database(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        UserPresence.objects.all().delete()
+        sequence_start = PresenceSequence.objects.get(realm=hamlet.realm).last_update_id
+
+        self.login_user(hamlet)
+        params = dict(status="active", last_update_id=-1)
+        result = self.client_post("/json/users/me/presence", params)
+        json = self.assert_json_success(result)
+        self.assertEqual(set(json["presences"].keys()), {str(hamlet.id)})
+        last_update_id = json["presence_last_update_id"]
+        # We skip past any IDs which may have been handed out before a
+        # Redis restart, and nothing has been written to the database yet.
+        self.assertEqual(last_update_id, sequence_start + PRESENCE_SEQUENCE_RESTART_GAP + 1)
+        self.assertFalse(UserPresence.objects.exists())
+
+        self.login_user(othello)
+        params = dict(status="idle", last_update_id=last_update_id)
+        result = self.client_post("/json/users/me/presence", params)
+        json = self.assert_json_success(result)
+        self.assertEqual(set(json["presences"].keys()), {str(othello.id)})
+        self.assertEqual(json["presence_last_update_id"], last_update_id + 1)
+
+        # Fetching without any changes returns the same last_update_id.
+        params = dict(status="idle", last_update_id=last_update_id + 1)
+        result = self.client_post("/json/users/me/presence", params)
+        json = self.assert_json_success(result)
+        self.assertEqual(json["presences"], {})
+        self.assertEqual(json["presence_last_update_id"], last_update_id + 1)
+
+        redis_presence = get_presence_for_user(hamlet.id, slim_presence=True)
+        self.assertEqual(flush_presence_updates(), 2)
+        self.assertEqual(flush_presence_updates(), 0)
+        self.assertEqual(
+            PresenceSequence.objects.get(realm=hamlet.realm).last_update_id, last_update_id + 1
+        )
+        presence = UserPresence.objects.get(user_profile=hamlet)
+        self.assertEqual(presence.last_update_id, last_update_id)
+        self.assertIsNone(UserPresence.objects.get(user_profile=othello).last_active_time)
+
+        # After the data in Redis is lost, it's reloaded from the
+        # database, with the same presence data.
+        clear_presence_store()
+        with override_settings(PRESENCE_UPDATES_IN_REDIS=False):
+            self.assertEqual(get_presence_for_user(hamlet.id, slim_presence=True), redis_presence)
+        self.assertEqual(get_presence_for_user(hamlet.id, slim_presence=True), redis_presence)
+        presence_dict, server_last_update_id = get_presence_dict_by_realm(
+            hamlet.realm, slim_presence=True
+        )
+        self.assertEqual(set(presence_dict.keys()), {str(hamlet.id), str(othello.id)})
+        self.assertEqual(server_last_update_id, last_update_id + 1)
+
+        self.login_user(othello)
+        self.client_post("/json/users/me/presence", dict(status="active"))
+        presence_dict, server_last_update_id = get_presence_dict_by_realm(
+            hamlet.realm, slim_presence=True, last_update_id_fetched_by_client=last_update_id + 1
+        )
+        self.assertEqual(set(presence_dict.keys()), {str(othello.id)})
+        self.assertEqual(
+            server_last_update_id, last_update_id + 1 + PRESENCE_SEQUENCE_RESTART_GAP + 1
+        )
+
+    def test_failed_flush_is_retried(self) -> None:
+        hamlet = self.example_user("hamlet")
+        UserPresence.objects.all().delete()
+        self.login_user(hamlet)
+        self.client_post("/json/users/me/presence", dict(status="active"))
+
+        with (
+            mock.patch.object(
+                UserPresence.objects, "bulk_create", side_effect=RuntimeError("Boom")
+            ),
+            self.assertRaisesRegex(RuntimeError, "Boom"),
+        ):
+            flush_presence_updates()
+        self.assertFalse(UserPresence.objects.exists())
+
+        self.assertEqual(flush_presence_updates(), 1)
+        self.assertTrue(UserPresence.objects.filter(user_profile=hamlet).exists())
+
+    def test_concurrent_update(self) -> None:
+        hamlet = self.example_user("hamlet")
+        UserPresence.objects.all().delete()
+        self.login_user(hamlet)
+
+        # Another process updates the user's presence between our
+        # reading and writing it; we let that update win.
+        presence, raw_value = presence_store.get_user_presence(hamlet)
+        self.assertIsNone(presence)
+        self.assertEqual(get_presence_for_user(hamlet.id), {})
+        self.client_post("/json/users/me/presence", dict(status="active"))
+        with (
+            mock.patch(
+                "zerver.lib.presence_store.get_user_presence", return_value=(None, raw_value)
+            ),
+            self.assertLogs("zerver.actions.presence", level="INFO") as mock_logs,
+        ):
+            result = self.client_post("/json/users/me/presence", dict(status="idle"))
+        self.assert_json_success(result)
+        self.assertEqual(
+            mock_logs.output,
+            [
+                f"INFO:zerver.actions.presence:UserPresence concurrently updated for {hamlet.id}, returning."
+            ],
+        )
+
+        presence, raw_value = presence_store.get_user_presence(hamlet)
+        assert presence is not None
+        self.assertIsNotNone(presence.last_active_time)
+
+    def test_filter_presence_idle_user_ids(self) -> None:
+        from zerver.actions.message_send import filter_presence_idle_user_ids
+
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        UserPresence.objects.all().delete()
+        self.login_user(hamlet)
+        self.client_post("/json/users/me/presence", dict(status="active"))
+
+        # Active users are found before their presence is flushed to
+        # the database.
+        self.assertFalse(UserPresence.objects.exists())
+        self.assertEqual(
+            filter_presence_idle_user_ids({hamlet.id, othello.id}, hamlet.realm_id), [othello.id]
+        )
+
+        with time_machine.travel(
+            timezone_now() + timedelta(seconds=settings.OFFLINE_THRESHOLD_SECS + 1), tick=False
+        ):
+            self.assertEqual(
+                filter_presence_idle_user_ids({hamlet.id, othello.id}, hamlet.realm_id),
+                [hamlet.id, othello.id],
+            )
+
+    def test_disable_presence(self) -> None:
+        hamlet = self.example_user("hamlet")
+        self.login_user(hamlet)
+        self.client_post("/json/users/me/presence", dict(status="active"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            do_change_user_setting(hamlet, "presence_enabled", False, acting_user=None)
+
+        presence, _ = presence_store.get_user_presence(hamlet)
+        assert presence is not None
+        self.assertIsNone(presence.last_active_time)
+        assert presence.last_connected_time is not None
+        self.assertLess(
+            presence.last_connected_time,
+            timezone_now() - timedelta(seconds=settings.OFFLINE_THRESHOLD_SECS),
+        )
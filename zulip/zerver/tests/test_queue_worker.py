@@ -840,7 +840,7 @@ class WorkerTest(ZulipTestCase):
             MAX_CONSUME_SECONDS = 1
 
             @override
-            def consume(self, data: Mapping[str, Any]) -> None:
+            def consume_batch(self, events: list[dict[str, Any]]) -> None:
                 # Send SIGALRM to ourselves to simulate a timeout.
                 pid = os.getpid()
                 os.kill(pid, signal.SIGALRM)
@@ -854,6 +854,14 @@ class WorkerTest(ZulipTestCase):
                 "urls": ["first", "second"],
             },
         )
+        fake_client.enqueue(
+            "timeout_worker",
+            {
+                "type": "timeout",
+                "message_id": 16,
+                "urls": ["third"],
+            },
+        )
 
         with simulated_queue_client(fake_client):
             worker = TimeoutWorker()
@@ -864,6 +872,10 @@ class WorkerTest(ZulipTestCase):
                     m.records[0].message,
                     "Timed out in timeout_worker after 1 seconds while fetching URLs for message 15: ['first', 'second']",
                 )
+                self.assertEqual(
+                    m.records[1].message,
+                    "Timed out in timeout_worker after 1 seconds while fetching URLs for message 16: ['third']",
+                )
 
     def test_worker_noname(self) -> None:
         class TestWorker(base_worker.QueueProcessingWorker):
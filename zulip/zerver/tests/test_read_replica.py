@@ -0,0 +1,62 @@
+import time
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+
+from zerver.lib import read_replica
+from zerver.lib.read_replica import (
+    REPLICA_DB_ALIAS,
+    ReadReplicaRouter,
+    ReplicaStatus,
+    choose_read_database,
+    read_database_alias,
+    reads_from_replica,
+)
+from zerver.lib.test_classes import ZulipTestCase
+from zerver.models import Message
+
+
+class ReadReplicaTest(ZulipTestCase):
+    def replica_status(self, *, usable: bool = True, max_message_id: int = 100) -> ReplicaStatus:
+        return ReplicaStatus(
+            checked_at=time.monotonic(), usable=usable, max_message_id=max_message_id
+        )
+
+    def test_no_replica_configured(self) -> None:
+        self.assertEqual(choose_read_database(), DEFAULT_DB_ALIAS)
+        with reads_from_replica() as alias:
+            self.assertEqual(alias, DEFAULT_DB_ALIAS)
+            self.assertEqual(read_database_alias.get(), DEFAULT_DB_ALIAS)
+
+    def test_choose_read_database(self) -> None:
+        with mock.patch.object(read_replica, "replica_configured", return_value=True):
+            with mock.patch.object(read_replica, "replica_status", self.replica_status()):
+                self.assertEqual(choose_read_database(), REPLICA_DB_ALIAS)
+                self.assertEqual(choose_read_database(max_message_id=100), REPLICA_DB_ALIAS)
+                # The replica hasn't seen this message yet.
+                self.assertEqual(choose_read_database(max_message_id=101), DEFAULT_DB_ALIAS)
+
+                with reads_from_replica() as alias:
+                    self.assertEqual(alias, REPLICA_DB_ALIAS)
+                    self.assertEqual(read_database_alias.get(), REPLICA_DB_ALIAS)
+                self.assertEqual(read_database_alias.get(), DEFAULT_DB_ALIAS)
+
+            with mock.patch.object(
+                read_replica, "replica_status", self.replica_status(usable=False)
+            ):
+                self.assertEqual(choose_read_database(), DEFAULT_DB_ALIAS)
+
+    def test_router(self) -> None:
+        router = ReadReplicaRouter()
+        self.assertEqual(router.db_for_read(Message), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Message), DEFAULT_DB_ALIAS)
+
+        token = read_database_alias.set(REPLICA_DB_ALIAS)
+        try:
+            self.assertEqual(router.db_for_read(Message), REPLICA_DB_ALIAS)
+            self.assertEqual(router.db_for_write(Message), DEFAULT_DB_ALIAS)
+        finally:
+            read_database_alias.reset(token)
+
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, "zerver"))
+        self.assertFalse(router.allow_migrate(REPLICA_DB_ALIAS, "zerver"))
@@ -1,11 +1,15 @@
 import re
+from unittest import mock
 
 import orjson
 from django.core.exceptions import ValidationError
+from django.test import override_settings
 from typing_extensions import override
 
+from zerver.actions.realm_linkifiers import do_add_linkifier
+from zerver.lib.message_rerendering import rerender_messages
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.models import RealmAuditLog, RealmFilter
+from zerver.models import Message, RealmAuditLog, RealmFilter
 from zerver.models.linkifiers import url_template_validator
 
 
@@ -221,6 +225,58 @@ class RealmFilterTest(ZulipTestCase):
         result = self.client_patch(f"/json/realm/filters/{linkifier_id}", info=data)
         self.assert_json_error(result, "Invalid URL template.")
 
+    @override_settings(RERENDER_MESSAGES_ON_REALM_CHANGES=True)
+    def test_rerender_messages(self) -> None:
+        iago = self.example_user("iago")
+        hamlet = self.example_user("hamlet")
+        matching_message_id = self.send_stream_message(hamlet, "Denmark", "Fixed in TRAC-1234.")
+        other_message_id = self.send_stream_message(hamlet, "Denmark", "Fixed in 1234.")
+        other_rendered_content = Message.objects.get(id=other_message_id).rendered_content
+
+        with self.capture_send_event_calls(expected_num_events=2) as events:
+            do_add_linkifier(
+                iago.realm,
+                "TRAC-(?P<id>[0-9]+)",
+                "https://trac.example.com/ticket/{id}",
+                acting_user=iago,
+            )
+
+        self.assertEqual(events[0]["event"]["type"], "realm_linkifiers")
+        update_event = events[1]["event"]
+        self.assertEqual(update_event["type"], "update_message")
+        self.assertEqual(update_event["message_ids"], [matching_message_id])
+        self.assertTrue(update_event["rendering_only"])
+        self.assertIn(hamlet.id, [user_info["id"] for user_info in events[1]["users"]])
+
+        message = Message.objects.get(id=matching_message_id)
+        self.assertEqual(
+            message.rendered_content,
+            '<p>Fixed in <a href="https://trac.example.com/ticket/1234">TRAC-1234</a>.</p>',
+        )
+        self.assertEqual(update_event["rendered_content"], message.rendered_content)
+        self.assertTrue(message.has_link)
+        self.assertEqual(
+            Message.objects.get(id=other_message_id).rendered_content, other_rendered_content
+        )
+
+        # Rendering it again changes nothing, and running out of time
+        # reports where to continue.
+        with (
+            mock.patch("zerver.lib.message_rerendering.RERENDER_SCAN_BATCH_SIZE", 1),
+            mock.patch("zerver.lib.message_rerendering.RERENDER_TIME_LIMIT_SECONDS", -1),
+        ):
+            progress = rerender_messages(
+                iago.realm,
+                ["TRAC-(?P<id>[0-9]+)"],
+                [],
+                min_id=matching_message_id - 1,
+                max_id=other_message_id,
+            )
+        self.assertEqual(progress.scanned_count, 1)
+        self.assertEqual(progress.rerendered_count, 0)
+        self.assertEqual(progress.last_message_id, matching_message_id)
+        self.assertFalse(progress.complete)
+
     def test_valid_urls(self) -> None:
         valid_urls = [
             "http://example.com/",
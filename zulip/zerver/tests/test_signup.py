@@ -1053,7 +1053,7 @@ class LoginTest(ZulipTestCase):
         # the alert words for a realm, etc.
         with (
             self.assert_database_query_count(94),
-            self.assert_memcached_count(14),
+            self.assert_memcached_count(13),
             self.captureOnCommitCallbacks(execute=True),
         ):
             self.register(self.nonreg_email("test"), "test")
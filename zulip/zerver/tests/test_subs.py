@@ -1,4 +1,5 @@
 import hashlib
+import itertools
 import random
 from collections.abc import Sequence
 from datetime import timedelta
@@ -6535,6 +6536,71 @@ class GetSubscribersTest(ZulipTestCase):
         self.login("iago")
         self.make_successful_subscriber_request(stream_name)
 
+    def test_gather_subscriptions_with_subscriber_counts(self) -> None:
+        sub_info = gather_subscriptions_helper(self.user_profile, include_subscribers=True)
+        expected_counts = {
+            sub["stream_id"]: len(sub["subscribers"])
+            for sub in [*sub_info.subscriptions, *sub_info.unsubscribed, *sub_info.never_subscribed]
+        }
+
+        sub_info = gather_subscriptions_helper(
+            self.user_profile, include_subscribers=False, include_subscriber_counts=True
+        )
+        for sub in [*sub_info.subscriptions, *sub_info.unsubscribed, *sub_info.never_subscribed]:
+            self.assertNotIn("subscribers", sub)
+            self.assertEqual(sub["subscriber_count"], expected_counts[sub["stream_id"]])
+
+    def test_json_get_bulk_subscribers(self) -> None:
+        self.make_stream("private_stream", invite_only=True)
+        self.subscribe(self.example_user("iago"), "private_stream")
+        realm = self.user_profile.realm
+        stream_ids = [get_stream(name, realm).id for name in ["Verona", "Denmark"]]
+        expected_subscribers = {
+            str(stream_id): sorted(
+                get_active_subscriptions_for_stream_id(
+                    stream_id, include_deactivated_users=False
+                ).values_list("user_profile_id", flat=True)
+            )
+            for stream_id in stream_ids
+        }
+
+        result = self.client_get(
+            "/json/streams/members", {"stream_ids": orjson.dumps(stream_ids).decode()}
+        )
+        self.assertEqual(self.assert_json_success(result)["subscribers"], expected_subscribers)
+
+        result = self.client_get(
+            "/json/streams/members",
+            {"stream_ids": orjson.dumps(stream_ids).decode(), "delta_encoded": "true"},
+        )
+        delta_encoded_subscribers = self.assert_json_success(result)["subscribers"]
+        for stream_id, user_ids in expected_subscribers.items():
+            self.assertEqual(
+                list(itertools.accumulate(delta_encoded_subscribers[stream_id])), user_ids
+            )
+
+        # Hamlet isn't subscribed to the private stream.
+        private_stream_id = get_stream("private_stream", realm).id
+        result = self.client_get(
+            "/json/streams/members",
+            {"stream_ids": orjson.dumps([*stream_ids, private_stream_id]).decode()},
+        )
+        self.assert_json_error(result, "Invalid channel ID")
+
+        result = self.client_get(
+            "/json/streams/members", {"stream_ids": orjson.dumps([99999999]).decode()}
+        )
+        self.assert_json_error(result, "Invalid channel ID")
+
+        self.login("iago")
+        result = self.client_get(
+            "/json/streams/members", {"stream_ids": orjson.dumps([private_stream_id]).decode()}
+        )
+        self.assertEqual(
+            self.assert_json_success(result)["subscribers"],
+            {str(private_stream_id): [self.example_user("iago").id]},
+        )
+
 
 class AccessStreamTest(ZulipTestCase):
     def test_access_stream(self) -> None:
@@ -1,19 +1,23 @@
+import itertools
 from collections.abc import Iterable
 from datetime import timedelta
 from unittest import mock
 
 import orjson
 import time_machine
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import Q
 from django.utils.timezone import now as timezone_now
 
 from zerver.actions.create_realm import do_create_realm
 from zerver.actions.realm_settings import do_set_realm_property
 from zerver.actions.user_groups import (
     add_subgroups_to_user_group,
+    bulk_add_members_to_user_groups,
     check_add_user_group,
     create_user_group_in_database,
     promote_new_full_members,
+    remove_subgroups_from_user_group,
 )
 from zerver.actions.users import do_deactivate_user
 from zerver.lib.create_user import create_user
@@ -39,6 +43,7 @@ from zerver.models import (
     GroupGroupMembership,
     NamedUserGroup,
     UserGroup,
+    UserGroupClosure,
     UserGroupMembership,
     UserProfile,
 )
@@ -193,6 +198,90 @@ class UserGroupTestCase(ZulipTestCase):
 
         self.assertIn(everyone_group.usergroup_ptr, get_recursive_membership_groups(shiva))
 
+    def test_user_group_closure(self) -> None:
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        groups = [check_add_user_group(realm, f"Level {i}", [], acting_user=None) for i in range(4)]
+        for supergroup, subgroup in itertools.pairwise(groups):
+            add_subgroups_to_user_group(supergroup, [subgroup], acting_user=None)
+        bulk_add_members_to_user_groups([groups[3]], [hamlet.id], acting_user=None)
+
+        def assert_closure(expected: dict[NamedUserGroup, list[NamedUserGroup]]) -> None:
+            for supergroup, subgroups in expected.items():
+                self.assertCountEqual(
+                    UserGroupClosure.objects.filter(supergroup_id=supergroup.id).values_list(
+                        "subgroup_id", flat=True
+                    ),
+                    [supergroup.id] + [subgroup.id for subgroup in subgroups],
+                )
+
+        assert_closure(
+            {
+                groups[0]: groups[1:],
+                groups[1]: groups[2:],
+                groups[2]: groups[3:],
+                groups[3]: [],
+            }
+        )
+        self.assertTrue(is_user_in_group(groups[0], hamlet))
+
+        # Removing a subgroup updates the closure of every supergroup
+        # above it.
+        remove_subgroups_from_user_group(groups[1], [groups[2]], acting_user=None)
+        assert_closure(
+            {
+                groups[0]: [groups[1]],
+                groups[1]: [],
+                groups[2]: [groups[3]],
+            }
+        )
+        self.assertFalse(is_user_in_group(groups[0], hamlet))
+        self.assertTrue(is_user_in_group(groups[2], hamlet))
+
+        # A group reachable through two paths stays in the closure
+        # until both are removed.
+        add_subgroups_to_user_group(groups[0], [groups[2], groups[3]], acting_user=None)
+        remove_subgroups_from_user_group(groups[0], [groups[2]], acting_user=None)
+        assert_closure({groups[0]: [groups[1], groups[3]]})
+        self.assertTrue(is_user_in_group(groups[0], hamlet))
+
+        # Deleting a group removes it from the closure.
+        group_3_id = groups[3].id
+        groups[3].delete()
+        assert_closure({groups[0]: [groups[1]], groups[2]: []})
+        self.assertFalse(
+            UserGroupClosure.objects.filter(
+                Q(supergroup_id=group_3_id) | Q(subgroup_id=group_3_id)
+            ).exists()
+        )
+
+    def test_user_group_closure_serializes_subgroup_changes(self) -> None:
+        realm = get_realm("zulip")
+        # While this test's transaction changes subgroups in the realm,
+        # another transaction changing unrelated subgroups in the realm
+        # waits for it to finish.  Otherwise, if both groups had a
+        # common supergroup, each would recompute that supergroup's
+        # closure without the other's change.
+        groups = [check_add_user_group(realm, f"Level {i}", [], acting_user=None) for i in range(2)]
+        add_subgroups_to_user_group(groups[0], [groups[1]], acting_user=None)
+
+        # The other connection can only see groups which were already
+        # committed.
+        hamletcharacters_group = NamedUserGroup.objects.get(name="hamletcharacters", realm=realm)
+        moderators_group = NamedUserGroup.objects.get(
+            name=SystemGroups.MODERATORS, realm=realm, is_system_group=True
+        )
+        other_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.addCleanup(other_connection.close)
+        with other_connection.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '100ms'")
+            with self.assertRaisesRegex(OperationalError, "lock timeout"):
+                cursor.execute(
+                    "INSERT INTO zerver_groupgroupmembership (supergroup_id, subgroup_id) "
+                    "VALUES (%s, %s)",
+                    [hamletcharacters_group.id, moderators_group.id],
+                )
+
     def test_subgroups_of_role_based_system_groups(self) -> None:
         realm = get_realm("zulip")
         owners_group = NamedUserGroup.objects.get(
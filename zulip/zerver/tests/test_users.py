@@ -9,15 +9,18 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sessions.models import Session
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.test import override_settings
 from django.utils.timezone import now as timezone_now
 
 from confirmation.models import Confirmation
 from zerver.actions.create_user import do_create_user, do_reactivate_user
 from zerver.actions.invites import do_create_multiuse_invite_link, do_invite_users
+from zerver.actions.message_delete import do_delete_messages
 from zerver.actions.message_send import RecipientInfoResult, get_recipient_info
 from zerver.actions.muted_users import do_mute_user
 from zerver.actions.realm_settings import do_set_realm_property
+from zerver.actions.streams import do_deactivate_stream
 from zerver.actions.user_settings import bulk_regenerate_api_keys, do_change_user_setting
 from zerver.actions.user_topics import do_set_user_topic_visibility_policy
 from zerver.actions.users import (
@@ -47,14 +50,25 @@ from zerver.lib.test_helpers import (
     simulated_empty_cache,
 )
 from zerver.lib.upload import upload_avatar_image
+from zerver.lib.user_access_cache import (
+    DIRECT_MESSAGES,
+    STREAMS,
+    discard_user_access_sets,
+    get_loaded_user_ids,
+    redis_client,
+    user_key,
+)
 from zerver.lib.user_groups import get_system_user_group_for_user
 from zerver.lib.users import (
     Account,
     access_user_by_id,
     access_user_by_id_including_cross_realm,
+    check_can_access_user,
+    get_accessible_user_ids,
     get_accounts_for_email,
     get_cross_realm_dicts,
     get_inaccessible_user_ids,
+    get_user_ids_who_can_access_user,
     user_ids_to_users,
 )
 from zerver.lib.utils import assert_is_not_none
@@ -919,7 +933,7 @@ class QueryCountTest(ZulipTestCase):
 
         with (
             self.assert_database_query_count(84),
-            self.assert_memcached_count(19),
+            self.assert_memcached_count(17),
             self.capture_send_event_calls(expected_num_events=10) as events,
         ):
             fred = do_create_user(
@@ -2778,6 +2792,108 @@ class GetProfileTest(ZulipTestCase):
         )
         self.assertEqual(inaccessible_user_ids, {othello.id})
 
+    @override_settings(USER_ACCESS_CACHE_IN_REDIS=True)
+    def test_user_access_cache(self) -> None:
+        realm = get_realm("zulip")
+        polonius = self.example_user("polonius")
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        iago = self.example_user("iago")
+        prospero = self.example_user("prospero")
+        cordelia = self.example_user("cordelia")
+        users = list(UserProfile.objects.filter(realm=realm, is_bot=False))
+        all_user_ids = [user.id for user in users]
+
+        # Redis isn't reset between tests, so discard any sets left
+        # over from other tests.
+        discard_user_access_sets(realm.id, get_loaded_user_ids(realm.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_up_db_for_testing_user_access()
+        polonius = self.example_user("polonius")
+
+        def get_access() -> tuple[set[int], set[int], set[int], set[int]]:
+            return (
+                set(get_accessible_user_ids(realm, polonius)),
+                set(get_accessible_user_ids(realm, polonius, include_deactivated_users=True)),
+                get_inaccessible_user_ids(all_user_ids, polonius),
+                {
+                    user.id
+                    for user in users
+                    if polonius.id in get_user_ids_who_can_access_user(user)
+                },
+            )
+
+        def assert_access(accessible_user_ids: set[int]) -> None:
+            # Sets are stored once the transaction commits.
+            with self.captureOnCommitCallbacks(execute=True):
+                access = get_access()
+            self.assertEqual(access[0], accessible_user_ids)
+            self.assertEqual(access[2], set(all_user_ids) - accessible_user_ids)
+            self.assertEqual(access[3], accessible_user_ids)
+            for user in users:
+                self.assertEqual(
+                    check_can_access_user(user, polonius), user.id in accessible_user_ids
+                )
+            # The sets maintained incrementally match those computed
+            # from the database.
+            with override_settings(USER_ACCESS_CACHE_IN_REDIS=False):
+                self.assertEqual(get_access(), access)
+
+        accessible_user_ids = {
+            polonius.id,
+            hamlet.id,
+            iago.id,
+            prospero.id,
+            self.example_user("aaron").id,
+            self.example_user("ZOE").id,
+            self.example_user("shiva").id,
+        }
+        assert_access(accessible_user_ids)
+        self.assertIn(polonius.id, get_loaded_user_ids(realm.id))
+
+        # Access gained in a transaction which is rolled back isn't
+        # kept, even if the sets were used inside it.
+        with self.assertRaises(JsonableError), transaction.atomic(savepoint=True):
+            self.subscribe(othello, "test_stream1")
+            self.assertIn(othello.id, get_accessible_user_ids(realm, polonius))
+            raise JsonableError("rolled back")
+        assert_access(accessible_user_ids)
+
+        # New access is added to the stored sets, rather than them
+        # being discarded.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscribe(othello, "test_stream1")
+        self.assertTrue(
+            redis_client.sismember(user_key(realm.id, polonius.id, STREAMS), othello.id)
+        )
+        accessible_user_ids.add(othello.id)
+        assert_access(accessible_user_ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unsubscribe(hamlet, "test_stream1")
+        assert_access(accessible_user_ids - {hamlet.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscribe(hamlet, "test_stream1")
+        assert_access(accessible_user_ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send_personal_message(cordelia, polonius)
+        self.assertTrue(
+            redis_client.sismember(user_key(realm.id, polonius.id, DIRECT_MESSAGES), cordelia.id)
+        )
+        accessible_user_ids.add(cordelia.id)
+        assert_access(accessible_user_ids)
+
+        do_deactivate_stream(get_stream("test_stream2", realm), acting_user=None)
+        accessible_user_ids.remove(iago.id)
+        assert_access(accessible_user_ids)
+
+        assert prospero.recipient_id is not None
+        for message in Message.objects.filter(sender=polonius, recipient_id=prospero.recipient_id):
+            do_delete_messages(realm, [message], acting_user=None)
+        accessible_user_ids.remove(prospero.id)
+        assert_access(accessible_user_ids)
+
 
 class DeleteUserTest(ZulipTestCase):
     def test_do_delete_user(self) -> None:
@@ -13,6 +13,7 @@ from requests.models import PreparedRequest, Response
 from typing_extensions import override
 from urllib3.util import Retry
 
+from zerver.lib.cache import REALM_STATE_EVENT_SECTIONS, bump_realm_state_generation
 from zerver.lib.partial import partial
 from zerver.lib.queue import queue_json_publish
 from zerver.models import Client, Realm, UserProfile
@@ -90,6 +91,7 @@ def request_event_queue(
     pronouns_field_type_supported: bool = True,
     linkifier_url_template: bool = False,
     user_list_incomplete: bool = False,
+    batched_presence_events: bool = False,
 ) -> str | None:
     if not settings.USING_TORNADO:
         return None
@@ -113,6 +115,7 @@ def request_event_queue(
         "pronouns_field_type_supported": orjson.dumps(pronouns_field_type_supported),
         "linkifier_url_template": orjson.dumps(linkifier_url_template),
         "user_list_incomplete": orjson.dumps(user_list_incomplete),
+        "batched_presence_events": orjson.dumps(batched_presence_events),
     }
 
     if event_types is not None:
@@ -181,6 +184,9 @@ def send_event(
 ) -> None:
     """`users` is a list of user IDs, or in some special cases like message
     send/update or embeds, dictionaries containing extra data."""
+    if event["type"] in REALM_STATE_EVENT_SECTIONS:
+        bump_realm_state_generation(realm.id, REALM_STATE_EVENT_SECTIONS[event["type"]])
+
     realm_ports = get_realm_tornado_ports(realm)
     if len(realm_ports) == 1:
         port_user_map = {realm_ports[0]: list(users)}
@@ -201,4 +207,10 @@ def send_event(
 def send_event_on_commit(
     realm: Realm, event: Mapping[str, Any], users: Iterable[int] | Iterable[Mapping[str, Any]]
 ) -> None:
+    if event["type"] in REALM_STATE_EVENT_SECTIONS:
+        # send_event will do this again once the transaction commits,
+        # in case a snapshot of the old state was cached in between;
+        # doing it now as well means that later queries in this
+        # transaction don't see a stale snapshot either.
+        bump_realm_state_generation(realm.id, REALM_STATE_EVENT_SECTIONS[event["type"]])
     transaction.on_commit(lambda: send_event(realm, event, users))
@@ -7,7 +7,7 @@ import random
 import time
 import traceback
 import uuid
-from collections import deque
+from collections import defaultdict, deque
 from collections.abc import Callable, Collection, Iterable, Mapping, MutableMapping, Sequence
 from collections.abc import Set as AbstractSet
 from contextlib import suppress
@@ -78,6 +78,7 @@ class ClientDescriptor:
         pronouns_field_type_supported: bool = True,
         linkifier_url_template: bool = False,
         user_list_incomplete: bool = False,
+        batched_presence_events: bool = False,
     ) -> None:
         # TODO: We eventually want to upstream this code to the caller, but
         # serialization concerns make it a bit difficult.
@@ -108,6 +109,7 @@ class ClientDescriptor:
         self.pronouns_field_type_supported = pronouns_field_type_supported
         self.linkifier_url_template = linkifier_url_template
         self.user_list_incomplete = user_list_incomplete
+        self.batched_presence_events = batched_presence_events
 
         # Default for lifespan_secs is DEFAULT_EVENT_QUEUE_TIMEOUT_SECS;
         # but users can set it as high as MAX_QUEUE_TIMEOUT_SECS.
@@ -138,6 +140,7 @@ class ClientDescriptor:
             pronouns_field_type_supported=self.pronouns_field_type_supported,
             linkifier_url_template=self.linkifier_url_template,
             user_list_incomplete=self.user_list_incomplete,
+            batched_presence_events=self.batched_presence_events,
         )
 
     @override
@@ -174,6 +177,7 @@ class ClientDescriptor:
             d.get("pronouns_field_type_supported", True),
             d.get("linkifier_url_template", False),
             d.get("user_list_incomplete", False),
+            d.get("batched_presence_events", False),
         )
         ret.last_connection_time = d["last_connection_time"]
         return ret
@@ -454,6 +458,7 @@ def clear_client_event_queues_for_testing() -> None:
     user_clients.clear()
     realm_clients_all_streams.clear()
     gc_hooks.clear()
+    pending_presence_events.clear()
 
 
 def add_client_gc_hook(hook: Callable[[int, ClientDescriptor, bool], None]) -> None:
@@ -575,6 +580,9 @@ def persistent_queue_filename(port: int, last: bool = False) -> str:
 
 def dump_event_queues(port: int) -> None:
     start = time.perf_counter()
+    # Deliver any presence changes we're holding back before saving
+    # the queues.
+    flush_presence_events()
 
     with open(persistent_queue_filename(port), "wb") as stored_queues:
         stored_queues.write(
@@ -1213,13 +1221,11 @@ def process_message_event(
         client.add_event(user_event)
 
 
-def process_presence_event(event: Mapping[str, Any], users: Iterable[int]) -> None:
-    if "user_id" not in event:
-        # We only recently added `user_id` to presence data.
-        # Any old events in our queue can just be dropped,
-        # since presence events are pretty ephemeral in nature.
-        logging.warning("Dropping some obsolete presence events after upgrade.")
-
+def get_presence_client_events(
+    event: Mapping[str, Any],
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Returns the presence events for clients with and without the
+    slim_presence option."""
     slim_event = dict(
         type="presence",
         user_id=event["user_id"],
@@ -1234,6 +1240,39 @@ def process_presence_event(event: Mapping[str, Any], users: Iterable[int]) -> No
         server_timestamp=event["server_timestamp"],
         presence=event["presence"],
     )
+    return slim_event, legacy_event
+
+
+# Presence events waiting to be delivered by flush_presence_events,
+# with the users to deliver them to, keyed by the user whose presence
+# changed.
+pending_presence_events: dict[int, tuple[Mapping[str, Any], list[int]]] = {}
+
+
+def process_presence_event(event: Mapping[str, Any], users: Iterable[int]) -> None:
+    if "user_id" not in event:
+        # We only recently added `user_id` to presence data.
+        # Any old events in our queue can just be dropped,
+        # since presence events are pretty ephemeral in nature.
+        logging.warning("Dropping some obsolete presence events after upgrade.")
+
+    # Events sent by older servers lack the timestamps we need for
+    # presence_batch events.
+    if settings.PRESENCE_EVENT_AGGREGATION_WINDOW_SECS > 0 and "active_timestamp" in event:
+        # When many users come online at once, as at the start of a
+        # work day, sending an event to every user for each of them
+        # does quadratic work.  So we hold presence changes back for
+        # a short window, and then deliver all of them in a single
+        # event to each queue; see flush_presence_events.
+        if not pending_presence_events:
+            tornado.ioloop.IOLoop.current().call_later(
+                settings.PRESENCE_EVENT_AGGREGATION_WINDOW_SECS, flush_presence_events
+            )
+        # A newer change to a user's presence replaces an older one.
+        pending_presence_events[event["user_id"]] = (event, list(users))
+        return
+
+    slim_event, legacy_event = get_presence_client_events(event)
 
     for user_profile_id in users:
         for client in get_client_descriptors_for_user(user_profile_id):
@@ -1244,6 +1283,60 @@ def process_presence_event(event: Mapping[str, Any], users: Iterable[int]) -> No
                     client.add_event(legacy_event)
 
 
+def flush_presence_events() -> None:
+    if not pending_presence_events:
+        return
+    start_time = time.perf_counter()
+    events = list(pending_presence_events.values())
+    pending_presence_events.clear()
+
+    # The presence changes to deliver to each user.
+    user_events: dict[int, list[int]] = defaultdict(list)
+    for index, (event, users) in enumerate(events):
+        for user_profile_id in users:
+            user_events[user_profile_id].append(index)
+
+    client_events = [get_presence_client_events(event) for event, users in events]
+    # Entries for the presences field of presence_batch events.
+    batch_presences = [
+        (
+            str(event["user_id"]),
+            dict(
+                active_timestamp=event["active_timestamp"],
+                idle_timestamp=event["idle_timestamp"],
+            ),
+        )
+        for event, users in events
+    ]
+    server_timestamp = time.time()
+
+    queue_count = 0
+    for user_profile_id, indexes in user_events.items():
+        for client in get_client_descriptors_for_user(user_profile_id):
+            if not client.accepts_event(events[indexes[0]][0]):
+                continue
+            queue_count += 1
+            if client.batched_presence_events:
+                client.add_event(
+                    dict(
+                        type="presence_batch",
+                        presences=dict(batch_presences[index] for index in indexes),
+                        server_timestamp=server_timestamp,
+                    )
+                )
+            else:
+                for index in indexes:
+                    slim_event, legacy_event = client_events[index]
+                    client.add_event(slim_event if client.slim_presence else legacy_event)
+
+    logging.debug(
+        "Tornado: Delivered %s presence changes to %s queues in %sms",
+        len(events),
+        queue_count,
+        int(1000 * (time.perf_counter() - start_time)),
+    )
+
+
 def process_event(event: Mapping[str, Any], users: Iterable[int]) -> None:
     for user_profile_id in users:
         for client in get_client_descriptors_for_user(user_profile_id):
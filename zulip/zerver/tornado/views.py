@@ -194,6 +194,9 @@ def get_events_backend(
     user_list_incomplete: bool = REQ(
         default=False, json_validator=check_bool, intentionally_undocumented=True
     ),
+    batched_presence_events: bool = REQ(
+        default=False, json_validator=check_bool, intentionally_undocumented=True
+    ),
 ) -> HttpResponse:
     if all_public_streams and not user_profile.can_access_public_streams():
         raise JsonableError(_("User not authorized for this query"))
@@ -228,6 +231,7 @@ def get_events_backend(
             pronouns_field_type_supported=pronouns_field_type_supported,
             linkifier_url_template=linkifier_url_template,
             user_list_incomplete=user_list_incomplete,
+            batched_presence_events=batched_presence_events,
         )
 
     result = in_tornado_thread(fetch_events)(
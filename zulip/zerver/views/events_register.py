@@ -5,14 +5,17 @@ from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.http import HttpRequest, HttpResponse
 from django.utils.translation import gettext as _
+from pydantic import Json
 
 from zerver.context_processors import get_valid_realm_from_request
 from zerver.lib.compatibility import is_pronouns_field_type_supported
-from zerver.lib.events import do_events_register
+from zerver.lib.events import do_events_register, fetch_initial_state_data
 from zerver.lib.exceptions import JsonableError, MissingAuthenticationError
+from zerver.lib.initial_state_profiler import DEFERRABLE_STATE_SECTIONS, InitialStateProfiler
 from zerver.lib.narrow_helpers import narrow_dataclasses_from_tuples
 from zerver.lib.request import REQ, RequestNotes, has_request_variables
 from zerver.lib.response import json_success
+from zerver.lib.typed_endpoint import typed_endpoint
 from zerver.lib.validator import check_bool, check_dict, check_int, check_list, check_string
 from zerver.models import Stream, UserProfile
 
@@ -47,6 +50,7 @@ def events_register_backend(
     slim_presence: bool = REQ(default=False, json_validator=check_bool),
     all_public_streams: bool | None = REQ(default=None, json_validator=check_bool),
     include_subscribers: bool = REQ(default=False, json_validator=check_bool),
+    include_subscriber_counts: bool = REQ(default=False, json_validator=check_bool),
     client_capabilities: dict[str, bool] | None = REQ(
         json_validator=check_dict(
             [
@@ -63,6 +67,9 @@ def events_register_backend(
                 ("user_settings_object", check_bool),
                 ("linkifier_url_template", check_bool),
                 ("user_list_incomplete", check_bool),
+                ("user_list_columnar", check_bool),
+                ("batched_presence_events", check_bool),
+                ("deferred_state_sections", check_bool),
             ],
             value_validator=check_bool,
         ),
@@ -76,6 +83,9 @@ def events_register_backend(
         json_validator=check_list(check_list(check_string, length=2)), default=[]
     ),
     queue_lifespan_secs: int = REQ(json_validator=check_int, default=0, documentation_pending=True),
+    state_versions: dict[str, str] | None = REQ(
+        json_validator=check_dict(value_validator=check_string), default=None
+    ),
 ) -> HttpResponse:
     if client_gravatar_raw is None:
         client_gravatar = maybe_user_profile.is_authenticated
@@ -111,6 +121,12 @@ def events_register_backend(
                     key="include_subscribers"
                 )
             )
+        if include_subscriber_counts:
+            raise JsonableError(
+                _("Invalid '{key}' parameter for anonymous request").format(
+                    key="include_subscriber_counts"
+                )
+            )
 
         # Language set by spectator to be passed down to clients as user_settings.
         spectator_requested_language = request.COOKIES.get(
@@ -134,23 +150,63 @@ def events_register_backend(
     #       but we will still need to support tuples for a long time.
     modern_narrow = narrow_dataclasses_from_tuples(narrow)
 
-    ret = do_events_register(
+    profiler = InitialStateProfiler()
+    with profiler.profile():
+        ret = do_events_register(
+            user_profile,
+            realm,
+            client,
+            apply_markdown,
+            client_gravatar,
+            slim_presence,
+            None,
+            event_types,
+            queue_lifespan_secs,
+            all_public_streams,
+            narrow=modern_narrow,
+            include_subscribers=include_subscribers,
+            include_subscriber_counts=include_subscriber_counts,
+            include_streams=include_streams,
+            client_capabilities=client_capabilities,
+            fetch_event_types=fetch_event_types,
+            spectator_requested_language=spectator_requested_language,
+            pronouns_field_type_supported=pronouns_field_type_supported,
+            client_state_versions=state_versions,
+            profiler=profiler,
+        )
+
+    # Log the slowest sections of the initial state, to help find
+    # what makes /register slow for a given user.
+    log_data = RequestNotes.get_notes(request).log_data
+    assert log_data is not None
+    log_data["extra"] = profiler.log_data_summary()
+
+    response = json_success(request, data=ret)
+    if settings.REGISTER_SERVER_TIMING_HEADER:
+        response["Server-Timing"] = profiler.server_timing_header()
+    return response
+
+
+@typed_endpoint
+def get_register_sections_backend(
+    request: HttpRequest,
+    user_profile: UserProfile,
+    *,
+    sections: Json[list[str]],
+    slim_presence: Json[bool] = False,
+) -> HttpResponse:
+    # Fetches the sections of the initial state which /register
+    # listed in deferred_state_sections.
+    for section in sections:
+        if section not in DEFERRABLE_STATE_SECTIONS:
+            raise JsonableError(_("Invalid section: {section}").format(section=section))
+
+    state = fetch_initial_state_data(
         user_profile,
-        realm,
-        client,
-        apply_markdown,
-        client_gravatar,
-        slim_presence,
-        None,
-        event_types,
-        queue_lifespan_secs,
-        all_public_streams,
-        narrow=modern_narrow,
-        include_subscribers=include_subscribers,
-        include_streams=include_streams,
-        client_capabilities=client_capabilities,
-        fetch_event_types=fetch_event_types,
-        spectator_requested_language=spectator_requested_language,
-        pronouns_field_type_supported=pronouns_field_type_supported,
+        realm=user_profile.realm,
+        event_types=sections,
+        queue_id=None,
+        slim_presence=slim_presence,
     )
-    return json_success(request, data=ret)
+    del state["queue_id"]
+    return json_success(request, data=state)
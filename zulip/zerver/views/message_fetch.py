@@ -1,9 +1,11 @@
+import time
 from collections.abc import Iterable
+from contextlib import AbstractContextManager, nullcontext
 from typing import Annotated
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.db import connection, transaction
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
 from django.http import HttpRequest, HttpResponse
 from django.utils.html import escape as escape_html
 from django.utils.translation import gettext as _
@@ -14,6 +16,7 @@ from sqlalchemy.types import Integer, Text
 from zerver.context_processors import get_valid_realm_from_request
 from zerver.lib.exceptions import JsonableError, MissingAuthenticationError
 from zerver.lib.message import get_first_visible_message_id, messages_for_ids
+from zerver.lib.message_cache_warming import record_narrow_fetch
 from zerver.lib.narrow import (
     NarrowParameter,
     add_narrow_conditions,
@@ -23,6 +26,7 @@ from zerver.lib.narrow import (
     parse_anchor_value,
     update_narrow_terms_containing_with_operator,
 )
+from zerver.lib.read_replica import reads_from_replica
 from zerver.lib.request import RequestNotes
 from zerver.lib.response import json_success
 from zerver.lib.sqlalchemy_utils import get_sqlalchemy_connection
@@ -166,6 +170,8 @@ def get_messages_backend(
         # email_address_visibility setting.
         client_gravatar = False
 
+    log_data = RequestNotes.get_notes(request).log_data
+    assert log_data is not None
     if narrow is not None:
         # Add some metadata to our logging data for narrows
         verbose_operators = []
@@ -174,11 +180,23 @@ def get_messages_backend(
                 verbose_operators.append("is:" + term.operand)
             else:
                 verbose_operators.append(term.operator)
-        log_data = RequestNotes.get_notes(request).log_data
-        assert log_data is not None
         log_data["extra"] = "[{}]".format(",".join(verbose_operators))
 
-    with transaction.atomic(durable=True):
+    # Time spent in each stage of the request, for the log line.
+    stage_timings: dict[str, float] = {}
+
+    # Searches, and fetches of history older than a message which has
+    # already been replicated (e.g. scrolling up), don't need to see
+    # the latest writes, so they can be served by a database replica.
+    # Everything else, including first_unread anchors and fetching the
+    # newest messages, reads from the primary.
+    read_database: AbstractContextManager[str] = nullcontext(DEFAULT_DB_ALIAS)
+    if narrow is not None and any(term.operator == "search" for term in narrow):
+        read_database = reads_from_replica()
+    elif anchor is not None and num_after == 0:
+        read_database = reads_from_replica(max_message_id=anchor)
+
+    with read_database as db_alias, transaction.atomic(using=db_alias, durable=True):
         # We're about to perform a search, and then get results from
         # it; this is done across multiple queries.  To prevent race
         # conditions, we want the messages returned to be consistent
@@ -200,9 +218,10 @@ def get_messages_backend(
         # outer transaction for each test.  We thus skip this command
         # in tests, since it would fail.
         if not settings.TEST_SUITE:  # nocoverage
-            cursor = connection.cursor()
+            cursor = connections[db_alias].cursor()
             cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
 
+        start = time.perf_counter()
         query_info = fetch_messages(
             narrow=narrow,
             user_profile=user_profile,
@@ -213,6 +232,7 @@ def get_messages_backend(
             num_before=num_before,
             num_after=num_after,
         )
+        stage_timings["ids"] = time.perf_counter() - start
 
         anchor = query_info.anchor
         include_history = query_info.include_history
@@ -236,17 +256,17 @@ def get_messages_backend(
                 user_message_flags[message_id] = ["read"]
         elif include_history:
             assert user_profile is not None
-            message_ids = [row[0] for row in rows]
-
-            # TODO: This could be done with an outer join instead of two queries
-            um_rows = UserMessage.objects.filter(
-                user_profile=user_profile, message_id__in=message_ids
-            )
-            user_message_flags = {um.message_id: um.flags_list() for um in um_rows}
-
-            for message_id in message_ids:
-                if message_id not in user_message_flags:
+            # fetch_messages outer-joins zerver_usermessage in this
+            # case, so the flags are NULL for messages the user
+            # didn't receive.
+            for row in rows:
+                message_id = row[0]
+                flags = row[1]
+                if flags is None:
                     user_message_flags[message_id] = ["read", "historical"]
+                else:
+                    user_message_flags[message_id] = UserMessage.flags_list_for_flags(flags)
+                message_ids.append(message_id)
         else:
             for row in rows:
                 message_id = row[0]
@@ -272,8 +292,19 @@ def get_messages_backend(
             allow_edit_history=realm.allow_edit_history,
             user_profile=user_profile,
             realm=realm,
+            stage_timings=stage_timings,
         )
 
+    timings = ",".join(
+        f"{stage}:{seconds * 1000:.0f}ms" for stage, seconds in stage_timings.items()
+    )
+    log_data["extra"] = "{} [{}]".format(log_data.get("extra", ""), timings).lstrip()
+
+    if query_info.found_newest:
+        # Track popular narrows, so that we can warm the message cache
+        # with their recent messages; see message_cache_warming.py.
+        record_narrow_fetch(realm.id, narrow)
+
     ret = dict(
         messages=message_list,
         result="success",
@@ -121,15 +121,15 @@ def update_message_flags_for_narrow(
 @typed_endpoint_without_parameters
 def mark_all_as_read(request: HttpRequest, user_profile: UserProfile) -> HttpResponse:
     request_notes = RequestNotes.get_notes(request)
-    count = do_mark_all_as_read(user_profile, timeout=50)
-    if count is None:
-        return json_success(request, data={"complete": False})
+    progress = do_mark_all_as_read(user_profile, timeout=50)
 
-    log_data_str = f"[{count} updated]"
+    log_data_str = f"[{progress.updated_count} updated]"
+    if not progress.complete:
+        log_data_str += " [incomplete]"
     assert request_notes.log_data is not None
     request_notes.log_data["extra"] = log_data_str
 
-    return json_success(request, data={"complete": True})
+    return json_success(request, data={"complete": progress.complete})
 
 
 @typed_endpoint
@@ -10,7 +10,15 @@ from django.db import transaction
 from django.http import HttpRequest, HttpResponse
 from django.utils.translation import gettext as _
 from django.utils.translation import override as override_language
-from pydantic import BaseModel, Field, Json, NonNegativeInt, StringConstraints, model_validator
+from pydantic import (
+    BaseModel,
+    Field,
+    Json,
+    NonNegativeInt,
+    PositiveInt,
+    StringConstraints,
+    model_validator,
+)
 
 from zerver.actions.default_streams import (
     do_add_default_stream,
@@ -66,7 +74,11 @@ from zerver.lib.streams import (
     list_to_streams,
     stream_to_dict,
 )
-from zerver.lib.subscription_info import gather_subscriptions
+from zerver.lib.subscription_info import (
+    bulk_access_stream_subscriber_user_ids,
+    delta_encode_user_ids,
+    gather_subscriptions,
+)
 from zerver.lib.topic import (
     get_topic_history_for_public_stream,
     get_topic_history_for_stream,
@@ -820,6 +832,22 @@ def get_subscribers_backend(
     return json_success(request, data={"subscribers": list(subscribers)})
 
 
+@typed_endpoint
+def get_bulk_subscribers_backend(
+    request: HttpRequest,
+    user_profile: UserProfile,
+    *,
+    stream_ids: Json[list[NonNegativeInt]],
+    delta_encoded: Json[bool] = False,
+) -> HttpResponse:
+    subscriber_map = bulk_access_stream_subscriber_user_ids(user_profile, stream_ids)
+    subscribers = {
+        str(stream_id): delta_encode_user_ids(user_ids) if delta_encoded else user_ids
+        for stream_id, user_ids in subscriber_map.items()
+    }
+    return json_success(request, data={"subscribers": subscribers})
+
+
 # By default, lists all streams that the user has access to --
 # i.e. public streams plus invite-only streams that the user is on
 @typed_endpoint
@@ -865,6 +893,8 @@ def get_topics_backend(
     maybe_user_profile: UserProfile | AnonymousUser,
     *,
     stream_id: PathOnly[NonNegativeInt],
+    before_max_id: Json[NonNegativeInt] | None = None,
+    num_topics: Json[PositiveInt] | None = None,
 ) -> HttpResponse:
     if not maybe_user_profile.is_authenticated:
         is_web_public_query = True
@@ -879,7 +909,10 @@ def get_topics_backend(
         realm = get_valid_realm_from_request(request)
         stream = access_web_public_stream(stream_id, realm)
         result = get_topic_history_for_public_stream(
-            realm_id=realm.id, recipient_id=assert_is_not_none(stream.recipient_id)
+            realm_id=realm.id,
+            recipient_id=assert_is_not_none(stream.recipient_id),
+            before_max_id=before_max_id,
+            num_topics=num_topics,
         )
 
     else:
@@ -892,6 +925,8 @@ def get_topics_backend(
             user_profile=user_profile,
             recipient_id=stream.recipient_id,
             public_history=stream.is_history_public_to_subscribers(),
+            before_max_id=before_max_id,
+            num_topics=num_topics,
         )
 
     return json_success(request, data=dict(topics=result))
@@ -17,6 +17,9 @@ from zerver.actions.message_flags import do_mark_stream_messages_as_read
 from zerver.actions.message_send import internal_send_private_message
 from zerver.actions.realm_export import notify_realm_export
 from zerver.lib.export import export_realm_wrapper
+from zerver.lib.message import get_last_message_id
+from zerver.lib.message_cache_warming import warm_realm_message_cache
+from zerver.lib.message_rerendering import rerender_messages
 from zerver.lib.push_notifications import clear_push_device_tokens
 from zerver.lib.queue import queue_json_publish, retry_event
 from zerver.lib.remote_server import (
@@ -219,6 +222,36 @@ class DeferredWorker(QueueProcessingWorker):
             realm_id = event["realm_id"]
             logger.info("Updating push bouncer with metadata on behalf of realm %s", realm_id)
             send_server_data_to_push_bouncer(consider_usage_statistics=False)
+        elif event["type"] == "rerender_messages":
+            realm = Realm.objects.get(id=event["realm_id"])
+            # Messages sent after the change are rendered with it.
+            max_id = event.get("max_id") or get_last_message_id()
+            progress = rerender_messages(
+                realm,
+                event["linkifier_patterns"],
+                event["emoji_names"],
+                min_id=event.get("min_id", 0),
+                max_id=max_id,
+            )
+            if not progress.complete:
+                # Like marking a stream's messages as read, this can
+                # take a long time in a large realm, so we re-queue
+                # the rest of the work, to let other work proceed.
+                queue_json_publish(
+                    "deferred_work",
+                    {**event, "min_id": progress.last_message_id, "max_id": max_id},
+                )
+            logger.info(
+                "Re-rendered %s of %s messages scanned in realm %s, through message %s",
+                progress.rerendered_count,
+                progress.scanned_count,
+                realm.id,
+                max_id if progress.complete else progress.last_message_id,
+            )
+        elif event["type"] == "warm_message_cache":
+            realm = Realm.objects.get(id=event["realm_id"])
+            count = warm_realm_message_cache(realm)
+            logger.info("Added %d messages to the message cache for realm %s", count, realm.id)
 
         end = time.time()
         logger.info(
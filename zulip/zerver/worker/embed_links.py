@@ -2,6 +2,7 @@
 import logging
 import time
 from collections.abc import Mapping
+from concurrent.futures import wait
 from types import FrameType
 from typing import Any
 
@@ -13,27 +14,57 @@ from zerver.actions.message_send import render_incoming_message
 from zerver.lib.url_preview import preview as url_preview
 from zerver.lib.url_preview.types import UrlEmbedData
 from zerver.models import Message, Realm
-from zerver.worker.base import InterruptConsumeError, QueueProcessingWorker, assign_queue
+from zerver.worker.base import InterruptConsumeError, LoopQueueProcessingWorker, assign_queue
 
 logger = logging.getLogger(__name__)
 
 
 @assign_queue("embed_links")
-class FetchLinksEmbedData(QueueProcessingWorker):
+class FetchLinksEmbedData(LoopQueueProcessingWorker):
     # This is a slow queue with network requests, so a disk write is negligible.
     # Update stats file after every consume call.
     CONSUME_ITERATIONS_BEFORE_UPDATE_STATS_NUM = 1
+    # We fetch the URLs of a batch of messages in parallel, so that a
+    # slow site doesn't hold up fetching the others, and fetch each URL
+    # only once.
+    batch_size = 10
+    sleep_delay = 1
+    # How long each message's URLs have to be fetched, which leaves
+    # the rest of MAX_CONSUME_SECONDS for rendering it.  A message
+    # whose URLs aren't fetched in time is skipped, without holding up
+    # the others in the batch; the fetches continue in the
+    # background, and their results are cached for the next time.
+    FETCH_TIMEOUT_SECONDS = 20.0
 
     @override
-    def consume(self, event: Mapping[str, Any]) -> None:
-        url_embed_data: dict[str, UrlEmbedData | None] = {}
-        for url in event["urls"]:
-            start_time = time.time()
-            url_embed_data[url] = url_preview.get_link_embed_data(url)
-            logging.info(
-                "Time spent on get_link_embed_data for %s: %s", url, time.time() - start_time
+    def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        futures = url_preview.start_link_embed_data_fetches(
+            url for event in events for url in event["urls"]
+        )
+        deadline = time.monotonic() + self.FETCH_TIMEOUT_SECONDS
+        for event in events:
+            event_futures = [futures[url] for url in event["urls"]]
+            _, not_done = wait(event_futures, timeout=max(deadline - time.monotonic(), 0))
+            if not_done:
+                logging.warning(
+                    "Timed out in %s after %s seconds while fetching URLs for message %s: %s",
+                    self.queue_name,
+                    self.FETCH_TIMEOUT_SECONDS,
+                    event["message_id"],
+                    event["urls"],
+                )
+                continue
+            self.update_message(
+                event,
+                {
+                    url: future.result()
+                    for url, future in zip(event["urls"], event_futures, strict=True)
+                },
             )
 
+    def update_message(
+        self, event: Mapping[str, Any], url_embed_data: dict[str, UrlEmbedData | None]
+    ) -> None:
         with transaction.atomic():
             try:
                 message = Message.objects.select_for_update().get(id=event["message_id"])
@@ -62,14 +93,12 @@ class FetchLinksEmbedData(QueueProcessingWorker):
     def timer_expired(
         self, limit: int, events: list[dict[str, Any]], signal: int, frame: FrameType | None
     ) -> None:
-        assert len(events) == 1
-        event = events[0]
-
-        logging.warning(
-            "Timed out in %s after %s seconds while fetching URLs for message %s: %s",
-            self.queue_name,
-            limit,
-            event["message_id"],
-            event["urls"],
-        )
+        for event in events:
+            logging.warning(
+                "Timed out in %s after %s seconds while fetching URLs for message %s: %s",
+                self.queue_name,
+                limit,
+                event["message_id"],
+                event["urls"],
+            )
         raise InterruptConsumeError
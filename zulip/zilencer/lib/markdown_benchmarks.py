@@ -0,0 +1,14 @@
+import os
+
+import orjson
+from django.conf import settings
+
+
+def markdown_test_case_inputs() -> list[tuple[str, str]]:
+    """The names and inputs of the Markdown test fixtures, which the
+    Markdown benchmarks render as a corpus of realistic messages."""
+    with open(
+        os.path.join(settings.DEPLOY_ROOT, "zerver/tests/fixtures/markdown_test_cases.json"), "rb"
+    ) as f:
+        test_cases = orjson.loads(f.read())["regular_tests"]
+    return [(test_case["name"], test_case["input"]) for test_case in test_cases]
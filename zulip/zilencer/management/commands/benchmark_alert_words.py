@@ -0,0 +1,60 @@
+import pickle
+import random
+import time
+from typing import Any
+
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.lib.alert_words import build_alert_word_automaton, get_user_ids_by_alert_word
+from zerver.lib.management import ZulipBaseCommand
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures building and searching alert word automatons.
+
+Generates alert words for --users users with --words words each, drawn
+from a shared vocabulary, and times building the realm's automaton,
+the pickling round trip we'd need to share it via memcached, and
+searching a message with it.  Doesn't use the database."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--users", help="Users with alert words", default=10000, type=int)
+        parser.add_argument("--words", help="Alert words per user", default=20, type=int)
+        parser.add_argument("--vocabulary", help="Distinct alert words", default=50000, type=int)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        vocabulary = [f"word{i}" for i in range(options["vocabulary"])]
+        user_ids_with_words = {
+            user_id: random.sample(vocabulary, options["words"])
+            for user_id in range(options["users"])
+        }
+        user_ids_by_word = get_user_ids_by_alert_word(user_ids_with_words)
+
+        start = time.perf_counter()
+        automaton = build_alert_word_automaton(user_ids_by_word)
+        print(
+            f"Built automaton for {len(user_ids_by_word)} distinct words "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+        start = time.perf_counter()
+        pickled = pickle.dumps(automaton)
+        pickle_time = time.perf_counter() - start
+        start = time.perf_counter()
+        pickle.loads(pickled)  # noqa: S301
+        print(
+            f"Pickled automaton is {len(pickled) / 1024 / 1024:.1f}MB; pickling took "
+            f"{pickle_time * 1000:.1f}ms, and unpickling "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+        content = " ".join(random.choices(vocabulary, k=200)).lower()
+        start = time.perf_counter()
+        matches = sum(1 for match in automaton.iter(content))
+        print(
+            f"Found {matches} alert words in a message in "
+            f"{(time.perf_counter() - start) * 1000:.3f}ms"
+        )
@@ -0,0 +1,138 @@
+import os
+import random
+import time
+from dataclasses import replace
+from typing import Any
+
+import orjson
+from django.conf import settings
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.markdown import (
+    LinkifierMatcher,
+    MarkdownRenderRequest,
+    render_markdown_request,
+    topic_links,
+)
+from zerver.lib.types import LinkifierDict
+
+# Keys for the Markdown engines we benchmark, which no realm will use.
+BENCHMARK_LINKIFIERS_KEY = -100
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures rendering with increasing numbers of linkifiers.
+
+For each of the --counts, generates that many linkifiers, and times
+searching the inputs of the Markdown test fixtures for linkifier
+matches with each linkifier in turn and with a single pass over them
+all, rendering the fixtures, and computing the topic links of
+generated topic names.  Doesn't use the database."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--counts", help="Comma-separated linkifier counts", default="1,10,100,300,1000"
+        )
+        parser.add_argument("--topics", help="Topic names to linkify", default=1000, type=int)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        with open(
+            os.path.join(settings.DEPLOY_ROOT, "zerver/tests/fixtures/markdown_test_cases.json"),
+            "rb",
+        ) as f:
+            test_cases = orjson.loads(f.read())["regular_tests"]
+        corpus = [test_case["input"] for test_case in test_cases]
+
+        for i, count in enumerate(int(count) for count in options["counts"].split(",")):
+            linkifiers = [
+                LinkifierDict(
+                    pattern=f"PROJ{n}-(?P<id>[0-9]+)",
+                    url_template=f"https://example.com/proj{n}/{{id}}",
+                    id=n,
+                )
+                for n in range(count)
+            ]
+            # Some of the content and topics should match.
+            sample = [
+                f"Fixed in PROJ{random.randrange(count)}-{random.randrange(1000)}."
+                for _ in range(10)
+            ]
+            topics = [
+                f"PROJ{random.randrange(count)}-{n} is broken" if n % 10 == 0 else f"topic {n}"
+                for n in range(options["topics"])
+            ]
+            print(f"{count} linkifiers:")
+            self.search_corpus(linkifiers, corpus + sample)
+            self.render_corpus(BENCHMARK_LINKIFIERS_KEY - i, linkifiers, corpus + sample)
+            self.linkify_topics(BENCHMARK_LINKIFIERS_KEY - i, linkifiers, topics)
+
+    def search_corpus(self, linkifiers: list[LinkifierDict], corpus: list[str]) -> None:
+        start = time.perf_counter()
+        matcher = LinkifierMatcher(linkifiers)
+        compile_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for content in corpus:
+            for pattern in matcher.patterns:
+                assert pattern is not None
+                pattern.search(content)
+        separate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for content in corpus:
+            for index in matcher.matching_linkifiers(content):
+                pattern = matcher.patterns[index]
+                assert pattern is not None
+                pattern.search(content)
+        single_pass_time = time.perf_counter() - start
+
+        print(f"  compiling: {compile_time * 1000:.1f}ms")
+        print(
+            f"  searching: {single_pass_time / len(corpus) * 1000:.3f}ms per message in a "
+            f"single pass, vs {separate_time / len(corpus) * 1000:.3f}ms with each linkifier"
+        )
+
+    def render_corpus(
+        self, linkifiers_key: int, linkifiers: list[LinkifierDict], corpus: list[str]
+    ) -> None:
+        requests = [
+            MarkdownRenderRequest(
+                content=content,
+                linkifiers_key=linkifiers_key,
+                linkifiers=linkifiers,
+                email_gateway=False,
+                realm=None,
+                has_message=False,
+                db_data=None,
+                image_preview_enabled=False,
+                url_embed_preview_enabled=False,
+                url_embed_data=None,
+            )
+            for content in corpus
+        ]
+        # The first rendering builds the Markdown engine.
+        start = time.perf_counter()
+        render_markdown_request(replace(requests[0], content=""))
+        setup_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for request in requests:
+            render_markdown_request(request)
+        print(
+            f"  rendering: {(time.perf_counter() - start) / len(requests) * 1000:.3f}ms "
+            f"per message, after {setup_time * 1000:.1f}ms building the engine"
+        )
+
+    def linkify_topics(
+        self, linkifiers_key: int, linkifiers: list[LinkifierDict], topics: list[str]
+    ) -> None:
+        start = time.perf_counter()
+        for topic in topics:
+            topic_links(linkifiers_key, topic, linkifiers)
+        print(
+            f"  topic links: {(time.perf_counter() - start) / len(topics) * 1000:.3f}ms per topic"
+        )
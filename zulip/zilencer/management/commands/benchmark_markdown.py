@@ -0,0 +1,301 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack, contextmanager, suppress
+from typing import Any
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import CommandParser
+from django.test import override_settings
+from markdown.util import Registry
+from typing_extensions import override
+
+from zerver.lib.exceptions import MarkdownRenderingError
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.markdown import ZulipMarkdown, markdown_convert, md_engines
+from zerver.models import Realm, UserProfile
+from zilencer.lib.markdown_benchmarks import markdown_test_case_inputs
+
+
+class ProcessorTimings:
+    """Total time spent in each of a Markdown engine's processors,
+    keyed by the stage and the name the processor is registered
+    under.  The inline patterns run inside the "inline"
+    treeprocessor, so their time is also counted there."""
+
+    def __init__(self) -> None:
+        self.times: dict[tuple[str, str], float] = defaultdict(float)
+        self.calls: Counter[tuple[str, str]] = Counter()
+
+    def timed(self, key: tuple[str, str], function: Callable[..., Any]) -> Callable[..., Any]:
+        def timed_function(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[key] += time.perf_counter() - start
+                self.calls[key] += 1
+
+        return timed_function
+
+    def timed_iterator(self, key: tuple[str, str], iterator: Iterator[Any]) -> Iterator[Any]:
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, None)
+            self.times[key] += time.perf_counter() - start
+            if item is None:
+                return
+            yield item
+
+    @contextmanager
+    def instrument(self, engine: ZulipMarkdown) -> Iterator[None]:
+        with ExitStack() as stack:
+            for stage, processors in [
+                ("preprocessor", engine.preprocessors),
+                ("blockprocessor", engine.parser.blockprocessors),
+                ("treeprocessor", engine.treeprocessors),
+                ("postprocessor", engine.postprocessors),
+            ]:
+                for name, processor in registered_items(processors):
+                    key = (stage, name)
+                    stack.enter_context(
+                        mock.patch.object(processor, "run", self.timed(key, processor.run))
+                    )
+            for name, pattern in registered_items(engine.inlinePatterns):
+                key = ("inline pattern", name)
+                stack.enter_context(
+                    mock.patch.object(pattern, "handleMatch", self.timed(key, pattern.handleMatch))
+                )
+                # Most of an inline pattern's time is spent searching
+                # the text with its regex.
+                stack.enter_context(
+                    mock.patch.object(
+                        pattern,
+                        "getCompiledRegExp",
+                        lambda regex=pattern.getCompiledRegExp(), key=key: TimedRegex(
+                            regex, key, self
+                        ),
+                    )
+                )
+            yield
+
+
+def registered_items(registry: Registry[Any]) -> list[tuple[str, Any]]:
+    # Each linkifier, for example, is a separately registered
+    # instance of the same class, so we tell them apart by name.
+    return [(item.name, registry[item.name]) for item in registry._priority]
+
+
+class TimedRegex:
+    def __init__(self, regex: Any, key: tuple[str, str], timings: ProcessorTimings) -> None:
+        self.regex = regex
+        self.key = key
+        self.timings = timings
+
+    def finditer(self, string: str, pos: int = 0) -> Iterator[Any]:
+        return self.timings.timed_iterator(self.key, iter(self.regex.finditer(string, pos)))
+
+    def match(self, string: str) -> Any:
+        return self.timings.timed(self.key, self.regex.match)(string)
+
+
+class StackSampler:
+    """Samples the stack of the thread that created it every
+    `interval` seconds, and counts each distinct stack; the counts
+    are written out as "folded" stacks, one per line, which most
+    flamegraph tools (flamegraph.pl, speedscope, inferno) read."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+
+    def sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.relpath(code.co_filename, settings.DEPLOY_ROOT)
+                names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    @contextmanager
+    def sampling(self) -> Iterator[None]:
+        thread = threading.Thread(target=self.sample, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            self.stopped.set()
+            thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class Command(ZulipBaseCommand):
+    help = """Benchmarks and profiles rendering messages with Markdown.
+
+Renders the inputs of the Markdown test fixtures, plus --synthetic
+large generated messages, --repeat times each through markdown_convert,
+in the given realm, and reports the time per message, the slowest
+inputs, and the time spent in each of the engine's preprocessors,
+block processors, inline patterns, treeprocessors and postprocessors.
+
+With --profile, also writes cProfile data for the rendering, which
+./tools/show-profile-results or snakeviz can show; with --flamegraph,
+also samples the stack while rendering, and writes folded stacks for
+flamegraph tools.  Rendering always happens in this process, without
+the rendered-Markdown cache.  Intended for use in a development
+environment only."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--repeat", help="Times to render each input", default=5, type=int)
+        parser.add_argument(
+            "--synthetic", help="Large generated messages to add", default=20, type=int
+        )
+        parser.add_argument("--profile", help="Write cProfile data to this file")
+        parser.add_argument("--flamegraph", help="Write folded stacks to this file")
+        parser.add_argument(
+            "--sample-interval",
+            help="Seconds between stack samples for --flamegraph",
+            default=0.001,
+            type=float,
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        corpus = markdown_test_case_inputs()
+        corpus += [
+            (f"synthetic_{i}", content)
+            for i, content in enumerate(self.synthetic_messages(realm, options["synthetic"]))
+        ]
+
+        with override_settings(MARKDOWN_RENDERING_PROCESSES=0, MARKDOWN_RENDER_CACHE_SIZE=0):
+            # Warm up, which also builds the realm's Markdown engine.
+            self.render_corpus(realm, corpus)
+
+            durations: dict[str, list[float]] = defaultdict(list)
+            for _ in range(options["repeat"]):
+                for name, duration in self.render_corpus(realm, corpus):
+                    durations[name].append(duration)
+            self.report_durations(durations)
+
+            timings = ProcessorTimings()
+            start = time.perf_counter()
+            with timings.instrument(md_engines[(realm.id, False)]):
+                self.render_corpus(realm, corpus)
+            self.report_timings(timings, time.perf_counter() - start)
+
+            if options["profile"]:
+                profile = cProfile.Profile()
+                profile.runcall(self.render_corpus, realm, corpus)
+                profile.dump_stats(options["profile"])
+                print(f"Profiling data written to {options['profile']}")
+
+            if options["flamegraph"]:
+                sampler = StackSampler(options["sample_interval"])
+                with sampler.sampling():
+                    self.render_corpus(realm, corpus)
+                sampler.write(options["flamegraph"])
+                print(f"Folded stacks written to {options['flamegraph']}")
+
+    def synthetic_messages(self, realm: Realm, count: int) -> list[str]:
+        full_names = list(
+            UserProfile.objects.filter(realm=realm, is_active=True, is_bot=False).values_list(
+                "full_name", flat=True
+            )[:20]
+        ) or ["Nobody"]
+        blocks: list[Callable[[], str]] = [
+            lambda: " ".join(
+                random.choice(
+                    [
+                        "lorem",
+                        "ipsum",
+                        "**bold**",
+                        "*emphasis*",
+                        "~~struck~~",
+                        "`code`",
+                        ":smile:",
+                        "\N{THUMBS UP SIGN}",
+                        "https://zulip.com/help/",
+                        "[a link](https://example.com)",
+                        f"@**{random.choice(full_names)}**",
+                        "#**general**",
+                        "<time:2024-01-01T12:00:00+00:00>",
+                    ]
+                )
+                for _ in range(60)
+            ),
+            lambda: "\n".join(f"* item {i} with `code` and **bold**" for i in range(10)),
+            lambda: "\n".join(f"> quoted line {i}" for i in range(5)),
+            lambda: (
+                "```python\n"
+                + "\n".join(f"def f{i}(x):\n    return x * {i}" for i in range(10))
+                + "\n```"
+            ),
+            lambda: (
+                "| a | b |\n| --- | --- |\n"
+                + "\n".join(f"| {i} | **{i * i}** |" for i in range(10))
+            ),
+        ]
+        messages = []
+        for _ in range(count):
+            parts: list[str] = []
+            length = 0
+            while True:
+                part = random.choice(blocks)()
+                if length + len(part) + 2 > settings.MAX_MESSAGE_LENGTH:
+                    break
+                parts.append(part)
+                length += len(part) + 2
+            messages.append("\n\n".join(parts))
+        return messages
+
+    def render_corpus(self, realm: Realm, corpus: list[tuple[str, str]]) -> list[tuple[str, float]]:
+        durations = []
+        for name, content in corpus:
+            start = time.perf_counter()
+            # Some fixtures test rendering failures.
+            with suppress(MarkdownRenderingError):
+                markdown_convert(content, message_realm=realm)
+            durations.append((name, time.perf_counter() - start))
+        return durations
+
+    def report_durations(self, durations: dict[str, list[float]]) -> None:
+        # The fastest of the repeats is the least noisy.
+        fastest = {name: min(times) for name, times in durations.items()}
+        ordered = sorted(fastest.values())
+        print(
+            f"Rendered {len(ordered)} inputs: {sum(ordered) * 1000:.1f}ms in total, "
+            f"median {ordered[len(ordered) // 2] * 1000:.3f}ms, "
+            f"95th percentile {ordered[int(len(ordered) * 0.95)] * 1000:.3f}ms"
+        )
+        print("Slowest inputs:")
+        for name, duration in sorted(fastest.items(), key=lambda item: item[1], reverse=True)[:10]:
+            print(f"  {duration * 1000:8.3f}ms  {name}")
+
+    def report_timings(self, timings: ProcessorTimings, total_time: float) -> None:
+        print(f"Time by processor, of {total_time * 1000:.1f}ms rendering:")
+        for (stage, name), duration in sorted(
+            timings.times.items(), key=lambda item: item[1], reverse=True
+        ):
+            print(
+                f"  {duration * 1000:8.1f}ms {duration / total_time:6.1%}  "
+                f"{stage} {name} ({timings.calls[stage, name]} calls)"
+            )
@@ -0,0 +1,56 @@
+import time
+from contextlib import suppress
+from typing import Any
+
+from django.core.management.base import CommandParser
+from django.test import override_settings
+from typing_extensions import override
+
+from zerver.lib.exceptions import MarkdownRenderingError
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.markdown import markdown_convert, markdown_render_cache
+from zerver.models import Realm
+from zilencer.lib.markdown_benchmarks import markdown_test_case_inputs
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures the rendered-Markdown cache on repeated content.
+
+Renders the inputs of the Markdown test fixtures --repeat times each,
+as bots and integrations sending the same content would, first with
+the cache disabled and then with it enabled, and reports the time per
+message and the cache's hit rate.  Intended for use in a development
+environment only."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--repeat", help="Times to render each fixture", default=10, type=int)
+        parser.add_argument(
+            "--cache-size", help="Rendered messages to cache", default=1000, type=int
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        corpus = [content for name, content in markdown_test_case_inputs()] * options["repeat"]
+
+        for cache_size in (0, options["cache_size"]):
+            with override_settings(MARKDOWN_RENDER_CACHE_SIZE=cache_size):
+                markdown_render_cache.clear()
+                duration = self.render_corpus(realm, corpus)
+            print(
+                f"Cache size {cache_size}: {duration / len(corpus) * 1000:.3f}ms per message, "
+                f"hit rate {markdown_render_cache.hit_rate():.0%} "
+                f"({markdown_render_cache.bypasses} not cacheable)"
+            )
+        markdown_render_cache.clear()
+
+    def render_corpus(self, realm: Realm, corpus: list[str]) -> float:
+        start = time.perf_counter()
+        for content in corpus:
+            # Some fixtures test rendering failures.
+            with suppress(MarkdownRenderingError):
+                markdown_convert(content, message_realm=realm)
+        return time.perf_counter() - start
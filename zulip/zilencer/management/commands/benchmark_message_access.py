@@ -0,0 +1,141 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import CommandError, CommandParser
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now as timezone_now
+from typing_extensions import override
+
+from zerver.actions.create_user import do_create_user
+from zerver.actions.message_edit import check_update_message
+from zerver.actions.streams import bulk_add_subscriptions
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.message import bulk_access_message_ids, has_message_access
+from zerver.lib.partial import partial
+from zerver.lib.streams import create_stream_if_needed
+from zerver.lib.topic import rebuild_stream_topics
+from zerver.lib.user_message import UserMessageLite, bulk_insert_ums
+from zerver.lib.utils import assert_is_not_none
+from zerver.models import Message, UserMessage, UserProfile
+from zerver.models.clients import get_client
+
+
+class RollbackError(Exception):
+    pass
+
+
+class Command(ZulipBaseCommand):
+    help = """Times message access checks and a topic move over many messages.
+
+Creates a temporary stream with --count messages (inside a transaction
+which is rolled back afterwards), then compares checking access to
+every message one at a time against bulk_access_message_ids, and
+times moving the whole topic to a new stream.  Intended for use in a
+development environment only."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--count", help="Number of messages in the topic", default=10000, type=int
+        )
+        parser.add_argument(
+            "--protected-history",
+            help="Use streams with protected history, which require UserMessage checks",
+            action="store_true",
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        try:
+            with transaction.atomic():
+                self.run_benchmark(realm.id, options["count"], options["protected_history"])
+                raise RollbackError
+        except RollbackError:
+            pass
+
+    def measure(self, name: str, function: Callable[[], object]) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            duration = time.perf_counter() - start
+        print(f"  {name}: {duration * 1000:.1f}ms, {len(queries)} queries")
+
+    def run_benchmark(self, realm_id: int, count: int, protected_history: bool) -> None:
+        user = UserProfile.objects.filter(
+            realm_id=realm_id, is_active=True, role=UserProfile.ROLE_REALM_OWNER
+        ).first()
+        if user is None:
+            raise CommandError("The realm has no active owner.")
+        viewer = do_create_user(
+            "benchmark-viewer@example.com", None, user.realm, "Viewer", acting_user=None
+        )
+
+        streams = []
+        for name in ("benchmark-source", "benchmark-destination"):
+            stream, _ = create_stream_if_needed(
+                user.realm,
+                name,
+                invite_only=protected_history,
+                history_public_to_subscribers=not protected_history,
+            )
+            bulk_add_subscriptions(user.realm, [stream], [user, viewer], acting_user=None)
+            streams.append(stream)
+        source, destination = streams
+
+        print(f"Creating {count} messages...")
+        messages = [
+            Message(
+                realm_id=realm_id,
+                sender=user,
+                recipient_id=source.recipient_id,
+                subject="benchmark",
+                content=f"Message {i}",
+                rendered_content=f"<p>Message {i}</p>",
+                date_sent=timezone_now(),
+                sending_client=get_client("benchmark"),
+            )
+            for i in range(count)
+        ]
+        Message.objects.bulk_create(messages)
+        bulk_insert_ums(
+            [
+                UserMessageLite(user_profile_id=user_profile.id, message_id=message.id, flags=0)
+                for message in messages
+                for user_profile in (user, viewer)
+            ]
+        )
+        rebuild_stream_topics(realm_id, assert_is_not_none(source.recipient_id))
+        message_ids = [message.id for message in messages]
+
+        def has_user_message(message_id: int) -> bool:
+            return UserMessage.objects.filter(user_profile=viewer, message_id=message_id).exists()
+
+        def check_one_at_a_time() -> None:
+            for message in Message.objects.filter(id__in=message_ids).select_related("recipient"):
+                has_message_access(
+                    viewer, message, has_user_message=partial(has_user_message, message.id)
+                )
+
+        print("Access checks:")
+        self.measure("one message at a time", check_one_at_a_time)
+        self.measure(
+            "bulk_access_message_ids", lambda: bulk_access_message_ids(viewer, message_ids)
+        )
+
+        print("Moving the topic:")
+        self.measure(
+            f"move {count} messages to another stream",
+            lambda: check_update_message(
+                user,
+                message_ids[0],
+                stream_id=destination.id,
+                propagate_mode="change_all",
+                send_notification_to_old_thread=False,
+                send_notification_to_new_thread=False,
+            ),
+        )
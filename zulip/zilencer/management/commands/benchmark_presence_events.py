@@ -0,0 +1,102 @@
+import time
+from typing import Any
+
+from django.core.management.base import CommandParser
+from django.test.utils import override_settings
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.tornado.event_queue import (
+    ClientDescriptor,
+    allocate_client_descriptor,
+    clear_client_event_queues_for_testing,
+    flush_presence_events,
+    process_presence_event,
+)
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures how presence event volume scales with the number of users.
+
+Simulates a wave of users coming online in a realm where every user
+has an event queue, as at the start of a work day, using in-process
+event queues in place of Tornado.  For each realm size, it reports the
+number of events pushed to queues and how long delivering them took,
+with presence events sent individually and with them aggregated over
+PRESENCE_EVENT_AGGREGATION_WINDOW_SECS, both for clients which
+support presence_batch events and those which don't.  Doesn't access
+the database."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--sizes",
+            help="Comma-separated list of realm sizes to simulate",
+            default="100,500,1000,2000",
+        )
+        parser.add_argument(
+            "--windows",
+            help="Number of aggregation windows the users come online over",
+            default=10,
+            type=int,
+        )
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        print(f"{'users':>8} {'mode':>12} {'events':>12} {'time':>10}")
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            for mode in ["individual", "aggregated", "batched"]:
+                events, duration = self.run_benchmark(size, options["windows"], mode)
+                print(f"{size:>8} {mode:>12} {events:>12} {duration * 1000:>8.0f}ms")
+
+    def run_benchmark(self, size: int, windows: int, mode: str) -> tuple[int, float]:
+        clear_client_event_queues_for_testing()
+        user_ids = list(range(1, size + 1))
+        clients: list[ClientDescriptor] = [
+            allocate_client_descriptor(
+                dict(
+                    user_profile_id=user_id,
+                    realm_id=1,
+                    event_types=None,
+                    client_type_name="website",
+                    apply_markdown=True,
+                    client_gravatar=True,
+                    slim_presence=True,
+                    all_public_streams=False,
+                    queue_timeout=600,
+                    last_connection_time=time.time(),
+                    narrow=[],
+                    batched_presence_events=mode == "batched",
+                )
+            )
+            for user_id in user_ids
+        ]
+
+        window_secs = 0 if mode == "individual" else 1
+        start = time.perf_counter()
+        with override_settings(PRESENCE_EVENT_AGGREGATION_WINDOW_SECS=window_secs):
+            for i, user_id in enumerate(user_ids):
+                timestamp = int(time.time())
+                event = dict(
+                    type="presence",
+                    email=f"user{user_id}@example.com",
+                    user_id=user_id,
+                    server_timestamp=time.time(),
+                    presence={
+                        "website": dict(
+                            client="website", status="active", timestamp=timestamp, pushable=False
+                        )
+                    },
+                    active_timestamp=timestamp,
+                    idle_timestamp=timestamp,
+                )
+                process_presence_event(event, user_ids)
+                # Each window's worth of users is delivered together.
+                if (i + 1) % max(size // windows, 1) == 0:
+                    flush_presence_events()
+            flush_presence_events()
+        duration = time.perf_counter() - start
+
+        events = sum(len(client.event_queue.queue) for client in clients)
+        clear_client_event_queues_for_testing()
+        return events, duration
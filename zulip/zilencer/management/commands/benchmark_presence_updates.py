@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import CommandError, CommandParser
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.timezone import now as timezone_now
+from typing_extensions import override
+
+from zerver.actions.presence import do_update_user_presence
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.presence_store import clear_presence_store, flush_presence_updates
+from zerver.models import UserPresence, UserProfile
+from zerver.models.clients import get_client
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures how many presence updates per second can be processed.
+
+Sends --count presence updates from the realm's active users, spread
+over --threads threads, first writing them to the database directly,
+and then with PRESENCE_UPDATES_IN_REDIS; for the latter, also times
+flushing the updates to the database.  Each user's updates are far
+enough apart that every one of them changes the user's presence, so
+the realm's presence data ends up in the future.  Intended for use in
+a development environment only."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--count", help="Number of presence updates to send", default=10000, type=int
+        )
+        parser.add_argument(
+            "--threads", help="Number of threads sending updates", default=4, type=int
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        users = list(UserProfile.objects.filter(realm=realm, is_active=True, is_bot=False))
+        if not users:
+            raise CommandError("The realm has no active users.")
+
+        start_time = timezone_now()
+        for in_redis in [False, True]:
+            with override_settings(PRESENCE_UPDATES_IN_REDIS=in_redis):
+                if in_redis:
+                    clear_presence_store()
+                start_time = self.run_benchmark(
+                    users, start_time, options["count"], options["threads"]
+                )
+                if in_redis:
+                    start = time.perf_counter()
+                    flushed = flush_presence_updates()
+                    duration = time.perf_counter() - start
+                    print(f"  flushed {flushed} rows to the database in {duration * 1000:.1f}ms")
+
+    def run_benchmark(
+        self, users: list[UserProfile], start_time: datetime, count: int, threads: int
+    ) -> datetime:
+        interval = timedelta(seconds=settings.PRESENCE_UPDATE_MIN_FREQ_SECONDS + 1)
+        client = get_client("website")
+
+        def send_updates(thread: int) -> None:
+            try:
+                for i in range(thread, count, threads):
+                    do_update_user_presence(
+                        users[i % len(users)],
+                        client,
+                        start_time + interval * (i // len(users) + 1),
+                        UserPresence.LEGACY_STATUS_ACTIVE_INT,
+                    )
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(send_updates, range(threads)))
+        duration = time.perf_counter() - start
+
+        backend = "Redis" if settings.PRESENCE_UPDATES_IN_REDIS else "database"
+        print(f"{backend}: {count} presence updates in {duration:.2f}s ({count / duration:.0f}/s)")
+        return start_time + interval * (count // len(users) + 2)
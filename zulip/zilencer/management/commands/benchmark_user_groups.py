@@ -0,0 +1,110 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import CommandError, CommandParser
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django_cte import With
+from typing_extensions import override
+
+from zerver.actions.user_groups import add_subgroups_to_user_group, check_add_user_group
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.user_groups import get_recursive_group_members, is_user_in_group
+from zerver.models import NamedUserGroup, Realm, UserGroup, UserProfile
+
+
+def get_recursive_group_members_with_cte(user_group: UserGroup) -> QuerySet[UserProfile]:
+    # The recursive query we used before UserGroupClosure, for comparison.
+    cte = With.recursive(
+        lambda cte: UserGroup.objects.filter(id=user_group.id)
+        .values(group_id=F("id"))
+        .union(
+            cte.join(NamedUserGroup, direct_supergroups=cte.col.group_id).values(group_id=F("id"))
+        )
+    )
+    subgroups = cte.join(UserGroup, id=cte.col.group_id).with_cte(cte)
+    return UserProfile.objects.filter(direct_groups__in=subgroups)
+
+
+class Command(ZulipBaseCommand):
+    help = """Measures group membership checks on deeply nested user groups.
+
+Creates a tree of nested user groups in the realm, --depth levels deep
+with --width subgroups per group, with one of the realm's users as a
+member of each group at the deepest level.  Then times checking
+membership of the top-level group using UserGroupClosure, and using a
+recursive query over GroupGroupMembership.  The groups are removed
+afterwards.  Intended for use in a development environment only."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--depth", help="Levels of nested groups", default=10, type=int)
+        parser.add_argument("--width", help="Subgroups of each group", default=2, type=int)
+        parser.add_argument(
+            "--iterations", help="Membership checks to time", default=1000, type=int
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        users = list(UserProfile.objects.filter(realm=realm, is_active=True, is_bot=False)[:2])
+        if len(users) < 2:
+            raise CommandError("The realm needs at least two active users.")
+        member, non_member = users
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            top_group = self.create_nested_groups(realm, member, options["depth"], options["width"])
+            print(f"Created nested groups in {time.perf_counter() - start:.2f}s")
+
+            checks: dict[str, Callable[[UserProfile], bool]] = {
+                "closure": lambda user: is_user_in_group(top_group, user),
+                "recursive query": lambda user: get_recursive_group_members_with_cte(top_group)
+                .filter(id=user.id)
+                .exists(),
+            }
+            for name, check in checks.items():
+                assert check(member)
+                assert not check(non_member)
+                start = time.perf_counter()
+                for i in range(options["iterations"]):
+                    check(member if i % 2 else non_member)
+                duration = time.perf_counter() - start
+                print(
+                    f"{name}: {duration / options['iterations'] * 1000:.3f}ms per membership check"
+                )
+
+            start = time.perf_counter()
+            member_count = get_recursive_group_members(top_group).count()
+            print(
+                f"Counted {member_count} recursive members in "
+                f"{(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+            transaction.set_rollback(True)
+
+    def create_nested_groups(
+        self, realm: Realm, member: UserProfile, depth: int, width: int
+    ) -> NamedUserGroup:
+        top_group = check_add_user_group(
+            realm, "Benchmark level 0", [member] if depth == 1 else [], acting_user=None
+        )
+        level = [top_group]
+        for i in range(1, depth):
+            next_level = []
+            for j, group in enumerate(level):
+                subgroups = [
+                    check_add_user_group(
+                        realm,
+                        f"Benchmark level {i} group {j * width + k}",
+                        [member] if i == depth - 1 else [],
+                        acting_user=None,
+                    )
+                    for k in range(width)
+                ]
+                add_subgroups_to_user_group(group, subgroups, acting_user=None)
+                next_level += subgroups
+            level = next_level
+        return top_group
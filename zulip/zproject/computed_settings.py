@@ -50,6 +50,8 @@ from .configured_settings import (
     REGISTER_LINK_DISABLED,
     REMOTE_POSTGRES_HOST,
     REMOTE_POSTGRES_PORT,
+    REMOTE_POSTGRES_REPLICA_HOST,
+    REMOTE_POSTGRES_REPLICA_PORT,
     REMOTE_POSTGRES_SSLMODE,
     ROOT_SUBDOMAIN_ALIASES,
     SENTRY_DSN,
@@ -382,6 +384,20 @@ elif (
         PASSWORD=get_secret("postgres_password"),
         HOST="localhost",
     )
+
+# An optional read-only streaming replica of the database, used for
+# some expensive reads which don't need to see the latest writes; see
+# zerver/lib/read_replica.py.  It shares the primary's credentials.
+if REMOTE_POSTGRES_REPLICA_HOST != "":
+    DATABASES["replica"] = deepcopy(DATABASES["default"])
+    DATABASES["replica"].update(
+        HOST=REMOTE_POSTGRES_REPLICA_HOST,
+        PORT=REMOTE_POSTGRES_REPLICA_PORT,
+        TEST={"MIRROR": "default"},
+    )
+    DATABASES["replica"]["OPTIONS"].pop("target_session_attrs", None)
+    DATABASE_ROUTERS = ["zerver.lib.read_replica.ReadReplicaRouter"]
+
 POSTGRESQL_MISSING_DICTIONARIES = get_config("postgresql", "missing_dictionaries", False)
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
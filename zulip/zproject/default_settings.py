@@ -203,6 +203,9 @@ REDIS_PORT = 6379
 REMOTE_POSTGRES_HOST = ""
 REMOTE_POSTGRES_PORT = ""
 REMOTE_POSTGRES_SSLMODE = ""
+REMOTE_POSTGRES_REPLICA_HOST = ""
+REMOTE_POSTGRES_REPLICA_PORT = ""
+DATABASE_REPLICA_MAX_LAG_SECONDS = 10
 
 TORNADO_PORTS: list[int] = []
 USING_TORNADO = True
@@ -560,6 +563,12 @@ PRESENCE_PING_INTERVAL_SECS = 60
 # organization can have before these presence update events are
 # disabled.
 USER_LIMIT_FOR_SENDING_PRESENCE_UPDATE_EVENTS = 100
+# If positive, Tornado holds these presence update events back for
+# this many seconds, and then delivers all of them to each client
+# supporting the `batched_presence_events` client capability as a
+# single event.  This makes them much cheaper in large organizations,
+# so one can raise USER_LIMIT_FOR_SENDING_PRESENCE_UPDATE_EVENTS.
+PRESENCE_EVENT_AGGREGATION_WINDOW_SECS = 0
 
 # Controls the how much newer a user presence update needs to be
 # than the currently saved last_active_time or last_connected_time in order for us to
@@ -573,6 +582,17 @@ PRESENCE_UPDATE_MIN_FREQ_SECONDS = 55
 # we will specify ACTIVE status  as long as the timedelta is within this limit and IDLE otherwise.
 PRESENCE_LEGACY_EVENT_OFFSET_FOR_ACTIVITY_SECONDS = 70
 
+# Whether presence updates are stored in Redis, and written to the
+# database in batches by `manage.py flush_presence_updates`, rather
+# than each taking a lock on the realm's PresenceSequence row.  This
+# helps organizations with thousands of concurrently online users.
+PRESENCE_UPDATES_IN_REDIS = False
+# How often presence updates stored in Redis are written to the
+# database.  Code which reads UserPresence rows directly, like the
+# check for idle users when sending notifications, may see data this
+# much older, so it should be well below OFFLINE_THRESHOLD_SECS.
+PRESENCE_REDIS_FLUSH_INTERVAL_SECS = 15
+
 # How many days deleted messages data should be kept before being
 # permanently deleted.
 ARCHIVED_DATA_VACUUMING_DELAY_DAYS = 30
@@ -654,6 +674,58 @@ MAX_GROUP_SIZE_FOR_MENTION_REACTIVATION = 11
 # this way, pending further optimization of the relevant code paths.
 CAN_ACCESS_ALL_USERS_GROUP_LIMITS_PRESENCE = False
 
+# Whether the users each guest can access, in organizations which
+# limit that via can_access_all_users_group, are cached in Redis and
+# updated incrementally, rather than computed from the database each
+# time they are needed.  See zerver/lib/user_access_cache.py.
+USER_ACCESS_CACHE_IN_REDIS = False
+
+# Time, in seconds, after which /register omits the optional sections
+# of the initial state it hasn't fetched yet, for clients which can
+# fetch them later (see DEFERRABLE_STATE_SECTIONS), so that one slow
+# section can't push /register past the client's request timeout.
+REGISTER_TIME_BUDGET_SECONDS: float | None = None
+# Whether /register responses include a Server-Timing header with the
+# time and database queries spent on each section of the initial
+# state.  Useful for debugging; this reveals details of the server's
+# performance to clients.
+REGISTER_SERVER_TIMING_HEADER = False
+
+# How many renderer processes each server process starts to render
+# Markdown in, so that rendering which takes too long can be stopped
+# by killing the renderer; see zerver/lib/markdown_rendering_pool.py.
+# If 0, Markdown is rendered in the server process itself.
+MARKDOWN_RENDERING_PROCESSES = 0
+
+# How many rendered messages each server process caches, keyed on
+# their content and everything else their rendering depends on, to
+# avoid re-rendering the identical messages bots and integrations
+# often send; see MarkdownRenderCache.  If 0, nothing is cached.
+MARKDOWN_RENDER_CACHE_SIZE = 0
+
+# For how many realms each server process keeps an index of their
+# users' names and user groups, used to resolve mentions in messages
+# without querying the database; see zerver/lib/mention.py.  If 0,
+# mentions are looked up in the database.
+MENTION_INDEX_MAX_REALMS = 0
+
+# For how many realms each server process keeps a copy of their
+# active custom emoji, used when rendering messages and reactions,
+# rather than fetching them from the remote cache each time; see
+# get_active_realm_emoji.  If 0, no copies are kept.
+REALM_EMOJI_CACHE_MAX_REALMS = 0
+
+# Whether changes to a realm's linkifiers or custom emoji re-render
+# the realm's existing messages they affect, in the background; see
+# zerver/lib/message_rerendering.py.
+RERENDER_MESSAGES_ON_REALM_CHANGES = False
+
+# How many long-running KaTeX worker processes each server process
+# keeps for rendering the math in a message in one batch; formulas
+# they fail to render fall back to KATEX_SERVER, or to starting node
+# for each formula.  See zerver/lib/tex.py.
+KATEX_WORKER_PROCESSES = 0
+
 # General expiry time for signed tokens we may generate
 # in some places through the codebase.
 SIGNED_ACCESS_TOKEN_VALIDITY_IN_SECONDS = 60
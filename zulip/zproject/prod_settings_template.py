@@ -596,6 +596,15 @@ SOCIAL_AUTH_SAML_SUPPORT_CONTACT = {
 # REMOTE_POSTGRES_HOST = "dbserver.example.com"
 # REMOTE_POSTGRES_PORT = "5432"
 # REMOTE_POSTGRES_SSLMODE = "require"
+##
+## Zulip can send some expensive read-only queries (fetching older
+## message history, search, stats, and exports) to a streaming replica
+## of the database, which uses the same credentials.  Reads fall back
+## to the primary if the replica's replication lag exceeds
+## DATABASE_REPLICA_MAX_LAG_SECONDS.
+# REMOTE_POSTGRES_REPLICA_HOST = "dbreplica.example.com"
+# REMOTE_POSTGRES_REPLICA_PORT = "5432"
+# DATABASE_REPLICA_MAX_LAG_SECONDS = 10
 
 ########
 ## RabbitMQ configuration.
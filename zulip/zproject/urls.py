@@ -58,7 +58,7 @@ from zerver.views.digest import digest_page
 from zerver.views.documentation import IntegrationView, MarkdownDirectoryView, integration_doc
 from zerver.views.drafts import create_drafts, delete_draft, edit_draft, fetch_drafts
 from zerver.views.email_mirror import email_mirror_message
-from zerver.views.events_register import events_register_backend
+from zerver.views.events_register import events_register_backend, get_register_sections_backend
 from zerver.views.health import health
 from zerver.views.home import accounts_accept_terms, desktop_home, home
 from zerver.views.invite import (
@@ -157,6 +157,7 @@ from zerver.views.streams import (
     create_default_stream_group,
     deactivate_stream_backend,
     delete_in_topic,
+    get_bulk_subscribers_backend,
     get_stream_backend,
     get_stream_email_address,
     get_streams_backend,
@@ -464,6 +465,7 @@ v1_api_and_json_patterns = [
     # streams -> zerver.views.streams
     # (this API is only used externally)
     rest_path("streams", GET=get_streams_backend),
+    rest_path("streams/members", GET=get_bulk_subscribers_backend),
     # GET returns `stream_id`, stream name should be encoded in the URL query (in `stream` param)
     rest_path("get_stream_id", GET=json_get_stream_id),
     # GET returns "stream info" (undefined currently?), HEAD returns whether stream exists (200 or 404)
@@ -504,6 +506,8 @@ v1_api_and_json_patterns = [
     rest_path("users/me/muted_users/<int:muted_user_id>", POST=mute_user, DELETE=unmute_user),
     # used to register for an event queue in tornado
     rest_path("register", POST=(events_register_backend, {"allow_anonymous_user_web"})),
+    # used to fetch the parts of the initial state that /register deferred
+    rest_path("register/sections", GET=get_register_sections_backend),
     # events -> zerver.tornado.views
     rest_path("events", GET=get_events, DELETE=cleanup_event_queue),
     # Used to generate a Zoom video call URL